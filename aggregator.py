@@ -0,0 +1,803 @@
+#!/usr/bin/env python3
+"""
+Edge-to-aggregator detection streaming for multi-node sites.
+
+On a large site every box alerting on its own means dozens of processes
+holding SMTP and Twilio credentials and people getting the same intruder
+from every camera that saw them. Instead, edge nodes (AGGREGATOR_ADDRESS
+set) publish their detections to one aggregator, which is the only process
+that sends notifications:
+
+    edge node    EdgePublisher.publish() only appends to a bounded queue; a
+                 sender thread packs events into binary batches, attaches a
+                 small JPEG thumbnail at most every EDGE_THUMBNAIL_INTERVAL
+                 seconds per camera, and streams them over TCP
+    aggregator   drops retransmitted batches, records every detection in the
+                 event store and feeds an AlertCoalescer keyed by node and
+                 camera; with AGGREGATOR_SCOPE=site all nodes share one alert
+                 window, so one intruder crossing five cameras is one alert
+                 plus digests
+
+Flow control and failures:
+
+    batching       up to EDGE_BATCH_SIZE events per message, sent when full or
+                   EDGE_BATCH_INTERVAL seconds after the first event
+    backpressure   at most EDGE_MAX_IN_FLIGHT batches wait for an ACK; beyond
+                   that events queue up (thumbnails are skipped once the queue
+                   is half full) and the oldest are dropped at EDGE_QUEUE_SIZE
+    reconnect      exponential backoff up to EDGE_RECONNECT_MAX; batches not
+                   acknowledged are resent, and the aggregator, which
+                   remembers the last batch of each node run, acknowledges
+                   duplicates without dispatching them again
+
+Wire format (big-endian): every message is a header (b'HD', version, type,
+payload length) and a payload. A node opens with HELLO (run id, node id,
+token) and gets WELCOME (last batch seen from this run) or REJECT. BATCH
+payloads are a sequence number, an event count and the events: timestamp,
+camera, frame size, box count, thumbnail length, then per box x1, y1, x2, y2,
+confidence (1/65535 units) and track id (-1 for none), then the thumbnail.
+"""
+
+import argparse
+import hmac
+import ipaddress
+import logging
+import secrets
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+from config import Config
+from logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HD'
+VERSION = 1
+HELLO, WELCOME, BATCH, ACK, REJECT = 1, 2, 3, 4, 5
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+_HEADER = struct.Struct('!2sBBI')  # magic, version, message type, payload length
+_HELLO = struct.Struct('!QH')  # run id, node id length; then node id and token
+_SEQ = struct.Struct('!Q')
+_BATCH = struct.Struct('!QH')  # sequence number, event count
+_EVENT = struct.Struct('!dHHHBI')  # timestamp, camera, frame width, frame height, boxes, thumbnail length
+_BOX = struct.Struct('!HHHHHi')  # x1, y1, x2, y2, confidence, track id
+
+HANDSHAKE_TIMEOUT = 5.0  # seconds
+RECONNECT_MIN = 0.5  # seconds
+THUMBNAIL_QUALITY = 70
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def parse_address(spec):
+    """
+    Parse a "host:port" address.
+
+    Returns:
+        tuple: (host, port)
+    """
+    host, _, port = spec.strip().rpartition(':')
+    if not host or not port.isdigit() or not 0 <= int(port) <= 65535:
+        raise ValueError(f"expected host:port, got {spec!r}")
+    return host.strip('[]'), int(port)
+
+
+def is_loopback(host):
+    """Whether a listen host only accepts connections from this machine."""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _message(kind, payload=b''):
+    return _HEADER.pack(MAGIC, VERSION, kind, len(payload)) + payload
+
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise EOFError("connection closed mid-message")
+    return data
+
+
+def _read_message(stream):
+    """
+    Read one message from a binary file object.
+
+    Returns:
+        tuple or None: (type, payload), None if the peer closed the connection
+    """
+    header = stream.read(_HEADER.size)
+    if not header:
+        return None
+    if len(header) != _HEADER.size:
+        raise EOFError("connection closed mid-message")
+    magic, version, kind, length = _HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError(f"not a detection stream (magic {magic!r}, version {version})")
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"message of {length} bytes exceeds the {MAX_PAYLOAD} byte limit")
+    return kind, _read_exactly(stream, length)
+
+
+def _u16(value):
+    return min(65535, max(0, int(value)))
+
+
+class EdgeEvent:
+    """One frame's detections as streamed to the aggregator."""
+
+    def __init__(self, camera, timestamp, boxes, width, height, thumbnail=None):
+        """
+        Args:
+            camera: Camera index on the node
+            timestamp: Capture time
+            boxes: List of ((x1, y1, x2, y2), confidence, track_id or None) in frame pixels
+            width, height: Frame size the boxes refer to
+            thumbnail: Optional JPEG bytes
+        """
+        self.camera = camera
+        self.timestamp = timestamp
+        self.boxes = boxes
+        self.width = width
+        self.height = height
+        self.thumbnail = thumbnail
+
+    def encode(self):
+        thumbnail = self.thumbnail or b''
+        boxes = self.boxes[:255]
+        parts = [_EVENT.pack(self.timestamp, self.camera, self.width, self.height, len(boxes), len(thumbnail))]
+        for (x1, y1, x2, y2), confidence, track_id in boxes:
+            parts.append(_BOX.pack(_u16(x1), _u16(y1), _u16(x2), _u16(y2), _u16(round(confidence * 65535)),
+                                   -1 if track_id is None else int(track_id)))
+        parts.append(thumbnail)
+        return b''.join(parts)
+
+    def detections(self, width=None):
+        """Detection dicts, with boxes scaled to an image of this width (default the frame's)."""
+        scale = width / self.width if width and self.width else 1.0
+        return [{'bbox': tuple(int(round(v * scale)) for v in bbox), 'confidence': confidence, 'track_id': track_id}
+                for bbox, confidence, track_id in self.boxes]
+
+
+def encode_batch(seq, events):
+    """BATCH message for a list of EdgeEvents."""
+    return _message(BATCH, _BATCH.pack(seq, len(events)) + b''.join(event.encode() for event in events))
+
+
+def decode_batch(payload):
+    """
+    Decode a BATCH payload.
+
+    Returns:
+        tuple: (seq, list of EdgeEvent)
+
+    Raises:
+        ProtocolError: If the payload is malformed
+    """
+    try:
+        seq, count = _BATCH.unpack_from(payload)
+        offset = _BATCH.size
+        events = []
+        for _ in range(count):
+            timestamp, camera, width, height, box_count, thumbnail_length = _EVENT.unpack_from(payload, offset)
+            offset += _EVENT.size
+            boxes = []
+            for _ in range(box_count):
+                x1, y1, x2, y2, confidence, track_id = _BOX.unpack_from(payload, offset)
+                offset += _BOX.size
+                boxes.append(((x1, y1, x2, y2), confidence / 65535, None if track_id < 0 else track_id))
+            thumbnail = payload[offset:offset + thumbnail_length]
+            if len(thumbnail) != thumbnail_length:
+                raise ProtocolError("truncated thumbnail")
+            offset += thumbnail_length
+            events.append(EdgeEvent(camera, timestamp, boxes, width, height, thumbnail or None))
+    except struct.error as e:
+        raise ProtocolError(f"malformed batch: {e}") from None
+    if offset != len(payload):
+        raise ProtocolError(f"{len(payload) - offset} trailing bytes after batch")
+    return seq, events
+
+
+def encode_hello(run_id, node_id, token):
+    node = node_id.encode()
+    return _message(HELLO, _HELLO.pack(run_id, len(node)) + node + token.encode())
+
+
+def _decode_hello(payload):
+    try:
+        run_id, length = _HELLO.unpack_from(payload)
+    except struct.error:
+        raise ProtocolError("malformed hello") from None
+    node = payload[_HELLO.size:_HELLO.size + length].decode(errors='replace')
+    return run_id, node, payload[_HELLO.size + length:]
+
+
+class EdgePublisher:
+    def __init__(self, address=None, node_id=None, token=None, batch_size=None, batch_interval=None,
+                 queue_size=None, max_in_flight=None, thumbnail_width=None, thumbnail_interval=None,
+                 reconnect_max=None):
+        """
+        Initialize the publisher and start its sender thread.
+
+        Args:
+            address: Aggregator "host:port" or (host, port) (default from config)
+            node_id: Name of this node (default from config, else the host name)
+            token: Shared secret the aggregator expects (default from config)
+            batch_size: Maximum events per batch (default from config)
+            batch_interval: Seconds the first event of a batch waits for more (default from config)
+            queue_size: Events buffered before the oldest are dropped (default from config)
+            max_in_flight: Batches sent without an acknowledgement (default from config)
+            thumbnail_width: Width of the JPEG thumbnails, 0 for none (default from config)
+            thumbnail_interval: Minimum seconds between thumbnails of one camera (default from config)
+            reconnect_max: Maximum seconds between reconnection attempts (default from config)
+        """
+        address = address if address is not None else Config.AGGREGATOR_ADDRESS
+        self.address = parse_address(address) if isinstance(address, str) else tuple(address)
+        self.node_id = node_id or Config.NODE_ID or socket.gethostname()
+        self.token = token if token is not None else Config.AGGREGATOR_TOKEN
+        self.batch_size = batch_size if batch_size is not None else Config.EDGE_BATCH_SIZE
+        self.batch_interval = batch_interval if batch_interval is not None else Config.EDGE_BATCH_INTERVAL
+        self.queue_size = queue_size if queue_size is not None else Config.EDGE_QUEUE_SIZE
+        self.max_in_flight = max_in_flight if max_in_flight is not None else Config.EDGE_MAX_IN_FLIGHT
+        self.thumbnail_width = thumbnail_width if thumbnail_width is not None else Config.EDGE_THUMBNAIL_WIDTH
+        self.thumbnail_interval = (thumbnail_interval if thumbnail_interval is not None
+                                   else Config.EDGE_THUMBNAIL_INTERVAL)
+        self.reconnect_max = reconnect_max if reconnect_max is not None else Config.EDGE_RECONNECT_MAX
+
+        # A new run id per process, so the aggregator does not take a restarted
+        # node's batch numbers for retransmissions
+        self.run_id = secrets.randbits(64)
+        self.cond = threading.Condition()
+        self.pending = deque()  # (queued at, EdgeEvent, frame for the thumbnail or None)
+        self.in_flight = OrderedDict()  # seq -> encoded BATCH message, until acknowledged
+        self.next_seq = 1
+        self.last_thumbnail = {}  # camera -> timestamp
+        self.running = True
+        self.close_deadline = None
+        self.connected = False
+
+        # Statistics
+        self.published = 0
+        self.dropped = 0
+        self.events_sent = 0
+        self.batches_sent = 0
+        self.batches_acked = 0
+        self.batches_resent = 0
+        self.thumbnails = 0
+        self.thumbnails_skipped = 0
+        self.bytes_sent = 0
+        self.max_queue_depth = 0
+        self.backpressure_stalls = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+
+        self.thread = threading.Thread(target=self._run, name='edge-publisher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def publish(self, camera, detections, frame=None, timestamp=None):
+        """
+        Queue a frame's detections for the aggregator. Never blocks.
+
+        Args:
+            camera: Camera index
+            detections: Detection dicts ('bbox', 'confidence', optional 'track_id')
+            frame: Frame for the thumbnail (must not be modified afterwards)
+            timestamp: Capture time (default now)
+
+        Returns:
+            bool: False if the publisher is closed or an older event was dropped to make room
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        boxes = [(det['bbox'], float(det['confidence']), det.get('track_id')) for det in detections]
+        height, width = frame.shape[:2] if frame is not None else (0, 0)
+        with self.cond:
+            if not self.running:
+                return False
+            self.published += 1
+            dropped = len(self.pending) >= self.queue_size
+            if dropped:
+                self.pending.popleft()
+                self.dropped += 1
+            # Thumbnails are encoded by the sender thread; here only pick which frames get one
+            thumbnail_frame = None
+            if (frame is not None and self.thumbnail_width
+                    and timestamp - self.last_thumbnail.get(camera, float('-inf')) >= self.thumbnail_interval):
+                self.last_thumbnail[camera] = timestamp
+                thumbnail_frame = frame
+            self.pending.append((time.monotonic(), EdgeEvent(camera, timestamp, boxes, width, height),
+                                 thumbnail_frame))
+            self.max_queue_depth = max(self.max_queue_depth, len(self.pending))
+            self.cond.notify_all()
+        return not dropped
+
+    def _encode_thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        if width > self.thumbnail_width:
+            frame = cv2.resize(frame, (self.thumbnail_width, int(height * self.thumbnail_width / width)),
+                               interpolation=cv2.INTER_AREA)
+        ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+        return data.tobytes() if ok else None
+
+    def _closing_expired(self):
+        return not self.running and (time.monotonic() >= self.close_deadline
+                                     or not (self.pending or self.in_flight))
+
+    def _ack(self, seq):
+        """Forget the batches up to seq, which the aggregator has processed."""
+        while self.in_flight:
+            first = next(iter(self.in_flight))
+            if first > seq:
+                break
+            del self.in_flight[first]
+            self.batches_acked += 1
+        self.cond.notify_all()
+
+    def _run(self):
+        """Connect, stream, and reconnect with backoff until closed."""
+        delay = RECONNECT_MIN
+        failures = 0  # consecutive attempts that did not get through the handshake
+        while True:
+            with self.cond:
+                if self._closing_expired():
+                    break
+            connects = self.connects
+            try:
+                sock = socket.create_connection(self.address, timeout=HANDSHAKE_TIMEOUT)
+            except OSError as e:
+                self.connect_failures += 1
+                error = f"unreachable ({e})"
+            else:
+                error = None
+                try:
+                    self._session(sock)
+                except (OSError, EOFError, ProtocolError) as e:
+                    error = str(e)
+                finally:
+                    with self.cond:
+                        self.connected = False
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    sock.close()
+                if self.connects > connects:
+                    self.disconnects += 1
+                    failures, delay = 0, RECONNECT_MIN
+
+            if error is None:
+                continue
+            if self.connects == connects:
+                failures += 1
+            if failures <= 1 or failures % 20 == 0:
+                logger.warning("Aggregator link to %s:%s down (%s), %d events queued, reconnecting",
+                               self.address[0], self.address[1], error, len(self.pending))
+            with self.cond:
+                if not self.running and self.connects == connects:
+                    break  # closing and the aggregator is gone
+                self.cond.wait_for(lambda: not self.running, timeout=delay)
+            if self.connects == connects:
+                delay = min(delay * 2, self.reconnect_max)
+
+    def _session(self, sock):
+        """Handshake, resend unacknowledged batches, then stream new ones."""
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        reader = sock.makefile('rb')
+        sock.sendall(encode_hello(self.run_id, self.node_id, self.token))
+        reply = _read_message(reader)
+        if reply is None:
+            raise EOFError("aggregator closed the connection during the handshake")
+        kind, payload = reply
+        if kind == REJECT:
+            raise ProtocolError(f"rejected by the aggregator: {payload.decode(errors='replace')}")
+        if kind != WELCOME:
+            raise ProtocolError(f"unexpected message type {kind} during the handshake")
+        sock.settimeout(None)
+
+        with self.cond:
+            self._ack(_SEQ.unpack(payload)[0])
+            resend = list(self.in_flight.values())
+            self.connected = True
+        self.connects += 1
+        if self.connects == 1:
+            logger.info("📡 Publishing detections to aggregator %s:%s as %s", self.address[0], self.address[1],
+                        self.node_id)
+        for data in resend:
+            sock.sendall(data)
+        self.batches_resent += len(resend)
+
+        closed = threading.Event()
+        threading.Thread(target=self._read_acks, args=(reader, closed), name='edge-publisher-acks',
+                         daemon=True).start()
+        stalled = False
+        while True:
+            with self.cond:
+                while True:
+                    if closed.is_set():
+                        raise EOFError("aggregator closed the connection")
+                    if self._closing_expired():
+                        return
+                    if len(self.in_flight) >= self.max_in_flight:
+                        # Backpressure: wait for ACKs while new events queue up
+                        if not stalled:
+                            self.backpressure_stalls += 1
+                            stalled = True
+                        self.cond.wait(0.5)
+                        continue
+                    stalled = False
+                    if not self.pending:
+                        self.cond.wait(0.5)
+                        continue
+                    linger = self.pending[0][0] + self.batch_interval - time.monotonic()
+                    if len(self.pending) < self.batch_size and linger > 0 and self.running:
+                        self.cond.wait(linger)
+                        continue
+                    break
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                degraded = len(self.pending) > self.queue_size // 2
+                seq = self.next_seq
+                self.next_seq += 1
+                # Reserved before the lock is released, so flush() and close() keep
+                # waiting while the thumbnails are encoded
+                self.in_flight[seq] = None
+
+            events, thumbnails, skipped = [], 0, 0
+            try:
+                for _, event, frame in batch:
+                    if frame is not None:
+                        if degraded:
+                            skipped += 1
+                        else:
+                            event.thumbnail = self._encode_thumbnail(frame)
+                            thumbnails += event.thumbnail is not None
+                    events.append(event)
+                data = encode_batch(seq, events)
+            except Exception:
+                with self.cond:
+                    del self.in_flight[seq]
+                    self.dropped += len(batch)
+                    self.cond.notify_all()
+                raise
+            with self.cond:
+                self.in_flight[seq] = data
+                self.batches_sent += 1
+                self.events_sent += len(events)
+                self.bytes_sent += len(data)
+                self.thumbnails += thumbnails
+                self.thumbnails_skipped += skipped
+            sock.sendall(data)
+
+    def _read_acks(self, reader, closed):
+        try:
+            while True:
+                message = _read_message(reader)
+                if message is None:
+                    break
+                kind, payload = message
+                if kind == ACK:
+                    with self.cond:
+                        self._ack(_SEQ.unpack(payload)[0])
+        except (OSError, EOFError, ProtocolError, struct.error):
+            pass
+        finally:
+            closed.set()
+            with self.cond:
+                self.cond.notify_all()
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until every queued event has been acknowledged.
+
+        Returns:
+            bool: True if nothing is left to send
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending and not self.in_flight, timeout=timeout)
+
+    def close(self, timeout=5.0):
+        """Stop accepting events and send what is queued, for at most timeout seconds."""
+        with self.cond:
+            if self.running:
+                self.running = False
+                self.close_deadline = time.monotonic() + timeout
+            self.cond.notify_all()
+        self.thread.join(timeout + 1.0)
+
+    def get_stats(self):
+        """Get publishing statistics."""
+        with self.cond:
+            return {
+                'node_id': self.node_id,
+                'connected': self.connected,
+                'published': self.published,
+                'dropped': self.dropped,
+                'queued': len(self.pending),
+                'max_queue_depth': self.max_queue_depth,
+                'in_flight': len(self.in_flight),
+                'events_sent': self.events_sent,
+                'batches_sent': self.batches_sent,
+                'batches_acked': self.batches_acked,
+                'batches_resent': self.batches_resent,
+                'events_per_batch': self.events_sent / self.batches_sent if self.batches_sent else 0.0,
+                'bytes_sent': self.bytes_sent,
+                'thumbnails': self.thumbnails,
+                'thumbnails_skipped': self.thumbnails_skipped,
+                'backpressure_stalls': self.backpressure_stalls,
+                'connects': self.connects,
+                'connect_failures': self.connect_failures,
+                'disconnects': self.disconnects,
+            }
+
+
+class _NodeRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.aggregator.serve_node(self.request)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _NodeState:
+    def __init__(self):
+        self.run_id = None
+        self.last_seq = 0  # last batch dispatched from run_id
+        self.connections = 0
+        self.events = 0
+        self.batches = 0
+        self.duplicates = 0
+        self.thumbnails = 0
+        self.last_seen = None
+
+
+class Aggregator:
+    def __init__(self, notification_system, event_store=None, host=None, port=None, token=None, scope=None,
+                 window=None):
+        """
+        Initialize the aggregator (call start() to listen).
+
+        Args:
+            notification_system: NotificationSystem that sends every alert of the site
+            event_store: Optional DetectionEventStore for all nodes' detections
+            host: Listen address (default from AGGREGATOR_LISTEN)
+            port: Listen port, 0 for any free port (default from AGGREGATOR_LISTEN)
+            token: Shared secret nodes must present (default from config; empty = any node)
+            scope: 'site' for one alert window across all nodes, 'camera' for one
+                per node camera (default from config)
+            window: Digest window in seconds (default from config)
+        """
+        from alert_coalescer import AlertCoalescer
+        listen_host, listen_port = parse_address(Config.AGGREGATOR_LISTEN)
+        self.host = host if host is not None else listen_host
+        self.port = port if port is not None else listen_port
+        token = token if token is not None else Config.AGGREGATOR_TOKEN
+        self.token = token.encode()
+        self.notification_system = notification_system
+        self.event_store = event_store
+        self.coalescer = AlertCoalescer(notification_system, window=window,
+                                        scope=scope or Config.AGGREGATOR_SCOPE)
+
+        self.lock = threading.Lock()
+        self.dispatch_lock = threading.Lock()
+        self.nodes = {}  # node id -> _NodeState
+        self.connections = set()
+        self.server = None
+        self.thread = None
+
+        # Statistics
+        self.rejected = 0
+        self.protocol_errors = 0
+
+    def start(self):
+        """Start listening."""
+        self.server = _ThreadingTCPServer((self.host, self.port), _NodeRequestHandler)
+        self.server.aggregator = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name='aggregator')
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info("📡 Aggregator listening on %s:%s", self.host, self.port)
+        if not self.token:
+            logger.warning("AGGREGATOR_TOKEN not set: any host that can reach this port can raise alerts")
+        return self
+
+    def stop(self):
+        """Disconnect the nodes, stop listening and send digests for open alert windows."""
+        if self.server:
+            self.server.shutdown()
+            with self.lock:
+                connections = list(self.connections)
+            for sock in connections:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self.server.server_close()
+            self.server = None
+        self.coalescer.close()
+
+    def serve_node(self, sock):
+        """Handle one node connection until it closes."""
+        with self.lock:
+            self.connections.add(sock)
+        node = None
+        try:
+            sock.settimeout(HANDSHAKE_TIMEOUT)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            reader = sock.makefile('rb')
+            message = _read_message(reader)
+            if message is None or message[0] != HELLO:
+                raise ProtocolError("expected hello")
+            run_id, node_id, token = _decode_hello(message[1])
+            if self.token and not hmac.compare_digest(token, self.token):
+                with self.lock:
+                    self.rejected += 1
+                logger.warning("Rejected node %r from %s: bad token", node_id, sock.getpeername()[0])
+                sock.sendall(_message(REJECT, b'bad token'))
+                return
+            sock.settimeout(None)
+
+            with self.lock:
+                node = self.nodes.setdefault(node_id, _NodeState())
+                if node.run_id != run_id:
+                    node.run_id, node.last_seq = run_id, 0
+                node.connections += 1
+                last_seq = node.last_seq
+            logger.info("📡 Node %s connected from %s", node_id, sock.getpeername()[0])
+            sock.sendall(_message(WELCOME, _SEQ.pack(last_seq)))
+
+            while True:
+                message = _read_message(reader)
+                if message is None:
+                    break
+                kind, payload = message
+                if kind != BATCH:
+                    raise ProtocolError(f"unexpected message type {kind}")
+                seq, events = decode_batch(payload)
+                with self.dispatch_lock:
+                    with self.lock:
+                        duplicate = node.run_id != run_id or seq <= node.last_seq
+                        if duplicate:
+                            node.duplicates += 1
+                    if not duplicate:
+                        self._dispatch(node_id, node, events)
+                        with self.lock:
+                            node.last_seq = seq
+                # Acknowledged only once dispatched, so a node never has more than
+                # EDGE_MAX_IN_FLIGHT batches waiting here
+                sock.sendall(_message(ACK, _SEQ.pack(seq)))
+        except (ProtocolError, EOFError) as e:
+            with self.lock:
+                self.protocol_errors += 1
+            logger.warning("Dropped node connection: %s", e)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.connections.discard(sock)
+                if node is not None:
+                    node.connections -= 1
+
+    def _dispatch(self, node_id, node, events):
+        """Record a batch of events and feed them to the alert coalescer."""
+        for event in events:
+            camera = f"{node_id}/{event.camera}"
+            frame = None
+            if event.thumbnail:
+                frame = cv2.imdecode(np.frombuffer(event.thumbnail, dtype=np.uint8), cv2.IMREAD_COLOR)
+            # Alert crops are cut from the thumbnail, so scale the boxes to it
+            detections = event.detections(frame.shape[1] if frame is not None else None)
+            alerted = self.coalescer.add(camera, detections, frame=frame, timestamp=event.timestamp)
+            if self.event_store:
+                self.event_store.record(camera, event.detections(), timestamp=event.timestamp, alerted=alerted,
+                                        extra={'node': node_id})
+            with self.lock:
+                node.events += 1
+                node.thumbnails += frame is not None
+                node.last_seen = event.timestamp
+        with self.lock:
+            node.batches += 1
+
+    def get_stats(self):
+        """Get aggregation statistics, per node and for the alerts sent."""
+        with self.lock:
+            nodes = {node_id: {
+                'connected': node.connections > 0,
+                'events': node.events,
+                'batches': node.batches,
+                'duplicates': node.duplicates,
+                'thumbnails': node.thumbnails,
+                'last_seen': node.last_seen,
+            } for node_id, node in self.nodes.items()}
+            stats = {
+                'nodes': nodes,
+                'connected_nodes': sum(1 for node in nodes.values() if node['connected']),
+                'events': sum(node['events'] for node in nodes.values()),
+                'duplicates': sum(node['duplicates'] for node in nodes.values()),
+                'rejected': self.rejected,
+                'protocol_errors': self.protocol_errors,
+            }
+        stats['alerts'] = self.coalescer.get_stats()
+        return stats
+
+
+def print_stats(stats):
+    alerts = stats['alerts']
+    print(f"📡 Aggregator: {stats['connected_nodes']}/{len(stats['nodes'])} nodes connected, "
+          f"{stats['events']} events, {stats['duplicates']} duplicate batches, {stats['rejected']} rejected")
+    print(f"   Alerts: {alerts['first_alerts']} first alerts + {alerts['digests']} digests "
+          f"({alerts['detections_per_alert']:.1f} events per alert)")
+    for node_id, node in sorted(stats['nodes'].items()):
+        state = 'connected' if node['connected'] else 'offline'
+        print(f"   {node_id}: {state}, {node['events']} events in {node['batches']} batches, "
+              f"{node['thumbnails']} thumbnails")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Receive detections from edge nodes and send the alerts of the site')
+    parser.add_argument('--listen', default=Config.AGGREGATOR_LISTEN, metavar='HOST:PORT',
+                        help=f'Address to accept node connections on (default: {Config.AGGREGATOR_LISTEN})')
+    parser.add_argument('--duration', type=float, default=0, metavar='SECONDS',
+                        help='Stop after this many seconds (default: run until interrupted)')
+    parser.add_argument('--stats-interval', type=float, default=60, metavar='SECONDS',
+                        help='Print statistics this often (default: 60)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        host, port = parse_address(args.listen)
+    except ValueError as e:
+        print(f"❌ --listen: {e}")
+        return 2
+    if not Config.AGGREGATOR_TOKEN and not is_loopback(host):
+        print(f"❌ --listen {args.listen}: set AGGREGATOR_TOKEN before accepting nodes from other hosts")
+        return 2
+    setup_logging()
+
+    from event_store import DetectionEventStore
+    from notification_system import NotificationSystem
+    notification_system = NotificationSystem()
+    event_store = DetectionEventStore() if Config.EVENT_STORE_ENABLED else None
+    aggregator = Aggregator(notification_system, event_store=event_store, host=host, port=port).start()
+
+    started = time.monotonic()
+    next_stats = started + args.stats_interval
+    try:
+        while not args.duration or time.monotonic() - started < args.duration:
+            time.sleep(0.5)
+            if time.monotonic() >= next_stats:
+                print_stats(aggregator.get_stats())
+                next_stats += args.stats_interval
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted")
+    finally:
+        aggregator.stop()
+        notification_system.shutdown()
+        if event_store:
+            event_store.close()
+    print_stats(aggregator.get_stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,110 +1,381 @@
-import pygame
+"""
+Local alarm playback with zones.
+
+One long-lived controller thread owns the audio device. Each alarm zone
+(ALARM_ZONES) has its own sound, decoded once at startup into a pygame Sound
+buffer, or synthesised with NumPy straight into memory if the zone has no
+WAV file (every zone gets its own pitch), and its own reserved mixer
+channel. Zones therefore sound at the same time and are mixed, and a
+trigger only starts mixing a buffer that is already decoded instead of
+loading and streaming a file from disk.
+
+Zone format: comma-separated name:cameras:priority[:sound], cameras joined
+with '+' or 'all', e.g. "front:0+1:2:front.wav,yard:2:1". Without zones,
+one 'default' zone covers every camera with ALARM_SOUND_FILE. While a zone
+of higher priority sounds, lower-priority zones are ducked to
+ALARM_DUCK_VOLUME instead of being silenced.
+
+Callers never block: play_alarm, extend_alarm and stop_alarm update the
+zone's deadline under a lock and post a command to the controller's queue.
+
+    play    start the zone's sound, or keep it going until at least
+            `duration` seconds from now if it is already sounding
+    extend  add seconds to a zone that is sounding
+    stop    silence one zone, or all of them, now
+
+The time from play_alarm to the sound starting on the mixer channel is
+measured for every trigger and reported by get_stats, together with the
+mixer's output buffer latency (ALARM_MIXER_BUFFER samples).
+"""
+
+import logging
 import os
+import queue
 import threading
 import time
+
+import numpy as np
+import pygame
+
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_ZONE = 'default'
+TONE_FREQUENCIES = (1000, 1400, 800, 1800, 600)  # zone pitches when no sound file is given
+
+
+def synthesize_alarm_tone(sample_rate, channels=1, duration=2.0, frequency=1000):
+    """
+    Generate the default alarm: a beep of `frequency` Hz pulsing ten times a second.
+
+    Returns:
+        np.array: int16 samples, shape (n,) for mono or (n, channels)
+    """
+    t = np.linspace(0, duration, int(sample_rate * duration), False)
+    wave = np.sin(frequency * 2 * np.pi * t) * np.sin(10 * 2 * np.pi * t)
+    wave = (wave * 32767).astype(np.int16)
+    if channels > 1:
+        wave = np.repeat(wave[:, None], channels, axis=1)
+    return np.ascontiguousarray(wave)
+
+
+class AlarmZone:
+    def __init__(self, name, cameras=None, priority=0, sound_file=None):
+        """
+        Args:
+            name: Zone name
+            cameras: Camera indexes routed to this zone (None = all cameras)
+            priority: Higher priorities duck lower ones while sounding
+            sound_file: WAV file for this zone (None = synthesised tone)
+        """
+        self.name = name
+        self.cameras = cameras
+        self.priority = priority
+        self.sound_file = sound_file
+
+        # Playback state (deadline guarded by AlarmSystem.lock; the rest owned by the controller)
+        self.deadline = 0.0  # monotonic time the zone should stop
+        self.sound = None
+        self.sound_source = 'console'
+        self.channel = None
+        self.sounding = False
+        self.next_console_beep = 0.0
+
+        # Statistics
+        self.triggers = 0
+        self.plays = 0
+        self.extends = 0
+
+    def __repr__(self):
+        cameras = '+'.join(str(camera) for camera in self.cameras) if self.cameras is not None else 'all'
+        return f"{self.name} (cameras {cameras}, priority {self.priority}, {self.sound_source})"
+
+    @staticmethod
+    def parse_zones(spec):
+        """
+        Parse a zone specification string.
+
+        Returns:
+            list: AlarmZone objects
+        """
+        zones = []
+        for item in spec.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            parts = item.split(':')
+            cameras = parts[1].strip().lower() if len(parts) > 1 else 'all'
+            priority = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+            sound_file = parts[3].strip() if len(parts) > 3 and parts[3].strip() else None
+            zones.append(AlarmZone(parts[0].strip(), None if cameras in ('', 'all')
+                                   else [int(camera) for camera in cameras.split('+')],
+                                   priority, sound_file))
+        if len({zone.name for zone in zones}) != len(zones):
+            raise ValueError(f"Duplicate alarm zone names in {spec!r}")
+        return zones
+
+
 class AlarmSystem:
-    def __init__(self):
-        """Initialize the alarm system."""
-        self.alarm_sound_file = Config.ALARM_SOUND_FILE
-        self.is_playing = False
+    def __init__(self, sound_file=None, mixer_buffer=None, zones=None, duck_volume=None):
+        """
+        Initialize the audio device, decode the zones' sounds and start the controller.
+
+        Args:
+            sound_file: WAV file of the default zone (default from config; a tone is synthesised if missing)
+            mixer_buffer: Mixer buffer size in samples; smaller starts sooner (default from config)
+            zones: List of AlarmZone (default parsed from config, or a single default zone)
+            duck_volume: Volume of zones while a higher-priority zone sounds (default from config)
+        """
+        self.alarm_sound_file = sound_file or Config.ALARM_SOUND_FILE
+        self.mixer_buffer = mixer_buffer if mixer_buffer is not None else Config.ALARM_MIXER_BUFFER
+        self.duck_volume = duck_volume if duck_volume is not None else Config.ALARM_DUCK_VOLUME
+        if zones is None:
+            zones = AlarmZone.parse_zones(Config.ALARM_ZONES) or [AlarmZone(DEFAULT_ZONE)]
+        for zone in zones:
+            if zone.name == DEFAULT_ZONE and zone.sound_file is None:
+                zone.sound_file = self.alarm_sound_file
+        self.zones = {zone.name: zone for zone in zones}
         self.audio_available = False
-        
+        self.output_latency = 0.0
+
         # Try to initialize pygame mixer
         try:
-            pygame.mixer.init()
+            pygame.mixer.init(buffer=self.mixer_buffer)
             self.audio_available = True
-            print("✅ Audio system initialized")
+            logger.info("Audio system initialized")
         except pygame.error as e:
-            print(f"⚠️ Audio not available: {e}")
-            print("📢 Will use console alerts instead")
+            logger.warning("Audio not available (%s), will use console alerts instead", e)
             self.audio_available = False
-        
+
         if self.audio_available:
-            self._create_default_alarm_sound()
-        
-    def _create_default_alarm_sound(self):
-        """Create a default alarm sound if none exists."""
-        if not os.path.exists(self.alarm_sound_file):
-            print(f"Creating default alarm sound: {self.alarm_sound_file}")
-            # Generate a simple beep sound
-            import numpy as np
-            from scipy.io.wavfile import write
-            
-            try:
-                # Generate a 2-second alarm sound
-                sample_rate = 44100
-                duration = 2.0
-                frequency = 1000  # 1kHz beep
-                
-                t = np.linspace(0, duration, int(sample_rate * duration), False)
-                # Create a beeping pattern
-                wave = np.sin(frequency * 2 * np.pi * t) * np.sin(10 * 2 * np.pi * t)
-                wave = (wave * 32767).astype(np.int16)
-                
-                write(self.alarm_sound_file, sample_rate, wave)
-                print(f"Default alarm sound created: {self.alarm_sound_file}")
-            except ImportError:
-                print("scipy not available, creating simple alarm file placeholder")
-                # Create a placeholder file
-                with open(self.alarm_sound_file, 'w') as f:
-                    f.write("# Placeholder alarm file - replace with actual .wav file")
-    
-    def play_alarm(self, duration=5):
+            self._load_sounds()
+
+        # Alarm state shared with callers
+        self.lock = threading.Lock()
+        self.commands = queue.Queue()
+        self.latencies = []  # trigger-to-audio times of recent plays in seconds
+
+        self.thread = threading.Thread(target=self._run, name="alarm-controller")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _load_sounds(self):
+        """Decode every zone's sound into a buffer once and reserve a mixer channel per zone."""
+        frequency, _, channels = pygame.mixer.get_init()
+        self.output_latency = self.mixer_buffer / frequency
+        decoded = {}  # sound file -> Sound, shared by zones using the same file
+        pygame.mixer.set_num_channels(max(8, len(self.zones)))
+        pygame.mixer.set_reserved(len(self.zones))
+        for index, zone in enumerate(self.zones.values()):
+            if zone.sound_file in decoded:
+                zone.sound, zone.sound_source = decoded[zone.sound_file], zone.sound_file
+            elif zone.sound_file and os.path.exists(zone.sound_file) and zone.sound_file.endswith('.wav'):
+                try:
+                    zone.sound = decoded[zone.sound_file] = pygame.mixer.Sound(zone.sound_file)
+                    zone.sound_source = zone.sound_file
+                except pygame.error as e:
+                    logger.warning("Could not decode %s: %s", zone.sound_file, e)
+            if zone.sound is None:
+                tone = synthesize_alarm_tone(frequency, channels,
+                                             frequency=TONE_FREQUENCIES[index % len(TONE_FREQUENCIES)])
+                zone.sound = pygame.sndarray.make_sound(tone)
+                zone.sound_source = 'tone'
+            zone.channel = pygame.mixer.Channel(index)
+            logger.info("🔔 Alarm zone %r ready (%.1fs)", zone, zone.sound.get_length())
+        logger.info("🔔 Mixer output buffer: %.0f ms", self.output_latency * 1000)
+
+    @property
+    def sound_source(self):
+        """Sound of the first zone ('console' without audio)."""
+        return next(iter(self.zones.values())).sound_source
+
+    def zone_for_camera(self, camera):
+        """
+        Route a camera to its zone.
+
+        Returns:
+            AlarmZone: The first zone listing the camera, else the first zone covering all cameras
         """
-        Play alarm sound for specified duration.
-        
+        fallback = None
+        for zone in self.zones.values():
+            if zone.cameras is None:
+                fallback = fallback or zone
+            elif camera in zone.cameras:
+                return zone
+        return fallback
+
+    def _resolve(self, zone=None, camera=None):
+        if zone is not None:
+            return self.zones[zone]
+        if camera is not None:
+            return self.zone_for_camera(camera)
+        return next(iter(self.zones.values()))
+
+    @property
+    def is_playing(self):
+        """Whether any zone is (or is about to be) sounding."""
+        now = time.monotonic()
+        with self.lock:
+            return any(zone.deadline > now for zone in self.zones.values())
+
+    def is_zone_playing(self, zone):
+        """Whether a zone is (or is about to be) sounding."""
+        with self.lock:
+            return self.zones[zone].deadline > time.monotonic()
+
+    def play_alarm(self, duration=5, zone=None, camera=None):
+        """
+        Sound a zone's alarm for at least `duration` seconds. Non-blocking; extends an
+        alarm that is already sounding instead of being ignored.
+
         Args:
             duration: Duration to play alarm in seconds
+            zone: Zone name (default: the camera's zone, else the first zone)
+            camera: Camera that triggered the alarm, routed to its zone
+
+        Returns:
+            bool: False if no zone covers the camera
         """
-        if self.is_playing:
-            return
-            
-        def _play():
+        target = self._resolve(zone, camera)
+        if target is None:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            target.triggers += 1
+            target.deadline = max(target.deadline, now + duration)
+        self.commands.put(('play', target, time.perf_counter()))
+        return True
+
+    def extend_alarm(self, seconds, zone=None):
+        """
+        Keep a sounding zone going for `seconds` longer. Non-blocking.
+
+        Returns:
+            bool: False if the zone is not sounding
+        """
+        target = self._resolve(zone)
+        with self.lock:
+            if target.deadline <= time.monotonic():
+                return False
+            target.deadline += seconds
+        self.commands.put(('extend', target, None))
+        return True
+
+    def stop_alarm(self, zone=None):
+        """Stop one zone's alarm, or every zone's."""
+        targets = [self.zones[zone]] if zone is not None else list(self.zones.values())
+        with self.lock:
+            for target in targets:
+                target.deadline = 0.0
+        self.commands.put(('stop', None, None))
+        logger.info("Alarm stopped (%s)", zone or "all zones")
+
+    def _run(self):
+        """Controller loop: the only thread that touches the mixer."""
+        while True:
+            # Silence zones past their deadline and find the next wake-up
+            now = time.monotonic()
+            with self.lock:
+                remaining = {zone: zone.deadline - now for zone in self.zones.values()}
+            timeout = None
+            for zone, left in remaining.items():
+                if not zone.sounding:
+                    continue
+                if left <= 0:
+                    self._silence(zone)
+                    continue
+                if not zone.sound:
+                    if now >= zone.next_console_beep:
+                        logger.warning("🚨 ALERT: HUMAN DETECTED! 🚨 (%s)", zone.name)
+                        zone.next_console_beep = now + 1.0
+                    left = min(left, zone.next_console_beep - now)
+                timeout = left if timeout is None else min(timeout, left)
+            self._apply_priorities()
+
             try:
-                self.is_playing = True
-                print("🚨 HUMAN DETECTED! Playing alarm...")
-                
-                if self.audio_available and os.path.exists(self.alarm_sound_file) and self.alarm_sound_file.endswith('.wav'):
-                    pygame.mixer.music.load(self.alarm_sound_file)
-                    pygame.mixer.music.play(-1)  # Loop indefinitely
-                    time.sleep(duration)
-                    pygame.mixer.music.stop()
-                else:
-                    # Fallback: console alert with visual emphasis
-                    print("📢 Using console alarm (audio not available)")
-                    for i in range(duration):
-                        print(f"🚨 ALERT: HUMAN DETECTED! 🚨 ({i+1}/{duration})")
-                        time.sleep(1)
-                        
-            except Exception as e:
-                print(f"Error playing alarm: {e}")
-                # Fallback to console alert
-                for i in range(duration):
-                    print(f"🚨 ALERT: HUMAN DETECTED! 🚨 ({i+1}/{duration})")
-                    time.sleep(1)
-            finally:
-                self.is_playing = False
-        
-        # Play alarm in separate thread to avoid blocking
-        alarm_thread = threading.Thread(target=_play)
-        alarm_thread.daemon = True
-        alarm_thread.start()
-    
-    def stop_alarm(self):
-        """Stop the currently playing alarm."""
+                command, zone, triggered_at = self.commands.get(timeout=timeout)
+            except queue.Empty:
+                continue
+
+            if command == 'shutdown':
+                for zone in self.zones.values():
+                    if zone.sounding:
+                        self._silence(zone)
+                return
+            if command == 'play':
+                with self.lock:
+                    due = zone.deadline > time.monotonic()
+                if not zone.sounding and due:
+                    self._sound(zone)
+                    latency = time.perf_counter() - triggered_at
+                    with self.lock:
+                        zone.plays += 1
+                        self.latencies.append(latency)
+                        del self.latencies[:-1000]
+                    logger.info("🚨 Playing alarm (%s), %.1f ms after the trigger", zone.name, latency * 1000)
+                elif zone.sounding:
+                    with self.lock:
+                        zone.extends += 1
+            elif command == 'extend':
+                with self.lock:
+                    zone.extends += 1
+            # 'stop' only needs the deadline check at the top of the loop
+
+    def _apply_priorities(self):
+        """Full volume for the highest-priority sounding zones, ducked volume for the rest."""
+        top = max((zone.priority for zone in self.zones.values() if zone.sounding), default=None)
+        for zone in self.zones.values():
+            if zone.sounding and zone.sound:
+                zone.channel.set_volume(1.0 if zone.priority == top else self.duck_volume)
+
+    def _sound(self, zone):
+        zone.sounding = True
+        zone.next_console_beep = 0.0
+        try:
+            if zone.sound:
+                zone.channel.play(zone.sound, loops=-1)
+            else:
+                logger.info("Using console alarm for %s (audio not available)", zone.name)
+        except pygame.error as e:
+            logger.error("Error playing alarm (%s): %s", zone.name, e)
+            zone.sound = None  # fall back to console alerts
+
+    def _silence(self, zone):
+        zone.sounding = False
         try:
-            if self.audio_available:
-                pygame.mixer.music.stop()
-            self.is_playing = False
-            print("Alarm stopped")
-        except Exception as e:
-            print(f"Error stopping alarm: {e}")
-    
+            if zone.sound:
+                zone.channel.stop()
+        except pygame.error as e:
+            logger.error("Error stopping alarm (%s): %s", zone.name, e)
+
+    def shutdown(self, timeout=2.0):
+        """Silence every zone and stop the controller thread."""
+        self.commands.put(('shutdown', None, None))
+        self.thread.join(timeout)
+
+    def get_stats(self):
+        """Get trigger counts and trigger-to-audio latency, overall and per zone."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            zones = {name: {'priority': zone.priority, 'source': zone.sound_source, 'triggers': zone.triggers,
+                            'plays': zone.plays, 'extends': zone.extends}
+                     for name, zone in self.zones.items()}
+        return {
+            'source': self.sound_source,
+            'triggers': sum(zone['triggers'] for zone in zones.values()),
+            'plays': sum(zone['plays'] for zone in zones.values()),
+            'extends': sum(zone['extends'] for zone in zones.values()),
+            'latency_avg': sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            'latency_max': latencies[-1] if latencies else 0.0,
+            'output_latency': self.output_latency,
+            'zones': zones,
+        }
+
     def test_alarm(self):
         """Test the alarm system."""
         print("Testing alarm system...")
         self.play_alarm(duration=2)
         time.sleep(3)
-        print("Alarm test completed")
\ No newline at end of file
+        print("Alarm test completed")
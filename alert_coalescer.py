@@ -0,0 +1,270 @@
+"""
+Alert coalescing with digest windows.
+
+Detections are grouped per camera (or for the whole site) into windows of
+ALERT_WINDOW seconds instead of being filtered by one global cooldown:
+
+    first detection   opens a window and is alerted within
+                      ALERT_FIRST_MAX_LATENCY seconds (0 = immediately)
+    during the window detections are only counted; the best frames are kept
+    window end        one digest (counts, peak confidence, montage of the
+                      best snapshots) if anything happened since the last
+                      alert, and the window is extended; otherwise it closes
+
+Any detection is therefore reported at most ALERT_FIRST_MAX_LATENCY +
+ALERT_WINDOW seconds after it happens, while a burst costs one message and
+one JPEG encode per window instead of one per cooldown period.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from config import Config
+
+SCOPES = ('camera', 'site')
+
+MONTAGE_TILE_WIDTH = 480
+
+
+class _Bucket:
+    """Detections accumulated since the last alert for one window."""
+
+    def __init__(self, max_snapshots):
+        self.max_snapshots = max_snapshots
+        self.start = None
+        self.end = None
+        self.frames = 0
+        self.max_people = 0
+        self.peak_confidence = 0.0
+        self.tracks = set()
+        self.cameras = {}
+        self.best = []  # min-heap of (confidence, seq, timestamp, camera, frame, detections)
+        self.seq = itertools.count()
+
+    def add(self, camera, detections, frame, timestamp):
+        if self.start is None:
+            self.start = timestamp
+        self.end = timestamp
+        self.frames += 1
+        self.max_people = max(self.max_people, len(detections))
+        self.cameras[camera] = self.cameras.get(camera, 0) + 1
+        for det in detections:
+            if det.get('track_id') is not None:
+                self.tracks.add((camera, det['track_id']))
+
+        confidence = max((det['confidence'] for det in detections), default=0.0)
+        self.peak_confidence = max(self.peak_confidence, confidence)
+        if frame is None:
+            return
+        entry = (confidence, next(self.seq), timestamp, camera, frame, detections)
+        if len(self.best) < self.max_snapshots:
+            heapq.heappush(self.best, entry)
+        elif confidence > self.best[0][0]:
+            heapq.heapreplace(self.best, entry)
+
+    def snapshots(self):
+        """Best frames, highest confidence first, as (confidence, timestamp, camera, frame, detections)."""
+        return [entry[:1] + entry[2:] for entry in sorted(self.best, reverse=True)]
+
+
+class _Window:
+    def __init__(self, key, opened_at, max_snapshots):
+        self.key = key
+        self.opened_at = opened_at
+        self.first_alert_sent = False
+        self.max_snapshots = max_snapshots
+        self.bucket = _Bucket(max_snapshots)
+
+    def take_bucket(self):
+        bucket, self.bucket = self.bucket, _Bucket(self.max_snapshots)
+        return bucket
+
+
+def build_montage(snapshots, tile_width=MONTAGE_TILE_WIDTH):
+    """
+    Tile snapshots into one image, labelled with camera, time and confidence.
+
+    Args:
+        snapshots: List of (confidence, timestamp, camera, frame, detections)
+        tile_width: Width of each tile in pixels
+
+    Returns:
+        np.array: Montage frame (the frame itself for a single snapshot)
+    """
+    if len(snapshots) == 1:
+        return snapshots[0][3]
+
+    tiles = []
+    for confidence, timestamp, camera, frame, _ in snapshots:
+        height = int(frame.shape[0] * tile_width / frame.shape[1])
+        tile = cv2.resize(frame, (tile_width, height), interpolation=cv2.INTER_AREA)
+        label = f"cam {camera}  {datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')}  {confidence:.2f}"
+        cv2.putText(tile, label, (8, 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        tiles.append(tile)
+
+    tile_height = max(tile.shape[0] for tile in tiles)
+    cols = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / cols)
+    montage = np.zeros((rows * tile_height, cols * tile_width, 3), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        y, x = (i // cols) * tile_height, (i % cols) * tile_width
+        montage[y:y + tile.shape[0], x:x + tile_width] = tile
+    return montage
+
+
+class AlertCoalescer:
+    def __init__(self, notification_system, window=None, first_max_latency=None, scope=None, max_snapshots=None):
+        """
+        Initialize the coalescer.
+
+        Args:
+            notification_system: NotificationSystem used to send alerts; its
+                worker pool runs the window timers
+            window: Digest window length in seconds (default from config)
+            first_max_latency: Maximum delay of the first alert of a window, used
+                to pick the best frame of the first moments (default from config)
+            scope: 'camera' for a window per camera, 'site' for one shared window
+            max_snapshots: Best snapshots kept per digest montage (default from config)
+        """
+        self.notification_system = notification_system
+        self.window = window if window is not None else Config.ALERT_WINDOW
+        self.first_max_latency = first_max_latency if first_max_latency is not None else Config.ALERT_FIRST_MAX_LATENCY
+        self.scope = scope or Config.ALERT_COALESCE_SCOPE
+        self.max_snapshots = max_snapshots if max_snapshots is not None else Config.ALERT_DIGEST_SNAPSHOTS
+        if self.scope not in SCOPES:
+            raise ValueError(f"Unknown coalescing scope {self.scope!r}, expected one of {SCOPES}")
+
+        self.lock = threading.Lock()
+        self.windows = {}  # key -> _Window
+        self.closed = False
+
+        # Statistics
+        self.detections = 0
+        self.windows_opened = 0
+        self.first_alerts = 0
+        self.digests = 0
+        self.first_alert_delays = []
+
+    def add(self, camera, detections, frame=None, timestamp=None):
+        """
+        Add a frame with detections. Non-blocking; sending happens on the notification pool.
+
+        Args:
+            camera: Camera identifier
+            detections: Detection dicts for this frame
+            frame: Annotated frame to use as a snapshot (must not be modified afterwards)
+            timestamp: Capture time (default now)
+
+        Returns:
+            bool: True if this detection opened a new window (an alert is on its way)
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        key = camera if self.scope == 'camera' else 'site'
+
+        with self.lock:
+            if self.closed:
+                return False
+            self.detections += 1
+            window = self.windows.get(key)
+            opened = window is None
+            if opened:
+                window = _Window(key, timestamp, self.max_snapshots)
+                self.windows[key] = window
+                self.windows_opened += 1
+            window.bucket.add(camera, detections, frame, timestamp)
+
+        if opened:
+            pool = self.notification_system.pool
+            if self.first_max_latency > 0:
+                pool.schedule(self.first_max_latency, self._send_first_alert, window)
+            else:
+                self._send_first_alert(window)
+            pool.schedule(self.first_max_latency + self.window, self._close_window, window)
+        return opened
+
+    def _send_first_alert(self, window):
+        """Alert on the best frame seen since the window opened."""
+        with self.lock:
+            if window.first_alert_sent or self.windows.get(window.key) is not window:
+                return
+            window.first_alert_sent = True
+            bucket = window.take_bucket()
+            self.first_alerts += 1
+            self.first_alert_delays.append(time.time() - window.opened_at)
+            del self.first_alert_delays[:-1000]
+
+        snapshots = bucket.snapshots()
+        if snapshots:
+            confidence, _, _, frame, detections = snapshots[0]
+            scores = [det['confidence'] for det in detections] or [confidence]
+            self.notification_system.send_detection_alert(len(detections), scores, frame=frame,
+                                                          detections=detections)
+        else:
+            self.notification_system.send_detection_alert(bucket.max_people, [bucket.peak_confidence])
+
+    def _close_window(self, window):
+        """Send a digest of what happened since the last alert, then extend or close the window."""
+        with self.lock:
+            if self.windows.get(window.key) is not window:
+                return
+            bucket = window.take_bucket()
+            if bucket.frames == 0:
+                del self.windows[window.key]
+                return
+            self.digests += 1
+            extend = not self.closed
+
+        self._send_digest(window.key, bucket)
+        if extend:
+            self.notification_system.pool.schedule(self.window, self._close_window, window)
+
+    def _send_digest(self, key, bucket):
+        snapshots = bucket.snapshots()
+        digest = {
+            'key': key,
+            'start': bucket.start,
+            'end': bucket.end,
+            'detection_frames': bucket.frames,
+            'people_tracked': len(bucket.tracks),
+            'max_people': bucket.max_people,
+            'peak_confidence': bucket.peak_confidence,
+            'cameras': dict(bucket.cameras),
+            'snapshot_count': len(snapshots),
+        }
+        montage = build_montage(snapshots) if snapshots else None
+        self.notification_system.send_digest_alert(digest, montage)
+
+    def close(self):
+        """Send digests for all open windows now and stop accepting detections."""
+        with self.lock:
+            self.closed = True
+            windows = list(self.windows.values())
+        for window in windows:
+            if not window.first_alert_sent:
+                self._send_first_alert(window)
+            self._close_window(window)
+        with self.lock:
+            self.windows.clear()
+
+    def get_stats(self):
+        """Get coalescing statistics."""
+        with self.lock:
+            alerts = self.first_alerts + self.digests
+            delays = sorted(self.first_alert_delays)
+            return {
+                'open_windows': len(self.windows),
+                'detections': self.detections,
+                'windows_opened': self.windows_opened,
+                'first_alerts': self.first_alerts,
+                'digests': self.digests,
+                'alerts_sent': alerts,
+                'detections_per_alert': self.detections / alerts if alerts else 0.0,
+                'first_alert_delay_max': delays[-1] if delays else 0.0,
+            }
@@ -0,0 +1,129 @@
+"""
+In-memory alert snapshots.
+
+The detection thread only wraps the frame; the JPEG is encoded lazily by the
+first notification worker that needs it (cv2.imencode, never a temporary
+file) and the same bytes are shared by every channel. Writing to disk is
+optional and only happens when detection images are persisted.
+
+Channels with an encoding profile (see snapshot_encoder) get their own crops,
+size and quality, encoded once per profile and cached on the snapshot.
+"""
+
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from config import Config
+from snapshot_encoder import encode_snapshot
+
+_sequence = itertools.count()
+
+
+class AlertSnapshot:
+    mime = 'image/jpeg'
+
+    def __init__(self, frame=None, timestamp=None, quality=None, path=None, detections=None):
+        """
+        Args:
+            frame: OpenCV frame to encode (must not be modified afterwards)
+            timestamp: Capture time in seconds since the epoch (default now)
+            quality: JPEG quality 0-100 (default from config)
+            path: Existing JPEG file to load instead of a frame
+            detections: Detection dicts in frame coordinates, used for crops
+        """
+        self.frame = frame
+        self.detections = detections or []
+        self.path = path
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.quality = quality if quality is not None else Config.SNAPSHOT_JPEG_QUALITY
+        self.sequence = next(_sequence)
+        self.lock = threading.Lock()
+        self._data = None
+        self.encode_time = 0.0
+        self._encoded = {}  # profile key -> EncodedSnapshot
+        self._encode_locks = {}  # profile key -> lock, so channels with different profiles encode in parallel
+
+    @classmethod
+    def from_file(cls, path):
+        """Wrap an existing image file; it is read on first use."""
+        return cls(path=path)
+
+    @classmethod
+    def from_bytes(cls, data, timestamp=None, detections=None):
+        """Wrap an already encoded JPEG."""
+        snapshot = cls(timestamp=timestamp, detections=detections)
+        snapshot._data = data
+        return snapshot
+
+    @property
+    def data(self):
+        """JPEG bytes, encoded on first access and cached."""
+        with self.lock:
+            if self._data is None:
+                start = time.perf_counter()
+                if self.frame is not None:
+                    ok, buffer = cv2.imencode('.jpg', self.frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                    if not ok:
+                        raise ValueError("JPEG encoding failed")
+                    self._data = buffer.tobytes()
+                elif self.path:
+                    with open(self.path, 'rb') as f:
+                        self._data = f.read()
+                else:
+                    raise ValueError("Snapshot has no frame or file")
+                self.encode_time = time.perf_counter() - start
+            return self._data
+
+    def encode(self, profile):
+        """
+        Images for one channel's encoding profile, encoded on first use and cached.
+
+        Returns:
+            EncodedSnapshot
+        """
+        with self.lock:
+            lock = self._encode_locks.setdefault(profile.key, threading.Lock())
+        with lock:
+            encoded = self._encoded.get(profile.key)
+            if encoded is None:
+                frame = self.frame
+                if frame is None:
+                    frame = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+                    if frame is None:
+                        raise ValueError("Snapshot image could not be decoded")
+                stem = os.path.splitext(self.filename)[0]
+                encoded = encode_snapshot(frame, self.detections, profile, basename=stem)
+                self._encoded[profile.key] = encoded
+            return encoded
+
+    @property
+    def filename(self):
+        """Unique file name: capture time to the microsecond plus a process-wide sequence number."""
+        if self.path:
+            return os.path.basename(self.path)
+        stamp = datetime.fromtimestamp(self.timestamp).strftime('%Y%m%d_%H%M%S_%f')
+        return f"detection_{stamp}_{self.sequence}.jpg"
+
+    def save(self, directory):
+        """
+        Write the JPEG to a directory without overwriting existing files.
+
+        Returns:
+            str: Path of the written file
+        """
+        os.makedirs(directory, exist_ok=True)
+        base, ext = os.path.splitext(self.filename)
+        path = os.path.join(directory, self.filename)
+        for attempt in itertools.count(1):
+            try:
+                with open(path, 'xb') as f:
+                    f.write(self.data)
+                return path
+            except FileExistsError:
+                path = os.path.join(directory, f"{base}_{attempt}{ext}")
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Offline analysis of recorded footage, faster than real time.
+
+Scans video files (or directories of them) for people and writes an
+indexed timeline:
+
+    parallel     every video is cut into ANALYZE_SEGMENT_SECONDS segments,
+                 decoded and analysed by a pool of worker processes (one per
+                 core by default, each with its share of the torch threads)
+    sampling     only every ANALYZE_STRIDE-th frame is decoded; the frames in
+                 between are skipped with grab(), which does not convert
+                 them to images
+    batching     sampled frames go through the model ANALYZE_BATCH_SIZE at a
+                 time
+    timeline     every detection is written to the detections table of an
+                 event store database (timeline.db, camera = video path
+                 relative to the common directory of the inputs, so cam1/0001.mp4
+                 and cam2/0001.mp4 stay apart; timestamps from the file's
+                 recording time) in one
+                 transaction, so none are dropped however long the footage, and detections less than
+                 ANALYZE_EVENT_GAP seconds apart are merged into events in
+                 the video_events table, each with a thumbnail of its best frame
+
+Throughput is reported in video-seconds per wall-second.
+
+    python analyze.py /recordings/2024-06-01 incident.mp4 --stride 10
+    python main.py --analyze /recordings/2024-06-01
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import cv2
+
+from config import Config
+from event_store import INSERT_SQL, SCHEMA, detection_rows
+from logging_setup import setup_logging
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.ts', '.webm', '.mpg', '.mpeg')
+
+EVENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    start_ts REAL NOT NULL,
+    peak_confidence REAL NOT NULL,
+    max_people INTEGER NOT NULL,
+    detections INTEGER NOT NULL,
+    thumbnail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_video_events_video ON video_events (video, start);
+CREATE INDEX IF NOT EXISTS idx_video_events_ts ON video_events (start_ts);
+"""
+
+# Per-process worker state, set by _init_worker
+_worker = {}
+
+
+def find_videos(paths):
+    """
+    Expand files and directories (recursively) into video files.
+
+    Returns:
+        list: Sorted video paths
+    """
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(os.path.join(root, name) for name in files
+                              if name.lower().endswith(VIDEO_EXTENSIONS))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"⚠️ {path}: not found, skipped")
+    return sorted(videos)
+
+
+def _probe(path):
+    """Frame count and frame rate of a video, or None if it cannot be read."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return (frames, fps) if frames > 0 else None
+    finally:
+        cap.release()
+
+
+class _Event:
+    """People seen in a stretch of one video."""
+
+    def __init__(self, time_offset, count, confidence, thumbnail):
+        self.start = self.end = time_offset
+        self.max_people = count
+        self.peak_confidence = confidence
+        self.detections = count
+        self.thumbnail = thumbnail  # JPEG of the best frame
+
+    def add(self, other):
+        """Extend this event with a later one."""
+        self.end = max(self.end, other.end)
+        self.max_people = max(self.max_people, other.max_people)
+        self.detections += other.detections
+        if other.peak_confidence > self.peak_confidence:
+            self.peak_confidence, self.thumbnail = other.peak_confidence, other.thumbnail
+
+
+def _init_worker(model_path, imgsz, threshold, threads, stride, batch_size, event_gap, thumb_width,
+                 model_factory):
+    """Load the model once per worker process."""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if model_factory is None:
+        from ultralytics import YOLO
+        model = YOLO(model_path)
+    else:
+        model = model_factory()
+    _worker.update(model=model, imgsz=imgsz, threshold=threshold, stride=stride, batch_size=batch_size,
+                   event_gap=event_gap, thumb_width=thumb_width)
+
+
+def _thumbnail(frame, boxes, width):
+    """Small JPEG of a frame with its detections outlined."""
+    frame = frame.copy()
+    for (x1, y1, x2, y2), _ in boxes:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    scale = width / frame.shape[1]
+    if scale < 1:
+        frame = cv2.resize(frame, (width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return encoded.tobytes() if ok else None
+
+
+def _infer(batch, detections, events):
+    """Run one batch of (frame index, time, frame) and collect people."""
+    model, imgsz, threshold = _worker['model'], _worker['imgsz'], _worker['threshold']
+    frames = [frame for _, _, frame in batch]
+    results = model(frames, verbose=False, imgsz=imgsz) if imgsz else model(frames, verbose=False)
+    for (index, offset, frame), result in zip(batch, results):
+        boxes = []
+        if result.boxes is not None:
+            for box in result.boxes:
+                confidence = float(box.conf[0])
+                if int(box.cls[0]) == 0 and confidence >= threshold:
+                    boxes.append((tuple(int(v) for v in box.xyxy[0].cpu().numpy()), confidence))
+        if not boxes:
+            continue
+        detections.append((index, offset, boxes))
+        peak = max(confidence for _, confidence in boxes)
+        # Thumbnails only for a new event or a better frame of the current one
+        if events and offset - events[-1].end <= _worker['event_gap']:
+            better = peak > events[-1].peak_confidence
+            events[-1].add(_Event(offset, len(boxes), peak,
+                                  _thumbnail(frame, boxes, _worker['thumb_width']) if better else None))
+        else:
+            events.append(_Event(offset, len(boxes), peak, _thumbnail(frame, boxes, _worker['thumb_width'])))
+
+
+def _analyze_segment(task):
+    """
+    Decode and analyse frames [start, end) of a video (runs in a worker process).
+
+    Returns:
+        dict: Detections, events and decode counters of the segment
+    """
+    path, start, end, fps = task
+    stride, batch_size = _worker['stride'], _worker['batch_size']
+    detections, events, batch = [], [], []
+    decoded = skipped = 0
+
+    cap = cv2.VideoCapture(path)
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while index < end:
+            if (index - start) % stride:
+                # Advance without converting the frame to an image
+                if not cap.grab():
+                    break
+                skipped += 1
+            else:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                decoded += 1
+                batch.append((index, index / fps, frame))
+                if len(batch) >= batch_size:
+                    _infer(batch, detections, events)
+                    batch = []
+            index += 1
+        if batch:
+            _infer(batch, detections, events)
+    finally:
+        cap.release()
+    return {'path': path, 'start': start, 'detections': detections, 'events': events,
+            'decoded': decoded, 'skipped': skipped, 'pid': os.getpid()}
+
+
+class FootageAnalyzer:
+    def __init__(self, output_dir=None, workers=None, stride=None, batch_size=None, segment_seconds=None,
+                 event_gap=None, thumb_width=None, model_path=None, model_factory=None):
+        """
+        Initialize the analyzer.
+
+        Args:
+            output_dir: Directory for timeline.db and thumbnails (default: a new run
+                directory under ANALYZE_OUTPUT_DIR)
+            workers: Worker processes (default from config; 0 = one per core)
+            stride: Analyse one frame in this many (default from config)
+            batch_size: Frames per inference call (default from config)
+            segment_seconds: Length of the pieces videos are split into (default from config)
+            event_gap: Seconds without people that end an event (default from config)
+            thumb_width: Thumbnail width in pixels (default from config)
+            model_path: Weights (default from config)
+            model_factory: Picklable function returning a model with the ultralytics call interface,
+                called once in each worker (default: load model_path with YOLO)
+        """
+        self.output_dir = output_dir or os.path.join(Config.ANALYZE_OUTPUT_DIR,
+                                                     datetime.now().strftime('%Y%m%d_%H%M%S'))
+        workers = workers if workers is not None else Config.ANALYZE_WORKERS
+        self.workers = workers or os.cpu_count() or 1
+        self.stride = stride or Config.ANALYZE_STRIDE
+        self.batch_size = batch_size or Config.ANALYZE_BATCH_SIZE
+        self.segment_seconds = segment_seconds or Config.ANALYZE_SEGMENT_SECONDS
+        self.event_gap = event_gap if event_gap is not None else Config.ANALYZE_EVENT_GAP
+        self.thumb_width = thumb_width or Config.ANALYZE_THUMB_WIDTH
+        self.model_path = model_path or Config.MODEL_PATH
+        self.model_factory = model_factory
+
+    def _tasks(self, videos):
+        """Split videos into segments; longest videos first so workers finish together."""
+        tasks, info = [], {}
+        for path in videos:
+            probed = _probe(path)
+            if probed is None:
+                print(f"⚠️ {path}: cannot read, skipped")
+                continue
+            frames, fps = probed
+            info[path] = (frames, fps)
+            # Segments start on a sampled frame so the stride is continuous across them
+            segment = max(self.stride, int(self.segment_seconds * fps) // self.stride * self.stride)
+            tasks.extend((path, start, min(frames, start + segment), fps) for start in range(0, frames, segment))
+        tasks.sort(key=lambda task: -info[task[0]][0])
+        return tasks, info
+
+    def _merge_events(self, segments):
+        """Join the events of consecutive segments that are closer than the event gap."""
+        merged = []
+        for segment in sorted(segments, key=lambda s: s['start']):
+            for event in segment['events']:
+                if merged and event.start - merged[-1].end <= self.event_gap:
+                    merged[-1].add(event)
+                else:
+                    merged.append(event)
+        return merged
+
+    @staticmethod
+    def _recording_start(path, duration):
+        """Best guess of when a recording started: its modification time minus its length."""
+        return os.path.getmtime(path) - duration
+
+    def run(self, paths):
+        """
+        Analyse videos and write the timeline.
+
+        Args:
+            paths: Video files and/or directories
+
+        Returns:
+            dict: Summary (videos, video_seconds, wall_seconds, speed, frames_decoded,
+                frames_skipped, detections, events, output_dir), or None if there was nothing to analyse
+        """
+        videos = find_videos(paths)
+        tasks, info = self._tasks(videos)
+        if not tasks:
+            print("❌ No readable videos found")
+            return None
+        video_seconds = sum(frames / fps for frames, fps in info.values())
+        workers = min(self.workers, len(tasks))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"🎞️ Analysing {len(info)} video(s), {video_seconds / 60:.1f} min of footage in {len(tasks)} segments "
+              f"with {workers} workers x {threads} threads (1 frame in {self.stride}, batches of {self.batch_size})")
+
+        os.makedirs(os.path.join(self.output_dir, 'thumbnails'), exist_ok=True)
+        start = time.perf_counter()
+        segments = {path: [] for path in info}
+        initargs = (self.model_path, Config.INFERENCE_IMGSZ or None, Config.CONFIDENCE_THRESHOLD, threads,
+                    self.stride, self.batch_size, self.event_gap, self.thumb_width, self.model_factory)
+        # Spawned, not forked: a fork of a process already running torch or camera threads can deadlock
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            for done, segment in enumerate(pool.imap_unordered(_analyze_segment, tasks), 1):
+                segments[segment['path']].append(segment)
+                elapsed = time.perf_counter() - start
+                print(f"   [{done}/{len(tasks)}] {os.path.basename(segment['path'])} @ "
+                      f"{segment['start'] / info[segment['path']][1]:.0f}s: {len(segment['detections'])} frames "
+                      f"with people ({elapsed:.1f}s elapsed)")
+        wall_seconds = time.perf_counter() - start
+
+        summary = self._write_timeline(segments, info)
+        summary.update({
+            'videos': len(info),
+            'video_seconds': video_seconds,
+            'wall_seconds': wall_seconds,
+            'speed': video_seconds / wall_seconds if wall_seconds else 0.0,
+            'frames_decoded': sum(s['decoded'] for parts in segments.values() for s in parts),
+            'frames_skipped': sum(s['skipped'] for parts in segments.values() for s in parts),
+            'workers': workers,
+            'output_dir': self.output_dir,
+        })
+        print(f"✅ {summary['video_seconds']:.0f} s of video in {wall_seconds:.1f} s = {summary['speed']:.1f}x "
+              f"real time ({summary['frames_decoded']} frames analysed, {summary['frames_skipped']} skipped): "
+              f"{summary['events']} events, {summary['detections']} detections")
+        print(f"   Timeline: {os.path.join(self.output_dir, 'timeline.db')}")
+        return summary
+
+    def _write_timeline(self, segments, info):
+        """Store detections and events, and save event thumbnails."""
+        db_path = os.path.join(self.output_dir, 'timeline.db')
+        rows = []
+        event_rows = []
+        # NVRs name files per camera directory (cam1/0001.mp4, cam2/0001.mp4): keep the directories
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in segments]) if segments else ''
+        for path, parts in segments.items():
+            frames, fps = info[path]
+            name = os.path.relpath(os.path.abspath(path), root)
+            # Readable stem plus a hash of the relative path, so thumbnails never overwrite each other
+            thumbnail_prefix = (f"{os.path.splitext(os.path.basename(name))[0]}_"
+                                f"{hashlib.sha1(name.encode()).hexdigest()[:8]}")
+            recording_start = self._recording_start(path, frames / fps)
+            for part in parts:
+                for index, offset, boxes in part['detections']:
+                    rows.extend(detection_rows(
+                        name, [{'bbox': bbox, 'confidence': confidence} for bbox, confidence in boxes],
+                        recording_start + offset, extra={'video_offset': offset, 'frame': index}))
+            for event in self._merge_events(parts):
+                thumbnail = None
+                if event.thumbnail:
+                    thumbnail = os.path.join(self.output_dir, 'thumbnails',
+                                             f"{thumbnail_prefix}_{event.start:09.2f}.jpg")
+                    with open(thumbnail, 'wb') as f:
+                        f.write(event.thumbnail)
+                event_rows.append((name, event.start, event.end, recording_start + event.start,
+                                   event.peak_confidence, event.max_people, event.detections, thumbnail))
+
+        # Written directly, not through DetectionEventStore.record(): its queue drops rows when full
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.executescript(SCHEMA + EVENTS_SCHEMA)
+            conn.executemany(INSERT_SQL, rows)
+            conn.executemany("INSERT INTO video_events (video, start, end, start_ts, peak_confidence, max_people, "
+                             "detections, thumbnail) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", event_rows)
+            conn.commit()
+        finally:
+            conn.close()
+        for name, event_start, event_end, _, confidence, people, _, _ in event_rows:
+            print(f"   {name} {event_start:8.1f}s - {event_end:8.1f}s  up to {people} people, peak {confidence:.2f}")
+        return {'events': len(event_rows), 'detections': len(rows)}
+
+
+def build_parser():
+    """Build the analysis argument parser."""
+    parser = argparse.ArgumentParser(description='Scan recorded video for people, faster than real time')
+    parser.add_argument('paths', nargs='+', help='Video files or directories')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per core)')
+    parser.add_argument('--stride', type=int, default=None, help='Analyse one frame in this many')
+    parser.add_argument('--batch-size', type=int, default=None, help='Frames per inference call')
+    parser.add_argument('--output-dir', default=None, help='Directory for the timeline and thumbnails')
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point."""
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    analyzer = FootageAnalyzer(output_dir=args.output_dir, workers=args.workers, stride=args.stride,
+                               batch_size=args.batch_size)
+    return 0 if analyzer.run(args.paths) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
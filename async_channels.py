@@ -0,0 +1,408 @@
+"""
+Non-blocking channel clients for the asyncio notification engine.
+
+    AsyncSMTPClient            pooled SMTP sessions on asyncio streams
+                               (EHLO, STARTTLS, AUTH PLAIN or LOGIN as the
+                               server advertises, SIZE and 8BITMIME, one
+                               transaction per message for all recipients)
+    AsyncTwilioWhatsAppClient  Twilio Messages API over one aiohttp session
+    AsyncWebhookClient         JSON webhooks over one aiohttp session
+
+They mirror SMTPConnectionPool, TwilioWhatsAppClient and WebhookClient, but
+a send awaits the network instead of holding a thread, so hundreds of
+recipients and webhooks can be in flight on a single event loop. The HTTP
+sessions are created on first use, inside the loop that runs the sends.
+"""
+
+import asyncio
+import base64
+import smtplib
+import ssl
+import time
+
+import aiohttp
+
+from config import Config
+from webhook_client import WebhookClient, WebhookError, check_webhook_response
+from whatsapp_client import RETRYABLE_STATUS, WhatsAppSendError, _TwilioClientBase
+
+
+class _AsyncSMTPSession:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.extensions = {}  # EHLO keyword (lower case) -> parameters
+        self.last_used = time.monotonic()
+
+
+class AsyncSMTPClient:
+    def __init__(self, host=None, port=None, username=None, password=None, use_starttls=None,
+                 pool_size=None, keepalive_interval=None, max_idle=None, timeout=30):
+        """
+        Initialize the client. Sessions are opened lazily.
+
+        Args:
+            host: SMTP server host (default from config)
+            port: SMTP server port (default from config)
+            username: Login user (None to skip AUTH)
+            password: Login password
+            use_starttls: Upgrade the connection with STARTTLS (default from config)
+            pool_size: Maximum concurrent sessions (default from config)
+            keepalive_interval: Idle seconds after which a session is checked with NOOP before reuse
+            max_idle: Seconds after which an idle session is closed instead of reused
+            timeout: Seconds to wait for each server reply
+        """
+        self.host = host if host is not None else Config.SMTP_HOST
+        self.port = port if port is not None else Config.SMTP_PORT
+        self.username = username
+        self.password = password
+        self.use_starttls = use_starttls if use_starttls is not None else Config.SMTP_STARTTLS
+        self.pool_size = pool_size if pool_size is not None else Config.SMTP_POOL_SIZE
+        self.keepalive_interval = keepalive_interval if keepalive_interval is not None else Config.SMTP_KEEPALIVE_INTERVAL
+        self.max_idle = max_idle if max_idle is not None else Config.SMTP_MAX_IDLE
+        self.timeout = timeout
+
+        self.idle = []  # _AsyncSMTPSession objects ready for reuse
+        self.slots = None  # semaphore bounding open sessions, created in the loop
+        self.open_count = 0
+
+        # Statistics
+        self.connections_opened = 0
+        self.reconnects = 0
+        self.messages_sent = 0
+        self.recipients_sent = 0
+
+    async def _reply(self, session):
+        """Read a (possibly multi-line) reply. Returns (code, text)."""
+        lines = []
+        while True:
+            line = await asyncio.wait_for(session.reader.readline(), self.timeout)
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].strip().decode(errors='replace'))
+            if line[3:4] != b'-':
+                return int(line[:3]), '\n'.join(lines)
+
+    async def _command(self, session, line, expect=(250,)):
+        """Send one command and check the reply code."""
+        session.writer.write(f"{line}\r\n".encode())
+        await session.writer.drain()
+        code, text = await self._reply(session)
+        if code not in expect:
+            raise smtplib.SMTPResponseException(code, text)
+        return code, text
+
+    async def _ehlo(self, session):
+        """EHLO, recording the extensions the server advertises (like smtplib.SMTP.ehlo)."""
+        _, text = await self._command(session, "EHLO localhost")
+        session.extensions = {}
+        for line in text.split('\n')[1:]:
+            keyword, _, params = line.partition(' ')
+            if keyword:
+                session.extensions[keyword.lower()] = params.strip()
+
+    async def _login(self, session):
+        """AUTH with the first mechanism both sides support: PLAIN, then LOGIN."""
+        if 'auth' not in session.extensions:
+            raise smtplib.SMTPNotSupportedError("SMTP AUTH extension not supported by server.")
+        mechanisms = session.extensions['auth'].upper().split()
+        if 'PLAIN' in mechanisms:
+            token = base64.b64encode(f"\0{self.username}\0{self.password}".encode()).decode()
+            await self._command(session, f"AUTH PLAIN {token}", expect=(235,))
+        elif 'LOGIN' in mechanisms:
+            await self._command(session, "AUTH LOGIN", expect=(334,))
+            await self._command(session, base64.b64encode(self.username.encode()).decode(), expect=(334,))
+            await self._command(session, base64.b64encode(self.password.encode()).decode(), expect=(235,))
+        else:
+            raise smtplib.SMTPException("No suitable authentication method found.")
+
+    async def _connect(self):
+        """Open and authenticate a new SMTP session."""
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        session = _AsyncSMTPSession(reader, writer)
+        try:
+            code, text = await self._reply(session)
+            if code != 220:
+                raise smtplib.SMTPConnectError(code, text)
+            await self._ehlo(session)
+            if self.use_starttls:
+                if 'starttls' not in session.extensions:
+                    raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+                await self._command(session, "STARTTLS", expect=(220,))
+                await writer.start_tls(ssl.create_default_context(), server_hostname=self.host)
+                # Capabilities before TLS are not to be trusted: ask again
+                await self._ehlo(session)
+            if self.username and self.password:
+                await self._login(session)
+        except BaseException:
+            writer.close()
+            raise
+        self.connections_opened += 1
+        return session
+
+    async def _is_alive(self, session):
+        """Check a session with NOOP."""
+        try:
+            await self._command(session, "NOOP")
+            return True
+        except (smtplib.SMTPException, OSError, asyncio.TimeoutError):
+            return False
+
+    @staticmethod
+    def _close(session):
+        session.writer.close()
+
+    async def _acquire(self):
+        """Take a session slot; reuse an idle session if it is still usable."""
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.pool_size)
+        await self.slots.acquire()
+        try:
+            while self.idle:
+                session = self.idle.pop()
+                idle_for = time.monotonic() - session.last_used
+                if idle_for < self.keepalive_interval or (idle_for < self.max_idle and await self._is_alive(session)):
+                    return session, True
+                self._close(session)
+                self.open_count -= 1
+            session = await self._connect()
+            self.open_count += 1
+            return session, False
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def _release(self, session, healthy=True):
+        if healthy:
+            session.last_used = time.monotonic()
+            self.idle.append(session)
+        else:
+            self._close(session)
+            self.open_count -= 1
+        self.slots.release()
+
+    async def _transaction(self, session, from_addr, recipients, data):
+        """MAIL, RCPT and DATA for one message. Returns the refused recipients."""
+        options = ''
+        if 'size' in session.extensions:
+            limit = session.extensions['size']
+            if limit.isdigit() and 0 < int(limit) < len(data):
+                raise smtplib.SMTPResponseException(552, f"Message of {len(data)} bytes exceeds the server's "
+                                                         f"maximum of {limit}")
+            options += f" SIZE={len(data)}"
+        if not data.isascii():
+            if '8bitmime' not in session.extensions:
+                raise smtplib.SMTPNotSupportedError("8-bit message but the server does not support 8BITMIME.")
+            options += " BODY=8BITMIME"
+        await self._command(session, f"MAIL FROM:<{from_addr}>{options}")
+        refused = {}
+        for recipient in recipients:
+            session.writer.write(f"RCPT TO:<{recipient}>\r\n".encode())
+            await session.writer.drain()
+            code, text = await self._reply(session)
+            if code not in (250, 251):
+                refused[recipient] = (code, text)
+        if len(refused) == len(recipients):
+            await self._command(session, "RSET")
+            return refused
+
+        await self._command(session, "DATA", expect=(354,))
+        session.writer.write(data)
+        await session.writer.drain()
+        code, text = await self._reply(session)
+        if code != 250:
+            raise smtplib.SMTPDataError(code, text)
+        return refused
+
+    @staticmethod
+    def _dot_stuff(message):
+        """CRLF line endings, leading dots doubled, terminated by <CRLF>.<CRLF>."""
+        if isinstance(message, str):
+            message = message.encode()
+        lines = message.replace(b'\r\n', b'\n').split(b'\n')
+        if lines and lines[-1] == b'':
+            lines.pop()
+        return b''.join((b'.' + line if line.startswith(b'.') else line) + b'\r\n' for line in lines) + b'.\r\n'
+
+    async def send_message(self, from_addr, recipients, message):
+        """
+        Send one already-serialised message to all recipients in a single transaction.
+
+        Returns:
+            dict: Recipients refused by the server as (code, message) (empty if all accepted)
+        """
+        recipients = [r.strip() for r in recipients if r and r.strip()]
+        if not recipients:
+            return {}
+        data = self._dot_stuff(message)
+
+        session, reused = await self._acquire()
+        try:
+            try:
+                refused = await self._transaction(session, from_addr, recipients, data)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                if not reused:
+                    raise
+                # Session died while idle: retry once on a new one
+                self._close(session)
+                self.reconnects += 1
+                session = await self._connect()
+                refused = await self._transaction(session, from_addr, recipients, data)
+        except BaseException:
+            # Includes cancellation by the engine's timeout: the session state is unknown
+            self._release(session, healthy=False)
+            raise
+
+        self._release(session)
+        self.messages_sent += 1
+        self.recipients_sent += len(recipients) - len(refused)
+        return refused
+
+    async def close(self):
+        """QUIT and close idle sessions."""
+        idle, self.idle = self.idle, []
+        for session in idle:
+            try:
+                session.writer.write(b"QUIT\r\n")
+                await session.writer.drain()
+            except (OSError, RuntimeError):
+                pass
+            self._close(session)
+            self.open_count -= 1
+
+    def get_stats(self):
+        """Get connection and delivery statistics."""
+        return {
+            'open_connections': self.open_count,
+            'idle_connections': len(self.idle),
+            'connections_opened': self.connections_opened,
+            'reconnects': self.reconnects,
+            'messages_sent': self.messages_sent,
+            'recipients_sent': self.recipients_sent,
+        }
+
+
+class AsyncTwilioWhatsAppClient(_TwilioClientBase):
+    """Twilio Messages API client; see _TwilioClientBase for the constructor arguments."""
+
+    session = None
+
+    def _session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                auth=aiohttp.BasicAuth(self.account_sid, self.auth_token),
+                connector=aiohttp.TCPConnector(limit=self.max_workers),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def send_message(self, to, body, media_urls=None):
+        """
+        Send one message, retrying failures where Twilio never received the request.
+
+        Returns:
+            str: Message SID
+
+        Raises:
+            WhatsAppSendError: If all attempts failed, or with unknown=True when
+                the message may have been accepted
+        """
+        data = self._request(to, body, media_urls)
+        form = [(key, value) for key, values in data.items()
+                for value in (values if isinstance(values, list) else [values])]
+
+        last_error, retryable, unknown = None, True, False
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+            await self.rate_limiter.acquire_async()
+            retry_after = None
+            try:
+                async with self._session().post(self.url, data=form) as response:
+                    text = await response.text()
+                    if response.status in (200, 201):
+                        self.sent += 1
+                        return (await response.json(content_type=None)).get('sid')
+                    last_error = f"HTTP {response.status}: {text[:200]}"
+                    if response.status not in RETRYABLE_STATUS:
+                        retryable, unknown = False, response.status >= 500
+                        break
+                    retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = str(e) or type(e).__name__
+                # Only a failed connect proves the request never reached Twilio
+                if not isinstance(e, (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)):
+                    unknown = True
+                    break
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        self.failed += 1
+        raise WhatsAppSendError(f"{to}: {last_error}", retryable=retryable, unknown=unknown)
+
+    async def fan_out(self, recipients, body, media_urls=None):
+        """
+        Send the same message to all recipients concurrently.
+
+        Returns:
+            dict: recipient -> message SID, or the exception raised for that recipient
+        """
+        recipients = [r.strip() for r in recipients if r.strip()]
+        results = await asyncio.gather(
+            *(self.send_message(recipient, body, media_urls) for recipient in recipients),
+            return_exceptions=True)
+        return dict(zip(recipients, results))
+
+    async def close(self):
+        """Release connections."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class AsyncWebhookClient(WebhookClient):
+    """JSON webhooks over one aiohttp session, all URLs of an alert concurrently."""
+
+    def __init__(self, timeout=None):
+        """
+        Args:
+            timeout: HTTP timeout in seconds (default from config)
+        """
+        self.timeout = timeout if timeout is not None else Config.WEBHOOK_TIMEOUT
+        self.session = None
+        self.sent = 0
+        self.failed = 0
+
+    def _session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=Config.WEBHOOK_MAX_CONCURRENCY),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def post(self, url, payload, idempotency_key=None):
+        """
+        POST one JSON payload.
+
+        Raises:
+            WebhookError: If the request failed or was rejected
+        """
+        headers = {'Content-Type': 'application/json'}
+        if idempotency_key:
+            headers['Idempotency-Key'] = f"{idempotency_key}:{url}"
+        try:
+            async with self._session().post(url, data=payload, headers=headers) as response:
+                check_webhook_response(url, response.status, await response.text())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.failed += 1
+            raise WebhookError(f"{url}: {str(e) or type(e).__name__}") from e
+        except WebhookError:
+            self.failed += 1
+            raise
+        self.sent += 1
+
+    async def close(self):
+        """Release connections."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Startup autotuner for the inference setup.
+
+The fastest torch thread count, inference backend and input size differ
+widely between hosts. The autotuner benchmarks every combination of the
+candidates on this host, on replayed footage or synthetic frames:
+
+    backends   torch (the .pt weights), and onnx / openvino exports when
+               their runtimes are installed (exported once, with dynamic
+               input size, next to the weights)
+    imgsz      AUTOTUNE_IMGSZ sizes
+    threads    powers of two up to the number of CPUs
+
+Each combination's detections are compared with a reference run (torch, the
+largest size), and the fastest combination whose recall is at least
+AUTOTUNE_RECALL_FLOOR and whose p95 latency is within AUTOTUNE_LATENCY_TARGET
+wins. Frames without people (the synthetic ones) cannot measure recall, so
+then only the reference size is benchmarked: backend and threads are tuned,
+the input size is never lowered on latency alone. The result is cached in AUTOTUNE_CACHE_PATH under a fingerprint of the
+hardware, the software versions and the model, and HumanDetector applies it
+on later startups on the same host (settings chosen explicitly still win).
+
+    python autotune.py --replay footage.mp4 --frames 60
+    python main.py --autotune
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from config import Config
+from human_detector import HumanDetector
+from logging_setup import setup_logging
+
+# Export format and runtime module of each non-torch backend
+EXPORT_BACKENDS = {'onnx': 'onnxruntime', 'openvino': 'openvino'}
+MATCH_IOU = 0.5  # a candidate box matches a reference box at this IoU
+
+
+def parse_sizes(spec):
+    """
+    Parse a comma-separated list of input sizes, e.g. "320,416,640".
+
+    Raises:
+        ValueError: If a size is not a positive multiple of 32
+    """
+    sizes = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.isdigit() or int(part) <= 0 or int(part) % 32:
+            raise ValueError(f"input size {part!r} must be a positive multiple of 32")
+        sizes.append(int(part))
+    if not sizes:
+        raise ValueError("no input sizes given")
+    return sorted(set(sizes))
+
+
+def default_thread_counts():
+    """Powers of two up to the number of CPUs, and the CPU count itself."""
+    cpus = os.cpu_count() or 1
+    counts, n = [], 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    counts.append(cpus)
+    return counts
+
+
+def _cpu_model():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name') or line.startswith('Model'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def hardware_fingerprint(model_path):
+    """
+    Identify this host's inference setup.
+
+    Returns:
+        tuple: (fingerprint: str, description: dict)
+    """
+    description = {
+        'machine': platform.machine(),
+        'cpu': _cpu_model(),
+        'cpus': os.cpu_count(),
+        'system': platform.system(),
+        'python': platform.python_version(),
+        'model': os.path.basename(model_path),
+    }
+    try:
+        import torch
+        description['torch'] = torch.__version__
+        if torch.cuda.is_available():
+            description['gpu'] = torch.cuda.get_device_name(0)
+    except ImportError:
+        pass
+    try:
+        import ultralytics
+        description['ultralytics'] = ultralytics.__version__
+    except ImportError:
+        pass
+    encoded = json.dumps(description, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16], description
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_tuning(model_path, cache_path=None):
+    """
+    Get the cached tuning of a model for this host.
+
+    Returns:
+        dict or None: backend, weights, imgsz, threads, latency and recall figures
+    """
+    fingerprint, _ = hardware_fingerprint(model_path)
+    return _read_cache(cache_path or Config.AUTOTUNE_CACHE_PATH).get(fingerprint)
+
+
+def save_tuning(model_path, tuning, cache_path=None):
+    """Store the tuning of a model for this host, keeping other hosts' entries."""
+    cache_path = cache_path or Config.AUTOTUNE_CACHE_PATH
+    fingerprint, description = hardware_fingerprint(model_path)
+    cache = _read_cache(cache_path)
+    cache[fingerprint] = dict(tuning, host=description, tuned_at=datetime.now().isoformat(timespec='seconds'))
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(temp_path, cache_path)
+
+
+def synthetic_frames(count, width=None, height=None):
+    """
+    Frames from the soak test's synthetic camera (latency only: the drawn
+    'person' is not something a real model recognises).
+    """
+    from soak import SyntheticCamera
+    camera = SyntheticCamera(width=width, height=height, activity_period=count, activity_fraction=0.5)
+    # Texture, so inference does not run on a flat image
+    noise = np.random.default_rng(0).integers(0, 40, camera.background.shape, dtype=np.uint8)
+    camera.background += noise
+    camera.is_running, camera.start_time = True, 0.0
+    frames = []
+    for i in range(count):
+        frame = camera.background.copy()
+        bbox = camera.person_bbox(now=i + 0.5)
+        if bbox:
+            cv2.rectangle(frame, bbox[:2], bbox[2:], (200, 180, 160), -1)
+        frames.append(frame)
+    return frames
+
+
+def replay_frames(path, count):
+    """
+    Frames spread evenly over a recording.
+
+    Raises:
+        ValueError: If the recording cannot be read
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open {path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    stride = max(1, total // count)
+    frames = []
+    try:
+        while len(frames) < count:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+            # Skip to the next sample without decoding the frames in between
+            for _ in range(stride - 1):
+                if not cap.grab():
+                    break
+    finally:
+        cap.release()
+    if not frames:
+        raise ValueError(f"No frames in {path}")
+    return frames
+
+
+def recall(truth, found):
+    """
+    Fraction of the reference boxes matched by a candidate's boxes (one match each).
+
+    Args:
+        truth: Per frame, a list of reference (x1, y1, x2, y2) boxes
+        found: Per frame, a list of the candidate's boxes
+
+    Returns:
+        float or None: None if there are no reference boxes
+    """
+    total = matched = 0
+    for expected, boxes in zip(truth, found):
+        unused = list(boxes)
+        for box in expected:
+            total += 1
+            best = max(unused, key=lambda candidate: HumanDetector._iou(box, candidate), default=None)
+            if best is not None and HumanDetector._iou(box, best) >= MATCH_IOU:
+                unused.remove(best)
+                matched += 1
+    return matched / total if total else None
+
+
+class Autotuner:
+    def __init__(self, frames, model_path=None, backends=None, sizes=None, thread_counts=None,
+                 recall_floor=None, latency_target=None, truth=None, load_model=None, export=None):
+        """
+        Initialize the autotuner.
+
+        Args:
+            frames: Benchmark frames (BGR images)
+            model_path: Weights to tune (default from config)
+            backends: Candidate backends (default from config)
+            sizes: Candidate input sizes (default from config)
+            thread_counts: Candidate torch thread counts (default: powers of two up to the CPU count)
+            recall_floor: Minimum recall against the reference (default from config)
+            latency_target: Maximum p95 latency per frame in seconds (default from config)
+            truth: Per frame, the person boxes expected (default: the reference run's detections)
+            load_model: Function (backend, weights) -> model with the ultralytics call interface
+                (default: ultralytics YOLO)
+            export: Function (backend) -> weights path, or None if unavailable
+                (default: ultralytics export, if the backend's runtime is installed)
+        """
+        self.frames = frames
+        self.model_path = model_path or Config.MODEL_PATH
+        self.backends = backends or [b.strip() for b in Config.AUTOTUNE_BACKENDS.split(',') if b.strip()]
+        self.sizes = sizes or parse_sizes(Config.AUTOTUNE_IMGSZ)
+        self.thread_counts = thread_counts or default_thread_counts()
+        self.recall_floor = recall_floor if recall_floor is not None else Config.AUTOTUNE_RECALL_FLOOR
+        self.latency_target = latency_target if latency_target is not None else Config.AUTOTUNE_LATENCY_TARGET
+        self.truth = truth
+        self.load_model = load_model or self._load_yolo
+        self.export = export or self._export
+        self.confidence_threshold = Config.CONFIDENCE_THRESHOLD
+        self.results = []
+
+    @staticmethod
+    def _load_yolo(backend, weights):
+        from ultralytics import YOLO
+        return YOLO(weights, task='detect')
+
+    def _weights(self, backend):
+        """
+        Get the weights file of a backend, exporting the model if needed.
+
+        Returns:
+            str or None: Path, or None if the backend is not available here
+        """
+        if backend == 'torch':
+            return self.model_path
+        if backend not in EXPORT_BACKENDS:
+            print(f"⚠️ Unknown backend {backend!r}, skipped")
+            return None
+        return self.export(backend)
+
+    def _export(self, backend):
+        runtime = EXPORT_BACKENDS[backend]
+        if importlib.util.find_spec(runtime) is None:
+            print(f"⚠️ Backend {backend} skipped: {runtime} is not installed")
+            return None
+        try:
+            from ultralytics import YOLO
+            print(f"📦 Exporting {self.model_path} to {backend}...")
+            return YOLO(self.model_path).export(format=backend, dynamic=True, verbose=False)
+        except Exception as e:
+            print(f"⚠️ Backend {backend} skipped: export failed: {e}")
+            return None
+
+    def _person_boxes(self, results):
+        boxes = []
+        for result in results:
+            if result.boxes is None:
+                continue
+            for box in result.boxes:
+                if int(box.cls[0]) == 0 and float(box.conf[0]) >= self.confidence_threshold:
+                    boxes.append(tuple(int(v) for v in box.xyxy[0].cpu().numpy()))
+        return boxes
+
+    def _benchmark(self, model, imgsz, threads, warmup=2):
+        """
+        Time one configuration over the benchmark frames.
+
+        Returns:
+            tuple: (latencies in seconds, boxes per frame)
+        """
+        import torch
+        torch.set_num_threads(threads)
+        for frame in self.frames[:warmup]:
+            model(frame, verbose=False, imgsz=imgsz)
+        latencies, found = [], []
+        for frame in self.frames:
+            start = time.perf_counter()
+            results = model(frame, verbose=False, imgsz=imgsz)
+            latencies.append(time.perf_counter() - start)
+            found.append(self._person_boxes(results))
+        return latencies, found
+
+    def run(self):
+        """
+        Benchmark every candidate and choose the setup.
+
+        Returns:
+            dict: The chosen setup (backend, weights, imgsz, threads, latency_avg,
+                latency_p95, recall, meets_target), or None if nothing could run
+        """
+        import torch
+        original_threads = torch.get_num_threads()
+        print(f"🔧 Autotuning {self.model_path} on {len(self.frames)} frames: backends {self.backends}, "
+              f"sizes {self.sizes}, threads {self.thread_counts}")
+        try:
+            # The reference: full-size torch inference with every thread
+            truth = self.truth
+            if truth is None:
+                reference = self.load_model('torch', self.model_path)
+                _, truth = self._benchmark(reference, max(self.sizes), max(self.thread_counts))
+            sizes = self.sizes
+            if not any(truth):
+                # A smaller input could lose people unnoticed: keep the reference size
+                sizes = [max(self.sizes)]
+                print(f"⚠️ No people in the benchmark frames: recall cannot be checked, so only "
+                      f"{sizes[0]}px is benchmarked (use --replay with footage of people to tune the size)")
+
+            self.results = []
+            for backend in self.backends:
+                weights = self._weights(backend)
+                if weights is None:
+                    continue
+                try:
+                    model = self.load_model(backend, weights)
+                except Exception as e:
+                    print(f"⚠️ Backend {backend} skipped: {e}")
+                    continue
+                for imgsz in sizes:
+                    for threads in self.thread_counts:
+                        latencies, found = self._benchmark(model, imgsz, threads)
+                        latencies.sort()
+                        result = {
+                            'backend': backend,
+                            'weights': weights,
+                            'imgsz': imgsz,
+                            'threads': threads,
+                            'latency_avg': sum(latencies) / len(latencies),
+                            'latency_p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                            'recall': recall(truth, found),
+                        }
+                        self.results.append(result)
+                        recall_text = f"{result['recall']:.2f}" if result['recall'] is not None else "n/a"
+                        print(f"   {backend:<9} {imgsz:>4}px {threads:>2} threads: "
+                              f"avg {result['latency_avg'] * 1000:6.1f} ms, "
+                              f"p95 {result['latency_p95'] * 1000:6.1f} ms, recall {recall_text}")
+        finally:
+            torch.set_num_threads(original_threads)
+        return self.choose()
+
+    def choose(self):
+        """
+        Pick the fastest result meeting the recall floor and the latency target;
+        if none meets the target, the fastest meeting the recall floor.
+
+        Returns:
+            dict or None
+        """
+        accurate = [r for r in self.results if r['recall'] is None or r['recall'] >= self.recall_floor]
+        if not accurate:
+            print(f"⚠️ No setup reaches recall {self.recall_floor}; keeping the most accurate one")
+            accurate = sorted(self.results, key=lambda r: -(r['recall'] or 0))[:1]
+        if not accurate:
+            return None
+        fast = [r for r in accurate if r['latency_p95'] <= self.latency_target]
+        if not fast:
+            print(f"⚠️ No setup meets the {self.latency_target * 1000:.0f} ms latency target; "
+                  f"using the fastest one")
+        best = dict(min(fast or accurate, key=lambda r: r['latency_avg']))
+        best['meets_target'] = bool(fast)
+        return best
+
+
+def build_parser():
+    """Build the autotune argument parser."""
+    parser = argparse.ArgumentParser(description='Benchmark inference setups on this host and cache the fastest')
+    parser.add_argument('--replay', default=None, metavar='VIDEO',
+                        help='Benchmark on frames from a recording (default: synthetic frames)')
+    parser.add_argument('--frames', type=int, default=Config.AUTOTUNE_FRAMES, help='Benchmark frames')
+    parser.add_argument('--model', default=None, help='Weights to tune (default: MODEL_PATH)')
+    parser.add_argument('--backends', default=None, help='Comma-separated backends (default: AUTOTUNE_BACKENDS)')
+    parser.add_argument('--imgsz', default=None, help='Comma-separated input sizes (default: AUTOTUNE_IMGSZ)')
+    parser.add_argument('--threads', default=None, help='Comma-separated thread counts (default: powers of two)')
+    parser.add_argument('--recall-floor', type=float, default=None)
+    parser.add_argument('--latency-target', type=float, default=None, metavar='SECONDS')
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point."""
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    try:
+        frames = replay_frames(args.replay, args.frames) if args.replay else synthetic_frames(args.frames)
+        tuner = Autotuner(
+            frames, model_path=args.model,
+            backends=[b.strip() for b in args.backends.split(',')] if args.backends else None,
+            sizes=parse_sizes(args.imgsz) if args.imgsz else None,
+            thread_counts=[int(t) for t in args.threads.split(',')] if args.threads else None,
+            recall_floor=args.recall_floor, latency_target=args.latency_target)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+
+    best = tuner.run()
+    if best is None:
+        print("❌ No setup could be benchmarked")
+        return 1
+    save_tuning(tuner.model_path, best)
+    print(f"✅ Tuned: {best['backend']} ({best['weights']}), {best['imgsz']}px, {best['threads']} threads, "
+          f"p95 {best['latency_p95'] * 1000:.1f} ms - saved to {Config.AUTOTUNE_CACHE_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Notification delivery benchmarks against local stand-in servers.
+
+    python benchmarks.py smtp --messages 100 --recipients 5
+    python benchmarks.py whatsapp --alerts 20 --recipients 5
+    python benchmarks.py outbox --alerts 2000 --producers 4
+    python benchmarks.py engine --alerts 50 --recipients 5 --webhooks 20
+"""
+
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import requests
+
+from alert_snapshot import AlertSnapshot
+from async_channels import AsyncSMTPClient, AsyncTwilioWhatsAppClient, AsyncWebhookClient
+from notification_engine import AsyncNotificationEngine
+from notification_outbox import NotificationOutbox
+from smtp_pool import SMTPConnectionPool
+from stand_in_servers import LocalHTTPServer, LocalSMTPServer, LocalTwilioServer
+from webhook_client import WebhookClient
+from whatsapp_client import TwilioWhatsAppClient
+from worker_pool import WorkerPool
+
+
+def _report(name, count, elapsed, unit="messages"):
+    print(f"   {name:<28} {count} {unit} in {elapsed:.2f}s = {count / elapsed:.1f} {unit}/s")
+
+
+def _legacy_send_email(host, port, sender, recipients, subject, body, image_data):
+    """Previous delivery path: new session per email, message re-encoded per recipient."""
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    image = MIMEImage(image_data, 'jpeg')
+    image.add_header('Content-Disposition', 'attachment; filename=detection.jpg')
+    msg.attach(image)
+
+    server = smtplib.SMTP(host, port)
+    for recipient in recipients:
+        msg['To'] = recipient
+        server.sendmail(sender, recipient, msg.as_string())
+        del msg['To']
+    server.quit()
+
+
+def _pooled_send_email(pool, sender, recipients, subject, body, image_data):
+    """Current delivery path: pooled session, single encode, one transaction."""
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = ', '.join(recipients)
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    image = MIMEImage(image_data, 'jpeg')
+    image.add_header('Content-Disposition', 'attachment; filename=detection.jpg')
+    msg.attach(image)
+    pool.send_message(sender, recipients, msg.as_bytes())
+
+
+def benchmark_smtp(args):
+    """Compare per-email sessions with pooled single-transaction delivery."""
+    server = LocalSMTPServer(connect_delay=args.connect_delay, command_delay=args.command_delay).start()
+    sender = "bench@example.com"
+    recipients = [f"recipient{i}@example.com" for i in range(args.recipients)]
+    image_data = os.urandom(args.image_kb * 1024)
+    print(f"📧 SMTP benchmark: {args.messages} messages x {args.recipients} recipients, "
+          f"{args.image_kb} KB attachment, connect delay {args.connect_delay * 1000:.0f} ms, "
+          f"command delay {args.command_delay * 1000:.1f} ms")
+
+    try:
+        start = time.perf_counter()
+        for i in range(args.messages):
+            _legacy_send_email('127.0.0.1', server.port, sender, recipients, f"Alert {i}", "Body", image_data)
+        legacy_time = time.perf_counter() - start
+        legacy_connections = server.connections
+        _report("per-email session", args.messages, legacy_time)
+
+        pool = SMTPConnectionPool(host='127.0.0.1', port=server.port, use_starttls=False, pool_size=1)
+        start = time.perf_counter()
+        for i in range(args.messages):
+            _pooled_send_email(pool, sender, recipients, f"Alert {i}", "Body", image_data)
+        pooled_time = time.perf_counter() - start
+        pool.close()
+        _report("pooled session", args.messages, pooled_time)
+
+        print(f"   Connections: {legacy_connections} per-email vs {server.connections - legacy_connections} pooled")
+        print(f"   Speed-up: {legacy_time / pooled_time:.1f}x")
+    finally:
+        server.stop()
+
+
+def _legacy_send_whatsapp(url, auth, sender, recipients, body):
+    """Previous delivery path: one request after another, new connection each time."""
+    for recipient in recipients:
+        response = requests.post(url, auth=auth, data={'To': recipient, 'From': sender, 'Body': body})
+        response.raise_for_status()
+
+
+def benchmark_whatsapp(args):
+    """Compare sequential per-recipient requests with pooled concurrent fan-out."""
+    server = LocalTwilioServer(response_delay=args.response_delay).start()
+    sid, token, sender = 'ACbench', 'bench', 'whatsapp:+14155238886'
+    recipients = [f"whatsapp:+1555000{i:04d}" for i in range(args.recipients)]
+    total = args.alerts * args.recipients
+    print(f"📱 WhatsApp benchmark: {args.alerts} alerts x {args.recipients} recipients, "
+          f"response delay {args.response_delay * 1000:.0f} ms")
+
+    try:
+        url = f"{server.url}/2010-04-01/Accounts/{sid}/Messages.json"
+        start = time.perf_counter()
+        for i in range(args.alerts):
+            _legacy_send_whatsapp(url, (sid, token), sender, recipients, f"Alert {i}")
+        legacy_time = time.perf_counter() - start
+        _report("sequential requests", total, legacy_time)
+
+        client = TwilioWhatsAppClient(sid, token, sender, api_base=server.url,
+                                      max_workers=args.workers, rate_per_second=0)
+        start = time.perf_counter()
+        for i in range(args.alerts):
+            client.fan_out(recipients, f"Alert {i}")
+        pooled_time = time.perf_counter() - start
+        client.close()
+        _report("concurrent fan-out", total, pooled_time)
+
+        print(f"   Alert latency: {legacy_time / args.alerts * 1000:.0f} ms sequential vs "
+              f"{pooled_time / args.alerts * 1000:.0f} ms fan-out")
+        print(f"   Speed-up: {legacy_time / pooled_time:.1f}x")
+    finally:
+        server.stop()
+
+
+def _outbox_throughput(path, batch_size, alerts, producers, image_data):
+    """Record alerts from several threads and wait until all are committed."""
+    outbox = NotificationOutbox(path, batch_size=batch_size)
+    per_producer = alerts // producers
+
+    def produce():
+        for i in range(per_producer):
+            outbox.record(f"Alert {i}", {'whatsapp': ['whatsapp:+15550000000'], 'email': ['a@example.com']},
+                          subject=f"Alert {i}", snapshot=AlertSnapshot.from_bytes(image_data))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=produce) for _ in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    outbox.flush(timeout=600)
+    elapsed = time.perf_counter() - start
+    commits = outbox.get_stats()['commits']
+    outbox.close()
+    return per_producer * producers, elapsed, commits
+
+
+def benchmark_outbox(args):
+    """Compare one fsync per alert with group commits."""
+    directory = tempfile.mkdtemp(prefix='outbox-bench-')
+    image_data = os.urandom(args.image_kb * 1024)
+    print(f"📤 Outbox benchmark: {args.alerts} alerts from {args.producers} threads, "
+          f"{args.image_kb} KB image, synchronous=FULL in {directory}")
+
+    count, single_time, single_commits = _outbox_throughput(
+        os.path.join(directory, 'single.db'), 1, args.alerts, args.producers, image_data)
+    _report(f"commit per alert ({single_commits})", count, single_time, unit="alerts")
+    count, group_time, group_commits = _outbox_throughput(
+        os.path.join(directory, 'group.db'), 500, args.alerts, args.producers, image_data)
+    _report(f"group commit ({group_commits})", count, group_time, unit="alerts")
+    print(f"   Speed-up: {single_time / group_time:.1f}x")
+
+
+class _AlertTracker:
+    """Per-alert submit and completion times, and the peak number of sender threads."""
+
+    def __init__(self, alerts):
+        self.lock = threading.Lock()
+        self.submitted = [0.0] * alerts
+        self.finished = [0.0] * alerts
+        self.peak_threads = 0
+        self.stop = threading.Event()
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+        self.sampler.start()
+
+    @staticmethod
+    def _sender_threads():
+        # The stand-in servers run in this process; count only the client side
+        return sum(1 for thread in threading.enumerate()
+                   if 'process_request_thread' not in thread.name and not thread.name.startswith('stand-in'))
+
+    def _sample(self):
+        while not self.stop.wait(0.005):
+            self.peak_threads = max(self.peak_threads, self._sender_threads())
+
+    def done(self, alert):
+        with self.lock:
+            self.finished[alert] = max(self.finished[alert], time.perf_counter())
+
+    def report(self, name, elapsed):
+        self.stop.set()
+        self.sampler.join()
+        latencies = sorted(f - s for s, f in zip(self.submitted, self.finished))
+        _report(name, len(latencies), elapsed, unit="alerts")
+        print(f"   {'':<28} alert latency p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms, peak threads {self.peak_threads}")
+        return latencies[int(len(latencies) * 0.95)]
+
+
+def _engine_workload(args, smtp_server, twilio_server, webhook_server):
+    sender = "bench@example.com"
+    emails = [f"recipient{i}@example.com" for i in range(args.recipients)]
+    phones = [f"whatsapp:+1555000{i:04d}" for i in range(args.recipients)]
+    urls = [f"{webhook_server.url}/hook/{i}" for i in range(args.webhooks)]
+    message = b"Subject: Alert\r\n\r\nPerson detected\r\n"
+    payload = b'{"message": "Person detected"}'
+    twilio = dict(account_sid='ACbench', auth_token='bench', from_number='whatsapp:+14155238886',
+                  api_base=twilio_server.url, max_workers=args.concurrency, rate_per_second=0)
+    return sender, emails, phones, urls, message, payload, twilio
+
+
+def _threaded_engine(args, servers):
+    """Current design: a worker pool whose threads block on each channel's I/O."""
+    sender, emails, phones, urls, message, payload, twilio_args = _engine_workload(args, *servers)
+    smtp = SMTPConnectionPool(host='127.0.0.1', port=servers[0].port, use_starttls=False, pool_size=args.smtp_sessions)
+    twilio = TwilioWhatsAppClient(**twilio_args)
+    webhooks = WebhookClient()
+    pool = WorkerPool('bench-notify', num_workers=args.workers, capacity=args.alerts * 3)
+    tracker = _AlertTracker(args.alerts)
+
+    def email(alert):
+        smtp.send_message(sender, emails, message)
+        tracker.done(alert)
+
+    def whatsapp(alert):
+        twilio.fan_out(phones, f"Alert {alert}")
+        tracker.done(alert)
+
+    def webhook(alert):
+        for url in urls:
+            webhooks.post(url, payload)
+        tracker.done(alert)
+
+    start = time.perf_counter()
+    for alert in range(args.alerts):
+        tracker.submitted[alert] = time.perf_counter()
+        for job in (email, whatsapp, webhook):
+            pool.submit(job, alert)
+    pool.shutdown(timeout=600)
+    elapsed = time.perf_counter() - start
+    smtp.close()
+    twilio.close()
+    webhooks.close()
+    return tracker.report(f"worker pool ({args.workers} threads)", elapsed), elapsed
+
+
+def _asyncio_engine(args, servers):
+    """Asyncio engine: every channel on one event loop, limited per channel."""
+    sender, emails, phones, urls, message, payload, twilio_args = _engine_workload(args, *servers)
+    smtp = AsyncSMTPClient(host='127.0.0.1', port=servers[0].port, use_starttls=False, pool_size=args.smtp_sessions)
+    twilio = AsyncTwilioWhatsAppClient(**twilio_args)
+    webhooks = AsyncWebhookClient()
+    engine = AsyncNotificationEngine('bench-async')
+    engine.add_channel('email', args.smtp_sessions, timeout=60, capacity=args.alerts)
+    engine.add_channel('whatsapp', args.concurrency, timeout=60, capacity=args.alerts)
+    engine.add_channel('webhook', args.concurrency, timeout=60, capacity=args.alerts)
+    tracker = _AlertTracker(args.alerts)
+
+    async def email(alert):
+        await smtp.send_message(sender, emails, message)
+        tracker.done(alert)
+
+    async def whatsapp(alert):
+        await twilio.fan_out(phones, f"Alert {alert}")
+        tracker.done(alert)
+
+    async def webhook(alert):
+        await asyncio.gather(*(webhooks.post(url, payload) for url in urls))
+        tracker.done(alert)
+
+    async def close():
+        await smtp.close()
+        await twilio.close()
+        await webhooks.close()
+
+    start = time.perf_counter()
+    for alert in range(args.alerts):
+        tracker.submitted[alert] = time.perf_counter()
+        for channel, job in (('email', email), ('whatsapp', whatsapp), ('webhook', webhook)):
+            engine.submit(channel, job, alert)
+    engine.shutdown(timeout=600, cleanup=close)
+    elapsed = time.perf_counter() - start
+    return tracker.report("asyncio engine (1 thread)", elapsed), elapsed
+
+
+def benchmark_engine(args):
+    """Compare the worker-pool design with the asyncio engine on the same mixed workload."""
+    servers = (LocalSMTPServer(command_delay=args.response_delay / 10).start(),
+               LocalTwilioServer(response_delay=args.response_delay).start(),
+               LocalHTTPServer(response_delay=args.response_delay).start())
+    print(f"🔀 Engine benchmark: {args.alerts} alerts, each to {args.recipients} WhatsApp recipients, "
+          f"{args.recipients} email recipients and {args.webhooks} webhooks; "
+          f"response delay {args.response_delay * 1000:.0f} ms")
+
+    try:
+        threaded_p95, threaded_time = _threaded_engine(args, servers)
+        async_p95, async_time = _asyncio_engine(args, servers)
+        print(f"   Speed-up: {threaded_time / async_time:.1f}x throughput, "
+              f"{threaded_p95 / async_p95:.1f}x lower p95 alert latency")
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def build_parser():
+    """Build the benchmark argument parser."""
+    parser = argparse.ArgumentParser(description='Notification delivery benchmarks using local stand-in servers')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    smtp = sub.add_parser('smtp', help='Per-email SMTP sessions vs pooled sessions')
+    smtp.add_argument('--messages', type=int, default=50)
+    smtp.add_argument('--recipients', type=int, default=5)
+    smtp.add_argument('--image-kb', type=int, default=150, help='Attachment size in KB')
+    smtp.add_argument('--connect-delay', type=float, default=0.05,
+                      help='Simulated connection/TLS setup time in seconds')
+    smtp.add_argument('--command-delay', type=float, default=0.002,
+                      help='Simulated round-trip time per SMTP command in seconds')
+    smtp.set_defaults(func=benchmark_smtp)
+
+    whatsapp = sub.add_parser('whatsapp', help='Sequential WhatsApp requests vs concurrent fan-out')
+    whatsapp.add_argument('--alerts', type=int, default=20)
+    whatsapp.add_argument('--recipients', type=int, default=5)
+    whatsapp.add_argument('--workers', type=int, default=8, help='Concurrent sends')
+    whatsapp.add_argument('--response-delay', type=float, default=0.1,
+                          help='Simulated API response time in seconds')
+    whatsapp.set_defaults(func=benchmark_whatsapp)
+
+    outbox = sub.add_parser('outbox', help='Per-alert commits vs group commits in the notification outbox')
+    outbox.add_argument('--alerts', type=int, default=2000)
+    outbox.add_argument('--producers', type=int, default=4, help='Threads recording alerts')
+    outbox.add_argument('--image-kb', type=int, default=50, help='Snapshot size in KB')
+    outbox.set_defaults(func=benchmark_outbox)
+
+    engine = sub.add_parser('engine', help='Worker-pool notification threads vs the asyncio engine')
+    engine.add_argument('--alerts', type=int, default=50)
+    engine.add_argument('--recipients', type=int, default=5, help='WhatsApp and email recipients per alert')
+    engine.add_argument('--webhooks', type=int, default=20, help='Webhook URLs per alert')
+    engine.add_argument('--workers', type=int, default=4, help='Worker threads of the pool design')
+    engine.add_argument('--concurrency', type=int, default=8,
+                        help='Concurrent WhatsApp requests and per-channel limit of the asyncio engine')
+    engine.add_argument('--smtp-sessions', type=int, default=2)
+    engine.add_argument('--response-delay', type=float, default=0.1,
+                        help='Simulated API response time in seconds')
+    engine.set_defaults(func=benchmark_engine)
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point."""
+    args = build_parser().parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
 import cv2
+import logging
 import threading
 import time
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 class CameraManager:
     def __init__(self, camera_index=None):
         """
@@ -12,11 +15,15 @@ class CameraManager:
             camera_index: Camera index (default from config)
         """
         self.camera_index = camera_index if camera_index is not None else Config.CAMERA_INDEX
-        self.frame_width = Config.FRAME_WIDTH
-        self.frame_height = Config.FRAME_HEIGHT
+        settings = Config.for_camera(self.camera_index)
+        self.frame_width = settings.FRAME_WIDTH
+        self.frame_height = settings.FRAME_HEIGHT
+        self.fps = settings.CAMERA_FPS
         
         self.cap = None
         self.current_frame = None
+        self.frame_seq = 0  # frames captured so far
+        self.frame_time = None  # capture time of current_frame
         self.is_running = False
         self.frame_lock = threading.Lock()
         self.capture_thread = None
@@ -24,40 +31,40 @@ class CameraManager:
     def start_camera(self):
         """Start the camera and begin capturing frames."""
         try:
-            print(f"Starting camera {self.camera_index}...")
+            logger.info("Starting camera %s...", self.camera_index)
             
             # Initialize camera
             self.cap = cv2.VideoCapture(self.camera_index)
             
             if not self.cap.isOpened():
-                print(f"❌ Error: Could not open camera {self.camera_index}")
+                logger.error("Could not open camera %s", self.camera_index)
                 return False
             
             # Set camera properties
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_width)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_height)
-            self.cap.set(cv2.CAP_PROP_FPS, 30)
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
             
             # Test camera
             ret, test_frame = self.cap.read()
             if not ret:
-                print("❌ Error: Could not read from camera")
+                logger.error("Could not read from camera %s", self.camera_index)
                 self.cap.release()
                 return False
             
-            print(f"✅ Camera started successfully")
-            print(f"Frame size: {test_frame.shape[1]}x{test_frame.shape[0]}")
+            logger.info("Camera %s started, frame size %dx%d", self.camera_index, test_frame.shape[1],
+                        test_frame.shape[0])
             
             # Start capture thread
             self.is_running = True
-            self.capture_thread = threading.Thread(target=self._capture_loop)
+            self.capture_thread = threading.Thread(target=self._capture_loop, name="camera-capture")
             self.capture_thread.daemon = True
             self.capture_thread.start()
             
             return True
             
         except Exception as e:
-            print(f"❌ Error starting camera: {e}")
+            logger.error("Error starting camera %s: %s", self.camera_index, e)
             return False
     
     def _capture_loop(self):
@@ -66,14 +73,18 @@ class CameraManager:
             try:
                 ret, frame = self.cap.read()
                 if ret:
+                    # read() returns a fresh buffer each call, so no copy is needed here
                     with self.frame_lock:
-                        self.current_frame = frame.copy()
+                        self.current_frame = frame
+                        self.frame_seq += 1
+                        self.frame_time = time.time()
                 else:
-                    print("⚠️ Warning: Failed to read frame from camera")
+                    # Rate limited by the logging setup when the camera keeps failing
+                    logger.warning("Failed to read frame from camera %s", self.camera_index)
                     time.sleep(0.1)  # Brief pause before retrying
                     
             except Exception as e:
-                print(f"Error in capture loop: {e}")
+                logger.exception("Error in capture loop of camera %s", self.camera_index)
                 time.sleep(0.1)
     
     def get_frame(self):
@@ -88,9 +99,21 @@ class CameraManager:
                 return self.current_frame.copy()
             return None
     
+    def get_frame_with_info(self):
+        """
+        Get the latest frame with its sequence number and capture time.
+        
+        Returns:
+            tuple: (frame or None, frame_seq: int, frame_time: float or None)
+        """
+        with self.frame_lock:
+            if self.current_frame is None:
+                return None, self.frame_seq, self.frame_time
+            return self.current_frame.copy(), self.frame_seq, self.frame_time
+    
     def stop_camera(self):
         """Stop the camera and cleanup resources."""
-        print("Stopping camera...")
+        logger.info("Stopping camera %s...", self.camera_index)
         self.is_running = False
         
         # Wait for capture thread to finish
@@ -102,7 +125,7 @@ class CameraManager:
             self.cap.release()
             self.cap = None
         
-        print("✅ Camera stopped")
+        logger.info("Camera %s stopped", self.camera_index)
     
     def is_camera_available(self):
         """Check if camera is available and working."""
@@ -135,18 +158,18 @@ class CameraManager:
         """
         available_cameras = []
         
-        print("Scanning for available cameras...")
+        logger.info("Scanning for available cameras...")
         for i in range(max_cameras):
             cap = cv2.VideoCapture(i)
             if cap.isOpened():
                 ret, _ = cap.read()
                 if ret:
                     available_cameras.append(i)
-                    print(f"✅ Camera {i}: Available")
+                    logger.info("Camera %d: available", i)
                 else:
-                    print(f"⚠️ Camera {i}: Opened but cannot read")
+                    logger.warning("Camera %d: opened but cannot read", i)
             else:
-                print(f"❌ Camera {i}: Not available")
+                logger.debug("Camera %d: not available", i)
             cap.release()
         
         return available_cameras
@@ -0,0 +1,159 @@
+"""
+Two-stage detection cascade.
+
+The nano model screens every frame at a low threshold. Its confident
+detections (CASCADE_ACCEPT_THRESHOLD and above) are accepted as they are;
+the uncertain ones in between are candidates that a larger model
+(VERIFIER_MODEL_PATH) re-scores on crops around each box:
+
+    only when needed   candidates are verified only on frames that would
+                       alert because of them, i.e. with no confident
+                       detection; otherwise only cached verdicts are used
+    batched            all crops of a frame go through the verifier at once
+    cached per track   a track's verdict is reused for CASCADE_CACHE_TTL
+                       seconds, so a person standing still is verified once
+
+Empty frames and frames with a confident detection cost exactly one nano
+inference, so the average per-frame cost stays close to nano-only while
+false alerts from low-confidence nano boxes are filtered out.
+"""
+
+import logging
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeVerifier:
+    def __init__(self, model=None, model_path=None, imgsz=None, verify_threshold=None, crop_padding=None,
+                 cache_ttl=None):
+        """
+        Initialize the verifier and load its model.
+
+        Args:
+            model: Optional preloaded model with the ultralytics call interface
+            model_path: Verifier weights (default from config)
+            imgsz: Verifier input size for the crops (default from config)
+            verify_threshold: Verifier confidence a candidate needs (default from config)
+            crop_padding: Context added around a candidate box, as a fraction of its size (default from config)
+            cache_ttl: Seconds a track's verdict is reused (default from config)
+        """
+        if model is None:
+            from ultralytics import YOLO
+            model_path = model_path or Config.VERIFIER_MODEL_PATH
+            logger.info("Loading verifier model %s...", model_path)
+            model = YOLO(model_path)
+        self.model = model
+        self.imgsz = imgsz if imgsz is not None else Config.VERIFIER_IMGSZ
+        self.verify_threshold = verify_threshold if verify_threshold is not None else Config.CASCADE_VERIFY_THRESHOLD
+        self.crop_padding = crop_padding if crop_padding is not None else Config.CASCADE_CROP_PADDING
+        self.cache_ttl = cache_ttl if cache_ttl is not None else Config.CASCADE_CACHE_TTL
+
+        self.lock = threading.Lock()
+        self.verdicts = {}  # track_id -> (verified, score, time)
+
+        # Statistics
+        self.frames_verified = 0
+        self.crops_verified = 0
+        self.cache_hits = 0
+        self.confirmed = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.latencies = []
+
+    def _crop(self, frame, bbox):
+        """Padded crop around a box, and the box in crop coordinates."""
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = bbox
+        pad_x, pad_y = int((x2 - x1) * self.crop_padding), int((y2 - y1) * self.crop_padding)
+        cx1, cy1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+        cx2, cy2 = min(width, x2 + pad_x), min(height, y2 + pad_y)
+        return frame[cy1:cy2, cx1:cx2], (x1 - cx1, y1 - cy1, x2 - cx1, y2 - cy1)
+
+    def _score(self, result, box):
+        """Highest person confidence of the verifier boxes overlapping the candidate."""
+        from human_detector import HumanDetector
+        score = 0.0
+        if result.boxes is None:
+            return score
+        for found in result.boxes:
+            if int(found.cls[0]) != 0:
+                continue
+            found_box = tuple(float(v) for v in found.xyxy[0].cpu().numpy())
+            if HumanDetector._iou(found_box, box) >= 0.3:
+                score = max(score, float(found.conf[0]))
+        return score
+
+    def verify(self, frame, candidates, cached_only=False, now=None):
+        """
+        Re-score candidates with the verifier, using cached verdicts where possible.
+
+        Args:
+            frame: Full frame the candidate boxes refer to
+            candidates: Detection dicts with 'bbox' and 'track_id'
+            cached_only: Do not run the verifier; candidates without a cached
+                verdict are dropped
+
+        Returns:
+            list: The confirmed candidates, with 'verified_confidence'
+        """
+        now = now or time.time()
+        confirmed, pending = [], []
+        with self.lock:
+            for candidate in candidates:
+                verdict = self.verdicts.get(candidate['track_id'])
+                if verdict is not None and now - verdict[2] <= self.cache_ttl:
+                    self.cache_hits += 1
+                    if verdict[0]:
+                        confirmed.append(dict(candidate, verified_confidence=verdict[1]))
+                else:
+                    pending.append(candidate)
+            if cached_only:
+                self.skipped += len(pending)
+                pending = []
+
+        if pending:
+            crops, boxes = zip(*(self._crop(frame, candidate['bbox']) for candidate in pending))
+            start = time.perf_counter()
+            results = self.model(list(crops), verbose=False, imgsz=self.imgsz)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.frames_verified += 1
+                self.crops_verified += len(pending)
+                self.latencies.append(elapsed)
+                if len(self.latencies) > 1000:
+                    del self.latencies[:500]
+                for candidate, box, result in zip(pending, boxes, results):
+                    score = self._score(result, box)
+                    verified = score >= self.verify_threshold
+                    self.verdicts[candidate['track_id']] = (verified, score, now)
+                    if verified:
+                        self.confirmed += 1
+                        confirmed.append(dict(candidate, verified_confidence=score))
+                    else:
+                        self.rejected += 1
+        return confirmed
+
+    def forget(self, live_tracks):
+        """Drop the verdicts of tracks that ended."""
+        with self.lock:
+            self.verdicts = {track_id: verdict for track_id, verdict in self.verdicts.items()
+                             if track_id in live_tracks}
+
+    def get_stats(self):
+        """Get verification statistics."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                'frames_verified': self.frames_verified,
+                'crops_verified': self.crops_verified,
+                'cache_hits': self.cache_hits,
+                'confirmed': self.confirmed,
+                'rejected': self.rejected,
+                'skipped': self.skipped,
+                'latency_avg': sum(latencies) / len(latencies) if latencies else 0.0,
+                'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            }
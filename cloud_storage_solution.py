@@ -5,124 +5,79 @@ This provides alternatives to ngrok using free cloud storage services.
 """
 
 import requests
-import base64
-import json
+import logging
 import os
+from alert_snapshot import AlertSnapshot
+from config import Config
+from media_uploader import CloudinaryProvider, ImgBBProvider, MediaUploader
 from notification_system import NotificationSystem
 
+logger = logging.getLogger(__name__)
+
+STORAGE_TYPES = ('imgbb', 'cloudinary')
+
 class CloudStorageNotificationSystem(NotificationSystem):
     """Extended NotificationSystem with cloud storage support."""
     
-    def __init__(self):
-        super().__init__()
-        self.cloud_storage_type = "imgbb"  # Options: imgbb, cloudinary
+    def __init__(self, outbox_path=None, storage_type=None):
+        # Uploads share one pooled session, are hedged across services and cached by content hash.
+        # Set up before the base class replays the outbox, which may publish images.
+        self.providers = {
+            'imgbb': ImgBBProvider(Config.IMGBB_API_KEY or '94768ba78c3507889c997c39aea6c2e9'),  # Your ImgBB API key
+            'cloudinary': CloudinaryProvider(),
+        }
+        self.uploader = MediaUploader(list(self.providers.values()))
+        self.cloud_storage_type = "imgbb"
+        self.set_cloud_storage(storage_type or Config.CLOUD_STORAGE_TYPE)
+        super().__init__(outbox_path)
     
-    def upload_to_imgbb(self, image_path):
-        """Upload image to ImgBB and get public URL."""
-        try:
-            # ImgBB API endpoint
-            url = "https://api.imgbb.com/1/upload"
-            
-            # Read and encode image
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode()
-            
-            # Prepare data (using your API key)
-            data = {
-                'key': '94768ba78c3507889c997c39aea6c2e9',  # Your ImgBB API key
-                'image': image_data
-            }
-            
-            # Upload to ImgBB
-            response = requests.post(url, data=data, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    image_url = result['data']['url']
-                    print(f"✅ Image uploaded to ImgBB: {image_url}")
-                    return image_url
-                else:
-                    print(f"❌ ImgBB upload failed: {result.get('error', {}).get('message', 'Unknown error')}")
-                    return None
-            else:
-                print(f"❌ ImgBB upload failed with status: {response.status_code}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ Error uploading to ImgBB: {e}")
-            return None
+    def upload_to_imgbb(self, image):
+        """Upload image to ImgBB only and get public URL."""
+        return self.uploader.upload(image, [self.providers['imgbb']])
     
-    def upload_to_cloudinary(self, image_path):
-        """Upload image to Cloudinary and get public URL."""
-        try:
-            # Cloudinary upload endpoint
-            url = "https://api.cloudinary.com/v1_1/demo/image/upload"
-            
-            # Prepare data
-            data = {
-                'upload_preset': 'ml_default'  # Public preset
-            }
-            
-            # Upload file
-            with open(image_path, 'rb') as file:
-                files = {'file': file}
-                response = requests.post(url, data=data, files=files, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                image_url = result.get('secure_url')
-                if image_url:
-                    print(f"✅ Image uploaded to Cloudinary: {image_url}")
-                    return image_url
-                else:
-                    print("❌ Cloudinary upload failed: No URL returned")
-                    return None
-            else:
-                print(f"❌ Cloudinary upload failed with status: {response.status_code}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ Error uploading to Cloudinary: {e}")
-            return None
+    def upload_to_cloudinary(self, image):
+        """Upload image to Cloudinary only and get public URL."""
+        return self.uploader.upload(image, [self.providers['cloudinary']])
     
     def _get_public_image_url(self, image_path):
-        """Upload image to cloud storage and return public URL."""
+        """Upload an image file to cloud storage and return public URL."""
         if not os.path.exists(image_path):
-            print(f"❌ Image file not found: {image_path}")
-            return None
-        
-        print(f"☁️ Uploading image to cloud storage ({self.cloud_storage_type})...")
-        
-        # Try the selected service first
-        if self.cloud_storage_type == "imgbb":
-            result = self.upload_to_imgbb(image_path)
-        elif self.cloud_storage_type == "cloudinary":
-            result = self.upload_to_cloudinary(image_path)
-        else:
-            print(f"❌ Unsupported cloud storage type: {self.cloud_storage_type}")
+            logger.error("Image file not found: %s", image_path)
             return None
-        
-        # If the selected service fails, try fallbacks
-        if result is None:
-            print("🔄 Primary service failed, trying fallback service...")
-            # Try the other service as fallback
-            if self.cloud_storage_type == "imgbb":
-                print("🔄 Trying Cloudinary as fallback...")
-                result = self.upload_to_cloudinary(image_path)
-            elif self.cloud_storage_type == "cloudinary":
-                print("🔄 Trying ImgBB as fallback...")
-                result = self.upload_to_imgbb(image_path)
-        
-        return result
+        return self._get_media_url(AlertSnapshot.from_file(image_path))
+    
+    def _get_media_url(self, image):
+        """
+        Upload an encoded alert image to cloud storage and return its public URL.
+        
+        The selected service is tried first; the other one is started as soon as
+        the first fails or is slower than usual, and identical images (the same
+        snapshot on another channel or a retry) reuse the URL of the first upload.
+        """
+        url = self.uploader.upload(image)
+        if url is None:
+            logger.error("Image upload failed on every cloud storage service")
+        return url
     
     def set_cloud_storage(self, storage_type):
         """Set the cloud storage service to use."""
-        if storage_type in ["imgbb", "cloudinary"]:
+        if storage_type in STORAGE_TYPES:
             self.cloud_storage_type = storage_type
-            print(f"✅ Cloud storage set to: {storage_type}")
+            self.uploader.set_primary(storage_type)
+            logger.info("Cloud storage set to: %s", storage_type)
         else:
-            print(f"❌ Unsupported cloud storage type: {storage_type}. Choose 'imgbb' or 'cloudinary'")
+            logger.error("Unsupported cloud storage type: %s. Choose 'imgbb' or 'cloudinary'", storage_type)
+    
+    def get_stats(self):
+        """Get notification metrics plus media upload, cache and hedging statistics."""
+        stats = super().get_stats()
+        stats['media'] = self.uploader.get_stats()
+        return stats
+    
+    def shutdown(self, timeout=10.0):
+        drained = super().shutdown(timeout)
+        self.uploader.close()
+        return drained
 
 def test_cloud_storage_solution():
     """Test the cloud storage solution."""
@@ -177,7 +132,7 @@ def test_cloud_storage_solution():
         print("📱 Testing WhatsApp notification with cloud URL...")
         test_message = "🧪 Test: Cloud storage solution for media URLs"
         
-        success = notification_system.send_whatsapp_notification(test_message, test_image_path)
+        success = notification_system.send_whatsapp_notification(test_message, AlertSnapshot(img))
         
         if success:
             print("✅ WhatsApp notification sent successfully!")
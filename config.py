@@ -1,27 +1,636 @@
+"""
+Typed, validated configuration.
+
+Every setting is read from the environment (or .env) with its type, default
+and allowed range declared in one place below. A malformed value does not
+crash the import: it is recorded and reported by Config.validate(), which
+the application calls at startup together with the cross-setting checks.
+
+Performance profiles (PERFORMANCE_PROFILE or --perf-profile) set every
+hot-path parameter for a use case at once:
+
+    low-latency    small input size, load shedding, asyncio notifications
+    low-power      low frame rate, one inference thread, power saving
+    high-accuracy  larger model and input size, no shedding
+    multi-camera   moderate input size and rate per camera, coalesced alerts
+
+Precedence, lowest first: default, profile, environment, command line.
+Camera-specific values are read from CAMERA_<index>_<SETTING> (and
+CAMERA_<index>_PROFILE) by Config.for_camera(index), for the settings in
+PER_CAMERA_SETTINGS; Config.validate() checks them for CAMERA_INDEX and every
+camera named in the environment. Config.describe() lists the effective values and where
+each came from, for the startup log.
+"""
+
 import os
+import re
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+TRUE_VALUES = ('true', '1', 'yes', 'on')
+FALSE_VALUES = ('false', '0', 'no', 'off')
+
+_SETTINGS = {}  # name -> _Setting, in declaration order
+_ERRORS = []  # malformed environment values, reported by Config.validate()
+
+
+class _Setting:
+    def __init__(self, name, kind, default, minimum=None, maximum=None, choices=None, secret=False):
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = choices
+        self.secret = secret
+        self.source = 'default'
+
+    def parse(self, raw):
+        """
+        Convert and check a raw (string or typed) value.
+
+        Raises:
+            ValueError: If the value has the wrong type or is out of range
+        """
+        if self.kind == 'bool':
+            if isinstance(raw, bool):
+                value = raw
+            elif str(raw).strip().lower() in TRUE_VALUES:
+                value = True
+            elif str(raw).strip().lower() in FALSE_VALUES:
+                value = False
+            else:
+                raise ValueError(f"expected true or false, got {raw!r}")
+        elif self.kind == 'list':
+            value = raw if isinstance(raw, list) else (str(raw).split(',') if raw else [])
+        elif self.kind == 'int':
+            try:
+                value = int(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f"expected an integer, got {raw!r}") from None
+        elif self.kind == 'float':
+            try:
+                value = float(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f"expected a number, got {raw!r}") from None
+        else:
+            value = raw
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"expected one of {self.choices}, got {value!r}")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"must be at least {self.minimum}, got {value!r}")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"must be at most {self.maximum}, got {value!r}")
+        return value
+
+    def load(self, environ_name=None, errors=None):
+        """
+        Read the setting from the environment.
+
+        Args:
+            environ_name: Variable to read (default: the setting's name)
+            errors: List that collects a malformed value's message
+
+        Returns:
+            tuple: (value, found) - the default if unset or malformed
+        """
+        environ_name = environ_name or self.name
+        raw = os.getenv(environ_name)
+        # An empty value means "not set", except for strings where empty is meaningful
+        if raw is None or (raw == '' and self.kind not in ('str', 'list')):
+            return self.default, False
+        try:
+            return self.parse(raw), True
+        except ValueError as e:
+            if errors is not None:
+                errors.append(f"{environ_name}: {e}")
+            return self.default, False
+
+
+def _setting(name, kind, default, **options):
+    setting = _Setting(name, kind, default, **options)
+    _SETTINGS[name] = setting
+    value, found = setting.load(errors=_ERRORS)
+    if found:
+        setting.source = 'env'
+    return value
+
+
+def _str(name, default=None, choices=None, secret=False):
+    return _setting(name, 'str', default, choices=choices, secret=secret)
+
+
+def _int(name, default, minimum=None, maximum=None):
+    return _setting(name, 'int', default, minimum=minimum, maximum=maximum)
+
+
+def _float(name, default, minimum=None, maximum=None):
+    return _setting(name, 'float', default, minimum=minimum, maximum=maximum)
+
+
+def _bool(name, default):
+    return _setting(name, 'bool', default)
+
+
+def _list(name):
+    return _setting(name, 'list', [])
+
+
+# Hot-path settings each profile sets
+PROFILES = {
+    'low-latency': {
+        'INFERENCE_IMGSZ': 320,
+        'CAMERA_FPS': 30,
+        'MAX_INFERENCE_FPS': 0,
+        'TORCH_THREADS': 0,
+        'LOAD_SHEDDING_ENABLED': True,
+        'LOAD_SHED_LATENCY_HIGH': 0.15,
+        'LOAD_SHED_LATENCY_LOW': 0.06,
+        'POWER_SAVING_ENABLED': False,
+        'ALERT_FIRST_MAX_LATENCY': 0.0,
+        'NOTIFICATION_ENGINE': 'asyncio',
+        'ALARM_MIXER_BUFFER': 256,
+    },
+    'low-power': {
+        'INFERENCE_IMGSZ': 320,
+        'CAMERA_FPS': 10,
+        'MAX_INFERENCE_FPS': 2.0,
+        'TORCH_THREADS': 1,
+        'POWER_SAVING_ENABLED': True,
+        'CPU_BUDGET_PERCENT': 15.0,
+        'IDLE_AFTER': 15.0,
+        'LOAD_SHEDDING_ENABLED': False,
+        'EVENT_FLUSH_INTERVAL': 2.0,
+        'ALARM_MIXER_BUFFER': 1024,
+    },
+    'high-accuracy': {
+        'MODEL_PATH': 'yolov8s.pt',
+        'INFERENCE_IMGSZ': 960,
+        'FRAME_WIDTH': 1280,
+        'FRAME_HEIGHT': 720,
+        'CAMERA_FPS': 15,
+        'MAX_INFERENCE_FPS': 0,
+        'CONFIDENCE_THRESHOLD': 0.4,
+        'LOAD_SHEDDING_ENABLED': False,
+        'POWER_SAVING_ENABLED': False,
+    },
+    'multi-camera': {
+        'INFERENCE_IMGSZ': 480,
+        'CAMERA_FPS': 15,
+        'MAX_INFERENCE_FPS': 5.0,
+        'TORCH_THREADS': 2,
+        'LOAD_SHEDDING_ENABLED': True,
+        'ALERT_COALESCING_ENABLED': True,
+        'NOTIFICATION_ENGINE': 'asyncio',
+    },
+}
+
+# Settings that CAMERA_<index>_<SETTING> can override for one camera
+PER_CAMERA_SETTINGS = ('FRAME_WIDTH', 'FRAME_HEIGHT', 'CAMERA_FPS', 'MODEL_PATH', 'INFERENCE_IMGSZ',
+                       'TORCH_THREADS', 'MAX_INFERENCE_FPS', 'CONFIDENCE_THRESHOLD', 'CAMERA_PRIORITY',
+                       'DETECTION_ZONES', 'EXCLUSION_ZONES', 'ZONE_FILTER_MODE', 'ZONE_MIN_OVERLAP',
+                       'CASCADE_ENABLED', 'CASCADE_SCREEN_THRESHOLD', 'CASCADE_ACCEPT_THRESHOLD')
+
+# Settings shown in the startup log even at their defaults
+HOT_PATH_SETTINGS = ('PERFORMANCE_PROFILE', 'CAMERA_INDEX', 'FRAME_WIDTH', 'FRAME_HEIGHT', 'CAMERA_FPS',
+                     'MODEL_PATH', 'INFERENCE_IMGSZ', 'TORCH_THREADS', 'MAX_INFERENCE_FPS',
+                     'CONFIDENCE_THRESHOLD', 'POWER_SAVING_ENABLED', 'LOAD_SHEDDING_ENABLED',
+                     'ALERT_COALESCING_ENABLED', 'NOTIFICATION_ENGINE')
+
+
+class CameraConfig:
+    """Config as seen by one camera: its overrides, else the global values."""
+
+    def __init__(self, camera_index, overrides, profile=None):
+        self.camera_index = camera_index
+        self.overrides = overrides
+        self.profile = profile
+
+    def __getattr__(self, name):
+        if name in self.overrides:
+            return self.overrides[name]
+        return getattr(Config, name)
+    
+    def source(self, name):
+        """Where the camera's value of a setting came from ('default' if nobody chose it)."""
+        if name in self.overrides:
+            return f"camera {self.camera_index}"
+        return _SETTINGS[name].source
+
+
 class Config:
     # Email settings
-    EMAIL_SENDER = os.getenv('EMAIL_SENDER')
-    EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
-    EMAIL_RECIPIENTS = os.getenv('EMAIL_RECIPIENTS', '').split(',') if os.getenv('EMAIL_RECIPIENTS') else []
+    EMAIL_SENDER = _str('EMAIL_SENDER')
+    EMAIL_PASSWORD = _str('EMAIL_PASSWORD', secret=True)
+    EMAIL_RECIPIENTS = _list('EMAIL_RECIPIENTS')
     
     # Twilio settings
-    TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-    TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-    TWILIO_WHATSAPP_FROM = os.getenv('TWILIO_WHATSAPP_FROM')
-    WHATSAPP_RECIPIENTS = os.getenv('WHATSAPP_RECIPIENTS', '').split(',') if os.getenv('WHATSAPP_RECIPIENTS') else []
+    TWILIO_ACCOUNT_SID = _str('TWILIO_ACCOUNT_SID', secret=True)
+    TWILIO_AUTH_TOKEN = _str('TWILIO_AUTH_TOKEN', secret=True)
+    TWILIO_WHATSAPP_FROM = _str('TWILIO_WHATSAPP_FROM')
+    WHATSAPP_RECIPIENTS = _list('WHATSAPP_RECIPIENTS')
+    
+    # Webhook settings (alerts POSTed as JSON)
+    WEBHOOK_URLS = _list('WEBHOOK_URLS')
+    
+    # Performance profile (see PROFILES; empty = the defaults below)
+    PERFORMANCE_PROFILE = _str('PERFORMANCE_PROFILE', '', choices=('',) + tuple(PROFILES))
     
     # Detection settings
-    CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD', 0.5))
-    DETECTION_COOLDOWN = int(os.getenv('DETECTION_COOLDOWN', 10))  # seconds
-    ALARM_SOUND_FILE = os.getenv('ALARM_SOUND_FILE', 'alarm.wav')
+    CONFIDENCE_THRESHOLD = _float('CONFIDENCE_THRESHOLD', 0.5, minimum=0.0, maximum=1.0)
+    DETECTION_COOLDOWN = _int('DETECTION_COOLDOWN', 10, minimum=0)  # seconds
+    ALARM_SOUND_FILE = _str('ALARM_SOUND_FILE', 'alarm.wav')  # a beep is synthesised if the file is missing
+    ALARM_MIXER_BUFFER = _int('ALARM_MIXER_BUFFER', 512, minimum=64, maximum=8192)  # samples; smaller = faster alarm onset
+    ALARM_ZONES = _str('ALARM_ZONES', '')  # name:cameras:priority[:sound],... e.g. front:0+1:2:front.wav,yard:2:1
+    ALARM_DUCK_VOLUME = _float('ALARM_DUCK_VOLUME', 0.3, minimum=0.0, maximum=1.0)  # lower-priority zones while a higher one sounds
+    
+    # Detection zones (polygons as fractions of the frame, see zone_filter.py; usually set per camera)
+    DETECTION_ZONES = _str('DETECTION_ZONES', '')  # name=x,y x,y x,y;... empty = whole frame
+    EXCLUSION_ZONES = _str('EXCLUSION_ZONES', '')  # same format; people here never count
+    ZONE_FILTER_MODE = _str('ZONE_FILTER_MODE', 'foot', choices=('foot', 'overlap'))
+    ZONE_MIN_OVERLAP = _float('ZONE_MIN_OVERLAP', 0.3, minimum=0.0, maximum=1.0)  # overlap mode
+    ZONE_ROI_PADDING = _float('ZONE_ROI_PADDING', 0.2, minimum=0.0, maximum=1.0)  # fraction of the frame
+    ZONE_ROI_MAX_FRACTION = _float('ZONE_ROI_MAX_FRACTION', 0.7, minimum=0.0, maximum=1.0)  # 0 = never crop
+    
+    # Inference
+    MODEL_PATH = _str('MODEL_PATH', 'yolov8n.pt')  # YOLOv8 nano for speed
+    INFERENCE_IMGSZ = _int('INFERENCE_IMGSZ', 0, minimum=0, maximum=1920)  # 0 = model default (640)
+    TORCH_THREADS = _int('TORCH_THREADS', 0, minimum=0)  # 0 = PyTorch default
+    MAX_INFERENCE_FPS = _float('MAX_INFERENCE_FPS', 0, minimum=0)  # 0 = as fast as frames arrive
+    
+    # Detection cascade (nano screens, a larger model verifies uncertain boxes; see cascade.py)
+    CASCADE_ENABLED = _bool('CASCADE_ENABLED', False)
+    VERIFIER_MODEL_PATH = _str('VERIFIER_MODEL_PATH', 'yolov8s.pt')
+    VERIFIER_IMGSZ = _int('VERIFIER_IMGSZ', 320, minimum=32, maximum=1920)  # crops are small
+    CASCADE_SCREEN_THRESHOLD = _float('CASCADE_SCREEN_THRESHOLD', 0.25, minimum=0.0, maximum=1.0)  # candidates
+    CASCADE_ACCEPT_THRESHOLD = _float('CASCADE_ACCEPT_THRESHOLD', 0.7, minimum=0.0, maximum=1.0)  # no verification
+    CASCADE_VERIFY_THRESHOLD = _float('CASCADE_VERIFY_THRESHOLD', 0.5, minimum=0.0, maximum=1.0)  # verifier score
+    CASCADE_CROP_PADDING = _float('CASCADE_CROP_PADDING', 0.2, minimum=0.0, maximum=2.0)  # fraction of the box
+    CASCADE_CACHE_TTL = _float('CASCADE_CACHE_TTL', 2.0, minimum=0)  # seconds a track's verdict is reused
+    
+    # Offline footage analysis (python analyze.py or --analyze)
+    ANALYZE_WORKERS = _int('ANALYZE_WORKERS', 0, minimum=0)  # processes; 0 = one per core
+    ANALYZE_STRIDE = _int('ANALYZE_STRIDE', 5, minimum=1)  # analyse one frame in this many
+    ANALYZE_BATCH_SIZE = _int('ANALYZE_BATCH_SIZE', 8, minimum=1)  # frames per inference call
+    ANALYZE_SEGMENT_SECONDS = _float('ANALYZE_SEGMENT_SECONDS', 60, minimum=1)  # work unit per process
+    ANALYZE_EVENT_GAP = _float('ANALYZE_EVENT_GAP', 2.0, minimum=0)  # seconds without people that end an event
+    ANALYZE_THUMB_WIDTH = _int('ANALYZE_THUMB_WIDTH', 320, minimum=32)
+    ANALYZE_OUTPUT_DIR = _str('ANALYZE_OUTPUT_DIR', 'analysis')
+    
+    # Autotuner (python autotune.py or --autotune; the result is applied at startup)
+    AUTOTUNE_ENABLED = _bool('AUTOTUNE_ENABLED', True)  # apply the cached result for this host
+    AUTOTUNE_CACHE_PATH = _str('AUTOTUNE_CACHE_PATH', 'autotune.json')
+    AUTOTUNE_BACKENDS = _str('AUTOTUNE_BACKENDS', 'torch,onnx,openvino')
+    AUTOTUNE_IMGSZ = _str('AUTOTUNE_IMGSZ', '320,416,480,640')
+    AUTOTUNE_RECALL_FLOOR = _float('AUTOTUNE_RECALL_FLOOR', 0.95, minimum=0.0, maximum=1.0)  # vs. the reference run
+    AUTOTUNE_LATENCY_TARGET = _float('AUTOTUNE_LATENCY_TARGET', 0.1, minimum=0.001)  # p95 seconds per frame
+    AUTOTUNE_FRAMES = _int('AUTOTUNE_FRAMES', 40, minimum=1)
     
     # Camera settings
-    CAMERA_INDEX = 0
-    FRAME_WIDTH = 640
-    FRAME_HEIGHT = 480
\ No newline at end of file
+    CAMERA_INDEX = _int('CAMERA_INDEX', 0, minimum=0)
+    FRAME_WIDTH = _int('FRAME_WIDTH', 640, minimum=32)
+    FRAME_HEIGHT = _int('FRAME_HEIGHT', 480, minimum=32)
+    CAMERA_FPS = _int('CAMERA_FPS', 30, minimum=1, maximum=240)
+    
+    # Event store settings
+    EVENT_STORE_ENABLED = _bool('EVENT_STORE_ENABLED', True)
+    EVENT_DB_PATH = _str('EVENT_DB_PATH', 'detections.db')
+    EVENT_BATCH_SIZE = _int('EVENT_BATCH_SIZE', 500, minimum=1)
+    EVENT_FLUSH_INTERVAL = _float('EVENT_FLUSH_INTERVAL', 0.5, minimum=0.01)  # seconds
+    EVENT_QUEUE_SIZE = _int('EVENT_QUEUE_SIZE', 10000, minimum=1)  # frames buffered before dropping
+
+    # Evidence store (detection snapshots on disk, indexed in the event database; see evidence_store.py).
+    # Off by default: raw frames only reach the disk when asked for, like SAVE_DETECTION_IMAGES
+    EVIDENCE_STORE_ENABLED = _bool('EVIDENCE_STORE_ENABLED', False)
+    EVIDENCE_DIR = _str('EVIDENCE_DIR', 'evidence')
+    EVIDENCE_INTERVAL = _float('EVIDENCE_INTERVAL', 1.0, minimum=0)  # seconds between snapshots per camera; 0 = every detection frame
+    EVIDENCE_MAX_MB = _float('EVIDENCE_MAX_MB', 2048, minimum=1)  # oldest snapshots are evicted beyond this
+    EVIDENCE_MAX_AGE_DAYS = _int('EVIDENCE_MAX_AGE_DAYS', 30, minimum=0)  # whole days kept; 0 = no age limit
+    EVIDENCE_BATCH_SIZE = _int('EVIDENCE_BATCH_SIZE', 32, minimum=1)  # snapshots made durable per fsync round
+    EVIDENCE_FLUSH_INTERVAL = _float('EVIDENCE_FLUSH_INTERVAL', 1.0, minimum=0.01)  # seconds a snapshot waits for its batch
+    EVIDENCE_QUEUE_SIZE = _int('EVIDENCE_QUEUE_SIZE', 16, minimum=1)  # raw frames held in memory before dropping
+
+    # Logging (queued to a background writer and rate limited per message; see logging_setup.py)
+    LOG_LEVEL = _str('LOG_LEVEL', 'INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'))
+    LOG_FORMAT = _str('LOG_FORMAT', 'text', choices=('text', 'json'))  # json = one object per line
+    LOG_RATE_LIMIT = _float('LOG_RATE_LIMIT', 1.0, minimum=0)  # records per second per message; 0 = unlimited
+    LOG_RATE_BURST = _float('LOG_RATE_BURST', 5, minimum=1)
+    LOG_QUEUE_SIZE = _int('LOG_QUEUE_SIZE', 10000, minimum=1)  # records buffered before dropping
+    
+    # Profiler settings
+    PROFILE_INTERVAL = _float('PROFILE_INTERVAL', 0.01, minimum=0.001)  # seconds between samples
+    PROFILE_DURATION = _float('PROFILE_DURATION', 30, minimum=0)  # default window in seconds
+    PROFILE_OUTPUT_DIR = _str('PROFILE_OUTPUT_DIR', 'profiles')
+    
+    # Power management (CPU budget and idle mode)
+    POWER_SAVING_ENABLED = _bool('POWER_SAVING_ENABLED', False)
+    CPU_BUDGET_PERCENT = _float('CPU_BUDGET_PERCENT', 25, minimum=1, maximum=100)  # percent of total host CPU
+    POWER_BUDGET_WATTS = _float('POWER_BUDGET_WATTS', 0, minimum=0)  # 0 = use CPU budget
+    POWER_IDLE_WATTS = _float('POWER_IDLE_WATTS', 3, minimum=0)  # host draw at 0% CPU
+    POWER_MAX_WATTS = _float('POWER_MAX_WATTS', 15, minimum=0)  # host draw at 100% CPU
+    IDLE_AFTER = _float('IDLE_AFTER', 30, minimum=0)  # seconds without activity before idling
+    IDLE_IMGSZ = _int('IDLE_IMGSZ', 320, minimum=32)
+    IDLE_TORCH_THREADS = _int('IDLE_TORCH_THREADS', 1, minimum=1)
+    IDLE_MIN_INFERENCE_INTERVAL = _float('IDLE_MIN_INFERENCE_INTERVAL', 0.5, minimum=0)  # seconds
+    IDLE_MAX_INFERENCE_INTERVAL = _float('IDLE_MAX_INFERENCE_INTERVAL', 5, minimum=0)  # seconds
+    IDLE_FRAME_INTERVAL = _float('IDLE_FRAME_INTERVAL', 0.1, minimum=0)  # frame polling while idle
+    MOTION_THRESHOLD = _float('MOTION_THRESHOLD', 4.0, minimum=0)  # mean abs pixel difference
+    
+    # Load shedding under overload (see load_shedder.py for the ladder format)
+    LOAD_SHEDDING_ENABLED = _bool('LOAD_SHEDDING_ENABLED', False)
+    LOAD_SHED_LADDER = _str('LOAD_SHED_LADDER', '640:1:all,480:1:all,320:2:1,320:4:1')
+    LOAD_SHED_LATENCY_HIGH = _float('LOAD_SHED_LATENCY_HIGH', 0.3, minimum=0)  # seconds
+    LOAD_SHED_LATENCY_LOW = _float('LOAD_SHED_LATENCY_LOW', 0.12, minimum=0)  # seconds
+    LOAD_SHED_BACKLOG_HIGH = _float('LOAD_SHED_BACKLOG_HIGH', 5, minimum=0)  # unprocessed frames
+    LOAD_SHED_BACKLOG_LOW = _float('LOAD_SHED_BACKLOG_LOW', 2, minimum=0)
+    LOAD_SHED_STEP_DOWN_AFTER = _int('LOAD_SHED_STEP_DOWN_AFTER', 5, minimum=1)  # overloaded frames
+    LOAD_SHED_RECOVER_AFTER = _float('LOAD_SHED_RECOVER_AFTER', 10, minimum=0)  # calm seconds
+    LOAD_SHED_MIN_DWELL = _float('LOAD_SHED_MIN_DWELL', 2, minimum=0)  # seconds between level changes
+    CAMERA_PRIORITY = _int('CAMERA_PRIORITY', 0)
+    
+    # Notification delivery
+    NOTIFICATION_WORKERS = _int('NOTIFICATION_WORKERS', 4, minimum=1)
+    NOTIFICATION_QUEUE_SIZE = _int('NOTIFICATION_QUEUE_SIZE', 100, minimum=1)
+    NOTIFICATION_OVERFLOW_POLICY = _str('NOTIFICATION_OVERFLOW_POLICY', 'drop_oldest',
+                                        choices=('drop_newest', 'drop_oldest', 'block'))
+    NOTIFICATION_ENGINE = _str('NOTIFICATION_ENGINE', 'threads', choices=('threads', 'asyncio'))  # asyncio = all channels on one event loop
+    SMTP_SEND_TIMEOUT = _float('SMTP_SEND_TIMEOUT', 60, minimum=0.1)  # seconds per email (asyncio engine)
+    WHATSAPP_SEND_TIMEOUT = _float('WHATSAPP_SEND_TIMEOUT', 60, minimum=0.1)  # seconds per alert fan-out (asyncio engine)
+    WEBHOOK_MAX_CONCURRENCY = _int('WEBHOOK_MAX_CONCURRENCY', 32, minimum=1)
+    WEBHOOK_TIMEOUT = _float('WEBHOOK_TIMEOUT', 10, minimum=0.1)  # seconds per request
+    WEBHOOK_SEND_TIMEOUT = _float('WEBHOOK_SEND_TIMEOUT', 30, minimum=0.1)  # seconds per alert to all webhooks (asyncio engine)
+    
+    # SMTP server and session pooling
+    SMTP_HOST = _str('SMTP_HOST', 'smtp.gmail.com')
+    SMTP_PORT = _int('SMTP_PORT', 587, minimum=1, maximum=65535)
+    SMTP_STARTTLS = _bool('SMTP_STARTTLS', True)
+    SMTP_POOL_SIZE = _int('SMTP_POOL_SIZE', 2, minimum=1)
+    SMTP_KEEPALIVE_INTERVAL = _float('SMTP_KEEPALIVE_INTERVAL', 60, minimum=0)  # seconds between NOOPs
+    SMTP_MAX_IDLE = _float('SMTP_MAX_IDLE', 900, minimum=0)  # close sessions unused this long
+    
+    # WhatsApp delivery (Twilio REST API)
+    TWILIO_API_BASE = _str('TWILIO_API_BASE', 'https://api.twilio.com')
+    WHATSAPP_MAX_CONCURRENCY = _int('WHATSAPP_MAX_CONCURRENCY', 8, minimum=1)
+    WHATSAPP_RATE_LIMIT = _float('WHATSAPP_RATE_LIMIT', 10, minimum=0)  # messages per second
+    WHATSAPP_RATE_BURST = _float('WHATSAPP_RATE_BURST', 10, minimum=1)
+    WHATSAPP_MAX_RETRIES = _int('WHATSAPP_MAX_RETRIES', 3, minimum=0)
+    WHATSAPP_BACKOFF_BASE = _float('WHATSAPP_BACKOFF_BASE', 0.5, minimum=0)  # seconds
+    
+    # Built-in media server for WhatsApp images (signed, expiring URLs; see media_server.py)
+    MEDIA_SERVER_ENABLED = _bool('MEDIA_SERVER_ENABLED', False)
+    MEDIA_SERVER_HOST = _str('MEDIA_SERVER_HOST', '0.0.0.0')
+    MEDIA_SERVER_PORT = _int('MEDIA_SERVER_PORT', 8765, minimum=0, maximum=65535)
+    MEDIA_SERVER_PUBLIC_URL = _str('MEDIA_SERVER_PUBLIC_URL', '')  # address providers reach the server at
+    MEDIA_SERVER_SECRET = _str('MEDIA_SERVER_SECRET', '', secret=True)  # URL signing key; random per run if empty
+    MEDIA_URL_TTL = _float('MEDIA_URL_TTL', 3600, minimum=1)  # seconds a media URL stays valid
+    MEDIA_SERVER_MAX_MB = _float('MEDIA_SERVER_MAX_MB', 64, minimum=1)
+    MEDIA_SERVER_DIR = _str('MEDIA_SERVER_DIR', '')  # keep images on disk here instead of in memory
+    
+    # Cloud media uploads for WhatsApp images (see cloud_storage_solution.py)
+    CLOUD_STORAGE_TYPE = _str('CLOUD_STORAGE_TYPE', 'imgbb', choices=('imgbb', 'cloudinary'))  # primary service
+    IMGBB_API_KEY = _str('IMGBB_API_KEY', secret=True)
+    IMGBB_UPLOAD_URL = _str('IMGBB_UPLOAD_URL', 'https://api.imgbb.com/1/upload')
+    CLOUDINARY_UPLOAD_URL = _str('CLOUDINARY_UPLOAD_URL', 'https://api.cloudinary.com/v1_1/demo/image/upload')
+    CLOUDINARY_UPLOAD_PRESET = _str('CLOUDINARY_UPLOAD_PRESET', 'ml_default')
+    MEDIA_UPLOAD_TIMEOUT = _float('MEDIA_UPLOAD_TIMEOUT', 30, minimum=0.1)  # seconds per upload
+    MEDIA_UPLOAD_WORKERS = _int('MEDIA_UPLOAD_WORKERS', 4, minimum=1)
+    MEDIA_HEDGE_PERCENTILE = _float('MEDIA_HEDGE_PERCENTILE', 90, minimum=0, maximum=100)  # start the fallback after this latency percentile; 0 = only on failure
+    MEDIA_HEDGE_MIN_DELAY = _float('MEDIA_HEDGE_MIN_DELAY', 0.5, minimum=0)  # seconds
+    MEDIA_HEDGE_INITIAL_DELAY = _float('MEDIA_HEDGE_INITIAL_DELAY', 3, minimum=0)  # seconds, until latencies are known
+    MEDIA_CACHE_SIZE = _int('MEDIA_CACHE_SIZE', 256, minimum=1)  # uploaded image URLs remembered by content hash
+    
+    # Alert snapshots (encoded in memory; written to disk only if enabled)
+    SNAPSHOT_JPEG_QUALITY = _int('SNAPSHOT_JPEG_QUALITY', 90, minimum=1, maximum=100)
+    SAVE_DETECTION_IMAGES = _bool('SAVE_DETECTION_IMAGES', False)
+    DETECTION_IMAGE_DIR = _str('DETECTION_IMAGE_DIR', 'detections')
+    # Per-channel encoding: context image width, format, target size or quality, detection crops
+    SNAPSHOT_PROFILE_EMAIL = _str('SNAPSHOT_PROFILE_EMAIL', 'width=1280,format=jpeg,quality=90,crops=2')
+    SNAPSHOT_PROFILE_WHATSAPP = _str('SNAPSHOT_PROFILE_WHATSAPP', 'width=800,format=jpeg,target_kb=100')
+    SNAPSHOT_PROFILE_WEBHOOK = _str('SNAPSHOT_PROFILE_WEBHOOK', 'width=640,format=jpeg,target_kb=60')
+    
+    # Alert coalescing (first alert immediately, then one digest per window)
+    ALERT_COALESCING_ENABLED = _bool('ALERT_COALESCING_ENABLED', False)
+    ALERT_WINDOW = _float('ALERT_WINDOW', 60, minimum=0.1)  # seconds per digest window
+    ALERT_FIRST_MAX_LATENCY = _float('ALERT_FIRST_MAX_LATENCY', 0, minimum=0)  # seconds; 0 = alert on first frame
+    ALERT_COALESCE_SCOPE = _str('ALERT_COALESCE_SCOPE', 'camera', choices=('camera', 'site'))
+    ALERT_DIGEST_SNAPSHOTS = _int('ALERT_DIGEST_SNAPSHOTS', 4, minimum=1)
+    
+    # Durable notification outbox (alerts survive outages and restarts)
+    OUTBOX_ENABLED = _bool('OUTBOX_ENABLED', True)
+    OUTBOX_DB_PATH = _str('OUTBOX_DB_PATH', 'outbox.db')
+    OUTBOX_MAX_ATTEMPTS = _int('OUTBOX_MAX_ATTEMPTS', 10, minimum=1)
+    OUTBOX_BACKOFF_BASE = _float('OUTBOX_BACKOFF_BASE', 2.0, minimum=0)  # seconds
+    OUTBOX_BACKOFF_MAX = _float('OUTBOX_BACKOFF_MAX', 300, minimum=0)  # seconds
+    OUTBOX_RETENTION_DAYS = _float('OUTBOX_RETENTION_DAYS', 7, minimum=0)
+    
+    # Multi-node sites: edge nodes stream detections to one aggregator that sends all alerts (see aggregator.py)
+    AGGREGATOR_ADDRESS = _str('AGGREGATOR_ADDRESS', '')  # host:port; set on edge nodes to publish instead of notifying
+    AGGREGATOR_LISTEN = _str('AGGREGATOR_LISTEN', '127.0.0.1:7878')  # where the aggregator accepts nodes; other hosts need AGGREGATOR_TOKEN
+    AGGREGATOR_TOKEN = _str('AGGREGATOR_TOKEN', '', secret=True)  # shared by the aggregator and its nodes
+    AGGREGATOR_SCOPE = _str('AGGREGATOR_SCOPE', 'site', choices=('camera', 'site'))  # one alert window for all nodes, or per camera
+    NODE_ID = _str('NODE_ID', '')  # name of this edge node; empty = host name
+    EDGE_BATCH_SIZE = _int('EDGE_BATCH_SIZE', 32, minimum=1)  # events per message
+    EDGE_BATCH_INTERVAL = _float('EDGE_BATCH_INTERVAL', 0.05, minimum=0)  # seconds an event waits for a fuller batch
+    EDGE_QUEUE_SIZE = _int('EDGE_QUEUE_SIZE', 1000, minimum=1)  # events buffered while the aggregator is slow or away
+    EDGE_MAX_IN_FLIGHT = _int('EDGE_MAX_IN_FLIGHT', 8, minimum=1)  # batches awaiting acknowledgement
+    EDGE_THUMBNAIL_WIDTH = _int('EDGE_THUMBNAIL_WIDTH', 320, minimum=0)  # 0 = no thumbnails
+    EDGE_THUMBNAIL_INTERVAL = _float('EDGE_THUMBNAIL_INTERVAL', 1.0, minimum=0)  # seconds between thumbnails per camera
+    EDGE_RECONNECT_MAX = _float('EDGE_RECONNECT_MAX', 10, minimum=0.1)  # seconds, longest reconnect backoff
+    
+    @classmethod
+    def set(cls, name, value, source='cli'):
+        """
+        Set a setting at runtime (command line options, profiles), with type and range checks.
+        
+        Raises:
+            ValueError: If the value is invalid
+        """
+        setting = _SETTINGS[name]
+        try:
+            value = setting.parse(value)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}") from None
+        setattr(cls, name, value)
+        setting.source = source
+    
+    @classmethod
+    def apply_profile(cls, name):
+        """
+        Switch to a performance profile ('' for none). Values from the environment
+        and the command line keep precedence over the profile.
+        """
+        if name and name not in PROFILES:
+            raise ValueError(f"Unknown performance profile {name!r}, expected one of {tuple(PROFILES)}")
+        for setting in _SETTINGS.values():
+            if setting.source.startswith('profile:'):
+                setattr(cls, setting.name, setting.default)
+                setting.source = 'default'
+        cls.PERFORMANCE_PROFILE = name
+        if _SETTINGS['PERFORMANCE_PROFILE'].source == 'default':
+            _SETTINGS['PERFORMANCE_PROFILE'].source = 'cli'
+        for key, value in PROFILES.get(name, {}).items():
+            if _SETTINGS[key].source == 'default':
+                cls.set(key, value, source=f"profile:{name}")
+    
+    @classmethod
+    def for_camera(cls, camera_index, errors=None):
+        """
+        Get the configuration of one camera: CAMERA_<index>_PROFILE, then
+        CAMERA_<index>_<SETTING> values, over the global settings. Malformed
+        values fall back to the global setting; validate() reports them.
+        
+        Args:
+            camera_index: Camera whose overrides to read
+            errors: List that collects problems instead of raising
+        
+        Returns:
+            CameraConfig
+        
+        Raises:
+            ValueError: If the camera's profile is unknown and no errors list is given
+        """
+        overrides = {}
+        profile = os.getenv(f"CAMERA_{camera_index}_PROFILE") or None
+        if profile is not None and profile not in PROFILES:
+            message = f"CAMERA_{camera_index}_PROFILE: unknown performance profile {profile!r}"
+            if errors is None:
+                raise ValueError(message)
+            errors.append(message)
+            profile = None
+        if profile is not None:
+            overrides.update({key: value for key, value in PROFILES[profile].items() if key in PER_CAMERA_SETTINGS})
+        for name in PER_CAMERA_SETTINGS:
+            value, found = _SETTINGS[name].load(f"CAMERA_{camera_index}_{name}", errors)
+            if found:
+                overrides[name] = value
+        return CameraConfig(camera_index, overrides, profile)
+    
+    @classmethod
+    def configured_cameras(cls):
+        """
+        Cameras with settings of their own: CAMERA_INDEX and every index
+        named by a CAMERA_<index>_<SETTING> variable.
+        
+        Returns:
+            list: Sorted camera indices
+        """
+        cameras = {cls.CAMERA_INDEX}
+        for key in os.environ:
+            match = re.match(r'CAMERA_(\d+)_', key)
+            if match:
+                cameras.add(int(match.group(1)))
+        return sorted(cameras)
+    
+    @classmethod
+    def validate(cls):
+        """
+        Check every setting and the relations between them, for the global
+        settings and for each configured camera.
+        
+        Raises:
+            ValueError: Listing every problem found
+        """
+        errors = list(_ERRORS)
+        for setting in _SETTINGS.values():
+            try:
+                setting.parse(getattr(cls, setting.name))
+            except ValueError as e:
+                errors.append(f"{setting.name}: {e}")
+        if cls.LOAD_SHED_LATENCY_LOW >= cls.LOAD_SHED_LATENCY_HIGH:
+            errors.append("LOAD_SHED_LATENCY_LOW must be below LOAD_SHED_LATENCY_HIGH")
+        if cls.LOAD_SHED_BACKLOG_LOW > cls.LOAD_SHED_BACKLOG_HIGH:
+            errors.append("LOAD_SHED_BACKLOG_LOW must not exceed LOAD_SHED_BACKLOG_HIGH")
+        if cls.IDLE_MIN_INFERENCE_INTERVAL > cls.IDLE_MAX_INFERENCE_INTERVAL:
+            errors.append("IDLE_MIN_INFERENCE_INTERVAL must not exceed IDLE_MAX_INFERENCE_INTERVAL")
+        if cls.POWER_IDLE_WATTS > cls.POWER_MAX_WATTS:
+            errors.append("POWER_IDLE_WATTS must not exceed POWER_MAX_WATTS")
+        if cls.CASCADE_SCREEN_THRESHOLD > cls.CASCADE_ACCEPT_THRESHOLD:
+            errors.append("CASCADE_SCREEN_THRESHOLD must not exceed CASCADE_ACCEPT_THRESHOLD")
+        if cls.OUTBOX_BACKOFF_BASE > cls.OUTBOX_BACKOFF_MAX:
+            errors.append("OUTBOX_BACKOFF_BASE must not exceed OUTBOX_BACKOFF_MAX")
+        if cls.MEDIA_SERVER_ENABLED and not cls.MEDIA_SERVER_PUBLIC_URL:
+            errors.append("MEDIA_SERVER_PUBLIC_URL is required with MEDIA_SERVER_ENABLED: "
+                          "Twilio cannot fetch images from the local listen address")
+        
+        # Specification strings, parsed by their modules
+        from load_shedder import LadderLevel
+        from snapshot_encoder import EncodingProfile
+        from alarm_system import AlarmZone
+        from autotune import parse_sizes
+        from zone_filter import Zone
+        for name, parse in (('LOAD_SHED_LADDER', LadderLevel.parse_ladder),
+                            ('ALARM_ZONES', AlarmZone.parse_zones),
+                            ('DETECTION_ZONES', Zone.parse_zones),
+                            ('EXCLUSION_ZONES', Zone.parse_zones),
+                            ('AUTOTUNE_IMGSZ', parse_sizes)):
+            try:
+                parse(getattr(cls, name))
+            except ValueError as e:
+                errors.append(f"{name}: {e}")
+        from aggregator import is_loopback, parse_address
+        for name in ('AGGREGATOR_ADDRESS', 'AGGREGATOR_LISTEN'):
+            try:
+                if getattr(cls, name):
+                    host, _ = parse_address(getattr(cls, name))
+                    if name == 'AGGREGATOR_LISTEN' and not cls.AGGREGATOR_TOKEN and not is_loopback(host):
+                        errors.append("AGGREGATOR_LISTEN: accepting nodes from other hosts requires AGGREGATOR_TOKEN")
+            except ValueError as e:
+                errors.append(f"{name}: {e}")
+        for channel in ('email', 'whatsapp', 'webhook'):
+            name = f"SNAPSHOT_PROFILE_{channel.upper()}"
+            try:
+                EncodingProfile.parse(channel, getattr(cls, name))
+            except ValueError as e:
+                errors.append(f"{name}: {e}")
+        
+        
+        # Per-camera overrides, checked like the global values they replace
+        for camera_index in cls.configured_cameras():
+            camera = cls.for_camera(camera_index, errors)
+            if camera.CASCADE_SCREEN_THRESHOLD > camera.CASCADE_ACCEPT_THRESHOLD:
+                errors.append(f"CAMERA_{camera_index}: CASCADE_SCREEN_THRESHOLD must not exceed "
+                              f"CASCADE_ACCEPT_THRESHOLD")
+            for name in ('DETECTION_ZONES', 'EXCLUSION_ZONES'):
+                if name not in camera.overrides:
+                    continue
+                try:
+                    Zone.parse_zones(camera.overrides[name])
+                except ValueError as e:
+                    errors.append(f"CAMERA_{camera_index}_{name}: {e}")
+        
+        if errors:
+            raise ValueError("Invalid configuration:\n  - " + "\n  - ".join(errors))
+    
+    @classmethod
+    def describe(cls, camera_index=None):
+        """
+        Effective settings for the startup log: the hot-path settings and everything
+        not at its default, with where each value came from. Secrets are masked and
+        lists (recipients, URLs) are only counted.
+        
+        Returns:
+            list: (name, value, source) tuples
+        """
+        camera = cls.for_camera(camera_index) if camera_index is not None else None
+        rows = []
+        for setting in _SETTINGS.values():
+            name = setting.name
+            if camera is not None and name in camera.overrides:
+                rows.append((name, camera.overrides[name], f"camera {camera_index}"))
+                continue
+            if name not in HOT_PATH_SETTINGS and setting.source == 'default':
+                continue
+            value = getattr(cls, name)
+            if setting.secret and value:
+                value = '***'
+            elif setting.kind == 'list':
+                value = f"{len(value)} entries"
+            rows.append((name, value, setting.source))
+        return rows
+
+
+# A profile from the environment applies from import on, so every component sees it
+if Config.PERFORMANCE_PROFILE:
+    Config.apply_profile(Config.PERFORMANCE_PROFILE)
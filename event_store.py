@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Persistent detection event store.
+
+Every detection is appended to a SQLite database (WAL mode) by a background
+writer thread, so the detection loop only pays for a queue put. The store can
+be queried by time range, camera and track, either from Python or from the
+command line:
+
+    python event_store.py query --since "2024-01-01 08:00" --until "2024-01-01 09:00"
+    python event_store.py count --since 3600 --bucket 300
+"""
+
+import argparse
+import json
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    track_id INTEGER,
+    confidence REAL NOT NULL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    alerted INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_detections_camera_ts ON detections (camera, ts);
+CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS idx_detections_track ON detections (track_id, ts);
+"""
+
+INSERT_SQL = """
+INSERT INTO detections (ts, camera, track_id, confidence, x1, y1, x2, y2, alerted, extra)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def detection_rows(camera, detections, timestamp, alerted=False, extra=None):
+    """
+    Rows for INSERT_SQL, one per detection.
+
+    Returns:
+        list: Parameter tuples
+    """
+    extra_json = json.dumps(extra) if extra else None
+    rows = []
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        rows.append((timestamp, str(camera), det.get('track_id'), float(det['confidence']),
+                     int(x1), int(y1), int(x2), int(y2), int(alerted), extra_json))
+    return rows
+
+
+class DetectionEventStore:
+    def __init__(self, db_path=None, batch_size=None, flush_interval=None, max_queue=None):
+        """
+        Initialize the event store and start the background writer.
+
+        Args:
+            db_path: SQLite database path (default from config)
+            batch_size: Maximum rows written per transaction
+            flush_interval: Maximum seconds a row waits before being committed
+            max_queue: Maximum frames (record() calls) buffered in memory before new ones are dropped
+        """
+        self.db_path = db_path if db_path is not None else Config.EVENT_DB_PATH
+        self.batch_size = batch_size if batch_size is not None else Config.EVENT_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else Config.EVENT_FLUSH_INTERVAL
+        max_queue = max_queue if max_queue is not None else Config.EVENT_QUEUE_SIZE
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self._read_local = threading.local()
+        self._readers = []  # every thread's read connection, closed by close()
+        self._lock = threading.Lock()
+
+        # Statistics (written only by the writer thread, except dropped_rows under the lock)
+        self.written_rows = 0
+        self.dropped_rows = 0
+        self.batches_written = 0
+
+        # Create schema up front so queries work before the first flush
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        conn.close()
+
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="event-store-writer")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    def _connect(self):
+        """Open a connection configured for concurrent WAL access."""
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        """Get a per-thread read connection."""
+        conn = getattr(self._read_local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            self._read_local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def record(self, camera, detections, timestamp=None, alerted=False, extra=None):
+        """
+        Queue detections for persistence. Never blocks the caller.
+
+        Args:
+            camera: Camera identifier
+            detections: List of detection dicts ('bbox', 'confidence', optional 'track_id')
+            timestamp: Unix timestamp of the frame (default: now)
+            alerted: Whether these detections raised an alert
+            extra: Optional JSON-serialisable dict stored alongside each row
+
+        Returns:
+            bool: False if the rows were dropped because the writer is behind
+        """
+        if not detections:
+            return True
+
+        ts = timestamp if timestamp is not None else time.time()
+        rows = detection_rows(camera, detections, ts, alerted, extra)
+
+        try:
+            self._queue.put_nowait(rows)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped_rows += len(rows)
+            return False
+
+    def _writer_loop(self):
+        """Drain the queue and commit rows in batches."""
+        conn = self._connect()
+        pending = []
+        waiters = []
+
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            while len(pending) < self.batch_size and not waiters:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    pending.extend(item)
+
+            if pending:
+                try:
+                    conn.executemany(INSERT_SQL, pending)
+                    conn.commit()
+                    self.written_rows += len(pending)
+                    self.batches_written += 1
+                except sqlite3.Error as e:
+                    logger.error("Event store write failed: %s", e)
+                pending = []
+
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+
+            if self._stop_event.is_set() and self._queue.empty():
+                break
+
+        conn.close()
+
+    def flush(self, timeout=5.0):
+        """
+        Block until everything queued so far has been committed.
+
+        Returns:
+            bool: True if the flush completed within the timeout
+        """
+        if not self._writer_thread.is_alive():
+            return False
+        marker = threading.Event()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Flush remaining rows, stop the writer thread and close every thread's read connection."""
+        self._stop_event.set()
+        if self._writer_thread.is_alive():
+            self._writer_thread.join(timeout=timeout)
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._read_local.conn = None
+
+    @staticmethod
+    def _where(start, end, camera, track_id):
+        """Build a WHERE clause that can use the table indexes."""
+        clauses, params = [], []
+        if camera is not None:
+            clauses.append("camera = ?")
+            params.append(str(camera))
+        if track_id is not None:
+            clauses.append("track_id = ?")
+            params.append(track_id)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query(self, start=None, end=None, camera=None, track_id=None, limit=1000):
+        """
+        Query detection rows in a time range.
+
+        Args:
+            start: Inclusive start unix timestamp (None for unbounded)
+            end: Exclusive end unix timestamp (None for unbounded)
+            camera: Optional camera filter
+            track_id: Optional track filter
+            limit: Maximum number of rows returned
+
+        Returns:
+            list: Detection dicts ordered by time
+        """
+        where, params = self._where(start, end, camera, track_id)
+        sql = f"SELECT * FROM detections {where} ORDER BY ts LIMIT ?"
+        rows = self._reader().execute(sql, params + [int(limit)]).fetchall()
+
+        results = []
+        for row in rows:
+            results.append({
+                'id': row['id'],
+                'timestamp': row['ts'],
+                'camera': row['camera'],
+                'track_id': row['track_id'],
+                'confidence': row['confidence'],
+                'bbox': (row['x1'], row['y1'], row['x2'], row['y2']),
+                'alerted': bool(row['alerted']),
+                'extra': json.loads(row['extra']) if row['extra'] else None,
+            })
+        return results
+
+    def count(self, start=None, end=None, camera=None, track_id=None, bucket=None):
+        """
+        Count detections in a time range.
+
+        Args:
+            start: Inclusive start unix timestamp
+            end: Exclusive end unix timestamp
+            camera: Optional camera filter
+            track_id: Optional track filter
+            bucket: Optional bucket width in seconds for a histogram
+
+        Returns:
+            int, or list of (bucket_start, count) tuples when bucket is given
+        """
+        where, params = self._where(start, end, camera, track_id)
+        conn = self._reader()
+        if not bucket:
+            return conn.execute(f"SELECT COUNT(*) FROM detections {where}", params).fetchone()[0]
+
+        sql = (f"SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, COUNT(*) FROM detections {where} "
+               f"GROUP BY bucket ORDER BY bucket")
+        return [(row[0], row[1]) for row in conn.execute(sql, [bucket, bucket] + params)]
+
+    def count_tracks(self, start=None, end=None, camera=None):
+        """Count distinct tracks (individual people) seen in a time range."""
+        where, params = self._where(start, end, camera, None)
+        sql = f"SELECT COUNT(DISTINCT track_id) FROM detections {where}"
+        return self._reader().execute(sql, params).fetchone()[0]
+
+    def get_stats(self):
+        """Get writer statistics."""
+        return {
+            'written_rows': self.written_rows,
+            'dropped_rows': self.dropped_rows,
+            'batches_written': self.batches_written,
+            'queued_batches': self._queue.qsize(),
+        }
+
+
+def _parse_time(value):
+    """Parse a CLI time: seconds-ago, unix timestamp or ISO date/time."""
+    if value is None:
+        return None
+    try:
+        number = float(value)
+        # Small numbers are "seconds ago", large ones are unix timestamps
+        return time.time() - number if number < 10 ** 9 else number
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    """Command line interface for querying the event store."""
+    parser = argparse.ArgumentParser(description='Query the detection event store')
+    parser.add_argument('--db', default=None, help='Database path (default: from config)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('query', 'count'):
+        cmd = sub.add_parser(name)
+        cmd.add_argument('--since', default=None,
+                         help='Start time: seconds ago, unix timestamp or ISO date/time')
+        cmd.add_argument('--until', default=None, help='End time (same formats as --since)')
+        cmd.add_argument('--camera', default=None, help='Camera identifier')
+        cmd.add_argument('--track', type=int, default=None, help='Track identifier')
+        if name == 'query':
+            cmd.add_argument('--limit', type=int, default=100, help='Maximum rows to print')
+            cmd.add_argument('--json', action='store_true', help='Print rows as JSON lines')
+        else:
+            cmd.add_argument('--bucket', type=float, default=None, help='Histogram bucket width in seconds')
+
+    args = parser.parse_args()
+    store = DetectionEventStore(db_path=args.db)
+    start, end = _parse_time(args.since), _parse_time(args.until)
+
+    try:
+        if args.command == 'query':
+            for row in store.query(start, end, camera=args.camera, track_id=args.track, limit=args.limit):
+                if args.json:
+                    print(json.dumps(row))
+                else:
+                    when = datetime.fromtimestamp(row['timestamp']).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+                    print(f"{when}  camera={row['camera']}  track={row['track_id']}  "
+                          f"conf={row['confidence']:.2f}  bbox={row['bbox']}"
+                          f"{'  ALERT' if row['alerted'] else ''}")
+        else:
+            result = store.count(start, end, camera=args.camera, track_id=args.track, bucket=args.bucket)
+            if args.bucket:
+                for bucket_start, count in result:
+                    print(f"{datetime.fromtimestamp(bucket_start).strftime('%Y-%m-%d %H:%M:%S')}  {count}")
+            else:
+                print(result)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
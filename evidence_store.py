@@ -0,0 +1,478 @@
+"""
+Evidence store for detection snapshots.
+
+While people are in view, a snapshot of the raw frame is kept at most every
+EVIDENCE_INTERVAL seconds per camera. The detection loop only wraps the
+frame and puts it on a bounded queue. A background writer does all the
+encoding and disk I/O:
+
+    content-addressed  files are named after the SHA-256 of their JPEG bytes
+                       and sharded by day and hash prefix, e.g.
+                       evidence/2024-01-01/3f/3f9a...e1.jpg, so names never
+                       collide and identical images are stored once
+    fsync batching     up to EVIDENCE_BATCH_SIZE snapshots (or whatever
+                       arrived within EVIDENCE_FLUSH_INTERVAL) are written,
+                       then fsynced together with their directories before
+                       their index rows are committed in one transaction
+    indexed            every snapshot is a row in the `evidence` table of the
+                       event database (time, camera, boxes, file, size)
+    quotas             beyond EVIDENCE_MAX_MB the oldest files are evicted
+                       down to 90% of the quota, a few hundred rows at a time
+                       from the time index; beyond EVIDENCE_MAX_AGE_DAYS
+                       whole day directories are removed
+
+A crash between the fsync and the commit leaves unindexed files behind;
+they are removed with their day directory by the age quota.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from alert_snapshot import AlertSnapshot
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evidence (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    people INTEGER NOT NULL,
+    confidence REAL,
+    alerted INTEGER NOT NULL DEFAULT 0,
+    boxes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_evidence_ts ON evidence (ts);
+CREATE INDEX IF NOT EXISTS idx_evidence_camera_ts ON evidence (camera, ts);
+CREATE INDEX IF NOT EXISTS idx_evidence_path ON evidence (path);
+"""
+
+INSERT_SQL = """
+INSERT INTO evidence (ts, camera, sha256, path, bytes, people, confidence, alerted, boxes)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+LOW_WATER = 0.9  # size eviction frees down to this fraction of the quota
+EVICT_ROWS = 256  # oldest rows examined per eviction query
+SWEEP_INTERVAL = 60.0  # seconds between age quota checks
+
+
+class _Entry:
+    """A queued snapshot and its index fields."""
+
+    def __init__(self, camera, snapshot, detections, alerted):
+        self.camera = str(camera)
+        self.snapshot = snapshot
+        self.detections = detections
+        self.alerted = alerted
+
+
+class EvidenceStore:
+    def __init__(self, db_path=None, root=None, interval=None, max_mb=None, max_age_days=None,
+                 batch_size=None, flush_interval=None, queue_size=None):
+        """
+        Initialize the store and start the background writer.
+
+        Args:
+            db_path: SQLite database holding the index (default: the event database)
+            root: Directory the snapshots are written under (default from config)
+            interval: Minimum seconds between snapshots of one camera (default from config)
+            max_mb: Total size quota in MB (default from config)
+            max_age_days: Whole days of evidence kept, 0 = no limit (default from config)
+            batch_size: Maximum snapshots per fsync batch (default from config)
+            flush_interval: Maximum seconds a snapshot waits for its batch (default from config)
+            queue_size: Maximum frames waiting for the writer before new ones are dropped (default from config)
+        """
+        self.db_path = db_path if db_path is not None else Config.EVENT_DB_PATH
+        self.root = root if root is not None else Config.EVIDENCE_DIR
+        self.interval = interval if interval is not None else Config.EVIDENCE_INTERVAL
+        max_mb = max_mb if max_mb is not None else Config.EVIDENCE_MAX_MB
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age_days = max_age_days if max_age_days is not None else Config.EVIDENCE_MAX_AGE_DAYS
+        self.batch_size = batch_size if batch_size is not None else Config.EVIDENCE_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else Config.EVIDENCE_FLUSH_INTERVAL
+        queue_size = queue_size if queue_size is not None else Config.EVIDENCE_QUEUE_SIZE
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self._read_local = threading.local()
+        self._readers = []  # every thread's read connection, closed by close()
+        self._lock = threading.Lock()
+        self.last_recorded = {}  # camera -> timestamp of its last snapshot
+
+        # Statistics (written only by the writer thread, except skipped and dropped under the lock)
+        self.skipped = 0
+        self.dropped = 0
+        self.stored = 0
+        self.deduplicated = 0
+        self.write_errors = 0
+        self.batches_written = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.batch_latencies = []
+
+        os.makedirs(self.root, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        # Each file counts once, however many rows share it
+        self.total_bytes = conn.execute(
+            "SELECT COALESCE(SUM(bytes), 0) FROM (SELECT MAX(bytes) AS bytes FROM evidence GROUP BY path)"
+        ).fetchone()[0]
+        conn.close()
+
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="evidence-writer")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    def _connect(self):
+        """Open a connection configured for concurrent WAL access."""
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        """Get a per-thread read connection."""
+        conn = getattr(self._read_local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            self._read_local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def record(self, camera, frame, detections, timestamp=None, alerted=False):
+        """
+        Queue a snapshot of a detection frame. Never blocks and never touches the disk.
+
+        Args:
+            camera: Camera identifier
+            frame: Raw frame (must not be modified afterwards)
+            detections: Detection dicts with 'bbox' and 'confidence'
+            timestamp: Capture time (default now)
+            alerted: Whether this detection raised an alert
+
+        Returns:
+            bool: True if the snapshot was queued, False if it was within
+            EVIDENCE_INTERVAL of the camera's last one (alerts are always
+            kept) or the writer is behind
+        """
+        ts = timestamp if timestamp is not None else time.time()
+        last = self.last_recorded.get(camera)
+        if last is not None and 0 <= ts - last < self.interval and not alerted:
+            with self._lock:
+                self.skipped += 1
+            return False
+        try:
+            self._queue.put_nowait(_Entry(camera, AlertSnapshot(frame, timestamp=ts, detections=detections),
+                                          detections, alerted))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        self.last_recorded[camera] = ts
+        return True
+
+    def _writer_loop(self):
+        """Collect snapshots into batches, write them and enforce the quotas."""
+        conn = self._connect()
+        pending = []
+        waiters = []
+        next_sweep = time.monotonic()
+
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            while len(pending) < self.batch_size and not waiters:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    pending.append(item)
+
+            if pending:
+                try:
+                    self._write_batch(conn, pending)
+                except (OSError, sqlite3.Error, ValueError) as e:
+                    self.write_errors += len(pending)
+                    logger.error("Evidence write failed: %s", e)
+                pending = []
+
+            try:
+                if self.total_bytes > self.max_bytes:
+                    self._evict_oldest(conn)
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + SWEEP_INTERVAL
+                    self._evict_expired(conn)
+            except (OSError, sqlite3.Error) as e:
+                logger.error("Evidence eviction failed: %s", e)
+
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+
+            if self._stop_event.is_set() and self._queue.empty():
+                break
+
+        conn.close()
+
+    def _write_batch(self, conn, entries):
+        """
+        Write new files, fsync them and their directories once, then index the whole batch.
+        If anything fails before the index is committed, the batch's new files are removed
+        again, so no file on disk is missing from the index or from total_bytes.
+        """
+        start = time.perf_counter()
+        rows, new_files, directories = [], {}, set()
+        committed = False
+        try:
+            for entry in entries:
+                ts = entry.snapshot.timestamp
+                data = entry.snapshot.data
+                entry.snapshot = None  # release the frame as soon as it is encoded
+                digest = hashlib.sha256(data).hexdigest()
+                path = os.path.join(_day(ts), digest[:2], f"{digest}.jpg")
+                full_path = os.path.join(self.root, path)
+                if path in new_files or os.path.exists(full_path):
+                    self.deduplicated += 1
+                else:
+                    directory = os.path.dirname(full_path)
+                    if not os.path.isdir(directory):
+                        os.makedirs(directory)
+                        directories.update((os.path.dirname(directory), self.root))
+                    directories.add(directory)
+                    fd = os.open(full_path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                    new_files[path] = [fd, len(data), False]  # descriptor, size, renamed
+                    os.write(fd, data)
+
+                boxes = [[int(v) for v in det['bbox']] + [round(float(det['confidence']), 3)]
+                         for det in entry.detections]
+                confidence = max((box[4] for box in boxes), default=None)
+                rows.append((ts, entry.camera, digest, path, len(data), len(boxes), confidence,
+                             int(entry.alerted), json.dumps(boxes)))
+
+            # One durability point for the batch: file contents, then their names, then the index
+            for fd, _, _ in new_files.values():
+                os.fsync(fd)
+            for path, new_file in new_files.items():
+                os.close(new_file[0])
+                new_file[0] = None
+                full_path = os.path.join(self.root, path)
+                os.replace(full_path + '.tmp', full_path)
+                new_file[2] = True
+            for directory in directories:
+                _fsync_directory(directory)
+
+            conn.executemany(INSERT_SQL, rows)
+            conn.commit()
+            committed = True
+        finally:
+            for path, (fd, _, renamed) in new_files.items():
+                if fd is not None:
+                    os.close(fd)
+                if committed:
+                    continue
+                # Nothing indexes these files: remove them rather than leak untracked bytes
+                if renamed:
+                    self._remove(path)
+                else:
+                    try:
+                        os.remove(os.path.join(self.root, path) + '.tmp')
+                    except OSError:
+                        pass
+            if not committed:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+
+        self.stored += len(rows)
+        self.total_bytes += sum(size for _, size, _ in new_files.values())
+        self.batches_written += 1
+        self.batch_latencies.append(time.perf_counter() - start)
+        if len(self.batch_latencies) > 1000:
+            del self.batch_latencies[:500]
+
+    def _remove(self, path):
+        """Delete an evidence file, and its shard directories once they are empty."""
+        full_path = os.path.join(self.root, path)
+        try:
+            os.remove(full_path)
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(full_path)
+        for _ in range(2):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def _evict_oldest(self, conn):
+        """Delete the oldest files until the store is back under LOW_WATER of the size quota."""
+        target = self.max_bytes * LOW_WATER
+        while self.total_bytes > target:
+            # Walk the time index; rows sharing a file are removed with it
+            oldest = conn.execute("SELECT path, bytes FROM evidence ORDER BY ts LIMIT ?", (EVICT_ROWS,)).fetchall()
+            if not oldest:
+                self.total_bytes = 0
+                return
+            victims = {}
+            freed = 0
+            for path, size in oldest:
+                if path not in victims:
+                    victims[path] = size
+                    freed += size
+                    if self.total_bytes - freed <= target:
+                        break
+            for path in victims:
+                self._remove(path)
+            conn.executemany("DELETE FROM evidence WHERE path = ?", [(path,) for path in victims])
+            conn.commit()
+            self.total_bytes -= freed
+            self.evicted_files += len(victims)
+            self.evicted_bytes += freed
+
+    def _evict_expired(self, conn):
+        """Remove the day directories and rows older than EVIDENCE_MAX_AGE_DAYS."""
+        if not self.max_age_days:
+            return
+        first_day = date.today() - timedelta(days=self.max_age_days - 1)
+        cutoff = datetime.combine(first_day, datetime.min.time()).timestamp()
+        expired = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM "
+            "(SELECT MAX(bytes) AS bytes FROM evidence WHERE ts < ? GROUP BY path)", (cutoff,)).fetchone()
+        # Day directories sort by name; everything before the first kept day goes, indexed or not
+        for name in sorted(os.listdir(self.root)):
+            if name >= first_day.isoformat():
+                break
+            if os.path.isdir(os.path.join(self.root, name)):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        if expired[0]:
+            conn.execute("DELETE FROM evidence WHERE ts < ?", (cutoff,))
+            conn.commit()
+            self.total_bytes -= expired[1]
+            self.evicted_files += expired[0]
+            self.evicted_bytes += expired[1]
+
+    def flush(self, timeout=5.0):
+        """
+        Block until everything queued so far is on disk and indexed.
+
+        Returns:
+            bool: True if the flush completed within the timeout
+        """
+        if not self._writer_thread.is_alive():
+            return False
+        marker = threading.Event()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Write the remaining snapshots, stop the writer thread and close every thread's read connection."""
+        self._stop_event.set()
+        if self._writer_thread.is_alive():
+            self._writer_thread.join(timeout=timeout)
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._read_local.conn = None
+
+    def query(self, start=None, end=None, camera=None, limit=1000):
+        """
+        Query indexed snapshots in a time range.
+
+        Args:
+            start: Inclusive start unix timestamp (None for unbounded)
+            end: Exclusive end unix timestamp (None for unbounded)
+            camera: Optional camera filter
+            limit: Maximum number of rows returned
+
+        Returns:
+            list: Snapshot dicts ordered by time, with the absolute 'path' of the image
+        """
+        clauses, params = [], []
+        if camera is not None:
+            clauses.append("camera = ?")
+            params.append(str(camera))
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(f"SELECT * FROM evidence {where} ORDER BY ts LIMIT ?",
+                                      params + [int(limit)]).fetchall()
+        return [{
+            'id': row['id'],
+            'timestamp': row['ts'],
+            'camera': row['camera'],
+            'sha256': row['sha256'],
+            'path': os.path.join(self.root, row['path']),
+            'bytes': row['bytes'],
+            'people': row['people'],
+            'confidence': row['confidence'],
+            'alerted': bool(row['alerted']),
+            'detections': [{'bbox': tuple(box[:4]), 'confidence': box[4]} for box in json.loads(row['boxes'] or '[]')],
+        } for row in rows]
+
+    def get_stats(self):
+        """Get writer and quota statistics."""
+        latencies = sorted(self.batch_latencies)
+        return {
+            'stored': self.stored,
+            'deduplicated': self.deduplicated,
+            'skipped': self.skipped,
+            'dropped': self.dropped,
+            'write_errors': self.write_errors,
+            'batches_written': self.batches_written,
+            'queued': self._queue.qsize(),
+            'total_bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'evicted_files': self.evicted_files,
+            'evicted_bytes': self.evicted_bytes,
+            'batch_latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        }
+
+
+def _day(timestamp):
+    """Local date of a timestamp, the name of its day directory."""
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+
+def _fsync_directory(directory):
+    """Make new names in a directory durable (not supported on every platform)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
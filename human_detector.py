@@ -1,30 +1,135 @@
+import logging
+import os
 import cv2
 import numpy as np
 from ultralytics import YOLO
 import time
 from config import Config
+from zone_filter import ZoneFilter
+from cascade import CascadeVerifier
+
+logger = logging.getLogger(__name__)
 
 class HumanDetector:
-    def __init__(self):
-        """Initialize the human detector with YOLO model."""
-        print("Loading YOLO model...")
-        self.model = YOLO('yolov8n.pt')  # Using YOLOv8 nano for speed
-        self.confidence_threshold = Config.CONFIDENCE_THRESHOLD
+    def __init__(self, model=None, camera_index=None, verifier=None):
+        """
+        Initialize the human detector with YOLO model.
+        
+        Args:
+            model: Optional preloaded model with the ultralytics call interface
+            camera_index: Camera whose settings (model, input size, threads,
+                thresholds) apply (default from config)
+            verifier: Optional preloaded verifier model for the cascade (CASCADE_ENABLED)
+        """
+        settings = Config.for_camera(camera_index if camera_index is not None else Config.CAMERA_INDEX)
+        tuned = self._load_tuning(settings)
+        imgsz, threads = settings.INFERENCE_IMGSZ, settings.TORCH_THREADS
+        if tuned:
+            # The autotuner's choice replaces defaults only, not values someone set
+            if settings.source('INFERENCE_IMGSZ') == 'default':
+                imgsz = tuned['imgsz']
+            if settings.source('TORCH_THREADS') == 'default':
+                threads = tuned['threads']
+        if model is None:
+            weights = settings.MODEL_PATH
+            if tuned and tuned['backend'] != 'torch':
+                weights = tuned['weights']
+            logger.info("Loading YOLO model %s...", weights)
+            model = YOLO(weights, task='detect')
+        self.model = model
+        self.confidence_threshold = settings.CONFIDENCE_THRESHOLD
+        self.imgsz = imgsz or None  # None = model default
         self.last_detection_time = 0
         self.cooldown_period = Config.DETECTION_COOLDOWN
         
-    def detect_humans(self, frame):
+        # Polygon zones and exclusions (None when the whole frame counts)
+        zone_filter = ZoneFilter(zones=settings.DETECTION_ZONES, exclusions=settings.EXCLUSION_ZONES,
+                                 mode=settings.ZONE_FILTER_MODE, min_overlap=settings.ZONE_MIN_OVERLAP,
+                                 mask_size=self.imgsz or 640)
+        self.zone_filter = zone_filter if zone_filter.active else None
+        
+        # Cascade: screen at a lower threshold, verify the uncertain boxes with a larger model
+        self.cascade = None
+        self.screen_threshold = self.confidence_threshold
+        if settings.CASCADE_ENABLED:
+            self.cascade = CascadeVerifier(model=verifier)
+            self.screen_threshold = settings.CASCADE_SCREEN_THRESHOLD
+            self.accept_threshold = settings.CASCADE_ACCEPT_THRESHOLD
+        
+        # Inference thread count (changed at runtime by the power manager)
+        try:
+            import torch
+            if threads:
+                torch.set_num_threads(threads)
+            self.default_num_threads = torch.get_num_threads()
+        except ImportError:
+            self.default_num_threads = None
+        self.num_threads = self.default_num_threads
+        
+        # Lightweight IoU tracker state: track_id -> (bbox, last_seen)
+        self.tracks = {}
+        self.next_track_id = 1
+        self.track_iou_threshold = 0.3
+        self.track_max_age = 1.0  # seconds
+        
+    @staticmethod
+    def _load_tuning(settings):
+        """
+        Get the autotuner's cached setup for this host and model, if there is a usable one.
+        
+        Returns:
+            dict or None
+        """
+        if not Config.AUTOTUNE_ENABLED:
+            return None
+        from autotune import load_tuning
+        tuned = load_tuning(settings.MODEL_PATH)
+        if tuned is None:
+            return None
+        if tuned['backend'] != 'torch' and not os.path.exists(tuned['weights']):
+            logger.warning("Autotuned %s weights %s missing, using torch", tuned['backend'], tuned['weights'])
+            tuned = dict(tuned, backend='torch', weights=settings.MODEL_PATH)
+        logger.info("⚡ Autotuned setup: %s, %spx, %s threads (p95 %.1f ms, tuned %s)", tuned['backend'],
+                    tuned['imgsz'], tuned['threads'], tuned['latency_p95'] * 1000, tuned.get('tuned_at', '?'))
+        return tuned
+    
+    def set_num_threads(self, num_threads):
+        """
+        Set the number of CPU threads used for inference.
+        
+        Args:
+            num_threads: Thread count, or None to restore the startup default
+        """
+        num_threads = num_threads or self.default_num_threads
+        if num_threads and num_threads != self.num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+            self.num_threads = num_threads
+    
+    def detect_humans(self, frame, imgsz=None, in_cooldown=False):
         """
         Detect humans in the given frame.
         
         Args:
             frame: OpenCV image frame
+            imgsz: Optional inference input size (default: INFERENCE_IMGSZ, else model default)
+            in_cooldown: The frame cannot alert; the cascade uses cached verdicts only
             
         Returns:
             tuple: (human_detected: bool, annotated_frame: np.array, detections: list)
         """
+        imgsz = imgsz or self.imgsz
+        
+        # Only the region around the detection zones is worth inferring on
+        roi = self.zone_filter.roi(frame.shape) if self.zone_filter else None
+        source = frame[roi[1]:roi[3], roi[0]:roi[2]] if roi else frame
+        offset_x, offset_y = roi[:2] if roi else (0, 0)
+        
         # Run YOLO inference
-        results = self.model(frame, verbose=False)
+        if imgsz:
+            results = self.model(source, verbose=False, imgsz=imgsz)
+        else:
+            results = self.model(source, verbose=False)
         
         human_detected = False
         detections = []
@@ -39,24 +144,88 @@ class HumanDetector:
                     confidence = float(box.conf[0])
                     
                     # Check if it's a person (class_id = 0 in COCO dataset)
-                    if class_id == 0 and confidence >= self.confidence_threshold:
+                    if class_id == 0 and confidence >= self.screen_threshold:
                         human_detected = True
                         
                         # Get bounding box coordinates
                         x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
                         detections.append({
-                            'bbox': (int(x1), int(y1), int(x2), int(y2)),
+                            'bbox': (int(x1) + offset_x, int(y1) + offset_y,
+                                     int(x2) + offset_x, int(y2) + offset_y),
                             'confidence': confidence
                         })
         
+        # Drop people outside the zones or inside exclusions
+        if self.zone_filter:
+            detections = self.zone_filter.filter(detections, frame.shape)
+            human_detected = bool(detections)
+        
+        # Give each detection a stable track id across frames
+        self._assign_track_ids(detections)
+        
+        # Keep confident boxes; uncertain ones only if the verifier confirms them
+        if self.cascade:
+            confident = [d for d in detections if d['confidence'] >= self.accept_threshold]
+            uncertain = [d for d in detections if d['confidence'] < self.accept_threshold]
+            if uncertain:
+                # No need to run the verifier if the frame alerts anyway because of a
+                # confident box, or cannot alert during the cooldown
+                confident += self.cascade.verify(frame, uncertain, cached_only=bool(confident) or in_cooldown)
+            self.cascade.forget(self.tracks)
+            detections = confident
+            human_detected = bool(detections)
+        
         # Annotate frame with detections
         annotated_frame = self._annotate_frame(frame, detections)
         
         return human_detected, annotated_frame, detections
     
+    @staticmethod
+    def _iou(a, b):
+        """Intersection over union of two (x1, y1, x2, y2) boxes."""
+        ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+        ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+        inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+        if inter == 0:
+            return 0.0
+        area_a = (a[2] - a[0]) * (a[3] - a[1])
+        area_b = (b[2] - b[0]) * (b[3] - b[1])
+        return inter / float(area_a + area_b - inter)
+    
+    def _assign_track_ids(self, detections):
+        """Greedily match detections to recent tracks by IoU and tag them with 'track_id'."""
+        now = time.time()
+        
+        # Forget tracks that have not been seen recently
+        self.tracks = {tid: t for tid, t in self.tracks.items() if now - t[1] <= self.track_max_age}
+        
+        candidates = []
+        for det_index, detection in enumerate(detections):
+            for track_id, (bbox, _) in self.tracks.items():
+                iou = self._iou(detection['bbox'], bbox)
+                if iou >= self.track_iou_threshold:
+                    candidates.append((iou, det_index, track_id))
+        candidates.sort(reverse=True)
+        
+        matched_detections, matched_tracks = set(), set()
+        for _, det_index, track_id in candidates:
+            if det_index in matched_detections or track_id in matched_tracks:
+                continue
+            detections[det_index]['track_id'] = track_id
+            matched_detections.add(det_index)
+            matched_tracks.add(track_id)
+        
+        for det_index, detection in enumerate(detections):
+            if det_index not in matched_detections:
+                detection['track_id'] = self.next_track_id
+                self.next_track_id += 1
+            self.tracks[detection['track_id']] = (detection['bbox'], now)
+    
     def _annotate_frame(self, frame, detections):
         """Annotate frame with bounding boxes and labels."""
         annotated_frame = frame.copy()
+        if self.zone_filter:
+            self.zone_filter.draw(annotated_frame)
         
         for detection in detections:
             x1, y1, x2, y2 = detection['bbox']
@@ -67,6 +236,8 @@ class HumanDetector:
             
             # Draw label
             label = f"Human: {confidence:.2f}"
+            if detection.get('zone'):
+                label += f" ({detection['zone']})"
             label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
             cv2.rectangle(annotated_frame, (x1, y1 - label_size[1] - 10), 
                          (x1 + label_size[0], y1), (0, 255, 0), -1)
@@ -75,6 +246,10 @@ class HumanDetector:
         
         return annotated_frame
     
+    def in_cooldown(self):
+        """Whether an alert was triggered less than the cooldown period ago."""
+        return time.time() - self.last_detection_time <= self.cooldown_period
+    
     def should_trigger_alert(self, human_detected):
         """
         Check if an alert should be triggered based on detection and cooldown.
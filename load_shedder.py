@@ -0,0 +1,221 @@
+"""
+Runtime load-shedding controller.
+
+Watches per-frame latency (capture to end of processing) and the number of
+captured frames that were never processed, and under sustained overload steps
+down a configured degradation ladder. Each rung sets the inference input size,
+a frame stride, and how many cameras (highest priority first) keep full frame
+rate; a rung whose stride is above 1 always reduces at least one camera, so a
+lone camera is strided too. Once load falls it climbs back up one rung at a time, with separate high
+and low thresholds plus a recovery period so it does not oscillate.
+
+Ladder format (LOAD_SHED_LADDER): comma-separated "imgsz:stride:full_rate_cameras"
+rungs from best to cheapest, e.g. "640:1:all,480:1:all,320:2:1,320:4:0".
+"""
+
+import logging
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LadderLevel:
+    def __init__(self, imgsz, frame_stride=1, full_rate_cameras=None):
+        """
+        Args:
+            imgsz: Inference input size at this level
+            frame_stride: Process one frame in this many for reduced-rate cameras
+            full_rate_cameras: Cameras kept at stride 1 (None = all); with a stride
+                above 1 the lowest-priority camera is always strided
+        """
+        self.imgsz = imgsz
+        self.frame_stride = max(1, frame_stride)
+        self.full_rate_cameras = full_rate_cameras
+
+    def __repr__(self):
+        cameras = 'all' if self.full_rate_cameras is None else self.full_rate_cameras
+        return f"{self.imgsz}px 1/{self.frame_stride} (full rate: {cameras})"
+
+    @staticmethod
+    def parse_ladder(spec):
+        """
+        Parse a ladder specification string.
+
+        Returns:
+            list: LadderLevel objects from best quality to cheapest
+        """
+        levels = []
+        for rung in spec.split(','):
+            rung = rung.strip()
+            if not rung:
+                continue
+            parts = rung.split(':')
+            imgsz = int(parts[0])
+            stride = int(parts[1]) if len(parts) > 1 and parts[1] else 1
+            cameras = parts[2].strip().lower() if len(parts) > 2 else 'all'
+            levels.append(LadderLevel(imgsz, stride, None if cameras in ('', 'all') else int(cameras)))
+        if not levels:
+            raise ValueError(f"Empty load-shedding ladder: {spec!r}")
+        return levels
+
+
+class LoadShedController:
+    def __init__(self, ladder=None):
+        """
+        Initialize the controller.
+
+        Args:
+            ladder: List of LadderLevel (default parsed from config)
+        """
+        self.ladder = ladder if ladder is not None else LadderLevel.parse_ladder(Config.LOAD_SHED_LADDER)
+        self.latency_high = Config.LOAD_SHED_LATENCY_HIGH
+        self.latency_low = Config.LOAD_SHED_LATENCY_LOW
+        self.backlog_high = Config.LOAD_SHED_BACKLOG_HIGH
+        self.backlog_low = Config.LOAD_SHED_BACKLOG_LOW
+        self.step_down_after = Config.LOAD_SHED_STEP_DOWN_AFTER
+        self.recover_after = Config.LOAD_SHED_RECOVER_AFTER
+        self.min_dwell = Config.LOAD_SHED_MIN_DWELL
+        self.smoothing = 0.3  # EWMA weight of the newest sample
+
+        self.level_index = 0
+        self.level_since = time.monotonic()
+        self.overload_streak = 0
+        self.calm_since = None
+
+        self.latency_ewma = 0.0
+        self.backlog_ewma = 0.0
+        self.max_latency = 0.0
+        self.max_alert_latency = 0.0
+        self.alert_latencies = []
+        self.step_downs = 0
+        self.step_ups = 0
+        self.level_time = [0.0] * len(self.ladder)
+
+        # camera_id -> {'priority': int, 'counter': int}
+        self.cameras = {}
+
+    @property
+    def level(self):
+        """Current ladder level."""
+        return self.ladder[self.level_index]
+
+    @property
+    def imgsz(self):
+        """Inference input size for the current level."""
+        return self.level.imgsz
+
+    def register_camera(self, camera_id, priority=0):
+        """
+        Register a camera. Higher priority cameras keep full rate longest.
+
+        Args:
+            camera_id: Camera identifier
+            priority: Larger numbers are more important
+        """
+        self.cameras[camera_id] = {'priority': priority, 'counter': 0}
+
+    def _full_rate_cameras(self):
+        """Camera ids currently allowed full frame rate."""
+        limit = self.level.full_rate_cameras
+        if limit is None or self.level.frame_stride == 1:
+            return set(self.cameras)
+        # A stride must shed something: otherwise a single camera would never slow down
+        limit = min(limit, len(self.cameras) - 1)
+        ranked = sorted(self.cameras, key=lambda cid: self.cameras[cid]['priority'], reverse=True)
+        return set(ranked[:limit])
+
+    def should_process(self, camera_id):
+        """
+        Decide whether to run detection on this camera's current frame.
+
+        Returns:
+            bool: False if the frame should be shed
+        """
+        if camera_id not in self.cameras:
+            self.register_camera(camera_id)
+        if self.level.frame_stride == 1 or camera_id in self._full_rate_cameras():
+            return True
+
+        state = self.cameras[camera_id]
+        state['counter'] += 1
+        if state['counter'] >= self.level.frame_stride:
+            state['counter'] = 0
+            return True
+        return False
+
+    def _change_level(self, index):
+        """Move to another ladder level."""
+        now = time.monotonic()
+        self.level_time[self.level_index] += now - self.level_since
+        direction = "⬇️ Shedding load" if index > self.level_index else "⬆️ Restoring quality"
+        self.level_index = index
+        self.level_since = now
+        self.overload_streak = 0
+        self.calm_since = None
+        for state in self.cameras.values():
+            state['counter'] = 0
+        logger.info("%s: level %d (%s)", direction, index, self.level)
+
+    def observe(self, latency, backlog=0):
+        """
+        Feed one processed frame's measurements into the controller.
+
+        Args:
+            latency: Seconds from frame capture to end of processing
+            backlog: Frames captured since the previous processed frame that were never processed
+        """
+        alpha = self.smoothing
+        self.latency_ewma = alpha * latency + (1 - alpha) * self.latency_ewma
+        self.backlog_ewma = alpha * max(0, backlog) + (1 - alpha) * self.backlog_ewma
+        self.max_latency = max(self.max_latency, latency)
+
+        now = time.monotonic()
+        dwell_ok = now - self.level_since >= self.min_dwell
+        overloaded = self.latency_ewma > self.latency_high or self.backlog_ewma > self.backlog_high
+        calm = self.latency_ewma < self.latency_low and self.backlog_ewma <= self.backlog_low
+
+        if overloaded:
+            self.overload_streak += 1
+            self.calm_since = None
+            if (self.overload_streak >= self.step_down_after and dwell_ok
+                    and self.level_index < len(self.ladder) - 1):
+                self.step_downs += 1
+                self._change_level(self.level_index + 1)
+        elif calm:
+            self.overload_streak = 0
+            if self.calm_since is None:
+                self.calm_since = now
+            elif now - self.calm_since >= self.recover_after and dwell_ok and self.level_index > 0:
+                self.step_ups += 1
+                self._change_level(self.level_index - 1)
+        else:
+            # Between thresholds: hold the current level
+            self.overload_streak = 0
+            self.calm_since = None
+
+    def record_alert_latency(self, latency):
+        """Record the capture-to-dispatch latency of an alert."""
+        self.max_alert_latency = max(self.max_alert_latency, latency)
+        self.alert_latencies.append(latency)
+        if len(self.alert_latencies) > 1000:
+            del self.alert_latencies[:500]
+
+    def get_stats(self):
+        """Get controller statistics."""
+        level_time = list(self.level_time)
+        level_time[self.level_index] += time.monotonic() - self.level_since
+        recent = sorted(self.alert_latencies)
+        return {
+            'level': self.level_index,
+            'level_description': repr(self.level),
+            'latency_ewma': self.latency_ewma,
+            'backlog_ewma': self.backlog_ewma,
+            'max_latency': self.max_latency,
+            'alert_latency_p95': recent[int(len(recent) * 0.95)] if recent else 0.0,
+            'max_alert_latency': self.max_alert_latency,
+            'step_downs': self.step_downs,
+            'step_ups': self.step_ups,
+            'level_time': level_time,
+        }
@@ -0,0 +1,217 @@
+"""
+Asynchronous, rate-limited structured logging.
+
+Components log through the standard library (logging.getLogger(__name__)).
+setup_logging() sends every record through a bounded queue to a
+QueueListener thread that formats and writes it, so a log call on the
+detection path costs a filter check and a queue put, never a write to a
+slow terminal or a stalled journald pipe:
+
+    non-blocking   the queue holds LOG_QUEUE_SIZE records; when the writer
+                   falls behind, new records are dropped and counted
+    rate limiting  every message (logger, level and format string) has a
+                   token bucket of LOG_RATE_LIMIT records per second with a
+                   burst of LOG_RATE_BURST; the next record that gets through
+                   says how many were suppressed, so a camera failing at
+                   frame rate costs a few lines per second, not hundreds
+    formats        LOG_FORMAT=text for terminals, json for journald and log
+                   shippers: one object per line with time, level, logger,
+                   thread, message and any fields passed with extra=
+
+Log with %-style arguments (log.warning("Camera %s lost", index)) rather
+than f-strings: the format string is the rate-limiting key, and formatting
+happens on the listener thread.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+from config import Config
+from rate_limiter import TokenBucket
+
+FORMATS = ('text', 'json')
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+MAX_RATE_KEYS = 1024  # message templates tracked; the least recently logged are forgotten
+SHUTDOWN_TIMEOUT = 5.0  # seconds to wait for the writer to empty the queue at shutdown
+
+# LogRecord attributes that are not user fields passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'suppressed'}
+
+_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_rate_filter = None
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, rate, burst):
+        """
+        Args:
+            rate: Records per second allowed for each message (0 disables limiting)
+            burst: Records of one message allowed at once
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.messages = OrderedDict()  # (logger, level, format string) -> [TokenBucket, suppressed since last]
+        self.suppressed = 0
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno >= logging.CRITICAL:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        with self.lock:
+            entry = self.messages.get(key)
+            if entry is None:
+                entry = self.messages[key] = [TokenBucket(self.rate, self.burst), 0]
+                if len(self.messages) > MAX_RATE_KEYS:
+                    self.messages.popitem(last=False)
+            else:
+                self.messages.move_to_end(key)
+            if not entry[0].try_acquire():
+                entry[1] += 1
+                self.suppressed += 1
+                return False
+            if entry[1]:
+                record.suppressed = entry[1]
+                entry[1] = 0
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.max_depth = 0
+
+    def prepare(self, record):
+        # The message is formatted on the listener thread; only a traceback is
+        # rendered here, so the record does not keep the failing frames alive
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+
+class _Listener(QueueListener):
+    def stop(self):
+        # The queue may be full; the sentinel waits for room rather than failing,
+        # and a writer stalled for good is abandoned (its thread is a daemon)
+        try:
+            self.queue.put(self._sentinel, timeout=SHUTDOWN_TIMEOUT)
+        except queue.Full:
+            return
+        self._thread.join(SHUTDOWN_TIMEOUT)
+        self._thread = None
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" ({suppressed} similar message{'s' if suppressed > 1 else ''} suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def setup_logging(level=None, fmt=None, rate=None, burst=None, queue_size=None, stream=None):
+    """
+    Route all logging through the background writer. Calling it again
+    replaces the previous setup.
+
+    Args:
+        level: Minimum level name, e.g. 'DEBUG' (default from config)
+        fmt: 'text' or 'json' (default from config)
+        rate: Records per second per message, 0 = unlimited (default from config)
+        burst: Records of one message allowed at once (default from config)
+        queue_size: Records buffered for the writer before dropping (default from config)
+        stream: Output stream (default stderr)
+    """
+    global _listener, _queue_handler, _rate_filter
+    level = (level or Config.LOG_LEVEL).upper()
+    fmt = fmt or Config.LOG_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown log format {fmt!r}, expected one of {FORMATS}")
+    rate = rate if rate is not None else Config.LOG_RATE_LIMIT
+    burst = burst if burst is not None else Config.LOG_RATE_BURST
+    queue_size = queue_size if queue_size is not None else Config.LOG_QUEUE_SIZE
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    rate_filter = RateLimitFilter(rate, burst)
+    handler.addFilter(rate_filter)
+
+    with _lock:
+        shutdown_logging()
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(handler)
+        _queue_handler, _rate_filter = handler, rate_filter
+        _listener = _Listener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging():
+    """Write the records still queued and stop the background writer."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+
+
+def get_stats():
+    """Get logging statistics."""
+    if _queue_handler is None:
+        return {'queued': 0, 'max_queue_depth': 0, 'dropped': 0, 'suppressed': 0}
+    return {
+        'queued': _queue_handler.queue.qsize(),
+        'max_queue_depth': _queue_handler.max_depth,
+        'dropped': _queue_handler.dropped,
+        'suppressed': _rate_filter.suppressed,
+    }
+
+
+atexit.register(shutdown_logging)
@@ -10,82 +10,142 @@ import time
 import signal
 import sys
 import argparse
+import logging
 from datetime import datetime
 
 from human_detector import HumanDetector
 from camera_manager import CameraManager
 from alarm_system import AlarmSystem
 from notification_system import NotificationSystem
-from config import Config
+from event_store import DetectionEventStore
+from evidence_store import EvidenceStore
+from profiler import SamplingProfiler
+from power_manager import PowerManager
+from load_shedder import LoadShedController
+from alert_coalescer import AlertCoalescer
+from aggregator import EdgePublisher
+from config import Config, PROFILES
+import logging_setup
+
+logger = logging.getLogger(__name__)
 
 class HumanDetectionApp:
-    def __init__(self, camera_index=None, headless=False):
+    def __init__(self, camera_index=None, headless=False, profile_duration=None):
         """
         Initialize the Human Detection App.
         
         Args:
             camera_index: Camera index to use (default from config)
             headless: Run without GUI display
+            profile_duration: Profile all threads for this many seconds after start
         """
         self.headless = headless
         self.is_running = False
+        self.profile_duration = profile_duration
+        self.profiler = SamplingProfiler()
         
-        print("🤖 Initializing Human Detection AI App...")
+        logger.info("🤖 Initializing Human Detection AI App...")
+        self._log_config(camera_index if camera_index is not None else Config.CAMERA_INDEX)
         
         # Initialize components
-        self.camera_manager = CameraManager(camera_index)
-        self.human_detector = HumanDetector()
-        self.alarm_system = AlarmSystem()
-        self.notification_system = NotificationSystem()
+        self._create_components(camera_index)
+        settings = Config.for_camera(self.camera_manager.camera_index)
+        self.min_frame_interval = 1.0 / settings.MAX_INFERENCE_FPS if settings.MAX_INFERENCE_FPS else 0.0
         
         # Statistics
         self.total_detections = 0
         self.session_start_time = datetime.now()
         self.last_detection_time = None
+        self.current_frame_time = time.time()
         
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
         
-        print("✅ Human Detection App initialized successfully!")
+        # SIGUSR1 toggles the sampling profiler (e.g. `kill -USR1 <pid>`)
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self._profile_signal_handler)
+        
+        logger.info("Human Detection App initialized successfully")
+    
+    @staticmethod
+    def _log_config(camera_index):
+        """Log the effective configuration, so performance runs can be reproduced."""
+        # One record for the whole listing: a record per setting would share a format string and be rate limited
+        settings = '\n'.join(f"   {name}={value}  [{source}]" for name, value, source in Config.describe(camera_index))
+        logger.info("⚙️ Effective configuration (performance profile: %s, camera %s):\n%s",
+                    Config.PERFORMANCE_PROFILE or 'none', camera_index, settings)
+    
+    def _create_components(self, camera_index):
+        """Create the camera, detector, alarm, notification and storage components."""
+        self.camera_manager = CameraManager(camera_index)
+        self.human_detector = HumanDetector(camera_index=self.camera_manager.camera_index)
+        self.alarm_system = AlarmSystem()
+        # Edge nodes stream detections to the aggregator, which alone holds the notification credentials
+        self.edge_publisher = EdgePublisher() if Config.AGGREGATOR_ADDRESS else None
+        self.notification_system = NotificationSystem() if not self.edge_publisher else None
+        self.alert_coalescer = (AlertCoalescer(self.notification_system)
+                                if Config.ALERT_COALESCING_ENABLED and self.notification_system else None)
+        self.event_store = DetectionEventStore() if Config.EVENT_STORE_ENABLED else None
+        self.evidence_store = EvidenceStore() if Config.EVIDENCE_STORE_ENABLED else None
+        self.power_manager = PowerManager() if Config.POWER_SAVING_ENABLED else None
+        self.load_shedder = LoadShedController() if Config.LOAD_SHEDDING_ENABLED else None
+        if self.load_shedder:
+            camera = self.camera_manager.camera_index
+            self.load_shedder.register_camera(camera, Config.for_camera(camera).CAMERA_PRIORITY)
     
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully."""
-        print(f"\n🛑 Received signal {signum}, shutting down gracefully...")
+        logger.info("🛑 Received signal %s, shutting down gracefully...", signum)
         self.stop()
         sys.exit(0)
     
+    def _profile_signal_handler(self, signum, frame):
+        """Toggle the sampling profiler on SIGUSR1."""
+        self._toggle_profiler()
+    
+    def _toggle_profiler(self):
+        """Start a profiling window, or stop the current one and write results."""
+        self.profiler.toggle(duration=Config.PROFILE_DURATION)
+    
     def start(self):
         """Start the human detection system."""
-        print("\n🚀 Starting Human Detection System...")
+        logger.info("🚀 Starting Human Detection System...")
         
         # Start camera
         if not self.camera_manager.start_camera():
-            print("❌ Failed to start camera. Exiting.")
+            logger.error("Failed to start camera. Exiting.")
             return False
         
         # Display camera info
         camera_info = self.camera_manager.get_camera_info()
         if camera_info:
-            print(f"📷 Camera Info: {camera_info['width']}x{camera_info['height']} @ {camera_info['fps']}fps")
+            logger.info("📷 Camera Info: %sx%s @ %sfps", camera_info['width'], camera_info['height'], camera_info['fps'])
         
         self.is_running = True
-        print("✅ System is now monitoring for humans...")
-        print("📢 Notifications configured for:")
-        if Config.WHATSAPP_RECIPIENTS:
-            print(f"   📱 WhatsApp: {len(Config.WHATSAPP_RECIPIENTS)} recipients")
-        if Config.EMAIL_RECIPIENTS:
-            print(f"   📧 Email: {len(Config.EMAIL_RECIPIENTS)} recipients")
+        logger.info("System is now monitoring for humans...")
+        if self.edge_publisher:
+            logger.info("📢 Notifications sent by the aggregator at %s (node %s)",
+                        Config.AGGREGATOR_ADDRESS, self.edge_publisher.node_id)
+        else:
+            logger.info("📢 Notifications configured for:")
+            if Config.WHATSAPP_RECIPIENTS:
+                logger.info("   📱 WhatsApp: %d recipients", len(Config.WHATSAPP_RECIPIENTS))
+            if Config.EMAIL_RECIPIENTS:
+                logger.info("   📧 Email: %d recipients", len(Config.EMAIL_RECIPIENTS))
         
         if not self.headless:
-            print("👁️ Press 'q' to quit, 's' for statistics, 't' to test notifications")
+            print("👁️ Press 'q' to quit, 's' for statistics, 't' to test notifications, 'p' to profile")
+        
+        if self.profile_duration:
+            self.profiler.start(duration=self.profile_duration)
         
         try:
             self._main_loop()
         except KeyboardInterrupt:
-            print("\n🛑 Interrupted by user")
+            logger.info("🛑 Interrupted by user")
         except Exception as e:
-            print(f"❌ Error in main loop: {e}")
+            logger.exception("Error in main loop: %s", e)
         finally:
             self.stop()
         
@@ -96,19 +156,51 @@ class HumanDetectionApp:
         fps_counter = 0
         fps_start_time = time.time()
         
+        last_frame_seq = None
+        backlog = 0  # frames the loop never got to since the last inferred frame
+        
         while self.is_running:
             # Get frame from camera
-            frame = self.camera_manager.get_frame()
+            frame, frame_seq, frame_time = self.camera_manager.get_frame_with_info()
             if frame is None:
                 time.sleep(0.1)
                 continue
             
+            # Don't process the same frame twice
+            if frame_seq == last_frame_seq:
+                if not self.headless:
+                    cv2.waitKey(1)
+                time.sleep(0.005)
+                continue
+            if last_frame_seq is not None:
+                backlog += frame_seq - last_frame_seq - 1
+            last_frame_seq = frame_seq
+            self.current_frame_time = frame_time or time.time()
+            frame_started = time.time()
+            
             # Detect humans
-            human_detected, annotated_frame, detections = self.human_detector.detect_humans(frame)
+            human_detected, annotated_frame, detections, inferred = self._detect(frame)
             
             # Process detections
             if human_detected:
-                self._handle_detection(detections, annotated_frame)
+                alerted = self._handle_detection(detections, annotated_frame)
+                
+                # Persist every detection (non-blocking, written in batches)
+                if self.event_store:
+                    self.event_store.record(self.camera_manager.camera_index, detections,
+                                            timestamp=self.current_frame_time, alerted=alerted)
+                
+                # Keep a snapshot of the raw frame as evidence (encoded and written by a background thread)
+                if self.evidence_store:
+                    self.evidence_store.record(self.camera_manager.camera_index, frame, detections,
+                                               timestamp=self.current_frame_time, alerted=alerted)
+            
+            # Feed capture-to-decision latency and skipped frames to the load shedder; shed
+            # and idle frames skip inference, so their latency says nothing about the load
+            if self.load_shedder and inferred:
+                self.load_shedder.observe(time.time() - self.current_frame_time, backlog)
+            if inferred:
+                backlog = 0
             
             # Display frame if not headless
             if not self.headless:
@@ -117,49 +209,155 @@ class HumanDetectionApp:
                 # Handle keyboard input
                 key = cv2.waitKey(1) & 0xFF
                 if key == ord('q'):
-                    print("\n👋 Quitting...")
+                    logger.info("👋 Quitting...")
                     break
                 elif key == ord('s'):
                     self._print_statistics()
                 elif key == ord('t'):
                     self._test_notifications()
+                elif key == ord('p'):
+                    self._toggle_profiler()
             else:
                 # Small delay for headless mode
                 time.sleep(0.03)  # ~30 FPS
             
+            # Poll the camera less often while the scene is idle
+            if self.power_manager and self.power_manager.frame_interval:
+                time.sleep(self.power_manager.frame_interval)
+            
+            # Cap the inference rate (MAX_INFERENCE_FPS)
+            if self.min_frame_interval:
+                time.sleep(max(0.0, frame_started + self.min_frame_interval - time.time()))
+            
             # FPS calculation
             fps_counter += 1
             if fps_counter % 30 == 0:  # Update every 30 frames
                 current_time = time.time()
                 fps = fps_counter / (current_time - fps_start_time)
-                if not self.headless:
-                    print(f"📊 FPS: {fps:.1f}")
+                logger.debug("📊 FPS: %.1f", fps)
                 fps_counter = 0
                 fps_start_time = current_time
     
+    def _detect(self, frame):
+        """
+        Run the detector on a frame, honouring power-saving and load-shedding settings.
+        
+        Returns:
+            tuple: (human_detected, annotated_frame, detections, inferred) - inferred is
+                   False when the frame was shed or skipped while idle
+        """
+        if self.load_shedder and not self.load_shedder.should_process(self.camera_manager.camera_index):
+            return False, frame, [], False
+        
+        if self.power_manager and not self.power_manager.should_infer(frame):
+            return False, frame, [], False
+        
+        # Use the smallest input size requested by either controller, capped by INFERENCE_IMGSZ
+        sizes = [self.human_detector.imgsz]
+        if self.power_manager:
+            self.human_detector.set_num_threads(self.power_manager.num_threads)
+            sizes.append(self.power_manager.imgsz)
+        if self.load_shedder:
+            sizes.append(self.load_shedder.imgsz)
+        sizes = [size for size in sizes if size]
+        
+        # Detections here can only alert once the cooldown is over; the coalescer and the
+        # aggregator decide alerts themselves
+        in_cooldown = (not self.edge_publisher and not self.alert_coalescer
+                       and self.human_detector.in_cooldown())
+        human_detected, annotated_frame, detections = self.human_detector.detect_humans(
+            frame, imgsz=min(sizes) if sizes else None, in_cooldown=in_cooldown)
+        if self.power_manager:
+            self.power_manager.observe(human_detected)
+        return human_detected, annotated_frame, detections, True
+    
     def _handle_detection(self, detections, frame):
-        """Handle human detection event."""
+        """
+        Handle human detection event.
+        
+        Returns:
+            bool: True if alerts were triggered
+        """
         detection_count = len(detections)
         confidence_scores = [det['confidence'] for det in detections]
         
+        if self.edge_publisher:
+            return self._publish_detection(detections, frame)
+        
+        if self.alert_coalescer:
+            return self._coalesce_detection(detections, frame)
+        
         # Check if we should trigger alerts (respects cooldown)
         if self.human_detector.should_trigger_alert(True):
             self.total_detections += 1
             self.last_detection_time = datetime.now()
             
-            print(f"\n🚨 HUMAN DETECTED! Count: {detection_count}, Max Confidence: {max(confidence_scores):.2f}")
+            logger.warning("🚨 HUMAN DETECTED! Count: %d, Max Confidence: %.2f", detection_count, max(confidence_scores))
+            
+            if self.load_shedder:
+                self.load_shedder.record_alert_latency(time.time() - self.current_frame_time)
             
             # Trigger sound alarm
-            self.alarm_system.play_alarm(duration=3)
+            self.alarm_system.play_alarm(duration=3, camera=self.camera_manager.camera_index)
             
             # Send notifications
             self.notification_system.send_detection_alert(
                 detection_count=detection_count,
                 confidence_scores=confidence_scores,
-                frame=frame
+                frame=frame,
+                detections=detections
             )
             
-            print("📢 Alerts sent!")
+            logger.info("📢 Alerts sent")
+            return True
+        
+        return False
+    
+    def _coalesce_detection(self, detections, frame):
+        """
+        Feed a detection to the coalescer, which alerts on the first detection of a
+        window and sends digests for the rest.
+        
+        Returns:
+            bool: True if this detection opened a new alert window
+        """
+        alerted = self.alert_coalescer.add(self.camera_manager.camera_index, detections,
+                                           frame=frame, timestamp=self.current_frame_time)
+        
+        # The local alarm keeps sounding on the detection cooldown while people remain
+        if self.human_detector.should_trigger_alert(True) or alerted:
+            self.alarm_system.play_alarm(duration=3, camera=self.camera_manager.camera_index)
+        
+        if alerted:
+            self.total_detections += 1
+            self.last_detection_time = datetime.now()
+            logger.warning("🚨 HUMAN DETECTED! Count: %d, Max Confidence: %.2f",
+                           len(detections), max(det['confidence'] for det in detections))
+            if self.load_shedder:
+                self.load_shedder.record_alert_latency(time.time() - self.current_frame_time)
+        return alerted
+    
+    def _publish_detection(self, detections, frame):
+        """
+        Stream a detection to the aggregator, which decides on notifications for
+        the whole site. The local alarm still sounds on the detection cooldown.
+        
+        Returns:
+            bool: True if the local alarm was triggered
+        """
+        self.edge_publisher.publish(self.camera_manager.camera_index, detections, frame=frame,
+                                    timestamp=self.current_frame_time)
+        if not self.human_detector.should_trigger_alert(True):
+            return False
+        
+        self.total_detections += 1
+        self.last_detection_time = datetime.now()
+        logger.warning("🚨 HUMAN DETECTED! Count: %d, Max Confidence: %.2f (sent to aggregator)",
+                       len(detections), max(det['confidence'] for det in detections))
+        if self.load_shedder:
+            self.load_shedder.record_alert_latency(time.time() - self.current_frame_time)
+        self.alarm_system.play_alarm(duration=3, camera=self.camera_manager.camera_index)
+        return True
     
     def _display_frame(self, frame, human_detected, detection_count):
         """Display frame with overlay information."""
@@ -184,7 +382,7 @@ class HumanDetectionApp:
                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
         
         # Add controls
-        cv2.putText(display_frame, "Press: 'q'=quit, 's'=stats, 't'=test", 
+        cv2.putText(display_frame, "Press: 'q'=quit, 's'=stats, 't'=test, 'p'=profile", 
                    (10, display_frame.shape[0] - 5), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)
         
@@ -201,12 +399,127 @@ class HumanDetectionApp:
             print(f"Last Detection: {self.last_detection_time.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"Detection Rate: {self.total_detections / (session_duration / 60):.2f} per minute")
         print(f"Camera: {self.camera_manager.get_camera_info()}")
+        zone_filter = self.human_detector.zone_filter
+        if zone_filter:
+            zones = zone_filter.get_stats()
+            print(f"Zones: {zones['zones']} zones, {zones['exclusions']} exclusions ({zones['mode']}), "
+                  f"{zones['rejected']}/{zones['evaluated']} people outside, "
+                  f"{zones['cropped_frames']} frames cropped to the zones")
+        if self.human_detector.cascade:
+            cascade = self.human_detector.cascade.get_stats()
+            print(f"Cascade: {cascade['confirmed']} confirmed, {cascade['rejected']} rejected by the verifier on "
+                  f"{cascade['frames_verified']} frames ({cascade['crops_verified']} crops, "
+                  f"{cascade['latency_avg'] * 1000:.0f} ms avg), {cascade['cache_hits']} cached verdicts")
+        
+        # Historical detections from the event store
+        if self.event_store:
+            now = time.time()
+            camera = self.camera_manager.camera_index
+            print(f"Detections (last hour): {self.event_store.count(now - 3600, camera=camera)}")
+            print(f"Detections (last 24h): {self.event_store.count(now - 86400, camera=camera)}")
+            print(f"People tracked (last 24h): {self.event_store.count_tracks(now - 86400, camera=camera)}")
+            print(f"Detections (all time): {self.event_store.count(camera=camera)}")
+            store_stats = self.event_store.get_stats()
+            if store_stats['dropped_rows']:
+                print(f"⚠️ Event store dropped {store_stats['dropped_rows']} rows (writer behind)")
+        
+        # Evidence snapshots on disk
+        if self.evidence_store:
+            evidence = self.evidence_store.get_stats()
+            print(f"Evidence: {evidence['stored']} snapshots ({evidence['deduplicated']} duplicates), "
+                  f"{evidence['total_bytes'] / 1024 / 1024:.1f}/{evidence['max_bytes'] / 1024 / 1024:.0f} MB used, "
+                  f"{evidence['evicted_files']} files evicted, "
+                  f"fsync batch {evidence['batch_latency_p95'] * 1000:.0f} ms p95")
+            if evidence['dropped'] or evidence['write_errors']:
+                print(f"⚠️ Evidence store dropped {evidence['dropped']} snapshots (writer behind), "
+                      f"{evidence['write_errors']} failed to write")
+        
+        # Local alarm
+        alarm = self.alarm_system.get_stats()
+        if alarm['plays']:
+            print(f"Alarm: {alarm['plays']} played, {alarm['extends']} extended, trigger-to-audio "
+                  f"p95 {alarm['latency_p95'] * 1000:.1f} ms (+{alarm['output_latency'] * 1000:.0f} ms output buffer)")
+            if len(alarm['zones']) > 1:
+                for name, zone in alarm['zones'].items():
+                    print(f"Alarm zone {name}: {zone['plays']} played, {zone['extends']} extended")
+        
+        # Edge node: detections go to the aggregator
+        if self.edge_publisher:
+            edge = self.edge_publisher.get_stats()
+            print(f"Aggregator: {'connected' if edge['connected'] else 'disconnected'}, {edge['events_sent']} events "
+                  f"in {edge['batches_sent']} batches ({edge['events_per_batch']:.1f} per batch, "
+                  f"{edge['bytes_sent'] / 1024:.0f} KB), {edge['queued']} queued, {edge['dropped']} dropped")
+            print(f"Aggregator link: {edge['connects']} connects, {edge['disconnects']} disconnects, "
+                  f"{edge['batches_resent']} batches resent, {edge['backpressure_stalls']} backpressure stalls, "
+                  f"{edge['thumbnails']} thumbnails ({edge['thumbnails_skipped']} skipped)")
+        
+        # Notification delivery
+        if self.notification_system:
+            notify = self.notification_system.get_stats()
+            print(f"Notifications: {notify['completed']} sent, {notify['failed']} failed, {notify['dropped']} dropped, "
+                  f"queue {notify['queue_depth']} (max {notify['max_queue_depth']})")
+            print(f"Send Latency: {notify['latency_avg'] * 1000:.0f} ms avg, {notify['latency_p95'] * 1000:.0f} ms p95")
+            for channel, engine in notify.get('channels', {}).items():
+                if engine['completed'] or engine['failed']:
+                    print(f"Channel {channel}: {engine['max_in_flight']}/{engine['concurrency']} max in flight, "
+                          f"{engine['timeouts']} timeouts, {engine['dropped']} dropped")
+            if 'outbox' in notify:
+                outbox = notify['outbox']
+                print(f"Outbox: {outbox['delivered']} delivered, {outbox['retried']} retries, "
+                      f"{outbox['failed']} failed, {outbox['unknown']} outcome unknown, "
+                      f"{outbox['pending']} pending for the next start")
+                if outbox['unrecorded']:
+                    print(f"⚠️ Outbox could not record {outbox['unrecorded']} deliveries (sent once, without retries)")
+            if 'media_server' in notify:
+                media = notify['media_server']
+                print(f"Media server: {media['images']} images ({media['stored_bytes'] / 1024:.0f} KB), "
+                      f"{media['served'] + media['partial']} served, {media['not_modified']} not modified, "
+                      f"{media['rejected']} rejected, {media['evicted']} evicted")
+            for channel, encoding in notify['encoding'].items():
+                if encoding['alerts']:
+                    print(f"Snapshots ({channel}): {encoding['bytes_avg'] / 1024:.0f} KB per alert, "
+                          f"{encoding['bytes_sent'] / 1024:.0f} KB total, "
+                          f"encode {encoding['encode_time_avg'] * 1000:.0f} ms avg")
+        
+        # Alert coalescing
+        if self.alert_coalescer:
+            coalesce = self.alert_coalescer.get_stats()
+            print(f"Alerts: {coalesce['first_alerts']} first alerts + {coalesce['digests']} digests for "
+                  f"{coalesce['detections']} detections ({coalesce['detections_per_alert']:.1f} per alert), "
+                  f"first alert delay max {coalesce['first_alert_delay_max'] * 1000:.0f} ms")
+        
+        # CPU budget adherence
+        if self.power_manager:
+            power = self.power_manager.get_stats()
+            print(f"Power Mode: {power['mode']} (idle {power['idle_time_percent']:.0f}% of the time, "
+                  f"{power['wakeups']} wake-ups)")
+            print(f"CPU: {power['average_cpu_percent']:.1f}% avg / {power['cpu_budget_percent']:.1f}% budget, "
+                  f"within budget {power['budget_adherence_percent']:.0f}% of the time")
+            print(f"Estimated Power: {power['estimated_watts']:.1f} W")
+            print(f"Frames: {power['frames_inferred']} inferred, {power['frames_skipped']} skipped while idle")
+        
+        # Load shedding
+        if self.load_shedder:
+            shed = self.load_shedder.get_stats()
+            print(f"Load Level: {shed['level']} ({shed['level_description']}), "
+                  f"{shed['step_downs']} step-downs / {shed['step_ups']} step-ups")
+            print(f"Frame Latency: {shed['latency_ewma'] * 1000:.0f} ms avg, {shed['max_latency'] * 1000:.0f} ms max")
+            print(f"Alert Latency: {shed['alert_latency_p95'] * 1000:.0f} ms p95, "
+                  f"{shed['max_alert_latency'] * 1000:.0f} ms max")
+
+        log = logging_setup.get_stats()
+        if log['suppressed'] or log['dropped']:
+            print(f"Logging: {log['suppressed']} repeated messages suppressed, {log['dropped']} dropped "
+                  f"(queue peaked at {log['max_queue_depth']})")
         print("========================\n")
     
     def _test_notifications(self):
         """Test notification systems."""
         print("\n🧪 Testing notification systems...")
-        self.notification_system.test_notifications()
+        if self.notification_system:
+            self.notification_system.test_notifications()
+        else:
+            print("📡 Notifications are sent by the aggregator; run --test-notifications there")
         self.alarm_system.test_alarm()
         print("Test completed!\n")
     
@@ -215,19 +528,41 @@ class HumanDetectionApp:
         if not self.is_running:
             return
         
-        print("\n🛑 Stopping Human Detection System...")
+        logger.info("🛑 Stopping Human Detection System...")
         self.is_running = False
         
+        # Write any in-progress profile before tearing threads down
+        self.profiler.stop()
+        
         # Stop components
         self.camera_manager.stop_camera()
         self.alarm_system.stop_alarm()
+        self.alarm_system.shutdown()
+        
+        # Send digests for open alert windows, then deliver notifications still queued
+        if self.alert_coalescer:
+            self.alert_coalescer.close()
+        if self.notification_system:
+            self.notification_system.shutdown()
+        
+        # Hand queued detections to the aggregator
+        if self.edge_publisher:
+            self.edge_publisher.close()
         
         # Close OpenCV windows
         cv2.destroyAllWindows()
         
-        # Print final statistics
+        # Print final statistics, then flush pending events and evidence to disk
+        if self.event_store:
+            self.event_store.flush()
+        if self.evidence_store:
+            self.evidence_store.flush()
         self._print_statistics()
-        print("✅ System stopped successfully!")
+        if self.event_store:
+            self.event_store.close()
+        if self.evidence_store:
+            self.evidence_store.close()
+        logger.info("System stopped successfully")
 
 def main():
     """Main entry point."""
@@ -244,10 +579,96 @@ def main():
                        help='Test notification systems and exit')
     parser.add_argument('--test-alarm', action='store_true', 
                        help='Test alarm system and exit')
+    parser.add_argument('--profile', type=float, nargs='?', const=Config.PROFILE_DURATION, default=None,
+                       metavar='SECONDS',
+                       help=f'Run the sampling profiler over all threads for a window '
+                            f'(default: {Config.PROFILE_DURATION:.0f}s)')
+    parser.add_argument('--power-save', action='store_true',
+                       help='Throttle inference while idle to stay within the CPU budget')
+    parser.add_argument('--cpu-budget', type=float, default=None, metavar='PERCENT',
+                       help='CPU budget for power-save mode, as a percent of total host CPU')
+    parser.add_argument('--watts-budget', type=float, default=None, metavar='WATTS',
+                       help='Power budget for power-save mode (estimated from CPU use)')
+    parser.add_argument('--load-shedding', action='store_true',
+                       help='Step down input size and frame rate under overload (see LOAD_SHED_LADDER)')
+    parser.add_argument('--alert-window', type=float, default=None, metavar='SECONDS',
+                       help='Coalesce detections into one alert plus digests per window (see ALERT_WINDOW)')
+    parser.add_argument('--notification-engine', choices=['threads', 'asyncio'], default=None,
+                       help='Send notifications from a worker pool or from one asyncio event loop '
+                            '(see NOTIFICATION_ENGINE)')
+    parser.add_argument('--perf-profile', choices=sorted(PROFILES), default=None,
+                       help='Performance profile for all hot-path settings (see PERFORMANCE_PROFILE)')
+    parser.add_argument('--autotune', nargs='?', const='', default=None, metavar='VIDEO',
+                       help='Benchmark thread counts, backends and input sizes on this host (on frames '
+                            'from VIDEO, or synthetic ones), cache the fastest setup and exit')
+    parser.add_argument('--analyze', nargs='+', default=None, metavar='PATH',
+                       help='Scan video files or directories for people in parallel, write a timeline and exit')
+    parser.add_argument('--aggregator', action='store_true',
+                       help='Run the site aggregator: receive detections from edge nodes on AGGREGATOR_LISTEN '
+                            'and send their notifications')
+    parser.add_argument('--publish-to', default=None, metavar='HOST:PORT',
+                       help='Run as an edge node publishing detections to this aggregator instead of notifying '
+                            '(see AGGREGATOR_ADDRESS)')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default=None,
+                       help='Minimum level of log messages (see LOG_LEVEL)')
+    parser.add_argument('--log-format', choices=['text', 'json'], default=None,
+                       help='Log as text lines or as one JSON object per line (see LOG_FORMAT)')
+    parser.add_argument('--soak', type=float, default=None, metavar='SECONDS',
+                       help='Run the memory/thread leak soak test with synthetic input and exit')
     
     args = parser.parse_args()
     
+    # Command line options override the environment and the performance profile
+    if args.perf_profile:
+        Config.apply_profile(args.perf_profile)
+    if args.notification_engine:
+        Config.set('NOTIFICATION_ENGINE', args.notification_engine)
+    if args.camera is not None:
+        Config.set('CAMERA_INDEX', args.camera)
+    if args.power_save or args.cpu_budget or args.watts_budget:
+        Config.set('POWER_SAVING_ENABLED', True)
+        if args.cpu_budget:
+            Config.set('CPU_BUDGET_PERCENT', args.cpu_budget)
+        if args.watts_budget:
+            Config.set('POWER_BUDGET_WATTS', args.watts_budget)
+    if args.load_shedding:
+        Config.set('LOAD_SHEDDING_ENABLED', True)
+    if args.alert_window:
+        Config.set('ALERT_COALESCING_ENABLED', True)
+        Config.set('ALERT_WINDOW', args.alert_window)
+    if args.publish_to:
+        Config.set('AGGREGATOR_ADDRESS', args.publish_to)
+    if args.log_level:
+        Config.set('LOG_LEVEL', args.log_level)
+    if args.log_format:
+        Config.set('LOG_FORMAT', args.log_format)
+    try:
+        Config.validate()
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    logging_setup.setup_logging()
+    
     # Handle utility commands
+    if args.autotune is not None:
+        from autotune import main as autotune_main
+        autotune_args = ['--model', Config.for_camera(Config.CAMERA_INDEX).MODEL_PATH]
+        if args.autotune:
+            autotune_args += ['--replay', args.autotune]
+        sys.exit(autotune_main(autotune_args))
+    
+    if args.analyze:
+        from analyze import main as analyze_main
+        sys.exit(analyze_main(args.analyze))
+    
+    if args.aggregator:
+        from aggregator import main as aggregator_main
+        sys.exit(aggregator_main([]))
+    
+    if args.soak:
+        from soak import main as soak_main
+        sys.exit(soak_main(['--duration', str(args.soak)]))
+    
     if args.list_cameras:
         print("🔍 Scanning for available cameras...")
         cameras = CameraManager.list_available_cameras()
@@ -261,6 +682,7 @@ def main():
         print("🧪 Testing notification systems...")
         notifier = NotificationSystem()
         notifier.test_notifications()
+        notifier.shutdown()  # Wait for queued sends
         return
     
     if args.test_alarm:
@@ -283,12 +705,14 @@ def main():
     print("====================================")
     
     # Check configuration
-    if not Config.EMAIL_RECIPIENTS and not Config.WHATSAPP_RECIPIENTS:
-        print("⚠️ WARNING: No notification recipients configured!")
-        print("Please edit .env file to add email and/or WhatsApp recipients.")
+    if (not Config.AGGREGATOR_ADDRESS and not Config.EMAIL_RECIPIENTS and not Config.WHATSAPP_RECIPIENTS
+            and not Config.WEBHOOK_URLS):
+        logger.warning("No notification recipients configured! "
+                       "Please edit .env file to add email and/or WhatsApp recipients or webhook URLs.")
     
     # Start the application
-    app = HumanDetectionApp(camera_index=args.camera, headless=args.headless)
+    app = HumanDetectionApp(camera_index=args.camera, headless=args.headless,
+                            profile_duration=args.profile)
     app.start()
 
 if __name__ == "__main__":
@@ -0,0 +1,304 @@
+"""
+Built-in media server for alert images.
+
+Twilio (and any other provider that takes media URLs) downloads images
+itself, so they must be reachable over HTTP. Instead of uploading every
+snapshot to a third party, the notification system can publish it here and
+hand out a URL to this process:
+
+    signed URLs     /media/<sha256><ext>?expires=<unix time>&sig=<HMAC>; a
+                    URL cannot be guessed, altered or used after it expires
+    caching         ETag (the content hash) with If-None-Match, single
+                    byte ranges (Range / 206) and immutable Cache-Control
+    size limit      images are kept in memory, or in a directory if
+                    MEDIA_SERVER_DIR is set, up to MEDIA_SERVER_MAX_MB;
+                    expired images go first, then the least recently used
+
+Images are keyed by content hash, so the same snapshot published for
+several channels or outbox retries is stored once. MEDIA_SERVER_PUBLIC_URL
+must be the address providers reach this server at (port forward or reverse
+proxy); the server itself listens on MEDIA_SERVER_HOST:MEDIA_SERVER_PORT.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'image/jpeg': '.jpg', 'image/webp': '.webp', 'image/png': '.png'}
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
+PATH_PATTERN = re.compile(r'/media/([0-9a-f]{64})(\.[a-z]+)?$')
+
+
+class _StoredImage:
+    def __init__(self, digest, mime, size, data, path, expires):
+        self.digest = digest
+        self.mime = mime
+        self.size = size
+        self.data = data  # None when stored on disk
+        self.path = path
+        self.expires = expires  # latest expiry of any URL handed out
+
+
+class _MediaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, headers=None, body=b''):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD' and body:
+            self.wfile.write(body)
+
+    def _serve(self):
+        server = self.server.media_server
+        url = urlparse(self.path)
+        match = PATH_PATTERN.match(url.path)
+        if not match:
+            self._send(404)
+            return
+        digest = match.group(1)
+        query = parse_qs(url.query)
+        status = server.check_signature(digest, query.get('expires', [''])[0], query.get('sig', [''])[0])
+        if status != 200:
+            self._send(status)
+            return
+
+        found = server.read(digest)
+        if found is None:
+            self._send(404)
+            return
+        item, data = found
+        headers = {
+            'Content-Type': item.mime,
+            'ETag': f'"{digest}"',
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': f"private, max-age={max(0, int(item.expires - time.time()))}, immutable",
+        }
+        if self.headers.get('If-None-Match') in (f'"{digest}"', '*'):
+            server.count('not_modified')
+            self._send(304, headers)
+            return
+
+        byte_range = self.headers.get('Range')
+        if byte_range:
+            match = RANGE_PATTERN.match(byte_range.strip())
+            start, end = None, None
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), len(data) - 1) if match.group(2) else len(data) - 1
+                else:  # suffix range: the last N bytes
+                    start, end = max(0, len(data) - int(match.group(2))), len(data) - 1
+            if start is None or start > end:
+                self._send(416, {'Content-Range': f"bytes */{len(data)}"})
+                return
+            headers['Content-Range'] = f"bytes {start}-{end}/{len(data)}"
+            server.count('partial', end - start + 1)
+            self._send(206, headers, data[start:end + 1])
+            return
+
+        server.count('served', len(data))
+        self._send(200, headers, data)
+
+    do_GET = do_HEAD = _serve
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MediaServer:
+    def __init__(self, host=None, port=None, public_url=None, secret=None, ttl=None, max_bytes=None,
+                 directory=None):
+        """
+        Initialize the server (call start() to listen).
+
+        Args:
+            host: Listen address (default from config)
+            port: Listen port, 0 for any free port (default from config)
+            public_url: Base URL providers fetch media from (default from config,
+                or the listen address, which only local clients can reach)
+            secret: HMAC key for signing URLs (default from config; random per
+                process if not set, so URLs do not survive a restart)
+            ttl: Seconds a URL stays valid (default from config)
+            max_bytes: Total size of stored images (default from config)
+            directory: Store images as files here instead of in memory (default from config)
+        """
+        self.host = host if host is not None else Config.MEDIA_SERVER_HOST
+        self.port = port if port is not None else Config.MEDIA_SERVER_PORT
+        self.public_url = public_url if public_url is not None else Config.MEDIA_SERVER_PUBLIC_URL
+        secret = secret if secret is not None else Config.MEDIA_SERVER_SECRET
+        self.secret = (secret or secrets.token_hex(32)).encode()
+        self.ttl = ttl if ttl is not None else Config.MEDIA_URL_TTL
+        self.max_bytes = max_bytes if max_bytes is not None else int(Config.MEDIA_SERVER_MAX_MB * 1024 * 1024)
+        self.directory = directory if directory is not None else Config.MEDIA_SERVER_DIR
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.images = OrderedDict()  # digest -> _StoredImage, least recently used first
+        self.stored_bytes = 0
+        self.server = None
+        self.thread = None
+
+        # Statistics
+        self.stats = {'published': 0, 'deduplicated': 0, 'evicted': 0, 'served': 0, 'partial': 0,
+                      'not_modified': 0, 'rejected': 0, 'bytes_served': 0}
+
+    def start(self):
+        """Start listening."""
+        self.server = _ThreadingHTTPServer((self.host, self.port), _MediaRequestHandler)
+        self.server.media_server = self
+        self.port = self.server.server_address[1]
+        if not self.public_url:
+            self.public_url = f"http://{'127.0.0.1' if self.host in ('', '0.0.0.0') else self.host}:{self.port}"
+            logger.warning("⚠️ MEDIA_SERVER_PUBLIC_URL is not set: media URLs point at %s, "
+                           "which Twilio cannot reach", self.public_url)
+        self.public_url = self.public_url.rstrip('/')
+        self.thread = threading.Thread(target=self.server.serve_forever, name='media-server')
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info("🖼️ Media server listening on %s:%s, URLs at %s", self.host, self.port, self.public_url)
+        return self
+
+    def stop(self):
+        """Stop the server and drop stored images."""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        with self.lock:
+            for item in self.images.values():
+                self._delete(item)
+            self.images.clear()
+            self.stored_bytes = 0
+
+    def _sign(self, digest, expires):
+        return hmac.new(self.secret, f"{digest}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def check_signature(self, digest, expires, signature):
+        """
+        Validate a request's URL parameters.
+
+        Returns:
+            int: 200 if valid, 403 for a bad signature, 410 if expired
+        """
+        status = 200
+        if not expires.isdigit() or not hmac.compare_digest(self._sign(digest, expires), signature):
+            status = 403
+        elif int(expires) < time.time():
+            status = 410
+        if status != 200:
+            self.count('rejected')
+        return status
+
+    def publish(self, image, ttl=None):
+        """
+        Store an image and return a signed URL for it.
+
+        Args:
+            image: Encoded image with .data and .mime
+            ttl: Seconds the URL stays valid (default: the server's)
+
+        Returns:
+            str: URL, or None if the image is larger than the store
+        """
+        if len(image.data) > self.max_bytes:
+            logger.warning("Image of %.0f KB exceeds the media store limit", len(image.data) / 1024)
+            return None
+        digest = hashlib.sha256(image.data).hexdigest()
+        expires = int(time.time() + (ttl if ttl is not None else self.ttl))
+        ext = EXTENSIONS.get(image.mime, '')
+
+        with self.lock:
+            self.stats['published'] += 1
+            item = self.images.get(digest)
+            if item is not None:
+                self.stats['deduplicated'] += 1
+                item.expires = max(item.expires, expires)
+                self.images.move_to_end(digest)
+            else:
+                self._make_room(len(image.data))
+                path = None
+                if self.directory:
+                    path = os.path.join(self.directory, digest + ext)
+                    with open(path, 'wb') as f:
+                        f.write(image.data)
+                item = _StoredImage(digest, image.mime, len(image.data), None if path else image.data,
+                                    path, expires)
+                self.images[digest] = item
+                self.stored_bytes += item.size
+        return f"{self.public_url}/media/{digest}{ext}?expires={expires}&sig={self._sign(digest, expires)}"
+
+    def _make_room(self, size):
+        """Evict expired images, then the least recently used, until `size` more bytes fit."""
+        now = time.time()
+        for digest in [digest for digest, item in self.images.items() if item.expires < now]:
+            self._evict(digest)
+        while self.images and self.stored_bytes + size > self.max_bytes:
+            self._evict(next(iter(self.images)))
+
+    def _evict(self, digest):
+        item = self.images.pop(digest)
+        self.stored_bytes -= item.size
+        self.stats['evicted'] += 1
+        self._delete(item)
+
+    @staticmethod
+    def _delete(item):
+        if item.path:
+            try:
+                os.remove(item.path)
+            except OSError:
+                pass
+
+    def read(self, digest):
+        """
+        Get a stored image and its bytes.
+
+        Returns:
+            tuple: (_StoredImage, bytes), or None if it is not (or no longer) stored
+        """
+        with self.lock:
+            item = self.images.get(digest)
+            if item is None:
+                return None
+            self.images.move_to_end(digest)
+            if item.data is not None:
+                return item, item.data
+        try:
+            with open(item.path, 'rb') as f:
+                return item, f.read()
+        except OSError:
+            return None  # evicted while being read
+
+    def count(self, name, nbytes=0):
+        with self.lock:
+            self.stats[name] += 1
+            self.stats['bytes_served'] += nbytes
+
+    def get_stats(self):
+        """Get storage and request statistics."""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['images'] = len(self.images)
+            stats['stored_bytes'] = self.stored_bytes
+            return stats
@@ -0,0 +1,277 @@
+"""
+Publishing alert images at public URLs for WhatsApp media.
+
+Twilio downloads media itself, so an image must be uploaded to a public
+host before its message is sent. MediaUploader makes that fast and cheap:
+
+    pooled session  one keep-alive HTTP session for all uploads, instead of a
+                    new connection (and TLS handshake) per image
+    hedging         the next provider is started when the current one has not
+                    answered within its recent MEDIA_HEDGE_PERCENTILE latency,
+                    or immediately when it fails; the first URL wins
+    dedupe          URLs are cached by the SHA-256 of the image bytes, and
+                    concurrent uploads of the same bytes share one request, so
+                    a snapshot is uploaded once across channels and retries
+
+Providers (ImgBB, Cloudinary) take their endpoint URLs from config, so tests
+and benchmarks can point them at local stand-ins.
+"""
+
+import base64
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 100
+MIN_LATENCY_SAMPLES = 5  # below this, the hedge waits MEDIA_HEDGE_INITIAL_DELAY
+
+
+class UploadError(Exception):
+    """Raised when a provider did not return a URL for an image."""
+
+
+class ImgBBProvider:
+    name = 'imgbb'
+
+    def __init__(self, api_key, url=None):
+        """
+        Args:
+            api_key: ImgBB API key
+            url: Upload endpoint (default from config)
+        """
+        self.api_key = api_key
+        self.url = url or Config.IMGBB_UPLOAD_URL
+
+    def upload(self, session, image, timeout):
+        """
+        Upload one image.
+
+        Returns:
+            str: Public URL
+
+        Raises:
+            UploadError: If the upload was rejected
+        """
+        data = {'key': self.api_key, 'image': base64.b64encode(image.data).decode(), 'name': image.filename}
+        response = session.post(self.url, data=data, timeout=timeout)
+        if response.status_code != 200:
+            raise UploadError(f"ImgBB: HTTP {response.status_code}")
+        result = response.json()
+        if not result.get('success'):
+            raise UploadError(f"ImgBB: {result.get('error', {}).get('message', 'Unknown error')}")
+        return result['data']['url']
+
+
+class CloudinaryProvider:
+    name = 'cloudinary'
+
+    def __init__(self, url=None, upload_preset=None):
+        """
+        Args:
+            url: Upload endpoint (default from config)
+            upload_preset: Unsigned upload preset (default from config)
+        """
+        self.url = url or Config.CLOUDINARY_UPLOAD_URL
+        self.upload_preset = upload_preset or Config.CLOUDINARY_UPLOAD_PRESET
+
+    def upload(self, session, image, timeout):
+        """
+        Upload one image.
+
+        Returns:
+            str: Public URL
+
+        Raises:
+            UploadError: If the upload was rejected
+        """
+        files = {'file': (image.filename, image.data, image.mime)}
+        response = session.post(self.url, data={'upload_preset': self.upload_preset}, files=files, timeout=timeout)
+        if response.status_code != 200:
+            raise UploadError(f"Cloudinary: HTTP {response.status_code}")
+        url = response.json().get('secure_url')
+        if not url:
+            raise UploadError("Cloudinary: No URL returned")
+        return url
+
+
+class MediaUploader:
+    def __init__(self, providers, timeout=None, hedge_percentile=None, hedge_min_delay=None,
+                 hedge_initial_delay=None, cache_size=None, max_workers=None):
+        """
+        Initialize the uploader.
+
+        Args:
+            providers: Providers in order of preference (first = primary)
+            timeout: HTTP timeout per upload in seconds (default from config)
+            hedge_percentile: Latency percentile of a provider after which the next
+                one is started (default from config; 0 = only after a failure)
+            hedge_min_delay: Lower bound of the hedge delay in seconds (default from config)
+            hedge_initial_delay: Hedge delay until enough latencies are known (default from config)
+            cache_size: Image hashes whose URLs are remembered (default from config)
+            max_workers: Concurrent upload requests (default from config)
+        """
+        self.providers = list(providers)
+        self.timeout = timeout if timeout is not None else Config.MEDIA_UPLOAD_TIMEOUT
+        self.hedge_percentile = hedge_percentile if hedge_percentile is not None else Config.MEDIA_HEDGE_PERCENTILE
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else Config.MEDIA_HEDGE_MIN_DELAY
+        self.hedge_initial_delay = (hedge_initial_delay if hedge_initial_delay is not None
+                                    else Config.MEDIA_HEDGE_INITIAL_DELAY)
+        self.cache_size = cache_size if cache_size is not None else Config.MEDIA_CACHE_SIZE
+        max_workers = max_workers if max_workers is not None else Config.MEDIA_UPLOAD_WORKERS
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_workers, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='media-upload')
+
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # sha256 -> URL, least recently used first
+        self.in_flight = {}  # sha256 -> Future of the upload in progress
+        self.latencies = {provider.name: deque(maxlen=LATENCY_SAMPLES) for provider in self.providers}
+
+        # Statistics
+        self.uploads = 0
+        self.cache_hits = 0
+        self.shared = 0
+        self.hedged = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+        self.wins = {provider.name: 0 for provider in self.providers}
+
+    def set_primary(self, name):
+        """Move the named provider to the front of the preference order."""
+        self.providers.sort(key=lambda provider: provider.name != name)
+
+    def upload(self, image, providers=None):
+        """
+        Publish an image, reusing the URL of identical bytes uploaded before.
+
+        Args:
+            image: Encoded image with .data, .filename and .mime
+            providers: Providers to use instead of the configured order
+
+        Returns:
+            str: Public URL, or None if every provider failed
+        """
+        digest = hashlib.sha256(image.data).hexdigest()
+        with self.lock:
+            url = self.cache.get(digest)
+            if url is not None:
+                self.cache.move_to_end(digest)
+                self.cache_hits += 1
+                return url
+            future = self.in_flight.get(digest)
+            owner = future is None
+            if owner:
+                future = self.in_flight[digest] = Future()
+            else:
+                self.shared += 1
+
+        if not owner:
+            # Another channel or retry is uploading the same bytes: wait for its URL
+            return future.result()
+
+        url = None
+        try:
+            url = self._upload_hedged(image, providers or self.providers)
+        finally:
+            with self.lock:
+                del self.in_flight[digest]
+                if url is not None:
+                    self.cache[digest] = url
+                    while len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+                else:
+                    self.failed += 1
+            future.set_result(url)
+        return url
+
+    def _hedge_delay(self, provider):
+        """Seconds to wait for a provider before also starting the next one."""
+        if not self.hedge_percentile:
+            return None
+        with self.lock:
+            samples = sorted(self.latencies[provider.name])
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return max(self.hedge_min_delay, self.hedge_initial_delay)
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return max(self.hedge_min_delay, samples[index])
+
+    def _upload_one(self, provider, image):
+        start = time.perf_counter()
+        url = provider.upload(self.session, image, self.timeout)
+        with self.lock:
+            # Recorded even when a hedge already won, so slow providers keep their true latency
+            self.latencies[provider.name].append(time.perf_counter() - start)
+            self.uploads += 1
+            self.bytes_uploaded += len(image.data)
+        return url
+
+    def _upload_hedged(self, image, providers):
+        """Race the providers in order, starting the next on a failure or a hedge timeout."""
+        waiting = list(providers)
+        running = {}  # Future -> provider
+        start_next = True
+        while True:
+            if start_next and waiting:
+                provider = waiting.pop(0)
+                if running:
+                    with self.lock:
+                        self.hedged += 1
+                    logger.info("🔀 %s slow, also uploading to %s", ', '.join(p.name for p in running.values()),
+                                provider.name)
+                running[self.executor.submit(self._upload_one, provider, image)] = provider
+                hedge_after = self._hedge_delay(provider) if waiting else None
+            if not running:
+                return None
+
+            done, _ = wait(running, timeout=hedge_after, return_when=FIRST_COMPLETED)
+            start_next = True  # hedge timeout, or a failure below: bring in the next provider
+            for future in done:
+                provider = running.pop(future)
+                try:
+                    url = future.result()
+                except Exception as e:
+                    logger.warning("Upload to %s failed: %s", provider.name, e)
+                    continue
+                with self.lock:
+                    self.wins[provider.name] += 1
+                logger.info("Image uploaded to %s: %s", provider.name, url)
+                return url
+            if not waiting:
+                hedge_after = None
+
+    def close(self):
+        """Release connections; uploads still running finish in the background."""
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def get_stats(self):
+        """Get upload, cache and hedging statistics."""
+        with self.lock:
+            latency_p95 = {}
+            for name, samples in self.latencies.items():
+                samples = sorted(samples)
+                latency_p95[name] = samples[int(len(samples) * 0.95)] if samples else 0.0
+            return {
+                'uploads': self.uploads,
+                'bytes_uploaded': self.bytes_uploaded,
+                'cache_hits': self.cache_hits,
+                'shared': self.shared,
+                'cached_urls': len(self.cache),
+                'hedged': self.hedged,
+                'failed': self.failed,
+                'wins': dict(self.wins),
+                'latency_p95': latency_p95,
+            }
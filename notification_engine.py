@@ -0,0 +1,292 @@
+"""
+Asyncio notification engine.
+
+All notification channels share one event loop in one thread instead of a
+pool of threads blocked on network I/O. Each channel has its own
+concurrency limit (a semaphore) and a timeout per job, so a slow SMTP server
+cannot hold back WhatsApp or webhook deliveries and a hung request is
+cancelled instead of occupying a sender forever.
+
+The submit API is thread-safe and never blocks: the detection loop (or any
+other thread) hands a coroutine function and its arguments to the engine,
+which starts it on the loop. Like WorkerPool:
+
+    submit     drops the job if the channel already has `capacity` jobs waiting
+    schedule   runs the job after a delay and is never dropped
+    shutdown   stops accepting jobs, starts delayed jobs immediately and waits
+               for everything in flight
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Channel:
+    def __init__(self, name, concurrency, timeout, capacity):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.capacity = capacity
+        self.semaphore = None  # created on the loop
+        self.waiting = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.dropped = 0
+
+
+class AsyncNotificationEngine:
+    def __init__(self, name='notify-async'):
+        """
+        Start the event loop thread. Channels are added with add_channel.
+
+        Args:
+            name: Name of the loop thread
+        """
+        self.name = name
+        self.channels = {}
+        self.accepting = True
+        self.lock = threading.Lock()
+
+        # Loop-side state
+        self.tasks = set()
+        self.timers = {}  # job id -> (TimerHandle, job)
+        self.job_ids = itertools.count()
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.pending = 0  # accepted and not finished, including delayed jobs
+        self.max_queue_depth = 0
+        self.latencies = []  # recent job run times in seconds
+        self.queue_waits = []  # recent submit-to-start times in seconds
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def add_channel(self, name, concurrency, timeout=None, capacity=100):
+        """
+        Register a channel.
+
+        Args:
+            name: Channel name used in submit/schedule
+            concurrency: Maximum jobs of this channel running at once
+            timeout: Seconds after which a running job is cancelled (None = no limit)
+            capacity: Maximum jobs waiting for a slot before submit drops new ones
+        """
+        self.channels[name] = _Channel(name, concurrency, timeout, capacity)
+
+    def submit(self, channel, fn, *args):
+        """
+        Run a coroutine function on the loop. Thread-safe and non-blocking.
+
+        Args:
+            channel: Registered channel name
+            fn: Coroutine function; a return value of False counts as a failure
+
+        Returns:
+            bool: True if the job was accepted
+        """
+        return self._accept(channel, fn, args, 0.0, droppable=True)
+
+    def schedule(self, delay, channel, fn, *args):
+        """
+        Run a coroutine function on the loop after a delay. Thread-safe; never dropped.
+
+        Returns:
+            bool: True if the job was accepted (False once shutting down)
+        """
+        return self._accept(channel, fn, args, delay, droppable=False)
+
+    def _accept(self, channel_name, fn, args, delay, droppable):
+        channel = self.channels[channel_name]
+        with self.lock:
+            if not self.accepting:
+                return False
+            self.submitted += 1
+            if droppable and channel.waiting >= channel.capacity:
+                self.dropped += 1
+                channel.dropped += 1
+                return False
+            channel.waiting += 1
+            self.pending += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.pending)
+        job = (channel, fn, args, time.monotonic() + delay)
+        self.loop.call_soon_threadsafe(self._enqueue, job, delay)
+        return True
+
+    def _enqueue(self, job, delay):
+        """Start a job now or arm its timer (runs on the loop)."""
+        if delay > 0 and self.accepting:
+            job_id = next(self.job_ids)
+            handle = self.loop.call_later(delay, self._fire, job_id)
+            self.timers[job_id] = (handle, job)
+        else:
+            self._start(job)
+
+    def _fire(self, job_id):
+        _, job = self.timers.pop(job_id)
+        self._start(job)
+
+    def _start(self, job):
+        task = self.loop.create_task(self._run(*job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, channel, fn, args, due):
+        if channel.semaphore is None:
+            channel.semaphore = asyncio.Semaphore(channel.concurrency)
+        started_at, ok = None, False
+        try:
+            async with channel.semaphore:
+                started_at = time.monotonic()
+                with self.lock:
+                    channel.waiting -= 1
+                    channel.in_flight += 1
+                    channel.max_in_flight = max(channel.max_in_flight, channel.in_flight)
+                try:
+                    result = await asyncio.wait_for(fn(*args), channel.timeout)
+                    ok = result is not False
+                except asyncio.TimeoutError:
+                    logger.warning("%s job %s timed out after %ss", channel.name, getattr(fn, '__name__', fn),
+                                   channel.timeout)
+                    channel.timeouts += 1
+                except Exception as e:
+                    logger.error("%s %s job %s failed: %s", self.name, channel.name, getattr(fn, '__name__', fn), e)
+                finally:
+                    with self.lock:
+                        channel.in_flight -= 1
+                        self._record_sample(self.latencies, time.monotonic() - started_at)
+                        self._record_sample(self.queue_waits, max(0.0, started_at - due))
+        finally:
+            # Also reached when the job is cancelled at shutdown
+            with self.lock:
+                if started_at is None:
+                    channel.waiting -= 1
+                self.pending -= 1
+                if ok:
+                    self.completed += 1
+                    channel.completed += 1
+                else:
+                    self.failed += 1
+                    channel.failed += 1
+
+    @staticmethod
+    def _record_sample(samples, value, limit=1000):
+        samples.append(value)
+        if len(samples) > limit:
+            del samples[:limit // 2]
+
+    def run(self, coro, timeout=None):
+        """
+        Run a coroutine on the loop from another thread and wait for its result.
+
+        Raises:
+            concurrent.futures.TimeoutError: If it did not finish in time
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def _drain(self, timeout):
+        """
+        Start delayed jobs now and wait until no job is left; cancel what is
+        still running at the timeout (runs on the loop).
+
+        Returns:
+            bool: True if every job finished in time
+        """
+        for handle, job in self.timers.values():
+            handle.cancel()
+            self._start(job)
+        self.timers.clear()
+        deadline = time.monotonic() + timeout
+        while self.tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.wait(set(self.tasks), timeout=remaining)
+        if not self.tasks:
+            return True
+        logger.warning("%s: cancelling %d job(s) still running at shutdown", self.name, len(self.tasks))
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.wait(set(self.tasks))
+        return False
+
+    def shutdown(self, timeout=10.0, cleanup=None):
+        """
+        Stop accepting jobs, finish queued and delayed jobs, and stop the loop.
+
+        Args:
+            timeout: Maximum seconds to wait for the drain
+            cleanup: Optional coroutine function run on the loop after the drain
+                (e.g. closing client sessions)
+
+        Returns:
+            bool: True if everything drained in time
+        """
+        with self.lock:
+            if not self.accepting:
+                return True
+            self.accepting = False
+        deadline = time.monotonic() + timeout
+
+        try:
+            drained = self.run(self._drain(timeout), timeout + 5.0)
+        except Exception as e:
+            drained = False
+            logger.warning("%s: shutdown did not complete: %s", self.name, e)
+        if cleanup is not None:
+            try:
+                self.run(cleanup(), max(1.0, deadline - time.monotonic()))
+            except Exception as e:
+                logger.warning("%s: cleanup failed: %s", self.name, e)
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=max(1.0, deadline - time.monotonic()))
+        return drained
+
+    def get_stats(self):
+        """Get the same queue, throughput and latency metrics as WorkerPool, plus per-channel counters."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            waits = sorted(self.queue_waits)
+            return {
+                'workers': 1,
+                'queue_depth': sum(channel.waiting for channel in self.channels.values()) - len(self.timers),
+                'max_queue_depth': self.max_queue_depth,
+                'delayed_jobs': len(self.timers),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'latency_avg': sum(latencies) / len(latencies) if latencies else 0.0,
+                'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+                'latency_max': latencies[-1] if latencies else 0.0,
+                'queue_wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+                'channels': {name: {
+                    'concurrency': channel.concurrency,
+                    'waiting': channel.waiting,
+                    'in_flight': channel.in_flight,
+                    'max_in_flight': channel.max_in_flight,
+                    'completed': channel.completed,
+                    'failed': channel.failed,
+                    'timeouts': channel.timeouts,
+                    'dropped': channel.dropped,
+                } for name, channel in self.channels.items()},
+            }
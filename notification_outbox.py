@@ -0,0 +1,349 @@
+"""
+Durable notification outbox.
+
+Every alert is committed to a SQLite database before any channel sends it,
+with one delivery row per channel. Deliveries carry an idempotency key
+(alert id + channel) that is passed to providers that honour one (email
+Message-ID, webhook Idempotency-Key), are retried with exponential backoff and
+jitter until OUTBOX_MAX_ATTEMPTS, and anything still pending when the process
+exits (crash, kill, outage) is replayed on the next start. A delivery whose
+outcome is unknown (a WhatsApp request that timed out after it was sent) is
+marked as such and not resent, since the Messages API cannot deduplicate it.
+
+A single writer thread owns all writes. It takes everything queued since its
+last commit and writes it in one transaction (group commit), so a burst of
+alerts costs one fsync rather than one per alert, while an isolated alert is
+committed immediately.
+"""
+
+import json
+import logging
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from alert_snapshot import AlertSnapshot
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    subject TEXT,
+    message TEXT NOT NULL,
+    image BLOB,
+    detections TEXT
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    alert_id TEXT NOT NULL REFERENCES alerts (id),
+    channel TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    recipients TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_status ON deliveries (status, next_attempt);
+"""
+
+PENDING, SENT, FAILED, UNKNOWN = 'pending', 'sent', 'failed', 'unknown'
+
+
+class NotificationOutbox:
+    def __init__(self, db_path=None, on_recorded=None, max_attempts=None, backoff_base=None,
+                 backoff_max=None, retention_days=None, batch_size=500):
+        """
+        Open (or create) the outbox and start the writer thread.
+
+        Args:
+            db_path: SQLite database path (default from config)
+            on_recorded: Called with each delivery dict once it is committed. If the
+                commit fails, it is called anyway with the delivery's key cleared:
+                the alert is then sent once, without retries, rather than lost
+            max_attempts: Attempts per delivery before giving up (default from config)
+            backoff_base: Delay before the first retry in seconds (default from config)
+            backoff_max: Maximum delay between retries in seconds (default from config)
+            retention_days: Days finished deliveries are kept (default from config)
+            batch_size: Maximum operations per group commit
+        """
+        self.db_path = db_path if db_path is not None else Config.OUTBOX_DB_PATH
+        self.on_recorded = on_recorded
+        self.max_attempts = max_attempts if max_attempts is not None else Config.OUTBOX_MAX_ATTEMPTS
+        self.backoff_base = backoff_base if backoff_base is not None else Config.OUTBOX_BACKOFF_BASE
+        self.backoff_max = backoff_max if backoff_max is not None else Config.OUTBOX_BACKOFF_MAX
+        retention_days = retention_days if retention_days is not None else Config.OUTBOX_RETENTION_DAYS
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._read_lock = threading.Lock()
+        self._closed_counts = None
+
+        # Statistics
+        self.recorded = 0
+        self.unrecorded = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.unknown = 0
+        self.commits = 0
+        self.operations_committed = 0
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        if 'detections' not in {row[1] for row in conn.execute("PRAGMA table_info(alerts)")}:
+            conn.execute("ALTER TABLE alerts ADD COLUMN detections TEXT")  # outboxes from older versions
+        cutoff = time.time() - retention_days * 86400
+        conn.execute("DELETE FROM deliveries WHERE status != ? AND updated < ?", (PENDING, cutoff))
+        conn.execute("DELETE FROM alerts WHERE id NOT IN (SELECT alert_id FROM deliveries)")
+        conn.commit()
+        self._reader = conn
+
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="outbox-writer")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    def _connect(self):
+        """Open a WAL connection; synchronous=FULL because these rows must survive power loss."""
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def record(self, message, channels, subject=None, snapshot=None):
+        """
+        Queue an alert for durable recording. Never blocks the caller; the JPEG
+        (if any) is encoded by the writer thread.
+
+        Args:
+            message: Alert text
+            channels: Dict of channel name -> list of recipients
+            subject: Optional subject (email)
+            snapshot: Optional AlertSnapshot shared by all channels
+
+        Returns:
+            str: Alert id
+        """
+        alert_id = uuid.uuid4().hex
+        now = time.time()
+        deliveries = [{
+            'id': None,
+            'alert_id': alert_id,
+            'channel': channel,
+            'key': f"{alert_id}:{channel}",
+            'subject': subject,
+            'message': message,
+            'snapshot': snapshot,
+            'recipients': list(recipients),
+            'attempts': 0,
+            'created': now,
+        } for channel, recipients in channels.items() if recipients]
+        if deliveries:
+            self._queue.put(('insert', deliveries))
+        return alert_id
+
+    def retry_delay(self, attempts):
+        """Exponential backoff with jitter for the given number of failed attempts."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def mark_sent(self, delivery):
+        """Record that every recipient of a delivery has been served."""
+        self.delivered += 1
+        self._update(delivery, SENT, None, [])
+
+    def mark_failed(self, delivery, remaining, error):
+        """Record that a delivery failed permanently (e.g. recipients rejected)."""
+        delivery['attempts'] += 1
+        self.failed += 1
+        self._update(delivery, FAILED, error, remaining)
+
+    def mark_unknown(self, delivery, remaining, error):
+        """Record that a delivery may or may not have been served, and must not be resent."""
+        delivery['attempts'] += 1
+        self.unknown += 1
+        self._update(delivery, UNKNOWN, error, remaining)
+
+    def mark_retry(self, delivery, remaining, error):
+        """
+        Record a failed attempt for the recipients still to be served.
+
+        Returns:
+            float: Seconds until the next attempt, or None if the delivery has given up
+        """
+        delivery['attempts'] += 1
+        delivery['recipients'] = list(remaining)
+        if delivery['attempts'] >= self.max_attempts:
+            self.failed += 1
+            self._update(delivery, FAILED, error, remaining)
+            return None
+        self.retried += 1
+        delay = self.retry_delay(delivery['attempts'])
+        self._update(delivery, PENDING, error, remaining, next_attempt=time.time() + delay)
+        return delay
+
+    def _update(self, delivery, status, error, remaining, next_attempt=None):
+        self._queue.put(('update', (status, delivery['attempts'], next_attempt or time.time(),
+                                    json.dumps(remaining), str(error) if error else None,
+                                    time.time(), delivery['key'])))
+
+    def pending(self):
+        """
+        Load deliveries that still have to be sent (used to replay after a restart).
+
+        Returns:
+            list: Delivery dicts, oldest first, with 'next_attempt' set
+        """
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT d.id, d.alert_id, d.channel, d.idempotency_key, d.recipients, d.attempts, "
+                "d.next_attempt, a.created, a.subject, a.message, a.image, a.detections "
+                "FROM deliveries d JOIN alerts a ON a.id = d.alert_id "
+                "WHERE d.status = ? ORDER BY d.id", (PENDING,)).fetchall()
+        return [{
+            'id': row[0],
+            'alert_id': row[1],
+            'channel': row[2],
+            'key': row[3],
+            'recipients': json.loads(row[4]),
+            'attempts': row[5],
+            'next_attempt': row[6],
+            'created': row[7],
+            'subject': row[8],
+            'message': row[9],
+            'snapshot': (AlertSnapshot.from_bytes(row[10], timestamp=row[7], detections=json.loads(row[11] or '[]'))
+                         if row[10] is not None else None),
+        } for row in rows]
+
+    def _write(self, conn, operations):
+        """Apply queued operations in one transaction; return the deliveries that were inserted."""
+        inserted = []
+        with conn:
+            for kind, payload in operations:
+                if kind == 'insert':
+                    first = payload[0]
+                    snapshot = first['snapshot']
+                    image, detections = None, None
+                    if snapshot is not None:
+                        detections = json.dumps([{'bbox': [int(v) for v in det['bbox']],
+                                                  'confidence': float(det['confidence'])}
+                                                 for det in snapshot.detections])
+                        try:
+                            image = snapshot.data
+                        except Exception as e:
+                            logger.warning("Could not encode alert image, recording text only: %s", e)
+                            for delivery in payload:
+                                delivery['snapshot'] = None
+                    conn.execute("INSERT INTO alerts (id, created, subject, message, image, detections) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)",
+                                 (first['alert_id'], first['created'], first['subject'], first['message'],
+                                  image, detections))
+                    for delivery in payload:
+                        cursor = conn.execute(
+                            "INSERT INTO deliveries (alert_id, channel, idempotency_key, recipients, "
+                            "next_attempt, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                            (delivery['alert_id'], delivery['channel'], delivery['key'],
+                             json.dumps(delivery['recipients']), delivery['created'], delivery['created']))
+                        delivery['id'] = cursor.lastrowid
+                        inserted.append(delivery)
+                else:
+                    conn.execute("UPDATE deliveries SET status = ?, attempts = ?, next_attempt = ?, recipients = ?, "
+                                 "last_error = ?, updated = ? WHERE idempotency_key = ?", payload)
+        return inserted
+
+    def _writer_loop(self):
+        """Group-commit everything queued since the last commit, then hand new deliveries on."""
+        conn = self._connect()
+        while True:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    break
+                continue
+
+            operations, waiters = [], []
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    operations.append(item)
+                if len(operations) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if operations:
+                try:
+                    inserted = self._write(conn, operations)
+                    self.commits += 1
+                    self.operations_committed += len(operations)
+                except sqlite3.Error as e:
+                    # Disk full, database locked...: send the new alerts once without the outbox
+                    inserted = [delivery for kind, payload in operations if kind == 'insert' for delivery in payload]
+                    logger.error("Outbox write failed, sending %d delivery(s) without retries: %s", len(inserted), e)
+                    for delivery in inserted:
+                        delivery['id'], delivery['key'] = None, None
+                        self.unrecorded += 1
+                for delivery in inserted:
+                    if delivery['key'] is not None:
+                        self.recorded += 1
+                    if self.on_recorded:
+                        self.on_recorded(delivery)
+
+            for waiter in waiters:
+                waiter.set()
+
+        conn.close()
+
+    def flush(self, timeout=5.0):
+        """
+        Block until everything queued so far has been committed.
+
+        Returns:
+            bool: True if the flush completed within the timeout
+        """
+        if not self._writer_thread.is_alive():
+            return False
+        marker = threading.Event()
+        self._queue.put(marker)
+        return marker.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Commit remaining updates and stop the writer thread."""
+        self.flush(timeout)
+        self._stop_event.set()
+        if self._writer_thread.is_alive():
+            self._writer_thread.join(timeout=timeout)
+        with self._read_lock:
+            self._closed_counts = self._status_counts()
+            self._reader.close()
+
+    def _status_counts(self):
+        return dict(self._reader.execute("SELECT status, COUNT(*) FROM deliveries GROUP BY status").fetchall())
+
+    def get_stats(self):
+        """Get outbox delivery and commit statistics."""
+        with self._read_lock:
+            counts = self._closed_counts if self._closed_counts is not None else self._status_counts()
+        return {
+            'recorded': self.recorded,
+            'unrecorded': self.unrecorded,
+            'delivered': self.delivered,
+            'retried': self.retried,
+            'failed': self.failed,
+            'unknown': self.unknown,
+            'pending': counts.get(PENDING, 0),
+            'commits': self.commits,
+            'operations_per_commit': self.operations_committed / self.commits if self.commits else 0.0,
+        }
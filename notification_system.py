@@ -1,18 +1,33 @@
-import smtplib
-import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
-from twilio.rest import Client
-import cv2
-import os
+import asyncio
+import logging
+import smtplib
 import threading
+import time
 from datetime import datetime
 from config import Config
+from alert_snapshot import AlertSnapshot
+from snapshot_encoder import EncodingProfile
+from worker_pool import WorkerPool
+from smtp_pool import SMTPConnectionPool
+from whatsapp_client import TwilioWhatsAppClient, WhatsAppSendError
+from webhook_client import WebhookClient, WebhookError, build_webhook_payload
+from notification_outbox import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ('threads', 'asyncio')
 
 class NotificationSystem:
-    def __init__(self):
-        """Initialize notification system."""
+    def __init__(self, outbox_path=None):
+        """
+        Initialize notification system.
+        
+        Args:
+            outbox_path: Notification outbox database path (default from config)
+        """
         self.email_sender = Config.EMAIL_SENDER
         self.email_password = Config.EMAIL_PASSWORD
         self.email_recipients = Config.EMAIL_RECIPIENTS
@@ -21,140 +36,519 @@ class NotificationSystem:
         self.twilio_auth_token = Config.TWILIO_AUTH_TOKEN
         self.twilio_whatsapp_from = Config.TWILIO_WHATSAPP_FROM
         self.whatsapp_recipients = Config.WHATSAPP_RECIPIENTS
+        self.webhook_urls = Config.WEBHOOK_URLS
         
-        # Initialize Twilio client
+        # Initialize Twilio client (shared keep-alive session, concurrent fan-out)
         if self.twilio_account_sid and self.twilio_auth_token:
-            self.twilio_client = Client(self.twilio_account_sid, self.twilio_auth_token)
+            self.twilio_client = TwilioWhatsAppClient(self.twilio_account_sid, self.twilio_auth_token,
+                                                      self.twilio_whatsapp_from)
         else:
             self.twilio_client = None
-            print("⚠️ Twilio credentials not configured. WhatsApp notifications disabled.")
+            logger.warning("Twilio credentials not configured. WhatsApp notifications disabled.")
+        
+        # Persistent SMTP sessions (connected on first use)
+        self.smtp_pool = SMTPConnectionPool(username=self.email_sender, password=self.email_password)
+        self.webhook_client = WebhookClient()
+        
+        # Fixed set of sender threads shared by all channels
+        self.pool = WorkerPool('notify',
+                               num_workers=Config.NOTIFICATION_WORKERS,
+                               capacity=Config.NOTIFICATION_QUEUE_SIZE,
+                               overflow_policy=Config.NOTIFICATION_OVERFLOW_POLICY)
+        
+        # Per-channel snapshot encoding (crops, size, quality) and its cost
+        self.encoding_profiles = {
+            'email': EncodingProfile.parse('email', Config.SNAPSHOT_PROFILE_EMAIL),
+            'whatsapp': EncodingProfile.parse('whatsapp', Config.SNAPSHOT_PROFILE_WHATSAPP),
+            'webhook': EncodingProfile.parse('webhook', Config.SNAPSHOT_PROFILE_WEBHOOK),
+        }
+        self.encoding_stats = {channel: {'alerts': 0, 'images': 0, 'bytes': 0, 'encode_time': 0.0}
+                               for channel in self.encoding_profiles}
+        self.encoding_lock = threading.Lock()
+        
+        # Optional asyncio engine: every channel's network I/O on one event loop
+        if Config.NOTIFICATION_ENGINE not in ENGINES:
+            raise ValueError(f"Unknown notification engine {Config.NOTIFICATION_ENGINE!r}, expected one of {ENGINES}")
+        self.engine = None
+        if Config.NOTIFICATION_ENGINE == 'asyncio':
+            self._start_engine()
+        
+        # Optional built-in server publishing WhatsApp images at signed URLs
+        self.media_server = None
+        if Config.MEDIA_SERVER_ENABLED:
+            from media_server import MediaServer
+            self.media_server = MediaServer().start()
+        
+        # Durable outbox: alerts are committed before sending and replayed after a restart
+        self.outbox = None
+        if Config.OUTBOX_ENABLED:
+            self.outbox = NotificationOutbox(outbox_path, on_recorded=self._schedule_delivery)
+            self._replay_outbox()
+    
+    def _start_engine(self):
+        """Start the event loop with per-channel limits and the non-blocking channel clients."""
+        from async_channels import AsyncSMTPClient, AsyncTwilioWhatsAppClient, AsyncWebhookClient
+        from notification_engine import AsyncNotificationEngine
+        
+        self.engine = AsyncNotificationEngine()
+        capacity = Config.NOTIFICATION_QUEUE_SIZE
+        self.engine.add_channel('email', Config.SMTP_POOL_SIZE, Config.SMTP_SEND_TIMEOUT, capacity)
+        self.engine.add_channel('whatsapp', Config.WHATSAPP_MAX_CONCURRENCY, Config.WHATSAPP_SEND_TIMEOUT, capacity)
+        self.engine.add_channel('webhook', Config.WEBHOOK_MAX_CONCURRENCY, Config.WEBHOOK_SEND_TIMEOUT, capacity)
+        
+        self.async_smtp = AsyncSMTPClient(username=self.email_sender, password=self.email_password)
+        self.async_twilio = (AsyncTwilioWhatsAppClient(self.twilio_account_sid, self.twilio_auth_token,
+                                                       self.twilio_whatsapp_from)
+                             if self.twilio_client else None)
+        self.async_webhooks = AsyncWebhookClient()
+    
+    async def _close_async_clients(self):
+        """Close the asyncio clients' connections (runs on the engine's loop)."""
+        await self.async_smtp.close()
+        if self.async_twilio:
+            await self.async_twilio.close()
+        await self.async_webhooks.close()
+    
+    @staticmethod
+    def _recipients(values):
+        """Configured recipients without blanks."""
+        return [value.strip() for value in values if value.strip()]
+    
+    @staticmethod
+    def _as_snapshot(image):
+        """Accept an AlertSnapshot or an image file path."""
+        if image is None or isinstance(image, AlertSnapshot):
+            return image
+        return AlertSnapshot.from_file(image)
+    
+    def _encode_for(self, channel, snapshot):
+        """
+        Get the channel's encoding of a snapshot and account for its size and encode time.
+        
+        Returns:
+            EncodedSnapshot
+        """
+        encoded = snapshot.encode(self.encoding_profiles[channel])
+        with self.encoding_lock:
+            stats = self.encoding_stats[channel]
+            stats['alerts'] += 1
+            stats['images'] += len(encoded.images)
+            stats['bytes'] += encoded.bytes
+            if not encoded.accounted:  # retries and channels with identical profiles reuse the encode
+                encoded.accounted = True
+                stats['encode_time'] += encoded.encode_time
+        logger.debug("📦 %s: %d image(s), %.0f KB, encoded in %.0f ms",
+                     channel, len(encoded.images), encoded.bytes / 1024, encoded.encode_time * 1000)
+        return encoded
+    
+    def _get_media_url(self, image):
+        """
+        Return a URL Twilio can fetch the image from, or None to send text only.
+        
+        Twilio downloads media itself, so local files cannot be attached: the
+        image is served by the built-in media server if it is enabled.
+        Subclasses that publish images elsewhere (e.g. cloud storage) override this.
+        
+        Args:
+            image: Encoded image with .data, .filename and .mime
+        """
+        if self.media_server:
+            return self.media_server.publish(image)
+        return None
+    
+    def _publish_whatsapp_image(self, snapshot):
+        """
+        Encode and publish the WhatsApp image of a snapshot.
+        
+        Returns:
+            list: Media URLs, or None to send text only
+        """
+        if snapshot is None:
+            return None
+        try:
+            # WhatsApp carries one image per message: the first of the channel's encoding
+            media_url = self._get_media_url(self._encode_for('whatsapp', snapshot).images[0])
+            return [media_url] if media_url else None
+        except Exception as e:
+            logger.warning("Could not publish detection image, sending text only: %s", e)
+            return None
+    
+    def _deliver_whatsapp(self, message, snapshot, recipients):
+        """
+        Send a WhatsApp message to the given recipients concurrently.
+        
+        Returns:
+            dict: Recipient -> error for every recipient that was not served
+        """
+        media_urls = self._publish_whatsapp_image(snapshot)
+        logger.debug("📱 Sending WhatsApp to %d recipient(s)...", len(recipients))
+        results = self.twilio_client.fan_out(recipients, message, media_urls)
+        return self._report_whatsapp(results)
+    
+    async def _deliver_whatsapp_async(self, message, snapshot, recipients):
+        """Like _deliver_whatsapp, on the engine's loop; encoding and publishing run in a thread."""
+        media_urls = None
+        if snapshot is not None:
+            media_urls = await asyncio.get_running_loop().run_in_executor(
+                None, self._publish_whatsapp_image, snapshot)
+        logger.debug("📱 Sending WhatsApp to %d recipient(s)...", len(recipients))
+        results = await self.async_twilio.fan_out(recipients, message, media_urls)
+        return self._report_whatsapp(results)
     
-    def send_whatsapp_notification(self, message, image_path=None):
+    @staticmethod
+    def _report_whatsapp(results):
+        """Log fan-out results; return recipient -> error for the failures."""
+        failed = {}
+        for recipient, result in results.items():
+            if isinstance(result, Exception):
+                logger.error("WhatsApp notification to %s failed: %s", recipient, result)
+                failed[recipient] = result
+            else:
+                logger.debug("WhatsApp sent successfully to %s (SID: %s)", recipient, result)
+        return failed
+    
+    def send_whatsapp_notification(self, message, image=None):
         """
         Send WhatsApp notification via Twilio.
         
         Args:
             message: Message to send
-            image_path: Optional path to image to send
+            image: Optional AlertSnapshot or image path to send
+            
+        Returns:
+            bool: True if the send was queued (recorded in the outbox when enabled)
         """
         if not self.twilio_client:
-            print("❌ WhatsApp notification failed: Twilio not configured")
+            logger.error("WhatsApp notification failed: Twilio not configured")
             return False
         
-        def _send_whatsapp():
-            try:
-                for recipient in self.whatsapp_recipients:
-                    if not recipient.strip():
-                        continue
-                        
-                    print(f"📱 Sending WhatsApp to {recipient}...")
-                    
-                    if image_path and os.path.exists(image_path):
-                        # Send message with image
-                        message_obj = self.twilio_client.messages.create(
-                            body=message,
-                            from_=self.twilio_whatsapp_from,
-                            to=recipient.strip(),
-                            media_url=[f"file://{os.path.abspath(image_path)}"]
-                        )
-                    else:
-                        # Send text message only
-                        message_obj = self.twilio_client.messages.create(
-                            body=message,
-                            from_=self.twilio_whatsapp_from,
-                            to=recipient.strip()
-                        )
-                    
-                    print(f"✅ WhatsApp sent successfully to {recipient} (SID: {message_obj.sid})")
-                    
-            except Exception as e:
-                print(f"❌ WhatsApp notification failed: {e}")
-                return False
-            
+        recipients = self._recipients(self.whatsapp_recipients)
+        if self.outbox:
+            self.outbox.record(message, {'whatsapp': recipients}, snapshot=self._as_snapshot(image))
             return True
         
-        # Send in separate thread to avoid blocking
-        whatsapp_thread = threading.Thread(target=_send_whatsapp)
-        whatsapp_thread.daemon = True
-        whatsapp_thread.start()
-        
+        # Send on the worker pool (or event loop) to avoid blocking
+        if not self._submit_delivery(self._new_delivery('whatsapp', message, recipients,
+                                                        snapshot=self._as_snapshot(image))):
+            logger.warning("WhatsApp notification dropped: notification queue full")
+            return False
         return True
     
-    def send_email_notification(self, subject, message, image_path=None):
+    def _build_email(self, subject, message, snapshot=None, recipients=None, idempotency_key=None):
+        """
+        Build and serialise the alert email once for all recipients.
+        
+        Returns:
+            bytes: The encoded MIME message
+        """
+        if recipients is None:
+            recipients = self._recipients(self.email_recipients)
+        msg = MIMEMultipart()
+        msg['From'] = self.email_sender
+        msg['To'] = ', '.join(recipients)
+        msg['Subject'] = subject
+        if idempotency_key:
+            # Stable across retries so mail clients collapse a resent alert into one
+            domain = self.email_sender.rsplit('@', 1)[-1] if self.email_sender else 'localhost'
+            msg['Message-ID'] = f"<{idempotency_key.replace(':', '.')}@{domain}>"
+        
+        # Add body to email
+        msg.attach(MIMEText(message, 'plain'))
+        
+        # Attach the context image and detection crops encoded for email
+        if snapshot is not None:
+            for encoded in self._encode_for('email', snapshot).images:
+                image = MIMEImage(encoded.data, encoded.mime.split('/')[1])
+                image.add_header('Content-Disposition', f'attachment; filename={encoded.filename}')
+                msg.attach(image)
+        
+        return msg.as_bytes()
+    
+    def _deliver_email(self, subject, message, snapshot, recipients, idempotency_key=None):
+        """
+        Send an email to the given recipients in one SMTP transaction.
+        
+        Returns:
+            dict: Recipient -> error for every recipient that was not served
+        """
+        logger.debug("📧 Sending email to %d recipient(s)...", len(recipients))
+        try:
+            refused = self.smtp_pool.send_message(
+                self.email_sender, recipients,
+                self._build_email(subject, message, snapshot, recipients, idempotency_key))
+        except smtplib.SMTPRecipientsRefused as e:
+            # Every recipient refused: the same (code, message) form the asyncio engine returns
+            refused = e.recipients
+        except Exception as e:
+            logger.error("Email notification failed: %s", e)
+            return {recipient: e for recipient in recipients}
+        return self._report_email(recipients, refused)
+    
+    async def _deliver_email_async(self, subject, message, snapshot, recipients, idempotency_key=None):
+        """Like _deliver_email, on the engine's loop; the message is built in a thread."""
+        logger.debug("📧 Sending email to %d recipient(s)...", len(recipients))
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, self._build_email, subject, message, snapshot, recipients, idempotency_key)
+            refused = await self.async_smtp.send_message(self.email_sender, recipients, data)
+        except Exception as e:
+            logger.error("Email notification failed: %s", e)
+            return {recipient: e for recipient in recipients}
+        return self._report_email(recipients, refused)
+    
+    @staticmethod
+    def _report_email(recipients, refused):
+        """Log refused recipients; return recipient -> error for them."""
+        for recipient in refused:
+            logger.error("Email refused for %s: %s", recipient, refused[recipient])
+        logger.debug("Email sent successfully to %d recipient(s)", len(recipients) - len(refused))
+        return dict(refused)
+    
+    def send_email_notification(self, subject, message, image=None):
         """
         Send email notification.
         
         Args:
             subject: Email subject
             message: Email message
-            image_path: Optional path to image to attach
+            image: Optional AlertSnapshot or image path to attach
+            
+        Returns:
+            bool: True if the send was queued (recorded in the outbox when enabled)
         """
         if not self.email_sender or not self.email_password:
-            print("❌ Email notification failed: Email credentials not configured")
+            logger.error("Email notification failed: Email credentials not configured")
             return False
         
-        def _send_email():
+        recipients = self._recipients(self.email_recipients)
+        if self.outbox:
+            self.outbox.record(message, {'email': recipients}, subject=subject, snapshot=self._as_snapshot(image))
+            return True
+        
+        # Send on the worker pool (or event loop) to avoid blocking
+        if not self._submit_delivery(self._new_delivery('email', message, recipients, subject,
+                                                        self._as_snapshot(image))):
+            logger.warning("Email notification dropped: notification queue full")
+            return False
+        return True
+    
+    def _webhook_payload(self, subject, message, snapshot, alert_id=None, created=None):
+        """JSON body for webhooks, with the images encoded for the webhook profile."""
+        images = self._encode_for('webhook', snapshot).images if snapshot is not None else None
+        return build_webhook_payload(subject, message, created, alert_id, images)
+    
+    def _deliver_webhook(self, subject, message, snapshot, urls, idempotency_key=None, alert_id=None, created=None):
+        """
+        POST an alert to the given webhook URLs, one after another.
+        
+        Returns:
+            dict: URL -> error for every webhook that did not accept the alert
+        """
+        logger.debug("🔗 Posting alert to %d webhook(s)...", len(urls))
+        payload = self._webhook_payload(subject, message, snapshot, alert_id, created)
+        failed = {}
+        for url in urls:
             try:
-                # Create message
-                msg = MIMEMultipart()
-                msg['From'] = self.email_sender
-                msg['Subject'] = subject
-                
-                # Add body to email
-                msg.attach(MIMEText(message, 'plain'))
-                
-                # Add image attachment if provided
-                if image_path and os.path.exists(image_path):
-                    with open(image_path, 'rb') as f:
-                        img_data = f.read()
-                        image = MIMEImage(img_data)
-                        image.add_header('Content-Disposition', 
-                                       f'attachment; filename=detection_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jpg')
-                        msg.attach(image)
-                
-                # Create SMTP session
-                server = smtplib.SMTP('smtp.gmail.com', 587)
-                server.starttls()  # Enable security
-                server.login(self.email_sender, self.email_password)
-                
-                # Send emails to all recipients
-                for recipient in self.email_recipients:
-                    if not recipient.strip():
-                        continue
-                        
-                    print(f"📧 Sending email to {recipient}...")
-                    msg['To'] = recipient.strip()
-                    
-                    text = msg.as_string()
-                    server.sendmail(self.email_sender, recipient.strip(), text)
-                    print(f"✅ Email sent successfully to {recipient}")
-                    
-                    # Remove the 'To' header for next recipient
-                    del msg['To']
-                
-                server.quit()
-                
-            except Exception as e:
-                print(f"❌ Email notification failed: {e}")
-                return False
+                self.webhook_client.post(url, payload, idempotency_key)
+            except WebhookError as e:
+                failed[url] = e
+        return self._report_webhooks(urls, failed)
+    
+    async def _deliver_webhook_async(self, subject, message, snapshot, urls, idempotency_key=None,
+                                     alert_id=None, created=None):
+        """Like _deliver_webhook, with all URLs in flight at once."""
+        logger.debug("🔗 Posting alert to %d webhook(s)...", len(urls))
+        payload = await asyncio.get_running_loop().run_in_executor(
+            None, self._webhook_payload, subject, message, snapshot, alert_id, created)
+        results = await asyncio.gather(*(self.async_webhooks.post(url, payload, idempotency_key) for url in urls),
+                                       return_exceptions=True)
+        failed = {url: result for url, result in zip(urls, results) if isinstance(result, Exception)}
+        return self._report_webhooks(urls, failed)
+    
+    @staticmethod
+    def _report_webhooks(urls, failed):
+        for error in failed.values():
+            logger.error("Webhook notification failed: %s", error)
+        if len(failed) < len(urls):
+            logger.debug("Webhook alert accepted by %d endpoint(s)", len(urls) - len(failed))
+        return failed
+    
+    def send_webhook_notification(self, subject, message, image=None):
+        """
+        POST an alert to every configured webhook.
+        
+        Args:
+            subject: Alert subject
+            message: Alert text
+            image: Optional AlertSnapshot or image path to include
             
-            return True
+        Returns:
+            bool: True if the send was queued (recorded in the outbox when enabled)
+        """
+        urls = self._recipients(self.webhook_urls)
+        if not urls:
+            logger.error("Webhook notification failed: no WEBHOOK_URLS configured")
+            return False
         
-        # Send in separate thread to avoid blocking
-        email_thread = threading.Thread(target=_send_email)
-        email_thread.daemon = True
-        email_thread.start()
+        if self.outbox:
+            self.outbox.record(message, {'webhook': urls}, subject=subject, snapshot=self._as_snapshot(image))
+            return True
         
+        if not self._submit_delivery(self._new_delivery('webhook', message, urls, subject, self._as_snapshot(image))):
+            logger.warning("Webhook notification dropped: notification queue full")
+            return False
+        return True
+    
+    def _replay_outbox(self):
+        """Resume deliveries left pending by a previous run."""
+        pending = self.outbox.pending()
+        if pending:
+            logger.info("📤 Replaying %d undelivered notification(s) from the outbox", len(pending))
+        for delivery in pending:
+            self._schedule_delivery(delivery, max(0.0, delivery['next_attempt'] - time.time()))
+    
+    @staticmethod
+    def _new_delivery(channel, message, recipients, subject=None, snapshot=None):
+        """A delivery that is not recorded in the outbox: attempted once, without a key."""
+        return {
+            'id': None,
+            'alert_id': None,
+            'channel': channel,
+            'key': None,
+            'subject': subject,
+            'message': message,
+            'snapshot': snapshot,
+            'recipients': recipients,
+            'attempts': 0,
+            'created': time.time(),
+        }
+    
+    def _submit_delivery(self, delivery):
+        """Queue a delivery without the outbox; it may be dropped when the queue is full."""
+        if self.engine:
+            return self.engine.submit(delivery['channel'], self._deliver_async, delivery)
+        return self.pool.submit(self._deliver, delivery)
+    
+    def _schedule_delivery(self, delivery, delay=0.0):
+        """Queue an outbox delivery; scheduled jobs are never dropped by the overflow policy."""
+        if self.engine:
+            self.engine.schedule(delay, delivery['channel'], self._deliver_async, delivery)
+        else:
+            self.pool.schedule(delay, self._deliver, delivery)
+    
+    @staticmethod
+    def _is_retryable(error):
+        """Permanent failures: recipients rejected by the server, the provider or the webhook."""
+        if isinstance(error, (WhatsAppSendError, WebhookError)):
+            return error.retryable
+        if isinstance(error, tuple):  # SMTP refusal (code, message)
+            return error[0] < 500
+        if isinstance(error, smtplib.SMTPResponseException):  # sender or message rejected
+            return error.smtp_code < 500
         return True
     
-    def send_detection_alert(self, detection_count, confidence_scores, frame=None):
+    def _channel_configured(self, channel):
+        if channel == 'whatsapp':
+            return self.twilio_client is not None
+        if channel == 'email':
+            return bool(self.email_sender and self.email_password)
+        return channel == 'webhook'
+    
+    def _deliver(self, delivery):
+        """Attempt one delivery and record the outcome (runs on a pool worker)."""
+        channel = delivery['channel']
+        try:
+            if not self._channel_configured(channel):
+                failed = {r: RuntimeError(f"{channel} not configured") for r in delivery['recipients']}
+            elif channel == 'whatsapp':
+                failed = self._deliver_whatsapp(delivery['message'], delivery['snapshot'], delivery['recipients'])
+            elif channel == 'email':
+                failed = self._deliver_email(delivery['subject'], delivery['message'], delivery['snapshot'],
+                                             delivery['recipients'], delivery['key'])
+            else:
+                failed = self._deliver_webhook(delivery['subject'], delivery['message'], delivery['snapshot'],
+                                               delivery['recipients'], delivery['key'],
+                                               delivery['alert_id'], delivery['created'])
+        except Exception as e:
+            failed = {r: e for r in delivery['recipients']}
+        return self._record_outcome(delivery, failed)
+    
+    async def _deliver_async(self, delivery):
+        """Attempt one delivery on the engine's event loop and record the outcome."""
+        channel = delivery['channel']
+        try:
+            if not self._channel_configured(channel):
+                failed = {r: RuntimeError(f"{channel} not configured") for r in delivery['recipients']}
+            elif channel == 'whatsapp':
+                failed = await self._deliver_whatsapp_async(delivery['message'], delivery['snapshot'],
+                                                            delivery['recipients'])
+            elif channel == 'email':
+                failed = await self._deliver_email_async(delivery['subject'], delivery['message'],
+                                                         delivery['snapshot'], delivery['recipients'],
+                                                         delivery['key'])
+            else:
+                failed = await self._deliver_webhook_async(delivery['subject'], delivery['message'],
+                                                           delivery['snapshot'], delivery['recipients'],
+                                                           delivery['key'], delivery['alert_id'],
+                                                           delivery['created'])
+        except asyncio.CancelledError:
+            # The channel timeout (or shutdown) cancelled the attempt: record it so it is retried,
+            # except WhatsApp, where a request in flight may already have been accepted
+            if channel == 'whatsapp':
+                error = WhatsAppSendError("whatsapp delivery timed out", unknown=True)
+            else:
+                error = TimeoutError(f"{channel} delivery timed out")
+            self._record_outcome(delivery, {r: error for r in delivery['recipients']})
+            raise
+        except Exception as e:
+            failed = {r: e for r in delivery['recipients']}
+        return self._record_outcome(delivery, failed)
+    
+    def _record_outcome(self, delivery, failed):
+        """
+        Mark an outbox delivery sent, failed or due for a retry.
+        
+        Returns:
+            bool: True if every recipient was served
+        """
+        channel = delivery['channel']
+        if delivery['key'] is None:  # not in the outbox: no retries
+            return not failed
+        
+        if not failed:
+            self.outbox.mark_sent(delivery)
+            return True
+        
+        error = '; '.join(f"{recipient}: {err}" for recipient, err in failed.items())
+        retry = [recipient for recipient, err in failed.items() if self._is_retryable(err)]
+        if not retry:
+            unknown = [recipient for recipient, err in failed.items() if getattr(err, 'unknown', False)]
+            if unknown:
+                # Possibly delivered already: resending could alert twice
+                logger.warning("%s alert outcome unknown for %d recipient(s), not resent", channel, len(unknown))
+                self.outbox.mark_unknown(delivery, list(failed), error)
+            else:
+                self.outbox.mark_failed(delivery, list(failed), error)
+            return False
+        
+        delay = self.outbox.mark_retry(delivery, retry, error)
+        if delay is None:
+            logger.error("%s alert abandoned after %d attempts", channel, delivery['attempts'])
+        else:
+            logger.warning("🔁 Retrying %s alert for %d recipient(s) in %.1fs", channel, len(retry), delay)
+            self._schedule_delivery(delivery, delay)
+        return False
+    
+    def send_detection_alert(self, detection_count, confidence_scores, frame=None, detections=None):
         """
         Send complete detection alert via all configured channels.
         
         Args:
             detection_count: Number of humans detected
             confidence_scores: List of confidence scores
-            frame: Optional OpenCV frame to save and send
+            frame: Optional OpenCV frame to send; it is encoded once, off this thread,
+                and must not be modified by the caller afterwards
+            detections: Optional detection dicts used to crop the people from the frame
         """
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
@@ -172,40 +566,81 @@ class NotificationSystem:
             message += f"Location: Security Camera\n\n"
             message += "Multiple people detected. Please check the premises immediately."
         
-        # Save frame as image if provided
-        image_path = None
+        subject = f"🚨 Security Alert - Human Detection - {timestamp}"
+        self._send_alert(subject, message, frame, detections)
+    
+    def send_digest_alert(self, digest, frame=None):
+        """
+        Send a digest of the detections coalesced over a window.
+        
+        Args:
+            digest: Summary dict from AlertCoalescer (start, end, detection_frames,
+                people_tracked, max_people, peak_confidence, cameras, snapshot_count)
+            frame: Optional montage of the best snapshots
+        """
+        start = datetime.fromtimestamp(digest['start']).strftime("%H:%M:%S")
+        end = datetime.fromtimestamp(digest['end']).strftime("%H:%M:%S")
+        cameras = ', '.join(f"camera {camera}: {frames}" for camera, frames in sorted(digest['cameras'].items(), key=str))
+        
+        message = f"🚨 SECURITY ALERT DIGEST 🚨\n\n"
+        message += f"Continued activity from {start} to {end}\n"
+        message += f"Frames with people: {digest['detection_frames']} ({cameras})\n"
+        if digest['people_tracked']:
+            message += f"People tracked: {digest['people_tracked']}\n"
+        message += f"Most people at once: {digest['max_people']}\n"
+        message += f"Peak confidence: {digest['peak_confidence']:.2f}\n"
         if frame is not None:
-            image_path = f"detection_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-            cv2.imwrite(image_path, frame)
-            print(f"Detection image saved: {image_path}")
+            message += f"Attached: best {digest['snapshot_count']} snapshot(s)\n"
+        message += "\nPlease check the premises."
         
-        # Send notifications
-        print("📢 Sending notifications...")
+        subject = f"🚨 Security Alert Digest - {digest['detection_frames']} detections - {start}-{end}"
+        self._send_alert(subject, message, frame)
+    
+    def _send_alert(self, subject, message, frame=None, detections=None):
+        """Queue an alert with an optional image on every configured channel."""
+        # Wrap the frame; each channel's encoding is produced once, by the first worker that needs it
+        snapshot = AlertSnapshot(frame, detections=detections) if frame is not None else None
         
-        # WhatsApp notification
-        if self.whatsapp_recipients:
-            self.send_whatsapp_notification(message, image_path)
+        # Send notifications
+        logger.info("📢 Sending notifications...")
         
-        # Email notification
-        if self.email_recipients:
-            subject = f"🚨 Security Alert - Human Detection - {timestamp}"
-            self.send_email_notification(subject, message, image_path)
-        
-        # Clean up temporary image file after a delay
-        if image_path:
-            def cleanup():
-                import time
-                time.sleep(60)  # Wait 1 minute before cleanup
-                try:
-                    if os.path.exists(image_path):
-                        os.remove(image_path)
-                        print(f"Cleaned up temporary file: {image_path}")
-                except Exception as e:
-                    print(f"Error cleaning up {image_path}: {e}")
+        if self.outbox:
+            # One durable record per alert; each channel is then delivered and retried independently
+            channels = {}
+            if self.whatsapp_recipients and self.twilio_client:
+                channels['whatsapp'] = self._recipients(self.whatsapp_recipients)
+            if self.email_recipients and self.email_sender and self.email_password:
+                channels['email'] = self._recipients(self.email_recipients)
+            if self.webhook_urls:
+                channels['webhook'] = self._recipients(self.webhook_urls)
+            self.outbox.record(message, channels, subject=subject, snapshot=snapshot)
+        else:
+            # WhatsApp notification
+            if self.whatsapp_recipients:
+                self.send_whatsapp_notification(message, snapshot)
+            
+            # Email notification
+            if self.email_recipients:
+                self.send_email_notification(subject, message, snapshot)
             
-            cleanup_thread = threading.Thread(target=cleanup)
-            cleanup_thread.daemon = True
-            cleanup_thread.start()
+            # Webhooks
+            if self.webhook_urls:
+                self.send_webhook_notification(subject, message, snapshot)
+        
+        # Keep a copy on disk only if persistence is enabled
+        if snapshot is not None and Config.SAVE_DETECTION_IMAGES:
+            self.pool.submit(self._save_snapshot, snapshot)
+    
+    @staticmethod
+    def _save_snapshot(snapshot):
+        """Persist a detection image (runs on a pool worker)."""
+        try:
+            path = snapshot.save(Config.DETECTION_IMAGE_DIR)
+            logger.debug("Detection image saved: %s", path)
+        except Exception as e:
+            logger.error("Could not save detection image: %s", e)
+            return False
+        return True
     
     def test_notifications(self):
         """Test all notification systems."""
@@ -223,4 +658,67 @@ class NotificationSystem:
             print("Testing Email...")
             self.send_email_notification("🧪 Test - Human Detection System", test_message)
         
-        print("Test notifications sent!")
\ No newline at end of file
+        # Test webhooks
+        if self.webhook_urls:
+            print("Testing webhooks...")
+            self.send_webhook_notification("🧪 Test - Human Detection System", test_message)
+        
+        print("Test notifications sent!")
+    
+    def get_stats(self):
+        """Get notification queue, send-latency, channel client and snapshot encoding metrics."""
+        if self.engine:
+            stats = self.engine.get_stats()
+            stats['smtp'] = self.async_smtp.get_stats()
+            if self.async_twilio:
+                stats['whatsapp'] = self.async_twilio.get_stats()
+            if self.webhook_urls:
+                stats['webhook'] = self.async_webhooks.get_stats()
+        else:
+            stats = self.pool.get_stats()
+            stats['smtp'] = self.smtp_pool.get_stats()
+            if self.twilio_client:
+                stats['whatsapp'] = self.twilio_client.get_stats()
+            if self.webhook_urls:
+                stats['webhook'] = self.webhook_client.get_stats()
+        if self.outbox:
+            stats['outbox'] = self.outbox.get_stats()
+        if self.media_server:
+            stats['media_server'] = self.media_server.get_stats()
+        stats['encoding'] = {}
+        with self.encoding_lock:
+            encoding_stats = {channel: dict(encoding) for channel, encoding in self.encoding_stats.items()}
+        for channel, encoding in encoding_stats.items():
+            alerts = encoding['alerts']
+            stats['encoding'][channel] = {
+                'alerts': alerts,
+                'images': encoding['images'],
+                'bytes_sent': encoding['bytes'],
+                'bytes_avg': encoding['bytes'] / alerts if alerts else 0.0,
+                'encode_time_avg': encoding['encode_time'] / alerts if alerts else 0.0,
+            }
+        return stats
+    
+    def shutdown(self, timeout=10.0):
+        """
+        Deliver queued notifications, stop the sender threads (or event loop) and close
+        channel sessions. Deliveries that could not be completed stay in the outbox for
+        the next start.
+        """
+        if self.engine:
+            self.pool.shutdown(timeout=timeout)  # snapshot saves and timers that may still raise alerts
+        if self.outbox:
+            self.outbox.flush(timeout)  # hand recorded alerts over before the senders stop accepting
+        if self.engine:
+            drained = self.engine.shutdown(timeout=timeout, cleanup=self._close_async_clients)
+        else:
+            drained = self.pool.shutdown(timeout=timeout)
+        if self.outbox:
+            self.outbox.close()
+        self.smtp_pool.close()
+        if self.twilio_client:
+            self.twilio_client.close()
+        self.webhook_client.close()
+        if self.media_server:
+            self.media_server.stop()
+        return drained
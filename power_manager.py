@@ -0,0 +1,196 @@
+"""
+CPU-budget and idle power management.
+
+While the scene is idle (no detections and no motion) the detector runs at a
+reduced inference rate, input size and thread count, adapted so the process
+stays inside an operator-set CPU (or watts-proxy) budget. A cheap motion check
+runs on every frame so the very next frame with activity is inferred at full
+settings.
+"""
+
+import os
+import time
+
+import cv2
+
+from config import Config
+
+ACTIVE = 'active'
+IDLE = 'idle'
+
+
+class PowerManager:
+    def __init__(self, cpu_budget=None, watts_budget=None):
+        """
+        Initialize the power manager.
+
+        Args:
+            cpu_budget: CPU budget as a percentage of total host capacity (default from config)
+            watts_budget: Optional budget in watts, converted to CPU with the configured power model
+        """
+        self.idle_watts = Config.POWER_IDLE_WATTS
+        self.max_watts = Config.POWER_MAX_WATTS
+        watts_budget = watts_budget if watts_budget is not None else Config.POWER_BUDGET_WATTS
+        if watts_budget:
+            self.cpu_budget = self._watts_to_cpu(watts_budget)
+        else:
+            self.cpu_budget = cpu_budget if cpu_budget is not None else Config.CPU_BUDGET_PERCENT
+
+        self.idle_after = Config.IDLE_AFTER
+        self.idle_imgsz = Config.IDLE_IMGSZ
+        self.idle_threads = Config.IDLE_TORCH_THREADS
+        self.min_idle_interval = Config.IDLE_MIN_INFERENCE_INTERVAL
+        self.max_idle_interval = Config.IDLE_MAX_INFERENCE_INTERVAL
+        self.idle_frame_interval = Config.IDLE_FRAME_INTERVAL
+        self.motion_threshold = Config.MOTION_THRESHOLD
+
+        self.mode = ACTIVE
+        self.idle_interval = self.min_idle_interval
+        self.last_activity_time = time.time()
+        self.last_inference_time = 0.0
+        self.previous_small = None
+        self.cpu_count = os.cpu_count() or 1
+
+        # CPU accounting over one-second windows
+        self.window_start_wall = time.monotonic()
+        self.window_start_cpu = self._process_cpu_time()
+        self.current_cpu = 0.0
+        self.windows_total = 0
+        self.windows_within_budget = 0
+        self.cpu_sum = 0.0
+        self.mode_time = {ACTIVE: 0.0, IDLE: 0.0}
+        self.mode_since = time.monotonic()
+        self.frames_skipped = 0
+        self.frames_inferred = 0
+        self.wakeups = 0
+
+    def _watts_to_cpu(self, watts):
+        """Convert a watts budget to a CPU percentage using a linear power model."""
+        span = max(self.max_watts - self.idle_watts, 1e-6)
+        return max(1.0, min(100.0, (watts - self.idle_watts) / span * 100))
+
+    def _cpu_to_watts(self, cpu_percent):
+        """Estimate power draw from CPU utilisation."""
+        return self.idle_watts + (self.max_watts - self.idle_watts) * cpu_percent / 100
+
+    @staticmethod
+    def _process_cpu_time():
+        """User plus system CPU seconds consumed by this process (all threads)."""
+        times = os.times()
+        return times.user + times.system
+
+    @property
+    def imgsz(self):
+        """Inference input size for the current mode (None = model default)."""
+        return self.idle_imgsz if self.mode == IDLE else None
+
+    @property
+    def num_threads(self):
+        """Inference thread count for the current mode (None = full)."""
+        return self.idle_threads if self.mode == IDLE else None
+
+    @property
+    def frame_interval(self):
+        """Seconds to wait between frames in the current mode."""
+        return self.idle_frame_interval if self.mode == IDLE else 0.0
+
+    def _set_mode(self, mode):
+        """Switch mode and account for time spent in the previous one."""
+        if mode == self.mode:
+            return
+        now = time.monotonic()
+        self.mode_time[self.mode] += now - self.mode_since
+        self.mode_since = now
+        if mode == ACTIVE:
+            self.wakeups += 1
+            self.idle_interval = self.min_idle_interval
+        self.mode = mode
+
+    def _detect_motion(self, frame):
+        """Cheap motion check on a tiny grayscale thumbnail."""
+        small = cv2.resize(frame, (64, 48), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        previous, self.previous_small = self.previous_small, small
+        if previous is None:
+            return False
+        return float(cv2.absdiff(small, previous).mean()) > self.motion_threshold
+
+    def _update_cpu(self):
+        """Close the CPU accounting window once per second and adapt the idle rate."""
+        now = time.monotonic()
+        elapsed = now - self.window_start_wall
+        if elapsed < 1.0:
+            return
+
+        cpu_now = self._process_cpu_time()
+        self.current_cpu = (cpu_now - self.window_start_cpu) / (elapsed * self.cpu_count) * 100
+        self.window_start_wall, self.window_start_cpu = now, cpu_now
+
+        self.windows_total += 1
+        self.cpu_sum += self.current_cpu
+        if self.current_cpu <= self.cpu_budget:
+            self.windows_within_budget += 1
+
+        # Only idle periods are throttled; activity always gets the full rate
+        if self.mode == IDLE:
+            if self.current_cpu > self.cpu_budget:
+                self.idle_interval = min(self.max_idle_interval, self.idle_interval * 1.5)
+            elif self.current_cpu < self.cpu_budget * 0.7:
+                self.idle_interval = max(self.min_idle_interval, self.idle_interval / 1.2)
+
+    def should_infer(self, frame):
+        """
+        Decide whether to run inference on this frame.
+
+        Motion switches straight back to active mode, so the frame that shows
+        activity is inferred at full settings.
+
+        Args:
+            frame: Current camera frame
+
+        Returns:
+            bool: True if the detector should run on this frame
+        """
+        self._update_cpu()
+        now = time.time()
+
+        if self._detect_motion(frame):
+            self.last_activity_time = now
+            self._set_mode(ACTIVE)
+        elif self.mode == ACTIVE and now - self.last_activity_time >= self.idle_after:
+            self._set_mode(IDLE)
+
+        if self.mode == IDLE and now - self.last_inference_time < self.idle_interval:
+            self.frames_skipped += 1
+            return False
+
+        self.last_inference_time = now
+        self.frames_inferred += 1
+        return True
+
+    def observe(self, human_detected):
+        """Record the result of an inference."""
+        if human_detected:
+            self.last_activity_time = time.time()
+            self._set_mode(ACTIVE)
+
+    def get_stats(self):
+        """Get power and budget statistics."""
+        mode_time = dict(self.mode_time)
+        mode_time[self.mode] += time.monotonic() - self.mode_since
+        total_time = sum(mode_time.values()) or 1.0
+        average_cpu = self.cpu_sum / self.windows_total if self.windows_total else 0.0
+        return {
+            'mode': self.mode,
+            'cpu_budget_percent': self.cpu_budget,
+            'current_cpu_percent': self.current_cpu,
+            'average_cpu_percent': average_cpu,
+            'estimated_watts': self._cpu_to_watts(average_cpu),
+            'budget_adherence_percent': (self.windows_within_budget / self.windows_total * 100
+                                         if self.windows_total else 100.0),
+            'idle_time_percent': mode_time[IDLE] / total_time * 100,
+            'idle_inference_interval': self.idle_interval,
+            'frames_inferred': self.frames_inferred,
+            'frames_skipped': self.frames_skipped,
+            'wakeups': self.wakeups,
+        }
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Low-overhead sampling profiler for the running app.
+
+A background thread periodically snapshots the stacks of every thread with
+sys._current_frames(), so the capture, alarm and notification threads are
+profiled alongside the main detection loop. Results are written as collapsed
+stacks (one "thread;frame;frame count" line per stack, the input format of
+flamegraph.pl and speedscope) plus a per-function text summary.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    def __init__(self, interval=None, output_dir=None):
+        """
+        Initialize the profiler.
+
+        Args:
+            interval: Seconds between samples (default from config)
+            output_dir: Directory for profile output (default from config)
+        """
+        self.interval = interval if interval is not None else Config.PROFILE_INTERVAL
+        self.output_dir = output_dir if output_dir is not None else Config.PROFILE_OUTPUT_DIR
+
+        self.is_running = False
+        self.lock = threading.Lock()
+        self.sampler_thread = None
+        self.stop_event = threading.Event()
+
+        self._reset()
+
+    def _reset(self):
+        """Clear collected samples."""
+        self.stack_counts = Counter()  # (thread_name, (code, ...)) -> samples
+        self.sample_count = 0
+        self.sampling_time = 0.0
+        self.start_time = None
+        self.end_time = None
+
+    def start(self, duration=None):
+        """
+        Start sampling all threads.
+
+        Args:
+            duration: Optional window in seconds, after which the profile is
+                stopped and written automatically
+
+        Returns:
+            bool: False if the profiler was already running
+        """
+        with self.lock:
+            if self.is_running:
+                return False
+            self._reset()
+            self.stop_event.clear()
+            self.is_running = True
+            self.start_time = time.time()
+
+            self.sampler_thread = threading.Thread(target=self._sample_loop, args=(duration,),
+                                                   name="profiler-sampler")
+            self.sampler_thread.daemon = True
+            self.sampler_thread.start()
+
+        window = f" for {duration:.0f}s" if duration else ""
+        logger.info("🔬 Sampling profiler started%s (interval %.1f ms)", window, self.interval * 1000)
+        return True
+
+    def stop(self):
+        """
+        Stop sampling and write the collected profile.
+
+        Returns:
+            tuple: (folded_path, summary_path) or None if not running
+        """
+        with self.lock:
+            if not self.is_running:
+                return None
+            self.stop_event.set()
+            thread = self.sampler_thread
+
+        if thread is not threading.current_thread():
+            thread.join(timeout=2)
+        return self._finish()
+
+    def toggle(self, duration=None):
+        """Start the profiler if idle, otherwise stop it and write results."""
+        if self.is_running:
+            self.stop()
+        else:
+            self.start(duration)
+
+    def _finish(self):
+        """Mark the profiler stopped and write reports."""
+        with self.lock:
+            if not self.is_running:
+                return None
+            self.is_running = False
+            self.end_time = time.time()
+        return self.write_reports()
+
+    def _sample_loop(self, duration):
+        """Sampler thread: snapshot every other thread's stack at a fixed interval."""
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + duration if duration else None
+        thread_names = {}
+        refresh_names_at = 0
+
+        while not self.stop_event.is_set():
+            tick = time.perf_counter()
+
+            # Thread names change rarely, so refresh the map a few times per second
+            if self.sample_count >= refresh_names_at:
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+                refresh_names_at = self.sample_count + 50
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                # Keep code objects only; they are turned into labels when writing
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+                self.stack_counts[(thread_names.get(ident, f"thread-{ident}"), tuple(stack))] += 1
+
+            self.sample_count += 1
+            elapsed = time.perf_counter() - tick
+            self.sampling_time += elapsed
+
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            self.stop_event.wait(max(0.0, self.interval - elapsed))
+
+        if deadline is not None and not self.stop_event.is_set():
+            self._finish()
+
+    @staticmethod
+    def _label(code):
+        """Format a code object as 'function (file:line)'."""
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def get_summary(self, top=30):
+        """
+        Aggregate samples per function.
+
+        Returns:
+            dict: Profile metadata and the top functions by self and total samples
+        """
+        self_counts = Counter()
+        total_counts = Counter()
+        thread_counts = Counter()
+        for (thread_name, stack), count in self.stack_counts.items():
+            thread_counts[thread_name] += count
+            if stack:
+                self_counts[stack[-1]] += count
+            for code in set(stack):
+                total_counts[code] += count
+
+        wall = ((self.end_time or time.time()) - self.start_time) if self.start_time else 0.0
+        total_samples = sum(self.stack_counts.values()) or 1
+        return {
+            'samples': self.sample_count,
+            'wall_time': wall,
+            'overhead_percent': (self.sampling_time / wall * 100) if wall else 0.0,
+            'threads': thread_counts.most_common(),
+            'self': [(self._label(code), n, n / total_samples * 100) for code, n in self_counts.most_common(top)],
+            'total': [(self._label(code), n, n / total_samples * 100) for code, n in total_counts.most_common(top)],
+        }
+
+    def write_reports(self):
+        """
+        Write collapsed stacks and a per-function summary to the output directory.
+
+        Returns:
+            tuple: (folded_path, summary_path)
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.start_time or time.time()).strftime('%Y%m%d_%H%M%S')
+        folded_path = os.path.join(self.output_dir, f"profile_{stamp}.folded")
+        summary_path = os.path.join(self.output_dir, f"profile_{stamp}_summary.txt")
+
+        # Collapsed stacks: identical labelled stacks are merged
+        folded = Counter()
+        for (thread_name, stack), count in self.stack_counts.items():
+            labels = [thread_name.replace(';', ':').replace(' ', '_')]
+            labels.extend(self._label(code).replace(';', ':') for code in stack)
+            folded[';'.join(labels)] += count
+        with open(folded_path, 'w') as f:
+            for line, count in sorted(folded.items()):
+                f.write(f"{line} {count}\n")
+
+        summary = self.get_summary()
+        with open(summary_path, 'w') as f:
+            f.write(f"Samples: {summary['samples']} over {summary['wall_time']:.1f}s "
+                    f"(interval {self.interval * 1000:.1f} ms)\n")
+            f.write(f"Profiler overhead: {summary['overhead_percent']:.2f}% of one core\n\n")
+            f.write("Samples per thread:\n")
+            for thread_name, count in summary['threads']:
+                f.write(f"  {count:8d}  {thread_name}\n")
+            for title, key in (("Top functions by self samples", 'self'),
+                               ("Top functions by total samples", 'total')):
+                f.write(f"\n{title}:\n")
+                for label, count, percent in summary[key]:
+                    f.write(f"  {count:8d}  {percent:6.2f}%  {label}\n")
+
+        logger.info("🔬 Profile written: %s (%d samples, overhead %.2f%%), summary: %s", folded_path,
+                    summary['samples'], summary['overhead_percent'], summary_path)
+        return folded_path, summary_path
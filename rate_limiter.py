@@ -0,0 +1,85 @@
+"""
+Thread-safe token-bucket rate limiter.
+"""
+
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate: Tokens added per second (0 disables limiting)
+            burst: Bucket capacity (default: max(1, rate))
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if available without waiting.
+
+        Returns:
+            bool: True if the tokens were taken
+        """
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def _take(self, tokens):
+        """Take tokens if available; otherwise return the seconds until they will be."""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Wait until tokens are available and take them.
+
+        Args:
+            tokens: Number of tokens to take
+            timeout: Maximum seconds to wait (None waits indefinitely)
+
+        Returns:
+            bool: True if the tokens were taken before the timeout
+        """
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """Like acquire, but waits without blocking the event loop."""
+        if self.rate <= 0:
+            return True
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return True
+            await asyncio.sleep(wait)
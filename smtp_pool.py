@@ -0,0 +1,243 @@
+"""
+Pooled, persistent SMTP sessions.
+
+Authenticated connections are kept open between alerts instead of paying for
+TCP, STARTTLS and login on every email. Idle sessions are kept alive with
+NOOP, checked before reuse, closed after SMTP_MAX_IDLE seconds, and
+transparently reopened if the server has dropped them.
+"""
+
+import smtplib
+import ssl
+import threading
+import time
+
+from config import Config
+
+
+class _PooledConnection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    def __init__(self, host=None, port=None, username=None, password=None, use_starttls=None,
+                 pool_size=None, keepalive_interval=None, max_idle=None, timeout=30):
+        """
+        Initialize the pool. Connections are opened lazily.
+
+        Args:
+            host: SMTP server host (default from config)
+            port: SMTP server port (default from config)
+            username: Login user (None to skip AUTH)
+            password: Login password
+            use_starttls: Upgrade the connection with STARTTLS (default from config)
+            pool_size: Maximum concurrent sessions (default from config)
+            keepalive_interval: Seconds between NOOPs on idle sessions (default from config)
+            max_idle: Seconds after which an idle session is closed (default from config)
+            timeout: Socket timeout in seconds
+        """
+        self.host = host if host is not None else Config.SMTP_HOST
+        self.port = port if port is not None else Config.SMTP_PORT
+        self.username = username
+        self.password = password
+        self.use_starttls = use_starttls if use_starttls is not None else Config.SMTP_STARTTLS
+        self.pool_size = pool_size if pool_size is not None else Config.SMTP_POOL_SIZE
+        self.keepalive_interval = keepalive_interval if keepalive_interval is not None else Config.SMTP_KEEPALIVE_INTERVAL
+        self.max_idle = max_idle if max_idle is not None else Config.SMTP_MAX_IDLE
+        self.timeout = timeout
+
+        self.cond = threading.Condition()
+        self.idle = []  # _PooledConnection objects ready for reuse
+        self.open_count = 0
+        self.closed = False
+        self.keepalive_thread = None
+
+        # Statistics
+        self.connections_opened = 0
+        self.reconnects = 0
+        self.messages_sent = 0
+        self.recipients_sent = 0
+
+    def _connect(self):
+        """Open and authenticate a new SMTP session."""
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        smtp.ehlo()
+        if self.use_starttls:
+            smtp.starttls(context=ssl.create_default_context())
+            smtp.ehlo()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self.connections_opened += 1
+        return _PooledConnection(smtp)
+
+    @staticmethod
+    def _close(conn):
+        """Close a session, ignoring errors from dead connections."""
+        try:
+            conn.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                conn.smtp.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _is_alive(conn):
+        """Check a session with NOOP."""
+        try:
+            return conn.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _acquire(self):
+        """Get an idle session, open a new one, or wait for one to be released."""
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise smtplib.SMTPException("SMTP pool is closed")
+                if self.idle:
+                    conn = self.idle.pop()
+                    break
+                if self.open_count < self.pool_size:
+                    self.open_count += 1
+                    conn = None
+                    break
+                self.cond.wait()
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self.cond:
+                    self.open_count -= 1
+                    self.cond.notify()
+                raise
+            self._start_keepalive()
+        elif time.monotonic() - conn.last_used > self.keepalive_interval and not self._is_alive(conn):
+            # Server dropped the idle session; replace it
+            self._close(conn)
+            self.reconnects += 1
+            conn = self._reconnect_slot()
+        return conn
+
+    def _reconnect_slot(self):
+        """Open a replacement session for a slot that is already counted as open."""
+        try:
+            return self._connect()
+        except Exception:
+            with self.cond:
+                self.open_count -= 1
+                self.cond.notify()
+            raise
+
+    def _release(self, conn):
+        """Return a healthy session to the pool."""
+        conn.last_used = time.monotonic()
+        with self.cond:
+            if self.closed:
+                self.open_count -= 1
+                self._close(conn)
+            else:
+                self.idle.append(conn)
+            self.cond.notify()
+
+    def _discard(self, conn):
+        """Drop a broken session and free its slot."""
+        self._close(conn)
+        with self.cond:
+            self.open_count -= 1
+            self.cond.notify()
+
+    def send_message(self, from_addr, recipients, message):
+        """
+        Send one already-serialised message to all recipients in a single transaction.
+
+        Args:
+            from_addr: Envelope sender
+            recipients: List of envelope recipients
+            message: Serialised message (bytes or str)
+
+        Returns:
+            dict: Recipients refused by the server (empty if all accepted)
+        """
+        recipients = [r.strip() for r in recipients if r and r.strip()]
+        if not recipients:
+            return {}
+
+        conn = self._acquire()
+        try:
+            refused = conn.smtp.sendmail(from_addr, recipients, message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Session died between the liveness check and the send: retry once on a new session
+            self._close(conn)
+            self.reconnects += 1
+            conn = self._reconnect_slot()
+            try:
+                refused = conn.smtp.sendmail(from_addr, recipients, message)
+            except Exception:
+                self._discard(conn)
+                raise
+        except smtplib.SMTPRecipientsRefused:
+            self._release(conn)
+            raise
+        except Exception:
+            self._discard(conn)
+            raise
+
+        self._release(conn)
+        self.messages_sent += 1
+        self.recipients_sent += len(recipients) - len(refused)
+        return refused
+
+    def _start_keepalive(self):
+        """Start the keepalive thread on first use."""
+        with self.cond:
+            if self.keepalive_thread is not None or self.closed or self.keepalive_interval <= 0:
+                return
+            self.keepalive_thread = threading.Thread(target=self._keepalive_loop, name="smtp-keepalive")
+            self.keepalive_thread.daemon = True
+            self.keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        """NOOP idle sessions so servers don't drop them; close sessions idle too long."""
+        while True:
+            with self.cond:
+                self.cond.wait(self.keepalive_interval)
+                if self.closed:
+                    return
+                now = time.monotonic()
+                due = [c for c in self.idle if now - c.last_used >= self.keepalive_interval]
+                for conn in due:
+                    self.idle.remove(conn)
+
+            for conn in due:
+                if now - conn.last_used >= self.max_idle or not self._is_alive(conn):
+                    self._discard(conn)
+                else:
+                    with self.cond:
+                        self.idle.append(conn)
+                        self.cond.notify()
+
+    def close(self):
+        """Close all idle sessions; sessions in use are closed when released."""
+        with self.cond:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.open_count -= len(idle)
+            self.cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def get_stats(self):
+        """Get connection and delivery statistics."""
+        with self.cond:
+            return {
+                'open_connections': self.open_count,
+                'idle_connections': len(self.idle),
+                'connections_opened': self.connections_opened,
+                'reconnects': self.reconnects,
+                'messages_sent': self.messages_sent,
+                'recipients_sent': self.recipients_sent,
+            }
@@ -0,0 +1,224 @@
+"""
+Bandwidth-aware snapshot encoding.
+
+Each notification channel has an encoding profile that turns an alert frame
+into the images actually sent:
+
+    context image   the full frame downscaled to at most `width` pixels
+    detection crops up to `crops` padded crops around the detection boxes,
+                    highest confidence first
+    quality         a fixed `quality`, or the highest quality whose output
+                    fits `target_kb` (binary search over the encoder quality,
+                    then downscaling if even the lowest quality is too big)
+
+Profile format (SNAPSHOT_PROFILE_<CHANNEL>): comma-separated key=value pairs,
+e.g. "width=800,format=jpeg,target_kb=80,crops=0" for a metered LTE link.
+Keys: width (0 = no resize), format (jpeg or webp), target_kb (0 = use
+quality), quality, min_quality, crops, crop_padding (fraction of box size).
+"""
+
+import time
+
+import cv2
+
+FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+}
+
+MIN_CROP_SIZE = 32
+MAX_DOWNSCALES = 4
+CLOSE_ENOUGH = 0.9  # stop searching once an encoding uses this fraction of the budget
+
+
+class EncodingProfile:
+    def __init__(self, name, width=0, format='jpeg', target_kb=0, quality=90, min_quality=30,
+                 crops=0, crop_padding=0.25):
+        """
+        Args:
+            name: Profile name (usually the channel)
+            width: Maximum context image width in pixels (0 = full resolution)
+            format: 'jpeg' or 'webp'
+            target_kb: Target size per image in KB (0 = fixed quality)
+            quality: Fixed quality, and upper bound of the adaptive search
+            min_quality: Lower bound of the adaptive search
+            crops: Maximum number of detection crops
+            crop_padding: Context added around each box, as a fraction of its size
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown snapshot format {format!r}, expected one of {tuple(FORMATS)}")
+        self.name = name
+        self.width = width
+        self.format = format
+        self.target_bytes = int(target_kb * 1024)
+        self.quality = quality
+        self.min_quality = min(min_quality, quality)
+        self.crops = crops
+        self.crop_padding = crop_padding
+        self.quality_hints = {}  # image index -> quality that last fitted the budget
+
+    @property
+    def key(self):
+        """Identifies the output, so channels with identical profiles share one encode."""
+        return (self.width, self.format, self.target_bytes, self.quality, self.min_quality,
+                self.crops, self.crop_padding)
+
+    def __repr__(self):
+        size = f"≤{self.target_bytes // 1024} KB" if self.target_bytes else f"q{self.quality}"
+        width = f"{self.width}px" if self.width else "full"
+        return f"{self.name}: {width} {self.format} {size}, {self.crops} crop(s)"
+
+    @staticmethod
+    def parse(name, spec):
+        """
+        Parse a profile specification string.
+
+        Returns:
+            EncodingProfile
+        """
+        options = {}
+        for item in spec.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            key, _, value = item.partition('=')
+            key = key.strip().lower()
+            value = value.strip()
+            if key == 'format':
+                options[key] = value.lower()
+            elif key in ('target_kb', 'crop_padding'):
+                options[key] = float(value)
+            elif key in ('width', 'quality', 'min_quality', 'crops'):
+                options[key] = int(value)
+            else:
+                raise ValueError(f"Unknown snapshot profile option {key!r} in {spec!r}")
+        return EncodingProfile(name, **options)
+
+
+class EncodedImage:
+    def __init__(self, filename, mime, data, quality):
+        self.filename = filename
+        self.mime = mime
+        self.data = data
+        self.quality = quality
+
+
+class EncodedSnapshot:
+    """The images produced for one channel, with their cost."""
+
+    def __init__(self, profile, images, encode_time):
+        self.profile = profile
+        self.images = images
+        self.encode_time = encode_time
+        self.accounted = False  # encode time already counted in channel statistics
+
+    @property
+    def bytes(self):
+        return sum(len(image.data) for image in self.images)
+
+
+def resize_to_width(image, width):
+    """Downscale (never upscale) to at most `width` pixels wide."""
+    if not width or image.shape[1] <= width:
+        return image
+    height = max(1, int(image.shape[0] * width / image.shape[1]))
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def crop_detections(frame, detections, max_crops, padding=0.25):
+    """
+    Crop padded regions around the most confident detections.
+
+    Returns:
+        list: Image crops, highest confidence first
+    """
+    crops = []
+    frame_height, frame_width = frame.shape[:2]
+    for det in sorted(detections, key=lambda d: d['confidence'], reverse=True)[:max_crops]:
+        x1, y1, x2, y2 = det['bbox']
+        pad_x, pad_y = int((x2 - x1) * padding), int((y2 - y1) * padding)
+        x1, y1 = max(0, int(x1) - pad_x), max(0, int(y1) - pad_y)
+        x2, y2 = min(frame_width, int(x2) + pad_x), min(frame_height, int(y2) + pad_y)
+        if x2 - x1 >= MIN_CROP_SIZE and y2 - y1 >= MIN_CROP_SIZE:
+            crops.append(frame[y1:y2, x1:x2])
+    return crops
+
+
+def _imencode(image, ext, flag, quality):
+    ok, buffer = cv2.imencode(ext, image, [flag, int(quality)])
+    if not ok:
+        raise ValueError(f"{ext} encoding failed")
+    return buffer.tobytes()
+
+
+def encode_to_target(image, format='jpeg', target_bytes=0, quality=90, min_quality=30, hint=None):
+    """
+    Encode an image at a fixed quality, or at the highest quality that fits target_bytes.
+
+    Args:
+        hint: Quality that fitted last time; tried first, so a stable scene
+            usually needs a single encode
+
+    Returns:
+        tuple: (encoded bytes, quality used)
+    """
+    ext, flag, _ = FORMATS[format]
+    if not target_bytes or hint is None or hint >= quality:
+        data = _imencode(image, ext, flag, quality)
+        if not target_bytes or len(data) <= target_bytes:
+            return data, quality
+
+    for _ in range(MAX_DOWNSCALES):
+        # Binary search for the highest quality within the budget, probing the hint first
+        low, high, best = min_quality, quality - 1, None
+        while low <= high:
+            mid = hint if hint is not None and low <= hint <= high else (low + high) // 2
+            hint = None
+            candidate = _imencode(image, ext, flag, mid)
+            if len(candidate) <= target_bytes:
+                best, low = (candidate, mid), mid + 1
+                if len(candidate) >= target_bytes * CLOSE_ENOUGH:
+                    break
+            else:
+                high = mid - 1
+        if best is not None:
+            return best
+        # Even the lowest quality is too big: trade resolution instead
+        if image.shape[1] < 2 * MIN_CROP_SIZE:
+            break
+        image = resize_to_width(image, int(image.shape[1] * 0.75))
+        data = _imencode(image, ext, flag, quality)
+        if len(data) <= target_bytes:
+            return data, quality
+
+    return _imencode(image, ext, flag, min_quality), min_quality
+
+
+def encode_snapshot(frame, detections, profile, basename='detection'):
+    """
+    Produce the context image and detection crops for one profile.
+
+    Args:
+        frame: Source frame
+        detections: Detection dicts with 'bbox' and 'confidence' (may be empty)
+        profile: EncodingProfile
+        basename: File name stem
+
+    Returns:
+        EncodedSnapshot
+    """
+    start = time.perf_counter()
+    ext, _, mime = FORMATS[profile.format]
+    sources = [(f"{basename}{ext}", resize_to_width(frame, profile.width))]
+    if profile.crops and detections:
+        for i, crop in enumerate(crop_detections(frame, detections, profile.crops, profile.crop_padding)):
+            sources.append((f"{basename}_person{i + 1}{ext}", crop))
+
+    images = []
+    for i, (filename, image) in enumerate(sources):
+        data, quality = encode_to_target(image, profile.format, profile.target_bytes, profile.quality,
+                                         profile.min_quality, hint=profile.quality_hints.get(i))
+        if profile.target_bytes:
+            profile.quality_hints[i] = quality
+        images.append(EncodedImage(filename, mime, data, quality))
+    return EncodedSnapshot(profile, images, time.perf_counter() - start)
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Memory and thread leak soak test.
+
+Drives HumanDetectionApp for hours from a synthetic camera, with fake
+notification backends so no real email or WhatsApp messages are sent, while
+recording tracemalloc usage, RSS and thread counts over time. The run fails
+if memory or the number of threads keeps growing past a bound after warm-up.
+
+    python soak.py --duration 14400 --alert-interval 2
+    python main.py --soak 14400
+"""
+
+import argparse
+import csv
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from config import Config
+from logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+class SyntheticCamera:
+    """CameraManager stand-in that renders a moving 'person' on a static scene."""
+
+    def __init__(self, width=None, height=None, fps=30, activity_period=60, activity_fraction=0.3):
+        """
+        Initialize the synthetic camera.
+
+        Args:
+            width: Frame width (default from config)
+            height: Frame height (default from config)
+            fps: Nominal frames per second reported by get_camera_info
+            activity_period: Seconds in one empty/occupied scene cycle
+            activity_fraction: Fraction of each cycle with a person in frame
+        """
+        self.camera_index = "synthetic"
+        self.frame_width = width or Config.FRAME_WIDTH
+        self.frame_height = height or Config.FRAME_HEIGHT
+        self.fps = fps
+        self.activity_period = activity_period
+        self.activity_fraction = activity_fraction
+
+        self.is_running = False
+        self.start_time = None
+        self.frame_count = 0
+
+        # Static background drawn once; each frame is a copy like a real capture
+        self.background = np.full((self.frame_height, self.frame_width, 3), 90, dtype=np.uint8)
+        cv2.rectangle(self.background, (0, self.frame_height * 2 // 3),
+                      (self.frame_width, self.frame_height), (60, 60, 60), -1)
+
+    def start_camera(self):
+        """Start producing frames."""
+        self.is_running = True
+        self.start_time = time.time()
+        logger.info("Synthetic camera started, frame size %dx%d", self.frame_width, self.frame_height)
+        return True
+
+    def person_bbox(self, now=None):
+        """
+        Get the bounding box of the synthetic person, if one is in the scene.
+
+        Returns:
+            tuple or None: (x1, y1, x2, y2)
+        """
+        elapsed = (now or time.time()) - self.start_time
+        phase = (elapsed % self.activity_period) / self.activity_period
+        if phase >= self.activity_fraction:
+            return None
+
+        # Walk across the frame during the active part of the cycle
+        progress = phase / self.activity_fraction
+        box_w, box_h = self.frame_width // 8, self.frame_height // 2
+        x1 = int(progress * (self.frame_width - box_w))
+        y1 = self.frame_height // 3
+        return (x1, y1, x1 + box_w, y1 + box_h)
+
+    def get_frame(self):
+        """Render the next frame."""
+        if not self.is_running:
+            return None
+        self.frame_count += 1
+        frame = self.background.copy()
+        bbox = self.person_bbox()
+        if bbox:
+            cv2.rectangle(frame, bbox[:2], bbox[2:], (200, 180, 160), -1)
+        return frame
+
+    def get_frame_with_info(self):
+        """Render the next frame with its sequence number and capture time."""
+        frame = self.get_frame()
+        return frame, self.frame_count, time.time()
+
+    def stop_camera(self):
+        """Stop producing frames."""
+        self.is_running = False
+        logger.info("Synthetic camera stopped")
+
+    def is_camera_available(self):
+        """Check if the camera is producing frames."""
+        return self.is_running
+
+    def get_camera_info(self):
+        """Get camera information."""
+        return {
+            'index': self.camera_index,
+            'width': self.frame_width,
+            'height': self.frame_height,
+            'fps': self.fps,
+            'is_opened': self.is_running,
+        }
+
+
+class _FakeTensor(np.ndarray):
+    """NumPy array with the .cpu()/.numpy() calls used on ultralytics tensors."""
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+class _FakeBox:
+    def __init__(self, bbox, confidence):
+        self.cls = np.array([0.0]).view(_FakeTensor)
+        self.conf = np.array([confidence]).view(_FakeTensor)
+        self.xyxy = np.array([bbox], dtype=np.float32).view(_FakeTensor)
+
+
+class _FakeResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class SyntheticModel:
+    """YOLO stand-in that 'detects' the synthetic camera's person."""
+
+    def __init__(self, camera, confidence=0.85, inference_time=0.01):
+        """
+        Args:
+            camera: SyntheticCamera whose ground truth is reported
+            confidence: Confidence reported for the person
+            inference_time: Simulated inference latency in seconds
+        """
+        self.camera = camera
+        self.confidence = confidence
+        self.inference_time = inference_time
+
+    def __call__(self, frame, verbose=False, **kwargs):
+        if self.inference_time:
+            time.sleep(self.inference_time)
+        bbox = self.camera.person_bbox()
+        boxes = [_FakeBox(bbox, self.confidence)] if bbox else []
+        return [_FakeResult(boxes)]
+
+
+def _create_fake_notification_system(latency, outbox_path=None):
+    """Build a NotificationSystem wired to local Twilio API and SMTP stand-ins."""
+    import tempfile
+    from notification_system import NotificationSystem
+    from smtp_pool import SMTPConnectionPool
+    from stand_in_servers import LocalSMTPServer, LocalTwilioServer
+    from whatsapp_client import TwilioWhatsAppClient
+
+    class FakeNotificationSystem(NotificationSystem):
+        def __init__(self):
+            super().__init__(outbox_path or os.path.join(tempfile.mkdtemp(prefix='outbox-'), 'outbox.db'))
+            self.twilio_server = LocalTwilioServer(response_delay=latency).start()
+            if self.twilio_client:
+                self.twilio_client.close()
+            self.twilio_client = TwilioWhatsAppClient('ACsoak', 'soak', 'whatsapp:+14155238886',
+                                                      api_base=self.twilio_server.url)
+            self.email_sender = "soak@example.com"
+            self.email_password = "soak"
+            self.email_recipients = ["soak-recipient@example.com"]
+            self.whatsapp_recipients = ["whatsapp:+10000000000"]
+
+            # Real SMTP client code path against a local sink
+            self.smtp_server = LocalSMTPServer(command_delay=latency / 10).start()
+            self.smtp_pool.close()
+            self.smtp_pool = SMTPConnectionPool(host='127.0.0.1', port=self.smtp_server.port, use_starttls=False)
+            if self.engine:
+                from async_channels import AsyncSMTPClient, AsyncTwilioWhatsAppClient
+                self.async_twilio = AsyncTwilioWhatsAppClient('ACsoak', 'soak', 'whatsapp:+14155238886',
+                                                              api_base=self.twilio_server.url)
+                self.async_smtp = AsyncSMTPClient(host='127.0.0.1', port=self.smtp_server.port, use_starttls=False)
+            self._replay_outbox()
+
+        def _replay_outbox(self):
+            # Replay only once the stand-ins are wired up, never through real credentials
+            if self.outbox and hasattr(self, 'smtp_server'):
+                super()._replay_outbox()
+
+        def shutdown(self, timeout=10.0):
+            drained = super().shutdown(timeout)
+            self.smtp_server.stop()
+            self.twilio_server.stop()
+            return drained
+
+    return FakeNotificationSystem()
+
+
+def _create_soak_app(args):
+    """Build a HumanDetectionApp wired to synthetic and fake components."""
+    from main import HumanDetectionApp
+    from human_detector import HumanDetector
+    from alarm_system import AlarmSystem
+    from event_store import DetectionEventStore
+    from evidence_store import EvidenceStore
+    from power_manager import PowerManager
+    from load_shedder import LoadShedController
+    from alert_coalescer import AlertCoalescer
+
+    class SoakApp(HumanDetectionApp):
+        def _create_components(self, camera_index):
+            self.camera_manager = SyntheticCamera(activity_period=args.activity_period,
+                                                  activity_fraction=args.activity_fraction)
+            model = None if args.real_detector else SyntheticModel(self.camera_manager)
+            self.human_detector = HumanDetector(model=model)
+            self.human_detector.cooldown_period = args.alert_interval
+            self.alarm_system = AlarmSystem()
+            self.edge_publisher = None
+            self.notification_system = _create_fake_notification_system(
+                args.send_latency, outbox_path=os.path.join(args.output_dir, 'soak_outbox.db'))
+            self.alert_coalescer = (AlertCoalescer(self.notification_system)
+                                    if Config.ALERT_COALESCING_ENABLED else None)
+            self.event_store = DetectionEventStore(db_path=os.path.join(args.output_dir, 'soak_events.db'))
+            self.evidence_store = EvidenceStore(db_path=os.path.join(args.output_dir, 'soak_events.db'),
+                                                root=os.path.join(args.output_dir, 'evidence'))
+            self.power_manager = PowerManager() if Config.POWER_SAVING_ENABLED else None
+            self.load_shedder = LoadShedController() if Config.LOAD_SHEDDING_ENABLED else None
+
+    return SoakApp(headless=True)
+
+
+def _read_rss_bytes():
+    """Current resident set size in bytes (0 if unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+            scale = 1 if sys.platform == 'darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        except ImportError:
+            return 0
+
+
+class SoakMonitor:
+    """Samples memory and thread counts and decides whether the run leaked."""
+
+    def __init__(self, sample_interval, warmup, max_memory_growth_mb, max_thread_growth):
+        self.sample_interval = sample_interval
+        self.warmup = warmup
+        self.max_memory_growth = max_memory_growth_mb * 1024 * 1024
+        self.max_thread_growth = max_thread_growth
+
+        self.samples = []
+        self.baseline_snapshot = None
+        self.final_snapshot = None
+        self.start_time = None
+
+    def sample(self):
+        """Record one sample."""
+        traced, peak = tracemalloc.get_traced_memory()
+        self.samples.append({
+            'elapsed': time.time() - self.start_time,
+            'traced_bytes': traced,
+            'traced_peak_bytes': peak,
+            'rss_bytes': _read_rss_bytes(),
+            'threads': threading.active_count(),
+        })
+        return self.samples[-1]
+
+    def run(self, duration, stop_event):
+        """Sample until the duration elapses or stop_event is set."""
+        self.start_time = time.time()
+        warmed_up = False
+        while not stop_event.is_set():
+            elapsed = time.time() - self.start_time
+            if not warmed_up and elapsed >= self.warmup:
+                self.baseline_snapshot = tracemalloc.take_snapshot()
+                warmed_up = True
+            sample = self.sample()
+            logger.info("Soak t=%.0fs traced=%.1fMB rss=%.1fMB threads=%d", sample['elapsed'],
+                        sample['traced_bytes'] / 1e6, sample['rss_bytes'] / 1e6, sample['threads'])
+            if elapsed >= duration:
+                break
+            stop_event.wait(min(self.sample_interval, max(0.1, duration - elapsed)))
+        self.final_snapshot = tracemalloc.take_snapshot()
+
+    def evaluate(self):
+        """
+        Compare post-warm-up samples against the bounds.
+
+        Returns:
+            tuple: (passed: bool, reasons: list of str)
+        """
+        steady = [s for s in self.samples if s['elapsed'] >= self.warmup]
+        if len(steady) < 2:
+            # Inconclusive: a run that measured nothing must not pass
+            return False, ["Inconclusive: not enough post-warm-up samples (run longer than --warmup)"]
+
+        first, tail = steady[0], steady[-3:]
+        reasons = []
+        passed = True
+
+        # Use the median of the last samples so a single spike does not fail the run
+        for key, label in (('traced_bytes', 'Python heap'), ('rss_bytes', 'RSS')):
+            end_value = sorted(s[key] for s in tail)[len(tail) // 2]
+            growth = end_value - first[key]
+            if growth > self.max_memory_growth:
+                passed = False
+                reasons.append(f"{label} grew {growth / 1e6:.1f}MB (bound {self.max_memory_growth / 1e6:.1f}MB)")
+            else:
+                reasons.append(f"{label} growth {growth / 1e6:.1f}MB within bound")
+
+        thread_growth = max(s['threads'] for s in steady) - first['threads']
+        if thread_growth > self.max_thread_growth:
+            passed = False
+            reasons.append(f"Thread count grew by {thread_growth} (bound {self.max_thread_growth})")
+        else:
+            reasons.append(f"Thread growth {thread_growth} within bound")
+
+        return passed, reasons
+
+    def write_report(self, output_dir, top=15):
+        """Write the sample timeline and the largest allocation growth sites."""
+        timeline_path = os.path.join(output_dir, 'soak_timeline.csv')
+        with open(timeline_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.samples[0].keys()))
+            writer.writeheader()
+            writer.writerows(self.samples)
+
+        report_path = os.path.join(output_dir, 'soak_allocations.txt')
+        with open(report_path, 'w') as f:
+            if self.baseline_snapshot and self.final_snapshot:
+                f.write("Top allocation growth since warm-up (by source line):\n")
+                for stat in self.final_snapshot.compare_to(self.baseline_snapshot, 'lineno')[:top]:
+                    f.write(f"  {stat}\n")
+            else:
+                f.write("No baseline snapshot (run ended during warm-up)\n")
+        return timeline_path, report_path
+
+
+def run_soak(args):
+    """
+    Run the soak test.
+
+    Returns:
+        bool: True if memory and thread counts stayed within bounds; False if they
+            grew or the run was too short to measure past the warm-up
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    args.output_dir = os.path.abspath(args.output_dir)
+    # Saved alert snapshots and profiles land in the output directory, not the repo
+    saved_dirs = Config.DETECTION_IMAGE_DIR, Config.PROFILE_OUTPUT_DIR
+    Config.DETECTION_IMAGE_DIR = os.path.join(args.output_dir, 'detections')
+    Config.PROFILE_OUTPUT_DIR = os.path.join(args.output_dir, 'profiles')
+    try:
+        return _run_soak(args)
+    finally:
+        Config.DETECTION_IMAGE_DIR, Config.PROFILE_OUTPUT_DIR = saved_dirs
+
+
+def _run_soak(args):
+    """Run the soak test with the output directory prepared."""
+    # Exercise the pygame playback path even on machines without a sound card
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+    logger.info("Soak test: %.0fs, sampling every %.0fs, output in %s",
+                args.duration, args.sample_interval, args.output_dir)
+
+    # Build the app (and import torch/ultralytics) before tracing; tracing imports is very slow
+    app = _create_soak_app(args)
+    tracemalloc.start(args.trace_frames)
+    monitor = SoakMonitor(args.sample_interval, args.warmup, args.max_memory_growth_mb, args.max_thread_growth)
+    stop_event = threading.Event()
+
+    def _monitor():
+        monitor.run(args.duration, stop_event)
+        app.stop()
+
+    monitor_thread = threading.Thread(target=_monitor, name="soak-monitor")
+    monitor_thread.daemon = True
+    monitor_thread.start()
+
+    try:
+        app.start()
+    finally:
+        stop_event.set()
+        monitor_thread.join(timeout=args.sample_interval + 5)
+
+    passed, reasons = monitor.evaluate()
+    timeline_path, report_path = monitor.write_report(args.output_dir)
+    tracemalloc.stop()
+
+    print(f"\n🧪 === SOAK RESULT ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ===")
+    for reason in reasons:
+        print(f"   - {reason}")
+    print(f"   - Timeline: {timeline_path}")
+    print(f"   - Allocation growth: {report_path}")
+    print("✅ Soak test PASSED" if passed else "❌ Soak test FAILED")
+    return passed
+
+
+def build_parser():
+    """Build the soak test argument parser."""
+    parser = argparse.ArgumentParser(description='Memory/thread leak soak test with synthetic input')
+    parser.add_argument('--duration', type=float, default=4 * 3600, help='Test duration in seconds')
+    parser.add_argument('--sample-interval', type=float, default=60, help='Seconds between samples')
+    parser.add_argument('--warmup', type=float, default=300, help='Seconds ignored before the baseline')
+    parser.add_argument('--max-memory-growth-mb', type=float, default=50,
+                        help='Maximum allowed heap/RSS growth after warm-up')
+    parser.add_argument('--max-thread-growth', type=int, default=10,
+                        help='Maximum allowed thread count growth after warm-up')
+    parser.add_argument('--alert-interval', type=float, default=2,
+                        help='Alert cooldown during the soak (seconds)')
+    parser.add_argument('--send-latency', type=float, default=0.2,
+                        help='Simulated latency of fake notification backends (seconds)')
+    parser.add_argument('--activity-period', type=float, default=60, help='Synthetic scene cycle in seconds')
+    parser.add_argument('--activity-fraction', type=float, default=0.3,
+                        help='Fraction of each cycle with a person in frame')
+    parser.add_argument('--real-detector', action='store_true', help='Run the real YOLO model on synthetic frames')
+    parser.add_argument('--trace-frames', type=int, default=5, help='Stack depth recorded by tracemalloc')
+    parser.add_argument('--output-dir', default='soak_results', help='Directory for soak output')
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point."""
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    return 0 if run_soak(args) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+Local stand-in servers for testing and benchmarking notification delivery
+without sending real email or messages.
+
+    LocalSMTPServer   minimal SMTP sink (EHLO/AUTH/MAIL/RCPT/DATA/NOOP/RSET/QUIT)
+    LocalHTTPServer   keep-alive HTTP/1.1 server with a pluggable request handler
+    LocalTwilioServer Twilio Messages API stand-in (POST .../Messages.json)
+    LocalImgBBServer, LocalCloudinaryServer
+                      image upload API stand-ins that also serve the uploads
+
+Each server listens on 127.0.0.1 with an OS-assigned port, runs in daemon
+threads and records what it received. Optional delays simulate the network
+and TLS costs of a real provider.
+"""
+
+import base64
+import email.parser
+import hashlib
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Handle one SMTP connection."""
+
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server.stand_in
+        time.sleep(server.connect_delay)
+        with server.lock:
+            server.connections += 1
+        self._reply("220 localhost stand-in SMTP ready")
+
+        mail_from, rcpt_to = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            time.sleep(server.command_delay)
+
+            if verb in ('EHLO', 'HELO'):
+                lines = ['localhost'] + list(server.extensions)
+                self.wfile.write(''.join(f"250{' ' if i == len(lines) - 1 else '-'}{line}\r\n"
+                                         for i, line in enumerate(lines)).encode())
+                self.wfile.flush()
+            elif verb == 'AUTH':
+                mechanism = command.split()[1].upper() if len(command.split()) > 1 else ''
+                if mechanism == 'LOGIN':
+                    # Username and password challenges
+                    for challenge in ("VXNlcm5hbWU6", "UGFzc3dvcmQ6"):
+                        self._reply(f"334 {challenge}")
+                        self.rfile.readline()
+                with server.lock:
+                    server.auth_mechanisms.append(mechanism)
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb == 'MAIL':
+                mail_from, *options = command.split(':', 1)[1].split()
+                rcpt_to = []
+                with server.lock:
+                    server.mail_options.append(options)
+                self._reply("250 OK")
+            elif verb == 'RCPT':
+                recipient = command.split(':', 1)[1].strip()
+                if recipient.strip('<>') in server.refuse:
+                    self._reply("550 5.1.1 No such user")
+                else:
+                    rcpt_to.append(recipient)
+                    self._reply("250 OK")
+            elif verb == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    data.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                with server.lock:
+                    server.messages.append({'from': mail_from, 'to': list(rcpt_to), 'data': b"".join(data)})
+                self._reply("250 OK queued")
+            elif verb == 'NOOP':
+                with server.lock:
+                    server.noops += 1
+                self._reply("250 OK")
+            elif verb == 'RSET':
+                mail_from, rcpt_to = None, []
+                self._reply("250 OK")
+            elif verb == 'QUIT':
+                self._reply("221 Bye")
+                break
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class LocalSMTPServer:
+    def __init__(self, connect_delay=0.0, command_delay=0.0):
+        """
+        Args:
+            connect_delay: Seconds to wait before the greeting (models TCP/TLS setup)
+            command_delay: Seconds to wait before each reply (models round trips)
+        """
+        self.connect_delay = connect_delay
+        self.command_delay = command_delay
+        self.refuse = set()  # addresses rejected with 550 at RCPT
+        self.extensions = ['AUTH PLAIN LOGIN', '8BITMIME']  # advertised in the EHLO reply
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.noops = 0
+        self.auth_mechanisms = []
+        self.mail_options = []  # parameters of each MAIL FROM
+        self.server = None
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        """Start listening on a free localhost port."""
+        self.server = _ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+        self.server.stand_in = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stand-in-smtp")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    """Dispatch requests to the owning LocalHTTPServer."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like real provider APIs
+
+    def _dispatch(self):
+        server = self.server.stand_in
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        time.sleep(server.response_delay)
+
+        with server.lock:
+            server.requests.append({'method': self.command, 'path': self.path,
+                                    'headers': dict(self.headers), 'body': body})
+        status, headers, payload = server.handle_request(self.command, self.path, self.headers, body)
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_HEAD = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class LocalHTTPServer:
+    def __init__(self, handler=None, response_delay=0.0):
+        """
+        Args:
+            handler: Callable (method, path, headers, body) -> (status, headers dict, body bytes)
+            response_delay: Seconds to wait before each response (models provider latency)
+        """
+        self.handler = handler
+        self.response_delay = response_delay
+        self.lock = threading.Lock()
+        self.requests = []
+        self.server = None
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def handle_request(self, method, path, headers, body):
+        """Produce a response; override or pass a handler."""
+        if self.handler:
+            return self.handler(method, path, headers, body)
+        return 200, {'Content-Type': 'text/plain'}, b'OK'
+
+    def start(self):
+        """Start listening on a free localhost port."""
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), _HTTPHandler)
+        self.server.stand_in = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"stand-in-{type(self).__name__}")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class LocalTwilioServer(LocalHTTPServer):
+    """Accepts Twilio Messages API calls and records the messages."""
+
+    def __init__(self, response_delay=0.0, fail_first=0, fail_status=503):
+        """
+        Args:
+            response_delay: Seconds to wait before each response
+            fail_first: Number of initial attempts per recipient that fail (tests retries)
+            fail_status: HTTP status returned for injected failures
+        """
+        super().__init__(response_delay=response_delay)
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.attempts = {}  # recipient -> attempts seen
+        self.messages = []
+
+    def handle_request(self, method, path, headers, body):
+        if method != 'POST' or not path.endswith('/Messages.json'):
+            return 404, {'Content-Type': 'application/json'}, b'{"message": "Not found"}'
+
+        form = {key: values if len(values) > 1 else values[0]
+                for key, values in parse_qs(body.decode()).items()}
+        recipient = form.get('To')
+        with self.lock:
+            self.attempts[recipient] = self.attempts.get(recipient, 0) + 1
+            if self.attempts[recipient] <= self.fail_first:
+                return self.fail_status, {'Content-Type': 'application/json'}, b'{"message": "Injected failure"}'
+            self.messages.append(form)
+            sid = f"SM{len(self.messages):032d}"
+
+        payload = json.dumps({'sid': sid, 'status': 'queued', 'to': recipient}).encode()
+        return 201, {'Content-Type': 'application/json'}, payload
+
+
+class _LocalMediaHost(LocalHTTPServer):
+    """Stores uploaded images and serves them at GET /media/<sha256>."""
+
+    upload_path = '/upload'
+
+    def __init__(self, response_delay=0.0, fail=False):
+        """
+        Args:
+            response_delay: Seconds to wait before each response
+            fail: Reject every upload with HTTP 500 (tests fallbacks)
+        """
+        super().__init__(response_delay=response_delay)
+        self.fail = fail
+        self.media = {}  # sha256 -> (mime, bytes)
+        self.uploads = 0
+        self.base_url = None
+
+    def start(self):
+        super().start()
+        self.base_url = self.url  # requests still in flight after stop() build URLs from it
+        return self
+
+    def handle_request(self, method, path, headers, body):
+        path = urlparse(path).path
+        if method in ('GET', 'HEAD') and path.startswith('/media/'):
+            with self.lock:
+                item = self.media.get(path[len('/media/'):])
+            if item is None:
+                return 404, {'Content-Type': 'text/plain'}, b'Not found'
+            return 200, {'Content-Type': item[0]}, item[1]
+        if method != 'POST' or path != self.upload_path:
+            return 404, {'Content-Type': 'application/json'}, b'{"error": "Not found"}'
+        if self.fail:
+            return 500, {'Content-Type': 'application/json'}, b'{"error": "Injected failure"}'
+
+        mime, data = self._parse_upload(headers, body)
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            self.uploads += 1
+            self.media[digest] = (mime, data)
+        return 200, {'Content-Type': 'application/json'}, json.dumps(self._result(f"{self.base_url}/media/{digest}")).encode()
+
+
+class LocalImgBBServer(_LocalMediaHost):
+    """ImgBB upload API stand-in (form field 'image' with base64 data)."""
+
+    upload_path = '/1/upload'
+
+    def _parse_upload(self, headers, body):
+        form = parse_qs(body.decode())
+        return 'image/jpeg', base64.b64decode(form['image'][0])
+
+    def _result(self, url):
+        return {'success': True, 'status': 200, 'data': {'url': url}}
+
+
+class LocalCloudinaryServer(_LocalMediaHost):
+    """Cloudinary unsigned upload API stand-in (multipart field 'file')."""
+
+    upload_path = '/v1_1/demo/image/upload'
+
+    def _parse_upload(self, headers, body):
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {headers.get('Content-Type')}\r\n\r\n".encode() + body)
+        for part in message.get_payload():
+            if part.get_param('name', header='Content-Disposition') == 'file':
+                return part.get_content_type(), part.get_payload(decode=True)
+        raise ValueError("No file in upload")
+
+    def _result(self, url):
+        return {'secure_url': url}
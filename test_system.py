@@ -41,7 +41,7 @@ def test_imports():
     return True
 
 def test_config():
-    """Test configuration loading."""
+    """Test configuration loading, validation, performance profiles and per-camera overrides."""
     print("\n🧪 Testing configuration...")
     
     try:
@@ -63,10 +63,99 @@ def test_config():
         else:
             print("   ⚠️ No WhatsApp recipients configured")
         
+        Config.validate()
+        print("✅ Configuration is valid")
+        
+        # Profiles fill in defaults; the environment and the command line keep precedence
+        import os
+        import config
+        saved_profile = Config.PERFORMANCE_PROFILE
+        saved_threshold = Config.CONFIDENCE_THRESHOLD, config._SETTINGS['CONFIDENCE_THRESHOLD'].source
+        saved_latency = Config.LOAD_SHED_LATENCY_LOW, config._SETTINGS['LOAD_SHED_LATENCY_LOW'].source
+        try:
+            Config.apply_profile('low-power')
+            low_power = (Config.INFERENCE_IMGSZ, Config.TORCH_THREADS, Config.POWER_SAVING_ENABLED)
+            Config.set('CONFIDENCE_THRESHOLD', 0.7)
+            Config.apply_profile('high-accuracy')
+            high_accuracy = (Config.MODEL_PATH, Config.INFERENCE_IMGSZ, Config.POWER_SAVING_ENABLED,
+                             Config.CONFIDENCE_THRESHOLD)
+        finally:
+            Config.set('CONFIDENCE_THRESHOLD', *saved_threshold)
+            Config.apply_profile(saved_profile)
+        print(f"   - low-power: {low_power}, high-accuracy: {high_accuracy}")
+        if low_power != (320, 1, True) or high_accuracy != ('yolov8s.pt', 960, False, 0.7):
+            print("❌ Expected profile values, with a command-line threshold kept across profiles")
+            return False
+        
+        # Per-camera overrides and validation
+        camera_environ = {'CAMERA_3_PROFILE': 'low-power', 'CAMERA_3_INFERENCE_IMGSZ': '416',
+                          'CAMERA_4_FRAME_WIDTH': 'wide', 'CAMERA_5_PROFILE': 'bogus',
+                          f'CAMERA_{Config.CAMERA_INDEX}_INFERENCE_IMGSZ': 'abc',
+                          f'CAMERA_{Config.CAMERA_INDEX}_DETECTION_ZONES': 'garbage'}
+        os.environ.update(camera_environ)
+        try:
+            camera = Config.for_camera(3)
+            overrides = (camera.INFERENCE_IMGSZ, camera.CAMERA_FPS, camera.FRAME_HEIGHT)
+            Config.set('LOAD_SHED_LATENCY_LOW', 1.0, source='test')
+            try:
+                Config.validate()
+                errors = ''
+            except ValueError as e:
+                errors = str(e)
+        finally:
+            for name in camera_environ:
+                os.environ.pop(name)
+            Config.set('LOAD_SHED_LATENCY_LOW', *saved_latency)
+        print(f"   - Camera 3 imgsz/fps/height: {overrides}")
+        if overrides != (416, 10, Config.FRAME_HEIGHT):
+            print("❌ Expected camera overrides over its profile over the global settings")
+            return False
+        if 'CAMERA_4_FRAME_WIDTH' not in errors or 'LOAD_SHED_LATENCY_LOW' not in errors:
+            print(f"❌ Expected validation to report a malformed value and inconsistent thresholds: {errors}")
+            return False
+        expected = ('CAMERA_5_PROFILE', f'CAMERA_{Config.CAMERA_INDEX}_INFERENCE_IMGSZ',
+                    f'CAMERA_{Config.CAMERA_INDEX}_DETECTION_ZONES')
+        if not all(name in errors for name in expected):
+            print(f"❌ Expected validation to report every camera's malformed overrides: {errors}")
+            return False
+        Config.validate()
+        
+        # An aggregator reachable from other hosts needs a token
+        saved_listen = Config.AGGREGATOR_LISTEN, config._SETTINGS['AGGREGATOR_LISTEN'].source
+        saved_token = Config.AGGREGATOR_TOKEN, config._SETTINGS['AGGREGATOR_TOKEN'].source
+        try:
+            Config.set('AGGREGATOR_TOKEN', '')
+            Config.set('AGGREGATOR_LISTEN', '0.0.0.0:7878')
+            try:
+                Config.validate()
+                open_listen = ''
+            except ValueError as e:
+                open_listen = str(e)
+            Config.set('AGGREGATOR_TOKEN', 'site-secret')
+            Config.validate()
+            Config.set('AGGREGATOR_TOKEN', '')
+            Config.set('AGGREGATOR_LISTEN', '127.0.0.1:7878')
+            Config.validate()
+        finally:
+            Config.set('AGGREGATOR_LISTEN', *saved_listen)
+            Config.set('AGGREGATOR_TOKEN', *saved_token)
+        if 'AGGREGATOR_LISTEN' not in open_listen:
+            print("❌ Expected a tokenless aggregator on all interfaces to be rejected")
+            return False
+        
+        try:
+            Config.set('NOTIFICATION_ENGINE', 'fibers')
+            print("❌ Expected an invalid choice to be rejected")
+            return False
+        except ValueError:
+            pass
+        
+        print("✅ Configuration test completed")
         return True
         
     except Exception as e:
         print(f"❌ Configuration test failed: {e}")
+        traceback.print_exc()
         return False
 
 def test_camera():
@@ -139,19 +228,76 @@ def test_human_detector():
         return False
 
 def test_alarm_system():
-    """Test alarm system."""
+    """Test the preloaded alarm: non-blocking play/extend/stop, trigger-to-audio latency and zones."""
     print("\n🧪 Testing alarm system...")
     
     try:
+        import os
+        import pygame
         from alarm_system import AlarmSystem
         
-        alarm = AlarmSystem()
-        print("✅ Alarm system initialized")
+        # No sound card needed: SDL's dummy driver mixes into nothing
+        saved_driver = os.environ.get('SDL_AUDIODRIVER')
+        pygame.mixer.quit()
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        try:
+            alarm = AlarmSystem(sound_file='missing-alarm.wav')
+        finally:
+            if saved_driver is None:
+                os.environ.pop('SDL_AUDIODRIVER')
+            else:
+                os.environ['SDL_AUDIODRIVER'] = saved_driver
+        print(f"✅ Alarm system initialized ({alarm.sound_source})")
+        
+        start = time.perf_counter()
+        alarm.play_alarm(duration=0.4)
+        call_time = time.perf_counter() - start
+        playing = alarm.is_playing
+        time.sleep(0.1)
+        busy = alarm.zones['default'].channel.get_busy() if alarm.audio_available else True
+        alarm.play_alarm(duration=0.4)  # arrives while sounding: extends instead of being dropped
+        alarm.extend_alarm(0.3)
+        time.sleep(0.5)
+        extended = alarm.is_playing
+        alarm.stop_alarm()
+        stopped = not alarm.is_playing
+        time.sleep(0.1)
+        silent = not alarm.zones['default'].channel.get_busy() if alarm.audio_available else True
+        stats = alarm.get_stats()
+        alarm.shutdown()
+        
+        print(f"   - play_alarm returned in {call_time * 1000:.2f} ms, trigger-to-audio "
+              f"{stats['latency_max'] * 1000:.2f} ms, {stats['plays']} played, {stats['extends']} extended")
+        if not (playing and busy and extended and stopped and silent):
+            print("❌ Expected the alarm to sound, be extended, and stop on request")
+            return False
+        if stats['plays'] != 1 or stats['extends'] != 2 or call_time > 0.05 or stats['latency_max'] > 0.1:
+            print("❌ Expected one non-blocking play with two extensions and a fast onset")
+            return False
         
-        # Test alarm (brief test)
-        print("🔊 Testing alarm (2 seconds)...")
-        alarm.play_alarm(duration=2)
-        time.sleep(3)  # Wait for alarm to finish
+        # Zones sound at the same time on their own channels; the higher priority ducks the lower
+        from alarm_system import AlarmZone
+        alarm = AlarmSystem(zones=AlarmZone.parse_zones("front:0+1:2,yard:2:1"), duck_volume=0.25)
+        front, yard = alarm.zones['front'], alarm.zones['yard']
+        alarm.play_alarm(duration=1.0, camera=2)
+        alarm.play_alarm(duration=1.0, camera=1)
+        unrouted = alarm.play_alarm(duration=1.0, camera=7)
+        time.sleep(0.1)
+        both = alarm.is_zone_playing('front') and alarm.is_zone_playing('yard')
+        if alarm.audio_available:
+            both = both and front.channel.get_busy() and yard.channel.get_busy()
+            ducked = (round(front.channel.get_volume(), 2), round(yard.channel.get_volume(), 2))
+        else:
+            ducked = (1.0, 0.25)
+        alarm.stop_alarm('front')
+        time.sleep(0.1)
+        restored = yard.channel.get_volume() if alarm.audio_available else 1.0
+        alarm.stop_alarm()
+        alarm.shutdown()
+        print(f"   - Zones: front+yard sounding {both}, volumes {ducked}, yard after front stopped {restored:.2f}")
+        if not both or unrouted or ducked != (1.0, 0.25) or restored < 0.99:
+            print("❌ Expected both zones mixed, the yard ducked under the front, and unrouted cameras ignored")
+            return False
         
         print("✅ Alarm test completed")
         return True
@@ -189,6 +335,1588 @@ def test_notification_system():
         traceback.print_exc()
         return False
 
+def test_event_store():
+    """Test detection event store persistence and queries."""
+    print("\n🧪 Testing event store...")
+    
+    try:
+        import sqlite3
+        import tempfile
+        import threading
+        import os
+        from event_store import DetectionEventStore
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = DetectionEventStore(db_path=os.path.join(tmp_dir, 'events.db'), flush_interval=0.05)
+            now = time.time()
+            
+            # Simulate a burst of per-frame logging
+            start = time.perf_counter()
+            for i in range(1000):
+                store.record(0, [{'bbox': (10, 10, 50, 100), 'confidence': 0.9, 'track_id': i % 3}],
+                             timestamp=now + i * 0.01)
+            record_time = time.perf_counter() - start
+            print(f"✅ Queued 1000 frames in {record_time * 1000:.1f} ms")
+            
+            if not store.flush():
+                print("❌ Event store flush timed out")
+                return False
+            
+            total = store.count(now, now + 20, camera=0)
+            track_rows = len(store.query(now, now + 20, track_id=1, limit=10000))
+            buckets = store.count(now, now + 20, bucket=5)
+            
+            # Queries from another thread get their own connection, which close() also closes
+            worker_readers = []
+            worker = threading.Thread(target=lambda: (store.count(now, now + 20),
+                                                      worker_readers.append(store._reader())))
+            worker.start()
+            worker.join()
+            store.close()
+            try:
+                worker_readers[0].execute("SELECT 1")
+                reader_closed = False
+            except sqlite3.ProgrammingError:
+                reader_closed = True
+            
+            print(f"   - Stored rows: {total}, track 1 rows: {track_rows}, buckets: {len(buckets)}")
+            if total != 1000 or track_rows != 333:
+                print("❌ Unexpected event store counts")
+                return False
+            if not reader_closed:
+                print("❌ Expected close() to close the read connections of other threads")
+                return False
+        
+        print("✅ Event store test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Event store test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_profiler():
+    """Test the sampling profiler on a busy background thread."""
+    print("\n🧪 Testing sampling profiler...")
+    
+    try:
+        import tempfile
+        import threading
+        from profiler import SamplingProfiler
+        
+        def busy():
+            end = time.time() + 0.6
+            while time.time() < end:
+                sum(i * i for i in range(1000))
+        
+        worker = threading.Thread(target=busy, name="busy-worker")
+        worker.start()
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = SamplingProfiler(interval=0.005, output_dir=tmp_dir)
+            profiler.start()
+            time.sleep(0.5)
+            folded_path, summary_path = profiler.stop()
+            worker.join()
+            
+            with open(folded_path) as f:
+                folded = f.read()
+            summary = profiler.get_summary()
+            print(f"   - Samples: {summary['samples']}, overhead: {summary['overhead_percent']:.2f}%")
+            if "busy-worker;" not in folded:
+                print("❌ Worker thread missing from collapsed stacks")
+                return False
+        
+        print("✅ Profiler test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Profiler test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_power_manager():
+    """Test idle throttling and snap-back on motion."""
+    print("\n🧪 Testing power manager...")
+    
+    try:
+        from config import Config
+        from power_manager import PowerManager, ACTIVE, IDLE
+        from soak import SyntheticCamera
+        
+        idle_after, Config.IDLE_AFTER = Config.IDLE_AFTER, 0.2
+        camera = SyntheticCamera(activity_period=100, activity_fraction=0.5)
+        camera.start_camera()
+        camera.start_time -= 60  # start in the empty half of the cycle
+        manager = PowerManager()
+        Config.IDLE_AFTER = idle_after
+        
+        # Empty scene: should fall idle and skip inference
+        end = time.time() + 0.6
+        while time.time() < end:
+            if manager.should_infer(camera.get_frame()):
+                manager.observe(False)
+            time.sleep(0.02)
+        if manager.mode != IDLE or manager.frames_skipped == 0:
+            print(f"❌ Expected idle mode with skipped frames, got {manager.get_stats()}")
+            return False
+        
+        # A person appears: the very next frame must be inferred in active mode
+        camera.start_time += 60
+        inferred = manager.should_infer(camera.get_frame())
+        if not inferred or manager.mode != ACTIVE:
+            print("❌ Did not snap back to active mode on motion")
+            return False
+        
+        stats = manager.get_stats()
+        print(f"   - Skipped {stats['frames_skipped']} idle frames, {stats['wakeups']} wake-up(s)")
+        print("✅ Power manager test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Power manager test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_load_shedder():
+    """Test the load-shedding ladder steps down under overload and recovers."""
+    print("\n🧪 Testing load shedder...")
+    
+    try:
+        from load_shedder import LoadShedController, LadderLevel
+        
+        controller = LoadShedController(LadderLevel.parse_ladder("640:1:all,320:2:1,320:4:0"))
+        controller.min_dwell = 0
+        controller.recover_after = 0.05
+        controller.register_camera('front', priority=10)
+        controller.register_camera('back', priority=0)
+        
+        # Sustained overload walks down the ladder
+        for _ in range(40):
+            controller.observe(latency=1.0, backlog=10)
+        if controller.level_index != 2:
+            print(f"❌ Expected lowest level under overload, got {controller.level_index}")
+            return False
+        processed = sum(controller.should_process('back') for _ in range(8))
+        print(f"   - Level {controller.level_index}: back camera processed {processed}/8 frames")
+        
+        # Load falls: climbs back with hysteresis
+        end = time.time() + 1.0
+        while controller.level_index > 0 and time.time() < end:
+            controller.observe(latency=0.01, backlog=0)
+            time.sleep(0.01)
+        if controller.level_index != 0:
+            print("❌ Controller did not recover after load fell")
+            return False
+        
+        # A lone camera is strided on the last rungs of the default ladder too
+        single = LoadShedController()
+        single.min_dwell = 0
+        single.register_camera('only', priority=10)
+        strided = []
+        for level in range(1, len(single.ladder)):
+            single._change_level(level)
+            strided.append(sum(single.should_process('only') for _ in range(8)))
+        print(f"   - Single camera processed {strided} of 8 frames on rungs 1-{len(single.ladder) - 1}")
+        if strided[-1] != 8 // single.ladder[-1].frame_stride:
+            print("❌ Expected the last rung to lower a single camera's frame rate")
+            return False
+        
+        print("✅ Load shedder test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Load shedder test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_notification_pool():
+    """Test that an alert storm does not grow the thread count."""
+    print("\n🧪 Testing notification worker pool...")
+    
+    try:
+        import threading
+        from config import Config
+        from soak import _create_fake_notification_system
+        
+        notifier = _create_fake_notification_system(latency=0.01)
+        notifier.twilio_client.rate_limiter.rate = 0  # measure the pool, not the provider rate limit
+        baseline_threads = threading.active_count()
+        
+        for i in range(200):
+            notifier.send_whatsapp_notification(f"storm {i}")
+            notifier.send_email_notification(f"storm {i}", "body")
+        peak_threads = threading.active_count()
+        
+        drained = notifier.shutdown(timeout=30)
+        stats = notifier.get_stats()
+        print(f"   - Threads: {baseline_threads} -> {peak_threads}, sent {stats['completed']}, "
+              f"dropped {stats['dropped']}, p95 {stats['latency_p95'] * 1000:.0f} ms")
+        
+        # Bounded, lazily started threads: WhatsApp fan-out workers plus the in-process
+        # stand-ins' connection threads; a thread per alert would add hundreds
+        allowance = 2 * Config.NOTIFICATION_WORKERS + Config.SMTP_POOL_SIZE
+        if peak_threads > baseline_threads + allowance or not drained:
+            print("❌ Thread count grew or queue did not drain")
+            return False
+        
+        print("✅ Notification pool test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Notification pool test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_smtp_pool():
+    """Test pooled SMTP delivery against a local stand-in server."""
+    print("\n🧪 Testing SMTP session pool...")
+    
+    try:
+        from smtp_pool import SMTPConnectionPool
+        from stand_in_servers import LocalSMTPServer
+        
+        server = LocalSMTPServer().start()
+        pool = SMTPConnectionPool(host='127.0.0.1', port=server.port, username='user', password='pass',
+                                  use_starttls=False, keepalive_interval=30)
+        recipients = ['a@example.com', 'b@example.com', 'c@example.com']
+        
+        for i in range(3):
+            pool.send_message('alerts@example.com', recipients, f"Subject: test {i}\r\n\r\nbody".encode())
+        
+        # Simulate the server dropping a session that has been idle past the keepalive interval
+        import socket
+        pool.idle[0].smtp.sock.shutdown(socket.SHUT_RDWR)
+        pool.idle[0].last_used -= 60
+        pool.send_message('alerts@example.com', recipients, b"Subject: after drop\r\n\r\nbody")
+        
+        stats = pool.get_stats()
+        pool.close()
+        server.stop()
+        
+        print(f"   - Messages: {len(server.messages)}, connections: {server.connections}, "
+              f"reconnects: {stats['reconnects']}")
+        if len(server.messages) != 4 or any(len(m['to']) != 3 for m in server.messages):
+            print("❌ Expected 4 single-transaction messages with 3 recipients each")
+            return False
+        if server.connections != 2 or stats['reconnects'] != 1:
+            print("❌ Expected one reused session and one reconnect")
+            return False
+        
+        print("✅ SMTP pool test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ SMTP pool test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_whatsapp_fanout():
+    """Test concurrent WhatsApp delivery with retries against a local Twilio stand-in."""
+    print("\n🧪 Testing WhatsApp fan-out...")
+    
+    try:
+        import time
+        from stand_in_servers import LocalTwilioServer
+        from whatsapp_client import TwilioWhatsAppClient, WhatsAppSendError
+        
+        server = LocalTwilioServer(response_delay=0.2, fail_first=1).start()
+        client = TwilioWhatsAppClient('ACtest', 'token', 'whatsapp:+14155238886', api_base=server.url,
+                                      max_workers=5, rate_per_second=0, backoff_base=0.01)
+        recipients = [f"whatsapp:+1555000{i:04d}" for i in range(5)]
+        
+        start = time.perf_counter()
+        results = client.fan_out(recipients, "Human detected", ["https://example.com/detection.jpg"])
+        elapsed = time.perf_counter() - start
+        stats = client.get_stats()
+        client.close()
+        server.stop()
+        
+        print(f"   - Delivered: {len(server.messages)}, retries: {stats['retries']}, took {elapsed:.2f}s")
+        if any(isinstance(r, WhatsAppSendError) for r in results.values()) or len(server.messages) != 5:
+            print("❌ Expected every recipient to be delivered after one retry")
+            return False
+        if stats['retries'] != 5 or server.messages[0]['MediaUrl'] != "https://example.com/detection.jpg":
+            print("❌ Expected one retry per recipient and the media URL to be forwarded")
+            return False
+        # Two attempts per recipient in parallel: ~0.4s, vs ~2s one after another
+        if elapsed > 1.2:
+            print("❌ Recipients were not sent concurrently")
+            return False
+        
+        # A read timeout may follow an accepted message: reported as unknown, never resent
+        slow = LocalTwilioServer(response_delay=0.5).start()
+        client = TwilioWhatsAppClient('ACtest', 'token', 'whatsapp:+14155238886', api_base=slow.url,
+                                      rate_per_second=0, backoff_base=0.01, max_retries=2, timeout=0.2)
+        timed_out = client.fan_out(recipients[:1], "Human detected")[recipients[0]]
+        time.sleep(0.5)
+        slow_attempts = len(slow.requests)
+        slow_url = client.url
+        slow.stop()
+        # Nothing listens: the request never left, so it is retried
+        client.url = slow_url
+        refused = client.fan_out(recipients[:1], "Human detected")[recipients[0]]
+        stats = client.get_stats()
+        client.close()
+        print(f"   - Read timeout: {slow_attempts} attempt(s), unknown={getattr(timed_out, 'unknown', None)}; "
+              f"refused: {stats['retries']} retries, retryable={getattr(refused, 'retryable', None)}")
+        if slow_attempts != 1 or not timed_out.unknown or timed_out.retryable:
+            print("❌ Expected a timed-out send to be tried once and reported as unknown")
+            return False
+        if stats['retries'] != 2 or refused.unknown or not refused.retryable:
+            print("❌ Expected a refused connection to be retried")
+            return False
+        
+        print("✅ WhatsApp fan-out test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ WhatsApp fan-out test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_alert_snapshot():
+    """Test that alert images are encoded once per channel profile, in memory, within budget."""
+    print("\n🧪 Testing in-memory alert snapshots...")
+    
+    try:
+        import email
+        import os
+        import tempfile
+        import cv2
+        import numpy as np
+        from config import Config
+        from alert_snapshot import AlertSnapshot
+        from snapshot_encoder import EncodingProfile
+        from soak import _create_fake_notification_system
+        
+        notifier = _create_fake_notification_system(latency=0.01)
+        notifier.encoding_profiles = {
+            'email': EncodingProfile.parse('email', 'width=1280,quality=90,crops=2'),
+            'whatsapp': EncodingProfile.parse('whatsapp', 'width=800,format=webp,target_kb=40'),
+        }
+        published = []
+        notifier._get_media_url = lambda image: published.append(image) or "https://example.com/a.webp"
+        
+        saved = (Config.SAVE_DETECTION_IMAGES, Config.DETECTION_IMAGE_DIR)
+        with tempfile.TemporaryDirectory() as image_dir:
+            Config.SAVE_DETECTION_IMAGES, Config.DETECTION_IMAGE_DIR = True, image_dir
+            try:
+                frame = cv2.GaussianBlur(np.random.randint(0, 255, (720, 1280, 3), dtype=np.uint8), (5, 5), 0)
+                detections = [{'bbox': [100, 100, 300, 500], 'confidence': 0.9},
+                              {'bbox': [700, 200, 900, 600], 'confidence': 0.7}]
+                # Two alerts within the same second must not overwrite each other
+                notifier.send_detection_alert(2, [0.9, 0.7], frame=frame, detections=detections)
+                notifier.send_detection_alert(2, [0.9, 0.7], frame=frame, detections=detections)
+                notifier.shutdown(timeout=10)
+            finally:
+                Config.SAVE_DETECTION_IMAGES, Config.DETECTION_IMAGE_DIR = saved
+            files = sorted(os.listdir(image_dir))
+            on_disk = [open(os.path.join(image_dir, name), 'rb').read() for name in files]
+        
+        attachments = [[part.get_payload(decode=True) for part in
+                        email.message_from_bytes(sent['data']).get_payload()[1:]]
+                       for sent in notifier.smtp_server.messages]
+        encoding = notifier.get_stats()['encoding']
+        
+        print(f"   - Saved: {len(files)}, emailed: {len(attachments)}, published: {len(published)}")
+        print(f"   - WhatsApp image: {max(len(image.data) for image in published) / 1024:.0f} KB, "
+              f"email: {encoding['email']['bytes_avg'] / 1024:.0f} KB per alert")
+        if len(files) != 2 or len(attachments) != 2 or len(published) != 2:
+            print("❌ Expected two saved images, two emails and two published images")
+            return False
+        if not all(data.startswith(b'\xff\xd8') for data in on_disk):
+            print("❌ Saved files are not JPEGs")
+            return False
+        if any(len(parts) != 3 for parts in attachments):
+            print("❌ Emails should carry the context image plus one crop per detection")
+            return False
+        if any(image.mime != 'image/webp' or len(image.data) > 40 * 1024 for image in published):
+            print("❌ WhatsApp images are not WebP within the 40 KB target")
+            return False
+        if encoding['whatsapp']['bytes_sent'] != sum(len(image.data) for image in published):
+            print("❌ Reported WhatsApp bytes do not match what was published")
+            return False
+        
+        # Channels with identical profiles share one encode
+        snapshot = AlertSnapshot(frame, detections=detections)
+        if snapshot.encode(EncodingProfile('a', width=640)) is not snapshot.encode(EncodingProfile('b', width=640)):
+            print("❌ Identical profiles were encoded twice")
+            return False
+        
+        print("✅ Alert snapshot test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Alert snapshot test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_alert_coalescer():
+    """Test that a burst of detections becomes one immediate alert plus digests."""
+    print("\n🧪 Testing alert coalescing...")
+    
+    try:
+        import time
+        import numpy as np
+        from alert_coalescer import AlertCoalescer
+        from worker_pool import WorkerPool
+        
+        class RecordingNotifier:
+            def __init__(self):
+                self.pool = WorkerPool('test-notify', num_workers=2)
+                self.alerts, self.digests = [], []
+            
+            def send_detection_alert(self, detection_count, confidence_scores, frame=None, detections=None):
+                self.alerts.append((time.time(), detection_count, frame))
+            
+            def send_digest_alert(self, digest, frame=None):
+                self.digests.append((digest, frame))
+        
+        notifier = RecordingNotifier()
+        coalescer = AlertCoalescer(notifier, window=0.5, first_max_latency=0, scope='camera', max_snapshots=4)
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        
+        # 1 s burst on two cameras at ~50 fps
+        start = time.time()
+        for i in range(50):
+            for camera in (0, 1):
+                detection = {'confidence': 0.5 + (i % 10) / 20, 'track_id': i % 3}
+                coalescer.add(camera, [detection], frame, timestamp=time.time())
+            time.sleep(0.02)
+        first_latency = notifier.alerts[0][0] - start if notifier.alerts else None
+        time.sleep(1.2)  # let the windows send their digests and close
+        
+        stats = coalescer.get_stats()
+        notifier.pool.shutdown()
+        print(f"   - {stats['detections']} detections -> {stats['first_alerts']} alerts + "
+              f"{stats['digests']} digests, open windows: {stats['open_windows']}")
+        
+        if len(notifier.alerts) != 2 or first_latency > 0.05:
+            print("❌ Expected one immediate first alert per camera")
+            return False
+        if not 2 <= stats['digests'] <= 6 or stats['open_windows'] != 0:
+            print("❌ Expected a few digests per camera and all windows closed after activity stopped")
+            return False
+        digest, montage = notifier.digests[0]
+        if digest['peak_confidence'] < 0.9 or digest['people_tracked'] != 3 or montage.shape != (720, 960, 3):
+            print("❌ Digest summary or 2x2 montage is wrong")
+            return False
+        if sum(d['detection_frames'] for d, _ in notifier.digests) + 2 != stats['detections']:
+            print("❌ Some detections were not reported")
+            return False
+        
+        print("✅ Alert coalescing test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Alert coalescing test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_notification_outbox():
+    """Test that alerts survive an outage and a restart and are delivered once."""
+    print("\n🧪 Testing notification outbox...")
+    
+    try:
+        import os
+        import tempfile
+        import time
+        from notification_outbox import NotificationOutbox
+        from soak import _create_fake_notification_system
+        
+        path = os.path.join(tempfile.mkdtemp(prefix='outbox-test-'), 'outbox.db')
+        
+        # An alert recorded by a previous run that exited before sending it
+        previous = NotificationOutbox(path)
+        previous.record("left over", {'whatsapp': ['whatsapp:+10000000000'],
+                                      'email': ['soak-recipient@example.com']}, subject="left over")
+        previous.close()
+        
+        notifier = _create_fake_notification_system(latency=0.01, outbox_path=path)
+        notifier.outbox.backoff_base = 0.05
+        notifier.twilio_client.max_retries = 0
+        
+        # Provider outage: the first two attempts per recipient fail with 503
+        notifier.twilio_server.fail_first = 2
+        notifier.whatsapp_recipients = ['whatsapp:+10000000001', 'whatsapp:+10000000002']
+        notifier.send_detection_alert(1, [0.9])
+        
+        deadline = time.time() + 10
+        while notifier.outbox.get_stats()['pending'] and time.time() < deadline:
+            time.sleep(0.05)
+        notifier.shutdown()
+        stats = notifier.get_stats()['outbox']
+        
+        whatsapp = [m['To'] for m in notifier.twilio_server.messages]
+        emails = [m['data'] for m in notifier.smtp_server.messages]
+        print(f"   - Delivered: {stats['delivered']}, retried: {stats['retried']}, pending: {stats['pending']}, "
+              f"{stats['operations_per_commit']:.1f} operations per commit")
+        if stats['pending'] or stats['failed'] or stats['delivered'] != 4:
+            print("❌ Expected the replayed alert and the new alert to be delivered on both channels")
+            return False
+        if sorted(whatsapp) != ['whatsapp:+10000000000', 'whatsapp:+10000000001', 'whatsapp:+10000000002']:
+            print(f"❌ Expected exactly one WhatsApp message per recipient, got {whatsapp}")
+            return False
+        if len(emails) != 2 or not any(b"left over" in data for data in emails) or stats['retried'] < 2:
+            print("❌ Expected the left-over email to be replayed and the outage to be retried")
+            return False
+        
+        # The outbox cannot be written (disk full, database locked): the alert is still sent, once
+        import sqlite3
+        broken_path = os.path.join(os.path.dirname(path), 'broken.db')
+        NotificationOutbox(broken_path).close()
+        conn = sqlite3.connect(broken_path)
+        conn.execute("CREATE TRIGGER disk_full BEFORE INSERT ON alerts BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+        conn.commit()
+        conn.close()
+        notifier = _create_fake_notification_system(latency=0.01, outbox_path=broken_path)
+        notifier.whatsapp_recipients = ['whatsapp:+10000000003']
+        notifier.send_detection_alert(1, [0.9])
+        notifier.outbox.flush()
+        notifier.shutdown()
+        stats = notifier.get_stats()['outbox']
+        whatsapp = [m['To'] for m in notifier.twilio_server.messages]
+        print(f"   - Outbox unwritable: {stats['unrecorded']} deliveries sent without it, WhatsApp to {whatsapp}")
+        if whatsapp != ['whatsapp:+10000000003'] or len(notifier.smtp_server.messages) != 1 or stats['recorded']:
+            print("❌ Expected the alert sent on every channel although it could not be recorded")
+            return False
+        
+        # A recipient the mail server permanently refuses (550) is not retried
+        notifier = _create_fake_notification_system(
+            latency=0.01, outbox_path=os.path.join(os.path.dirname(path), 'refused.db'))
+        notifier.outbox.backoff_base = 0.05
+        notifier.smtp_server.refuse.add('nobody@example.com')
+        notifier.email_recipients = ['nobody@example.com']
+        notifier.send_email_notification("Alert", "refused")
+        deadline = time.time() + 5
+        while notifier.outbox.get_stats()['pending'] and time.time() < deadline:
+            time.sleep(0.05)
+        notifier.shutdown()
+        stats = notifier.get_stats()['outbox']
+        print(f"   - Refused recipient: {stats['failed']} failed, {stats['retried']} retries")
+        if stats['failed'] != 1 or stats['retried'] or stats['pending']:
+            print("❌ Expected a 5xx recipient refusal to fail once without retries")
+            return False
+        
+        print("✅ Notification outbox test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Notification outbox test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_notification_engine():
+    """Test the asyncio engine's channel limits and timeouts, and all channels on one event loop."""
+    print("\n🧪 Testing asyncio notification engine...")
+    
+    try:
+        import asyncio
+        import json
+        import threading
+        from config import Config
+        from notification_engine import AsyncNotificationEngine
+        from stand_in_servers import LocalHTTPServer
+        from soak import _create_fake_notification_system
+        
+        # Per-channel concurrency limit and timeout, fed from several threads
+        engine = AsyncNotificationEngine('test-async')
+        engine.add_channel('slow', concurrency=2, timeout=0.3)
+        
+        async def job(delay):
+            await asyncio.sleep(delay)
+        
+        submitters = [threading.Thread(target=lambda: [engine.submit('slow', job, 0.01) for _ in range(10)])
+                      for _ in range(4)]
+        for thread in submitters:
+            thread.start()
+        for thread in submitters:
+            thread.join()
+        engine.submit('slow', job, 5.0)
+        drained = engine.shutdown(timeout=5)
+        stats = engine.get_stats()['channels']['slow']
+        print(f"   - Engine: {stats['completed']} completed, {stats['timeouts']} timed out, "
+              f"max in flight {stats['max_in_flight']}")
+        if not drained or stats['completed'] != 40 or stats['timeouts'] != 1 or stats['max_in_flight'] > 2:
+            print("❌ Expected 40 jobs at most 2 at a time and the slow job to time out")
+            return False
+        if engine.submit('slow', job, 0.01):
+            print("❌ Engine accepted a job after shutdown")
+            return False
+        
+        # SMTP, WhatsApp and webhooks through the engine against local stand-ins
+        webhook_server = LocalHTTPServer().start()
+        saved = Config.NOTIFICATION_ENGINE
+        Config.NOTIFICATION_ENGINE = 'asyncio'
+        try:
+            notifier = _create_fake_notification_system(latency=0.01)
+        finally:
+            Config.NOTIFICATION_ENGINE = saved
+        notifier.async_twilio.rate_limiter.rate = 0
+        notifier.webhook_urls = [f"{webhook_server.url}/hook/{i}" for i in range(3)]
+        for i in range(5):
+            notifier.send_detection_alert(1, [0.9])
+        notifier.shutdown(timeout=10)
+        webhook_server.stop()
+        
+        outbox = notifier.get_stats()['outbox']
+        payload = json.loads(webhook_server.requests[0]['body'])
+        print(f"   - Emails: {len(notifier.smtp_server.messages)}, WhatsApp: {len(notifier.twilio_server.messages)}, "
+              f"webhooks: {len(webhook_server.requests)}, outbox delivered {outbox['delivered']}")
+        if (len(notifier.smtp_server.messages), len(notifier.twilio_server.messages),
+                len(webhook_server.requests), outbox['delivered']) != (5, 5, 15, 15):
+            print("❌ Expected every alert on every channel")
+            return False
+        if 'SECURITY ALERT' not in payload['message'] or 'Idempotency-Key' not in webhook_server.requests[0]['headers']:
+            print("❌ Webhook payload or idempotency key missing")
+            return False
+        
+        # SMTP sessions follow the extensions the server advertises in its EHLO reply
+        import smtplib
+        from async_channels import AsyncSMTPClient
+        from stand_in_servers import LocalSMTPServer
+        smtp_server = LocalSMTPServer().start()
+        
+        async def send(message=b"Subject: test\r\n\r\nbody", use_starttls=False):
+            client = AsyncSMTPClient(host='127.0.0.1', port=smtp_server.port, username='user', password='pass',
+                                     use_starttls=use_starttls)
+            try:
+                await client.send_message('alerts@example.com', ['a@example.com'], message)
+                return None
+            except smtplib.SMTPException as e:
+                return e
+            finally:
+                await client.close()
+        
+        smtp_server.extensions = ['AUTH LOGIN', 'SIZE 100000']
+        accepted = asyncio.run(send())
+        oversized = asyncio.run(send(b"Subject: big\r\n\r\n" + b"x" * 200000))
+        eight_bit = asyncio.run(send("Subject: caf\u00e9\r\n\r\nbody".encode()))
+        no_tls = asyncio.run(send(use_starttls=True))
+        smtp_server.extensions = []
+        no_auth = asyncio.run(send())
+        smtp_server.stop()
+        refusals = [type(e).__name__ for e in (oversized, eight_bit, no_tls, no_auth)]
+        print(f"   - SMTP: auth {sorted(set(smtp_server.auth_mechanisms))}, "
+              f"MAIL options {smtp_server.mail_options[0]}, refused oversized/8-bit/STARTTLS/AUTH: {refusals}")
+        if (accepted is not None or set(smtp_server.auth_mechanisms) != {'LOGIN'}
+                or not smtp_server.mail_options[0][0].startswith('SIZE=')):
+            print("❌ Expected AUTH LOGIN and a SIZE declaration when only those are advertised")
+            return False
+        if not (isinstance(oversized, smtplib.SMTPResponseException) and oversized.smtp_code == 552
+                and all(isinstance(e, smtplib.SMTPNotSupportedError) for e in (eight_bit, no_tls, no_auth))):
+            print("❌ Expected messages and sessions the server does not support to be refused before sending")
+            return False
+        if len(smtp_server.messages) != 1:
+            print("❌ Expected only the supported message to be sent")
+            return False
+        
+        print("✅ Notification engine test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Notification engine test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_media_uploads():
+    """Test hedged, deduplicated media uploads against local image host stand-ins."""
+    print("\n🧪 Testing media uploads...")
+    
+    try:
+        import threading
+        import time
+        import cv2
+        import numpy as np
+        import requests
+        from media_uploader import CloudinaryProvider, ImgBBProvider, MediaUploader
+        from snapshot_encoder import EncodedImage
+        from stand_in_servers import LocalCloudinaryServer, LocalImgBBServer
+        
+        def image(seed):
+            frame = np.random.default_rng(seed).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+            return EncodedImage('detection.jpg', 'image/jpeg', cv2.imencode('.jpg', frame)[1].tobytes(), 90)
+        
+        # Slow primary: the fallback is started after the hedge delay and wins
+        imgbb = LocalImgBBServer(response_delay=1.0).start()
+        cloudinary = LocalCloudinaryServer(response_delay=0.05).start()
+        uploader = MediaUploader([ImgBBProvider('test', f"{imgbb.url}/1/upload"),
+                                  CloudinaryProvider(f"{cloudinary.url}/v1_1/demo/image/upload", 'test')],
+                                 hedge_initial_delay=0.2, hedge_min_delay=0.05)
+        first = image(1)
+        start = time.perf_counter()
+        url = uploader.upload(first)
+        elapsed = time.perf_counter() - start
+        print(f"   - Hedged upload took {elapsed:.2f}s: {url}")
+        if not url or not url.startswith(cloudinary.url) or elapsed > 0.6:
+            print("❌ Expected the fallback to win well before the slow primary answered")
+            return False
+        if requests.get(url, timeout=5).content != first.data:
+            print("❌ Uploaded image not served at its URL")
+            return False
+        
+        # Same bytes again, and concurrently from several channels: one upload each
+        again = uploader.upload(first)
+        second = image(2)
+        urls = []
+        threads = [threading.Thread(target=lambda: urls.append(uploader.upload(second))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = uploader.get_stats()
+        print(f"   - Cache hits: {stats['cache_hits']}, shared: {stats['shared']}, hedged: {stats['hedged']}")
+        if again != url or len(set(urls)) != 1 or stats['cache_hits'] != 1 or stats['shared'] != 3:
+            print("❌ Expected identical images to reuse one upload")
+            return False
+        if cloudinary.uploads != 2:
+            print("❌ Expected one upload per image")
+            return False
+        uploader.close()
+        imgbb.stop()
+        
+        # Failing primary without hedging: the fallback starts immediately
+        imgbb = LocalImgBBServer(fail=True).start()
+        uploader = MediaUploader([ImgBBProvider('test', f"{imgbb.url}/1/upload"),
+                                  CloudinaryProvider(f"{cloudinary.url}/v1_1/demo/image/upload", 'test')],
+                                 hedge_percentile=0)
+        url = uploader.upload(image(3))
+        fell_back = url is not None and url.startswith(cloudinary.url) and uploader.get_stats()['hedged'] == 0
+        uploader.close()
+        imgbb.stop()
+        cloudinary.stop()
+        if not fell_back:
+            print("❌ Expected the fallback after the primary failed")
+            return False
+        
+        print("✅ Media upload test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Media upload test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_media_server():
+    """Test signed URLs, ETag/Range caching and size-limited eviction of the built-in media server."""
+    print("\n🧪 Testing media server...")
+    
+    try:
+        import tempfile
+        import time
+        import numpy as np
+        import requests
+        from config import Config
+        from media_server import MediaServer
+        from snapshot_encoder import EncodedImage
+        from soak import _create_fake_notification_system
+        
+        server = MediaServer(host='127.0.0.1', port=0, public_url='', ttl=60, max_bytes=2500,
+                             directory=tempfile.mkdtemp(prefix='media-')).start()
+        images = [EncodedImage('detection.jpg', 'image/jpeg', bytes([i]) * 1000, 90) for i in range(3)]
+        url = server.publish(images[0])
+        
+        response = requests.get(url, timeout=5)
+        etag = response.headers.get('ETag')
+        cached = requests.get(url, headers={'If-None-Match': etag}, timeout=5)
+        partial = requests.get(url, headers={'Range': 'bytes=100-199'}, timeout=5)
+        print(f"   - GET {response.status_code}, If-None-Match {cached.status_code}, Range {partial.status_code}")
+        if response.status_code != 200 or response.content != images[0].data or cached.status_code != 304:
+            print("❌ Expected the image and a 304 for its ETag")
+            return False
+        if partial.status_code != 206 or partial.content != images[0].data[100:200]:
+            print("❌ Expected a 206 with the requested byte range")
+            return False
+        
+        tampered = requests.get(url.replace('expires=', 'expires=1'), timeout=5).status_code
+        expired = requests.get(server.publish(images[1], ttl=-1), timeout=5).status_code
+        if tampered != 403 or expired != 410:
+            print(f"❌ Expected 403 for an altered URL and 410 for an expired one, got {tampered} and {expired}")
+            return False
+        
+        # 2500 bytes hold two images: the expired one goes first, then the least recently used
+        url_2 = server.publish(images[2])
+        server.publish(EncodedImage('other.jpg', 'image/jpeg', b'x' * 1000, 90))
+        stats = server.get_stats()
+        evicted = requests.get(url, timeout=5).status_code
+        print(f"   - Stored: {stats['images']} images, {stats['stored_bytes']} bytes, evicted {stats['evicted']}")
+        if stats['stored_bytes'] > 2500 or evicted != 404 or requests.get(url_2, timeout=5).status_code != 200:
+            print("❌ Expected eviction to keep the store within its limit")
+            return False
+        server.stop()
+        
+        # WhatsApp alerts carry a media URL the provider can fetch
+        saved = Config.MEDIA_SERVER_ENABLED, Config.MEDIA_SERVER_PORT, Config.MEDIA_SERVER_HOST
+        Config.MEDIA_SERVER_ENABLED, Config.MEDIA_SERVER_PORT, Config.MEDIA_SERVER_HOST = True, 0, '127.0.0.1'
+        try:
+            try:
+                Config.validate()
+                print("❌ Expected MEDIA_SERVER_PUBLIC_URL to be required with the media server enabled")
+                return False
+            except ValueError as e:
+                if 'MEDIA_SERVER_PUBLIC_URL' not in str(e):
+                    raise
+            notifier = _create_fake_notification_system(latency=0.01)
+        finally:
+            Config.MEDIA_SERVER_ENABLED, Config.MEDIA_SERVER_PORT, Config.MEDIA_SERVER_HOST = saved
+        notifier.send_detection_alert(1, [0.9], frame=np.zeros((480, 640, 3), dtype=np.uint8))
+        deadline = time.time() + 10
+        while not notifier.twilio_server.messages and time.time() < deadline:
+            time.sleep(0.05)
+        media_url = notifier.twilio_server.messages[0].get('MediaUrl') if notifier.twilio_server.messages else None
+        fetched = requests.get(media_url, timeout=5) if media_url else None
+        notifier.shutdown(timeout=5)
+        if fetched is None or fetched.status_code != 200 or fetched.headers['Content-Type'] != 'image/jpeg':
+            print("❌ Expected the WhatsApp media URL to serve the alert image")
+            return False
+        
+        print("✅ Media server test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Media server test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_autotune():
+    """Test the autotuner picks the fastest setup meeting recall and latency, and its result is applied."""
+    print("\n🧪 Testing autotuner...")
+    
+    try:
+        import os
+        import tempfile
+        import numpy as np
+        import torch
+        import config
+        from config import Config
+        from autotune import Autotuner, load_tuning, save_tuning
+        from human_detector import HumanDetector
+        from soak import _FakeBox, _FakeResult
+        
+        # People 120 and 20 px tall; the model misses people under 12 px at its input size
+        frames = [np.zeros((240, 320, 3), dtype=np.uint8) for _ in range(6)]
+        truth = [[(10, 10, 50, 130)] if i % 2 else [(200, 100, 210, 120)] for i in range(6)]
+        
+        class SizedModel:
+            def __init__(self, speedup):
+                self.speedup = speedup
+                self.frame_index = 0
+            
+            def __call__(self, frame, verbose=False, imgsz=640):
+                time.sleep(0.01 * imgsz / 640 / torch.get_num_threads() / self.speedup)
+                boxes = [_FakeBox(box, 0.9) for box in truth[self.frame_index % len(truth)]
+                         if (box[3] - box[1]) * imgsz / 640 >= 12]
+                self.frame_index += 1
+                return [_FakeResult(boxes)]
+        
+        def load_model(backend, weights):
+            return SizedModel(2.0 if backend == 'onnx' else 1.0)
+        
+        def tuner(latency_target):
+            return Autotuner([f for f in frames], model_path='yolov8n.pt', backends=['torch', 'onnx'],
+                             sizes=[320, 480, 640], thread_counts=[1, 2], recall_floor=0.9,
+                             latency_target=latency_target, truth=truth, load_model=load_model,
+                             export=lambda backend: f"yolov8n.{backend}")
+        
+        threads = torch.get_num_threads()
+        best = tuner(latency_target=1.0).run()
+        print(f"   - Chosen: {best['backend']} {best['imgsz']}px {best['threads']} threads, recall {best['recall']}")
+        if (best['backend'], best['imgsz'], best['threads'], best['recall']) != ('onnx', 480, 2, 1.0):
+            print("❌ Expected the fastest setup that keeps every person (onnx, 480px, 2 threads)")
+            return False
+        if torch.get_num_threads() != threads:
+            print("❌ Thread count not restored after tuning")
+            return False
+        if tuner(latency_target=0.0001).run()['meets_target']:
+            print("❌ An unreachable latency target should be reported as missed")
+            return False
+        
+        # Without people in the frames recall cannot be measured: the input size is not lowered
+        blind = tuner(latency_target=1.0)
+        blind.truth = [[] for _ in frames]
+        best_blind = blind.run()
+        if {r['imgsz'] for r in blind.results} != {640} or best_blind['imgsz'] != 640:
+            print("❌ Expected only the reference size benchmarked when recall cannot be measured")
+            return False
+        
+        # Cached per host; HumanDetector applies it unless a value was set explicitly
+        saved = Config.AUTOTUNE_CACHE_PATH, Config.INFERENCE_IMGSZ, config._SETTINGS['INFERENCE_IMGSZ'].source
+        Config.AUTOTUNE_CACHE_PATH = os.path.join(tempfile.mkdtemp(prefix='autotune-'), 'autotune.json')
+        try:
+            save_tuning(Config.MODEL_PATH, dict(best, backend='torch', weights=Config.MODEL_PATH))
+            if load_tuning(Config.MODEL_PATH)['imgsz'] != 480 or load_tuning('yolov8s.pt') is not None:
+                print("❌ Expected the tuning to be cached for this host and model only")
+                return False
+            detector = HumanDetector(model=SizedModel(1.0))
+            tuned = (detector.imgsz, torch.get_num_threads())
+            Config.set('INFERENCE_IMGSZ', 320)
+            explicit = HumanDetector(model=SizedModel(1.0)).imgsz
+        finally:
+            Config.AUTOTUNE_CACHE_PATH = saved[0]
+            Config.set('INFERENCE_IMGSZ', saved[1], source=saved[2])
+            torch.set_num_threads(threads)
+        print(f"   - Applied: {tuned[0]}px, {tuned[1]} threads; explicit INFERENCE_IMGSZ kept at {explicit}")
+        if tuned != (480, 2) or explicit != 320:
+            print("❌ Expected the tuned size and threads, and an explicit size to win")
+            return False
+        
+        print("✅ Autotune test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Autotune test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_zone_filter():
+    """Test polygon zones, exclusions and the zone ROI crop."""
+    print("\n🧪 Testing zone filter...")
+    
+    try:
+        import os
+        import numpy as np
+        from human_detector import HumanDetector
+        from soak import _FakeBox, _FakeResult
+        from zone_filter import ZoneFilter
+        
+        door = "door=0.1,0.5 0.3,0.5 0.3,1 0.1,1"
+        bench = "bench=0.22,0.9 0.3,0.9 0.3,1 0.22,1"
+        shape = (480, 640, 3)
+        
+        def people(*boxes):
+            return [{'bbox': box, 'confidence': 0.9} for box in boxes]
+        
+        # Foot points: in the door, outside every zone, on the excluded bench
+        zone_filter = ZoneFilter(zones=door, exclusions=bench, mode='foot')
+        kept = zone_filter.filter(people((80, 200, 160, 470), (400, 200, 480, 470), (120, 250, 170, 470)), shape)
+        print(f"   - Foot mode kept {[(d['bbox'], d['zone']) for d in kept]}")
+        if [(d['bbox'], d['zone']) for d in kept] != [((80, 200, 160, 470), 'door')]:
+            print("❌ Expected only the person standing in the door zone")
+            return False
+        
+        # Overlap: 85% of the first box is in the door, 42% of the second
+        zone_filter = ZoneFilter(zones=door, exclusions='', mode='overlap', min_overlap=0.5)
+        kept = zone_filter.filter(people((80, 200, 160, 470), (150, 240, 250, 400)), shape)
+        if [d['bbox'] for d in kept] != [(80, 200, 160, 470)]:
+            print(f"❌ Expected only the mostly-inside box in overlap mode, got {kept}")
+            return False
+        
+        # Vectorised: many boxes in one pass
+        boxes = np.random.default_rng(0).integers(0, 300, (500, 2))
+        many = people(*[(int(x), int(y), int(x) + 60, int(y) + 170) for x, y in boxes])
+        start = time.perf_counter()
+        kept = zone_filter.filter(many, shape)
+        print(f"   - {len(many)} boxes filtered in {(time.perf_counter() - start) * 1000:.2f} ms, {len(kept)} kept")
+        
+        # The detector only infers on the padded zone area and maps boxes back
+        class CropModel:
+            shapes = []
+            
+            def __call__(self, frame, verbose=False, **kwargs):
+                self.shapes.append(frame.shape)
+                return [_FakeResult([_FakeBox((80, 56, 160, 326), 0.9)])]
+        
+        os.environ['CAMERA_7_DETECTION_ZONES'] = door
+        try:
+            detector = HumanDetector(model=CropModel(), camera_index=7)
+        finally:
+            del os.environ['CAMERA_7_DETECTION_ZONES']
+        detected, _, detections = detector.detect_humans(np.zeros(shape, dtype=np.uint8))
+        print(f"   - ROI {detector.zone_filter.roi(shape)}, model input {CropModel.shapes[-1]}, "
+              f"detections {[(d['bbox'], d['zone']) for d in detections]}")
+        if CropModel.shapes[-1] != (336, 320, 3):
+            print("❌ Expected inference on the zone ROI only")
+            return False
+        if not detected or detections[0]['bbox'] != (80, 200, 160, 470) or detections[0]['zone'] != 'door':
+            print("❌ Expected the detection mapped back to frame coordinates")
+            return False
+        
+        print("✅ Zone filter test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Zone filter test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_cascade():
+    """Test the nano/verifier cascade: batched verification only when it decides an alert, cached per track."""
+    print("\n🧪 Testing detection cascade...")
+    
+    try:
+        import os
+        import numpy as np
+        from human_detector import HumanDetector
+        from soak import _FakeBox, _FakeResult
+        
+        real, fake, sure, doubtful = (100, 100, 200, 300), (400, 100, 500, 300), (300, 300, 350, 400), (550, 300, 600, 400)
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        frame[100:300, 100:200] = 255  # only this box looks like a person to the verifier
+        
+        class ScriptedModel:
+            script = [[(real, 0.5), (fake, 0.4)], [(real, 0.5), (fake, 0.4)], [], [(sure, 0.9), (doubtful, 0.4)],
+                      [(fake, 0.4)], [(doubtful, 0.45)]]
+            
+            def __init__(self):
+                self.calls = 0
+            
+            def __call__(self, image, verbose=False, **kwargs):
+                boxes = [_FakeBox(box, confidence) for box, confidence in self.script[self.calls]]
+                self.calls += 1
+                return [_FakeResult(boxes)]
+        
+        class Verifier:
+            batches = []
+            
+            def __call__(self, crops, verbose=False, **kwargs):
+                self.batches.append(len(crops))
+                return [_FakeResult([_FakeBox((0, 0, crop.shape[1], crop.shape[0]),
+                                              0.9 if crop.mean() > 128 else 0.1)]) for crop in crops]
+        
+        camera_environ = {'CAMERA_8_CASCADE_ENABLED': 'true', 'CAMERA_8_CASCADE_SCREEN_THRESHOLD': '0.3'}
+        os.environ.update(camera_environ)
+        try:
+            detector = HumanDetector(model=ScriptedModel(), camera_index=8, verifier=Verifier())
+        finally:
+            for name in camera_environ:
+                del os.environ[name]
+        if detector.screen_threshold != 0.3:
+            print(f"❌ Expected the camera's screen threshold, got {detector.screen_threshold}")
+            return False
+        
+        outcomes = []
+        for _ in range(len(ScriptedModel.script) - 1):
+            detected, _, detections = detector.detect_humans(frame)
+            outcomes.append((detected, [d['bbox'] for d in detections]))
+        stats = detector.cascade.get_stats()
+        print(f"   - Verifier batches {Verifier.batches}, outcomes {[o[0] for o in outcomes]}, stats {stats}")
+        
+        if outcomes[0] != (True, [real]) or outcomes[1] != (True, [real]):
+            print("❌ Expected the verifier to confirm the real person and reject the false box")
+            return False
+        if outcomes[2][0] or outcomes[3] != (True, [sure]) or outcomes[4][0]:
+            print("❌ Expected confident boxes kept and cached rejections to stay rejected")
+            return False
+        if Verifier.batches != [2]:
+            print("❌ Expected one batched verification; later frames use the cache or need none")
+            return False
+        if stats['cache_hits'] != 3 or stats['skipped'] != 1:
+            print("❌ Expected cached verdicts and a skipped verification on the confident frame")
+            return False
+        
+        # During the alert cooldown an unverified, uncertain box is not worth a verifier run
+        detector.last_detection_time = time.time()
+        detected, _, _ = detector.detect_humans(frame, in_cooldown=detector.in_cooldown())
+        if detected or Verifier.batches != [2]:
+            print("❌ Expected no verification while the alert cooldown runs")
+            return False
+        
+        print("✅ Cascade test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Cascade test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_aggregator():
+    """Test streaming detections from several edge nodes to one aggregator over loopback."""
+    print("\n🧪 Testing edge-to-aggregator streaming...")
+    
+    cleanup = []  # run in reverse on every exit, so no sender thread outlives the test
+    try:
+        import os
+        import socket
+        import tempfile
+        import time
+        import numpy as np
+        from aggregator import (ACK, Aggregator, EdgeEvent, EdgePublisher, _SEQ, _read_message, encode_batch,
+                                encode_hello)
+        from event_store import DetectionEventStore
+        from worker_pool import WorkerPool
+        
+        class RecordingNotifier:
+            def __init__(self):
+                self.pool = WorkerPool('test-notify', num_workers=2)
+                self.alerts, self.digests = [], []
+            
+            def send_detection_alert(self, detection_count, confidence_scores, frame=None, detections=None):
+                self.alerts.append((detection_count, frame, detections))
+            
+            def send_digest_alert(self, digest, frame=None):
+                self.digests.append((digest, frame))
+        
+        notifier = RecordingNotifier()
+        cleanup.append(notifier.pool.shutdown)
+        store = DetectionEventStore(db_path=os.path.join(tempfile.mkdtemp(prefix='aggregator-'), 'site.db'))
+        cleanup.append(store.close)
+        aggregator = Aggregator(notifier, event_store=store, host='127.0.0.1', port=0, token='site-secret',
+                                scope='site', window=30).start()
+        cleanup.append(aggregator.stop)
+        address = ('127.0.0.1', aggregator.port)
+        nodes = [EdgePublisher(address, node_id=f"node-{i}", token='site-secret', batch_size=16,
+                               batch_interval=0.02, thumbnail_width=160, thumbnail_interval=0.5, reconnect_max=0.5)
+                 for i in range(3)]
+        cleanup.extend(lambda node=node: node.close(timeout=1) for node in nodes)
+        
+        # Three nodes with two cameras each, 40 frames with a person per node
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        frame[100:400, 200:300] = 255
+        for i in range(40):
+            for node in nodes:
+                node.publish(i % 2, [{'bbox': (200, 100, 300, 400), 'confidence': 0.8, 'track_id': i % 3}],
+                             frame=frame, timestamp=time.time())
+        flushed = all(node.flush(timeout=5) for node in nodes)
+        stats = aggregator.get_stats()
+        edge = nodes[0].get_stats()
+        print(f"   - {stats['events']} events from {stats['connected_nodes']} nodes, "
+              f"{edge['events_per_batch']:.1f} events per batch, {edge['thumbnails']} thumbnails per node, "
+              f"{len(notifier.alerts)} alert(s)")
+        if not flushed or stats['events'] != 120 or stats['connected_nodes'] != 3:
+            print("❌ Expected every event of the three nodes acknowledged by the aggregator")
+            return False
+        if edge['batches_sent'] >= 40 or edge['thumbnails'] == 0 or edge['thumbnails'] >= 40:
+            print("❌ Expected batched events and rate-limited thumbnails")
+            return False
+        # One intruder seen by all nodes is one site alert, with crops scaled to the thumbnail
+        if len(notifier.alerts) != 1:
+            print("❌ Expected the nodes' detections correlated into one site alert")
+            return False
+        count, alert_frame, alert_detections = notifier.alerts[0]
+        if alert_frame is None or alert_frame.shape[1] != 160 or alert_detections[0]['bbox'] != (50, 25, 75, 100):
+            print("❌ Expected the alert built from a thumbnail with scaled boxes")
+            return False
+        store.flush()
+        if store.count() != 120 or store.count(camera='node-1/0') != 20:
+            print("❌ Expected every detection recorded per node and camera")
+            return False
+        
+        # A node with the wrong token is turned away
+        intruder = EdgePublisher(address, node_id='rogue', token='guess', reconnect_max=0.5)
+        intruder.publish(0, [{'bbox': (0, 0, 10, 10), 'confidence': 0.9}])
+        time.sleep(0.3)
+        intruder.close(timeout=0)
+        if aggregator.get_stats()['rejected'] < 1 or aggregator.get_stats()['events'] != 120:
+            print("❌ Expected a node with a bad token rejected")
+            return False
+        
+        # A retransmitted batch is acknowledged but not dispatched twice
+        batch = encode_batch(1, [EdgeEvent(0, time.time(), [((0, 0, 10, 10), 0.9, None)], 640, 480)])
+        with socket.create_connection(address, timeout=5) as sock:
+            reader = sock.makefile('rb')
+            sock.sendall(encode_hello(7, 'raw', 'site-secret'))
+            _read_message(reader)
+            sock.sendall(batch + batch)
+            acks = [_read_message(reader) for _ in range(2)]
+        stats = aggregator.get_stats()
+        if acks != [(ACK, _SEQ.pack(1))] * 2 or stats['duplicates'] != 1 or stats['events'] != 121:
+            print("❌ Expected a duplicate batch acknowledged and ignored")
+            return False
+        
+        # Aggregator restart: events queued meanwhile are delivered after the reconnect
+        aggregator.stop()
+        for i in range(10):
+            nodes[0].publish(0, [{'bbox': (200, 100, 300, 400), 'confidence': 0.7}], frame=frame)
+        time.sleep(0.3)
+        restarted = Aggregator(notifier, host='127.0.0.1', port=address[1], token='site-secret').start()
+        cleanup.insert(2, restarted.stop)  # stopped after the nodes have closed
+        delivered = nodes[0].flush(timeout=5)
+        edge = nodes[0].get_stats()
+        print(f"   - After an aggregator restart: {restarted.get_stats()['events']} events delivered, "
+              f"{edge['connects']} connects, {edge['disconnects']} disconnects")
+        if not delivered or restarted.get_stats()['events'] != 10 or edge['connects'] < 2:
+            print("❌ Expected the node to reconnect and deliver its queued events")
+            return False
+        
+        # Backpressure: with the aggregator away, publishing stays fast and the oldest events are dropped
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            closed_port = probe.getsockname()[1]
+        offline = EdgePublisher(('127.0.0.1', closed_port), node_id='offline', queue_size=10, reconnect_max=0.5)
+        cleanup.append(lambda: offline.close(timeout=0))
+        start = time.perf_counter()
+        accepted = [offline.publish(0, [{'bbox': (0, 0, 10, 10), 'confidence': 0.9}], frame=frame)
+                    for _ in range(50)]
+        elapsed = time.perf_counter() - start
+        offline_stats = offline.get_stats()
+        offline.close(timeout=0)
+        print(f"   - Aggregator unreachable: 50 publishes in {elapsed * 1000:.1f} ms, "
+              f"{offline_stats['queued']} queued, {offline_stats['dropped']} dropped")
+        if offline_stats['queued'] != 10 or offline_stats['dropped'] != 40 or sum(accepted) != 10 or elapsed > 0.1:
+            print("❌ Expected a bounded queue that drops the oldest events without blocking")
+            return False
+        
+        print("✅ Aggregator test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Aggregator test failed: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        for close in reversed(cleanup):
+            close()
+
+class _WhiteBoxModel:
+    """Fake model finding the white box in test footage; module level so spawned workers can unpickle it."""
+    
+    def __call__(self, frames, verbose=False, **kwargs):
+        import numpy as np
+        from soak import _FakeBox, _FakeResult
+        results = []
+        for frame in frames:
+            ys, xs = np.nonzero(frame[:, :, 0] > 128)
+            box = [_FakeBox((xs.min(), ys.min(), xs.max(), ys.max()), 0.9)] if len(xs) else []
+            results.append(_FakeResult(box))
+        return results
+
+def test_footage_analysis():
+    """Test offline analysis: parallel segments, strided decoding, batched inference and the event timeline."""
+    print("\n🧪 Testing footage analysis...")
+    
+    try:
+        import os
+        import sqlite3
+        import tempfile
+        import cv2
+        import numpy as np
+        from analyze import FootageAnalyzer
+        
+        # 20 s at 10 fps with a person from 3-7 s and from 15-18 s
+        directory = tempfile.mkdtemp(prefix='footage-')
+        path = os.path.join(directory, 'yard.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (160, 120))
+        for index in range(200):
+            frame = np.zeros((120, 160, 3), dtype=np.uint8)
+            if 30 <= index < 70 or 150 <= index < 180:
+                frame[20:100, 60:90] = 255
+            writer.write(frame)
+        writer.release()
+        
+        analyzer = FootageAnalyzer(output_dir=os.path.join(directory, 'out'), workers=2, stride=5, batch_size=4,
+                                   segment_seconds=5, event_gap=2.0, model_factory=_WhiteBoxModel)
+        summary = analyzer.run([directory])
+        print(f"   - {summary['video_seconds']:.0f} s of video at {summary['speed']:.0f}x real time, "
+              f"{summary['frames_decoded']} decoded, {summary['frames_skipped']} skipped")
+        if summary['frames_decoded'] != 40 or summary['frames_skipped'] != 160:
+            print("❌ Expected every 5th frame decoded and the rest skipped with grab()")
+            return False
+        
+        conn = sqlite3.connect(os.path.join(directory, 'out', 'timeline.db'))
+        events = conn.execute("SELECT start, end, max_people, thumbnail FROM video_events ORDER BY start").fetchall()
+        rows = conn.execute("SELECT COUNT(*) FROM detections WHERE camera = 'yard.avi'").fetchone()[0]
+        conn.close()
+        print(f"   - Events {[(start, end) for start, end, _, _ in events]}, {rows} detection rows")
+        # The first person crosses the 5 s segment boundary and must stay one event
+        if [(start, end) for start, end, _, _ in events] != [(3.0, 6.5), (15.0, 17.5)] or rows != 14:
+            print("❌ Expected two events merged across segments and one row per sampled frame with a person")
+            return False
+        if not all(thumbnail and os.path.getsize(thumbnail) > 0 for _, _, _, thumbnail in events):
+            print("❌ Expected a thumbnail for every event")
+            return False
+        
+        # Hours of footage: far more detection frames than the live event store's queue holds
+        detections = [(index, index * 0.5, [((10, 10, 50, 100), 0.9)]) for index in range(60000)]
+        analyzer.output_dir = os.path.join(directory, 'long')
+        os.makedirs(os.path.join(analyzer.output_dir, 'thumbnails'))
+        summary = analyzer._write_timeline({path: [{'start': 0, 'detections': detections, 'events': []}]},
+                                           {path: (200, 10)})
+        conn = sqlite3.connect(os.path.join(analyzer.output_dir, 'timeline.db'))
+        rows = conn.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+        conn.close()
+        print(f"   - 60000 detection frames: {rows} rows stored, {summary['detections']} reported")
+        if rows != 60000 or summary['detections'] != 60000:
+            print("❌ Expected every detection of a long recording in the timeline")
+            return False
+        
+        # NVR layout: the same file name in one directory per camera
+        from analyze import _Event
+        clips = [os.path.join(directory, 'nvr', camera, '0001.avi') for camera in ('cam1', 'cam2')]
+        segments = {}
+        for clip in clips:
+            os.makedirs(os.path.dirname(clip))
+            open(clip, 'wb').close()
+            segments[clip] = [{'start': 0, 'detections': [(0, 1.0, [((10, 10, 50, 100), 0.9)])],
+                               'events': [_Event(1.0, 1, 0.9, clip.encode())]}]
+        analyzer.output_dir = os.path.join(directory, 'nvr-out')
+        os.makedirs(os.path.join(analyzer.output_dir, 'thumbnails'))
+        analyzer._write_timeline(segments, {clip: (200, 10) for clip in clips})
+        conn = sqlite3.connect(os.path.join(analyzer.output_dir, 'timeline.db'))
+        cameras = sorted(row[0] for row in conn.execute("SELECT DISTINCT camera FROM detections"))
+        thumbnails = [row[0] for row in conn.execute("SELECT thumbnail FROM video_events ORDER BY video")]
+        conn.close()
+        print(f"   - NVR cameras {cameras}, thumbnails {[os.path.basename(t) for t in thumbnails]}")
+        contents = [open(thumbnail, 'rb').read() for thumbnail in thumbnails]
+        if cameras != [os.path.join('cam1', '0001.avi'), os.path.join('cam2', '0001.avi')] or contents != [
+                clip.encode() for clip in clips]:
+            print("❌ Expected same-named files of different cameras kept apart, thumbnails included")
+            return False
+        
+        print("✅ Footage analysis test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Footage analysis test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_logging():
+    """Test the background log writer: per-message rate limiting, JSON output and dropping instead of blocking."""
+    print("\n🧪 Testing logging...")
+
+    import logging
+    from logging_setup import get_stats, setup_logging, shutdown_logging
+    root_level = logging.getLogger().level
+    try:
+        import io
+        import json
+        import threading
+        logger = logging.getLogger('test.camera')
+
+        # A camera failing at frame rate: the burst gets through, the rest is counted
+        output = io.StringIO()
+        setup_logging(level='INFO', fmt='text', rate=1, burst=5, stream=output)
+        start = time.perf_counter()
+        for _ in range(100):
+            logger.warning("Failed to read frame from camera %d", 0)
+        elapsed = time.perf_counter() - start
+        logger.info("Camera %d started", 1)
+        time.sleep(1.1)
+        logger.warning("Failed to read frame from camera %d", 0)
+        shutdown_logging()
+        lines = output.getvalue().splitlines()
+        stats = get_stats()
+        print(f"   - 100 identical warnings in {elapsed * 1000:.1f} ms: {len(lines)} lines written, "
+              f"{stats['suppressed']} suppressed")
+        failures = [line for line in lines if 'Failed to read frame' in line]
+        if len(failures) != 6 or not any('Camera 1 started' in line for line in lines):
+            print("❌ Expected the burst of 5 plus one line per refill, other messages unaffected")
+            return False
+        if not failures[-1].endswith('similar messages suppressed)') or stats['suppressed'] < 90:
+            print("❌ Expected the next line through to report the suppressed count")
+            return False
+
+        # One JSON object per line, with extra= fields and the traceback
+        output = io.StringIO()
+        setup_logging(level='DEBUG', fmt='json', rate=0, stream=output)
+        logger.debug("FPS: %.1f", 29.97, extra={'camera': 2})
+        try:
+            raise RuntimeError("device unplugged")
+        except RuntimeError:
+            logger.exception("Capture loop crashed")
+        shutdown_logging()
+        entries = [json.loads(line) for line in output.getvalue().splitlines()]
+        print(f"   - JSON: {entries[0]}")
+        if (len(entries) != 2 or entries[0]['message'] != 'FPS: 30.0' or entries[0]['camera'] != 2
+                or entries[0]['level'] != 'DEBUG' or 'device unplugged' not in entries[1].get('exception', '')):
+            print("❌ Expected one JSON object per record with its fields and exception")
+            return False
+
+        # A stalled output (terminal, journald pipe) must not block the caller
+        class StalledStream(io.StringIO):
+            def __init__(self):
+                super().__init__()
+                self.release = threading.Event()
+
+            def write(self, text):
+                self.release.wait()
+                return super().write(text)
+
+        stalled = StalledStream()
+        setup_logging(level='INFO', rate=0, queue_size=10, stream=stalled)
+        start = time.perf_counter()
+        for index in range(1000):
+            logger.info("Frame %d processed", index)
+        elapsed = time.perf_counter() - start
+        stats = get_stats()
+        stalled.release.set()
+        shutdown_logging()
+        print(f"   - Stalled writer: 1000 records in {elapsed * 1000:.1f} ms, {stats['dropped']} dropped, "
+              f"queue peaked at {stats['max_queue_depth']}")
+        if elapsed > 0.5 or stats['dropped'] < 980 or stats['max_queue_depth'] > 10:
+            print("❌ Expected records beyond the queue bound to be dropped without blocking")
+            return False
+
+        print("✅ Logging test completed")
+        return True
+
+    except Exception as e:
+        print(f"❌ Logging test failed: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        shutdown_logging()
+        logging.getLogger().setLevel(root_level)
+
+def test_evidence_store():
+    """Test evidence snapshots: background writes, content addressing, the index and both quotas."""
+    print("\n🧪 Testing evidence store...")
+
+    try:
+        import hashlib
+        import os
+        import tempfile
+        import numpy as np
+        from evidence_store import EvidenceStore
+
+        directory = tempfile.mkdtemp(prefix='evidence-')
+        db_path, root = os.path.join(directory, 'events.db'), os.path.join(directory, 'evidence')
+        frames = [np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8) for _ in range(12)]
+        detections = [{'bbox': (10, 20, 110, 220), 'confidence': 0.87}]
+
+        def files_on_disk():
+            return sorted(os.path.relpath(os.path.join(path, name), root)
+                          for path, _, names in os.walk(root) for name in names)
+
+        # A sub-second burst: every snapshot is kept, and recording never waits for the disk
+        store = EvidenceStore(db_path=db_path, root=root, interval=0, max_mb=100, max_age_days=0,
+                              batch_size=4, flush_interval=0.05, queue_size=32)
+        now = time.time()
+        start = time.perf_counter()
+        for index, frame in enumerate(frames[:8]):
+            store.record(0, frame, detections, timestamp=now + index * 0.01)
+        elapsed = time.perf_counter() - start
+        store.record(0, frames[0], detections, timestamp=now + 0.5)  # same image again
+        store.flush()
+        stats = store.get_stats()
+        files = files_on_disk()
+        print(f"   - 8 snapshots recorded in {elapsed * 1000:.1f} ms, {len(files)} files, "
+              f"{stats['batches_written']} fsync batches, {stats['deduplicated']} duplicate")
+        if elapsed > 0.1 or stats['stored'] != 9 or len(files) != 8 or stats['deduplicated'] != 1:
+            print("❌ Expected a distinct file per snapshot, the repeated image stored once, and no blocking")
+            return False
+        day, prefix, name = files[0].split(os.sep)
+        with open(os.path.join(root, files[0]), 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if name != f"{digest}.jpg" or prefix != digest[:2] or day != time.strftime('%Y-%m-%d', time.localtime(now)):
+            print(f"❌ Expected day/hash-prefix/sha256.jpg paths, got {files[0]}")
+            return False
+
+        rows = store.query(camera=0)
+        if len(rows) != 9 or rows[0]['detections'] != [{'bbox': (10, 20, 110, 220), 'confidence': 0.87}] \
+                or not all(os.path.exists(row['path']) for row in rows):
+            print("❌ Expected every snapshot indexed with its boxes and file")
+            return False
+
+        # Per-camera interval, except for alerts
+        store.interval = 1.0
+        queued = [store.record(1, frames[8], detections, timestamp=now + offset) for offset in (0, 0.3, 0.6)]
+        queued.append(store.record(1, frames[9], detections, timestamp=now + 0.7, alerted=True))
+        if queued != [True, False, False, True]:
+            print(f"❌ Expected one snapshot per interval plus alerts, got {queued}")
+            return False
+
+        # Evidence older than the age quota goes with its day directory
+        store.interval = 0
+        store.record(2, frames[10], detections, timestamp=now - 40 * 86400)
+        store.close()
+        store = EvidenceStore(db_path=db_path, root=root, interval=0, max_mb=100, max_age_days=30,
+                              batch_size=4, flush_interval=0.05)
+        store.flush()
+        remaining = store.query()
+        if len(remaining) != 11 or any(row['camera'] == '2' for row in remaining) or len(files_on_disk()) != 10:
+            print("❌ Expected the 40 day old snapshot and its directory removed")
+            return False
+
+        # Size quota: the oldest files are evicted until the store is back under 90%
+        size = os.path.getsize(remaining[0]['path'])
+        store.close()
+        store = EvidenceStore(db_path=db_path, root=root, interval=0, max_mb=size * 6.5 / 1024 / 1024,
+                              max_age_days=30, batch_size=4, flush_interval=0.05)
+        store.record(3, frames[11], detections, timestamp=now + 1)
+        store.flush()
+        stats = store.get_stats()
+        on_disk = sum(os.path.getsize(os.path.join(root, path)) for path in files_on_disk())
+        kept = store.query()
+        print(f"   - Size quota: {stats['evicted_files']} files evicted, {stats['total_bytes'] / 1024:.0f} KB "
+              f"of {stats['max_bytes'] / 1024:.0f} KB used")
+        if stats['total_bytes'] > stats['max_bytes'] * 0.9 or on_disk != stats['total_bytes']:
+            print("❌ Expected the store under 90% of its quota, with the tracked size matching the disk")
+            return False
+        if kept[-1]['camera'] != '3' or kept[0]['timestamp'] <= now:
+            print("❌ Expected the oldest snapshots evicted and the newest kept")
+            return False
+        store.close()
+        
+        # A batch that fails before its index commit leaves neither temporary nor unindexed files
+        import sqlite3
+        from unittest import mock
+        from alert_snapshot import AlertSnapshot
+        from evidence_store import _Entry
+        
+        class FailingConnection:
+            def executemany(self, *args):
+                raise sqlite3.OperationalError("disk I/O error")
+            
+            def rollback(self):
+                pass
+        
+        def batch(seed):
+            frame = np.random.default_rng(seed).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+            return [_Entry(4, AlertSnapshot(frame, timestamp=now + 2, detections=detections), detections, False)]
+        
+        before, total_bytes = files_on_disk(), store.total_bytes
+        failures = []
+        for failure in ('index', 'rename'):
+            try:
+                if failure == 'rename':
+                    with mock.patch('evidence_store.os.replace', side_effect=OSError("no space left")):
+                        store._write_batch(FailingConnection(), batch(1))
+                else:
+                    store._write_batch(FailingConnection(), batch(2))
+            except (OSError, sqlite3.Error) as e:
+                failures.append(type(e).__name__)
+        print(f"   - Failed batches: {failures}, {len(files_on_disk()) - len(before)} files left behind")
+        if len(failures) != 2 or files_on_disk() != before or store.total_bytes != total_bytes:
+            print("❌ Expected failed batches to remove their temporary and renamed files")
+            return False
+
+        print("✅ Evidence store test completed")
+        return True
+
+    except Exception as e:
+        print(f"❌ Evidence store test failed: {e}")
+        traceback.print_exc()
+        return False
+
+def test_soak():
+    """Test the soak harness verdicts on short runs: within bounds, grown, and too short to measure."""
+    print("\n🧪 Testing soak harness...")
+    
+    try:
+        import os
+        import tempfile
+        from soak import build_parser, run_soak
+        
+        def soak(*options):
+            return run_soak(build_parser().parse_args([
+                '--output-dir', tempfile.mkdtemp(prefix='soak-'), '--sample-interval', '0.5',
+                '--activity-period', '2', '--alert-interval', '0.5', '--send-latency', '0.01', *options]))
+        
+        cwd = os.getcwd()
+        verdicts = {
+            'within bounds': soak('--duration', '3', '--warmup', '1'),
+            'thread growth': soak('--duration', '3', '--warmup', '1', '--max-thread-growth', '-1'),
+            'inconclusive': soak('--duration', '1', '--warmup', '5'),
+        }
+        print(f"   - Verdicts: {verdicts}")
+        
+        if verdicts != {'within bounds': True, 'thread growth': False, 'inconclusive': False}:
+            print("❌ Expected a short clean run to pass, and growth or a run without samples to fail")
+            return False
+        if os.getcwd() != cwd:
+            print("❌ Expected the soak run to leave the working directory alone")
+            return False
+        
+        print("✅ Soak harness test completed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Soak harness test failed: {e}")
+        traceback.print_exc()
+        return False
+
 def test_main_app():
     """Test main application initialization."""
     print("\n🧪 Testing main application...")
@@ -223,6 +1951,27 @@ def main():
         ("Human Detector Test", test_human_detector),
         ("Alarm System Test", test_alarm_system),
         ("Notification System Test", test_notification_system),
+        ("Event Store Test", test_event_store),
+        ("Profiler Test", test_profiler),
+        ("Power Manager Test", test_power_manager),
+        ("Load Shedder Test", test_load_shedder),
+        ("Notification Pool Test", test_notification_pool),
+        ("SMTP Pool Test", test_smtp_pool),
+        ("WhatsApp Fan-out Test", test_whatsapp_fanout),
+        ("Alert Snapshot Test", test_alert_snapshot),
+        ("Alert Coalescing Test", test_alert_coalescer),
+        ("Notification Outbox Test", test_notification_outbox),
+        ("Notification Engine Test", test_notification_engine),
+        ("Media Upload Test", test_media_uploads),
+        ("Media Server Test", test_media_server),
+        ("Autotune Test", test_autotune),
+        ("Zone Filter Test", test_zone_filter),
+        ("Cascade Test", test_cascade),
+        ("Footage Analysis Test", test_footage_analysis),
+        ("Aggregator Test", test_aggregator),
+        ("Logging Test", test_logging),
+        ("Evidence Store Test", test_evidence_store),
+        ("Soak Harness Test", test_soak),
         ("Main Application Test", test_main_app),
     ]
     
@@ -0,0 +1,109 @@
+"""
+Generic JSON webhooks.
+
+Each alert is POSTed as JSON to every URL in WEBHOOK_URLS (home automation,
+chat bridges, incident tools). The payload carries the alert text and the
+images encoded for the 'webhook' snapshot profile as base64:
+
+    {"id": ..., "created": ..., "subject": ..., "message": ...,
+     "images": [{"filename": ..., "mime": ..., "data": <base64>}]}
+
+Every request carries an Idempotency-Key header (alert id + channel + URL),
+so a receiver can ignore a delivery that is retried after a timeout.
+"""
+
+import base64
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class WebhookError(Exception):
+    """Raised when a webhook did not accept an alert."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def build_webhook_payload(subject, message, created=None, alert_id=None, images=None):
+    """
+    Serialise an alert for webhooks.
+
+    Args:
+        images: Optional list of encoded images (.filename, .mime, .data)
+
+    Returns:
+        bytes: JSON body
+    """
+    return json.dumps({
+        'id': alert_id,
+        'created': created,
+        'subject': subject,
+        'message': message,
+        'images': [{'filename': image.filename, 'mime': image.mime,
+                    'data': base64.b64encode(image.data).decode()} for image in images or []],
+    }).encode()
+
+
+def check_webhook_response(url, status, text):
+    """
+    Raise WebhookError unless the status is a success.
+
+    Raises:
+        WebhookError: Retryable for throttling, timeouts and server errors
+    """
+    if 200 <= status < 300:
+        return
+    raise WebhookError(f"{url}: HTTP {status}: {text[:200]}", retryable=status in RETRYABLE_STATUS)
+
+
+class WebhookClient:
+    def __init__(self, timeout=None):
+        """
+        Args:
+            timeout: HTTP timeout in seconds (default from config)
+        """
+        self.timeout = timeout if timeout is not None else Config.WEBHOOK_TIMEOUT
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=Config.WEBHOOK_MAX_CONCURRENCY, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Statistics
+        self.sent = 0
+        self.failed = 0
+
+    def post(self, url, payload, idempotency_key=None):
+        """
+        POST one JSON payload.
+
+        Raises:
+            WebhookError: If the request failed or was rejected
+        """
+        headers = {'Content-Type': 'application/json'}
+        if idempotency_key:
+            headers['Idempotency-Key'] = f"{idempotency_key}:{url}"
+        try:
+            response = self.session.post(url, data=payload, headers=headers, timeout=self.timeout)
+            check_webhook_response(url, response.status_code, response.text)
+        except requests.RequestException as e:
+            self.failed += 1
+            raise WebhookError(f"{url}: {e}") from e
+        except WebhookError:
+            self.failed += 1
+            raise
+        self.sent += 1
+
+    def close(self):
+        """Release connections."""
+        self.session.close()
+
+    def get_stats(self):
+        """Get delivery statistics."""
+        return {'sent': self.sent, 'failed': self.failed}
@@ -0,0 +1,195 @@
+"""
+Concurrent WhatsApp delivery through the Twilio Messages REST API.
+
+One keep-alive HTTP session and a fixed set of sender threads are shared by
+all alerts, so messages to N recipients go out in parallel instead of one
+after another. A token bucket keeps the send rate inside the provider's
+limits, and each recipient is retried independently with exponential backoff
+and jitter, but only when the request provably never reached Twilio: connection
+failures and 429/503 rejections. The Messages API has no idempotency key, so a
+read timeout or another server error (the message may have been accepted) is
+reported as an unknown outcome and not resent.
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from config import Config
+from rate_limiter import TokenBucket
+
+# Responses that reject the request before it is processed; other 5xx may follow an accepted message
+RETRYABLE_STATUS = {429, 503}
+
+
+class WhatsAppSendError(Exception):
+    """Raised when a message could not be delivered to a recipient."""
+
+    def __init__(self, message, retryable=True, unknown=False):
+        """
+        Args:
+            message: Error description
+            retryable: Whether resending cannot deliver the message twice
+            unknown: Twilio may have accepted the message (read timeout, server error)
+        """
+        super().__init__(message)
+        self.retryable = retryable and not unknown
+        self.unknown = unknown
+
+
+def _never_sent(error):
+    """Whether a requests failure happened before the request reached the server."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class _TwilioClientBase:
+    """Settings, request building, backoff and statistics shared by the blocking and asyncio clients."""
+
+    def __init__(self, account_sid, auth_token, from_number, api_base=None, max_workers=None,
+                 rate_per_second=None, burst=None, max_retries=None, backoff_base=None, timeout=15):
+        """
+        Initialize the client.
+
+        Args:
+            account_sid: Twilio account SID
+            auth_token: Twilio auth token
+            from_number: Sender, e.g. 'whatsapp:+14155238886'
+            api_base: API root URL (default from config; point at a stand-in for tests)
+            max_workers: Concurrent sends (default from config)
+            rate_per_second: Sustained message rate limit (default from config)
+            burst: Messages allowed in a burst (default from config)
+            max_retries: Retries per recipient (default from config)
+            backoff_base: First retry delay in seconds (default from config)
+            timeout: HTTP timeout in seconds
+        """
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.api_base = (api_base if api_base is not None else Config.TWILIO_API_BASE).rstrip('/')
+        self.max_workers = max_workers if max_workers is not None else Config.WHATSAPP_MAX_CONCURRENCY
+        self.max_retries = max_retries if max_retries is not None else Config.WHATSAPP_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else Config.WHATSAPP_BACKOFF_BASE
+        self.timeout = timeout
+        self.url = f"{self.api_base}/2010-04-01/Accounts/{account_sid}/Messages.json"
+
+        rate = rate_per_second if rate_per_second is not None else Config.WHATSAPP_RATE_LIMIT
+        self.rate_limiter = TokenBucket(rate, burst if burst is not None else Config.WHATSAPP_RATE_BURST)
+
+        # Statistics
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    def _backoff(self, attempt, retry_after=None):
+        """Delay before the next attempt: exponential with full jitter, or the server's Retry-After."""
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    def _request(self, to, body, media_urls=None):
+        """Form fields of a Messages API call."""
+        data = {'To': to, 'From': self.from_number, 'Body': body}
+        if media_urls:
+            data['MediaUrl'] = list(media_urls)
+        return data
+
+    def get_stats(self):
+        """Get delivery statistics."""
+        return {'sent': self.sent, 'failed': self.failed, 'retries': self.retries}
+
+
+class TwilioWhatsAppClient(_TwilioClientBase):
+    def __init__(self, account_sid, auth_token, from_number, **kwargs):
+        """Initialize the client; see _TwilioClientBase for the keyword arguments."""
+        super().__init__(account_sid, auth_token, from_number, **kwargs)
+
+        # Keep-alive connection pool sized for the sender threads
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='whatsapp')
+
+    def send_message(self, to, body, media_urls=None):
+        """
+        Send one message, retrying failures where Twilio never received the request.
+
+        Args:
+            to: Recipient, e.g. 'whatsapp:+1234567890'
+            body: Message text
+            media_urls: Optional list of publicly reachable media URLs
+
+        Returns:
+            str: Message SID
+
+        Raises:
+            WhatsAppSendError: If all attempts failed, or with unknown=True when
+                the message may have been accepted
+        """
+        data = self._request(to, body, media_urls)
+
+        last_error, retryable, unknown = None, True, False
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+            self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                response = self.session.post(self.url, data=data, timeout=self.timeout)
+                if response.status_code in (200, 201):
+                    self.sent += 1
+                    return response.json().get('sid')
+                last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRYABLE_STATUS:
+                    retryable, unknown = False, response.status_code >= 500
+                    break
+                retry_after = response.headers.get('Retry-After')
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = str(e)
+                if not _never_sent(e):
+                    unknown = True
+                    break
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, retry_after))
+
+        self.failed += 1
+        raise WhatsAppSendError(f"{to}: {last_error}", retryable=retryable, unknown=unknown)
+
+    def fan_out(self, recipients, body, media_urls=None):
+        """
+        Send the same message to all recipients concurrently.
+
+        Returns:
+            dict: recipient -> message SID, or the exception raised for that recipient
+        """
+        futures = {}
+        for recipient in recipients:
+            recipient = recipient.strip()
+            if recipient:
+                futures[recipient] = self.executor.submit(self.send_message, recipient, body, media_urls)
+
+        results = {}
+        for recipient, future in futures.items():
+            try:
+                results[recipient] = future.result()
+            except Exception as e:
+                results[recipient] = e
+        return results
+
+    def close(self):
+        """Wait for in-flight sends and release connections."""
+        self.executor.shutdown(wait=True)
+        self.session.close()
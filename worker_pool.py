@@ -0,0 +1,245 @@
+"""
+Bounded worker pool.
+
+A fixed number of long-lived worker threads consume jobs from a queue with a
+fixed capacity, so a burst of work never creates more threads. When the queue
+is full the overflow policy decides what happens:
+
+    drop_newest  reject the new job
+    drop_oldest  discard the oldest queued job to make room
+    block        wait up to block_timeout seconds for room, then reject
+
+Delayed jobs (e.g. cleanups) are kept in a heap serviced by one scheduler
+thread instead of sleeping inside a thread of their own.
+"""
+
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+_STOP = object()
+
+
+class WorkerPool:
+    def __init__(self, name, num_workers=4, capacity=100, overflow_policy='drop_oldest', block_timeout=1.0):
+        """
+        Initialize the pool and start its threads.
+
+        Args:
+            name: Name used for the worker threads
+            num_workers: Number of worker threads
+            capacity: Maximum number of queued jobs
+            overflow_policy: One of OVERFLOW_POLICIES
+            block_timeout: Seconds to wait for room with the 'block' policy
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy!r}, expected one of {OVERFLOW_POLICIES}")
+
+        self.name = name
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=capacity)
+        self.accepting = True
+
+        # Delayed jobs: heap of (run_at, seq, fn, args, kwargs)
+        self.delayed = []
+        self.delayed_seq = itertools.count()
+        self.delayed_cond = threading.Condition()
+
+        # Metrics
+        self.metrics_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.latencies = []  # recent job run times in seconds
+        self.queue_waits = []  # recent submit-to-start times in seconds
+        self.max_queue_depth = 0
+
+        self.workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"{name}-worker-{i}")
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+        self.scheduler = threading.Thread(target=self._scheduler_loop, name=f"{name}-scheduler")
+        self.scheduler.daemon = True
+        self.scheduler.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue a job.
+
+        Returns:
+            bool: True if the job was accepted
+        """
+        if not self.accepting:
+            return False
+
+        job = (time.monotonic(), fn, args, kwargs)
+        with self.metrics_lock:
+            self.submitted += 1
+
+        try:
+            if self.overflow_policy == 'block':
+                self.queue.put(job, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(job)
+        except queue.Full:
+            if self.overflow_policy != 'drop_oldest':
+                self._record_drop()
+                return False
+            # Make room by discarding the oldest job, then retry once
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self._record_drop()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self._record_drop()
+                return False
+
+        with self.metrics_lock:
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    def schedule(self, delay, fn, *args, **kwargs):
+        """
+        Run a job on the pool after a delay.
+
+        Args:
+            delay: Seconds to wait before queueing the job
+        """
+        if not self.accepting:
+            return False
+        with self.delayed_cond:
+            heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.delayed_seq), fn, args, kwargs))
+            self.delayed_cond.notify()
+        return True
+
+    def _record_drop(self):
+        with self.metrics_lock:
+            self.dropped += 1
+
+    @staticmethod
+    def _record_sample(samples, value, limit=1000):
+        samples.append(value)
+        if len(samples) > limit:
+            del samples[:limit // 2]
+
+    def _worker_loop(self):
+        """Run queued jobs until a stop marker is received."""
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                self.queue.task_done()
+                break
+
+            submitted_at, fn, args, kwargs = job
+            started_at = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+                ok = result is not False
+            except Exception as e:
+                logger.error("%s job %s failed: %s", self.name, getattr(fn, '__name__', fn), e)
+                ok = False
+            finished_at = time.monotonic()
+
+            with self.metrics_lock:
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._record_sample(self.latencies, finished_at - started_at)
+                self._record_sample(self.queue_waits, started_at - submitted_at)
+            self.queue.task_done()
+
+    def _scheduler_loop(self):
+        """Move delayed jobs onto the queue when they fall due."""
+        with self.delayed_cond:
+            while True:
+                if not self.delayed:
+                    if not self.accepting:
+                        break
+                    self.delayed_cond.wait()
+                    continue
+
+                run_at = self.delayed[0][0]
+                now = time.monotonic()
+                if run_at > now and self.accepting:
+                    self.delayed_cond.wait(run_at - now)
+                    continue
+
+                # Due, or shutting down (remaining delayed jobs run immediately)
+                _, _, fn, args, kwargs = heapq.heappop(self.delayed)
+                job = (time.monotonic(), fn, args, kwargs)
+                with self.metrics_lock:
+                    self.submitted += 1
+                self.delayed_cond.release()
+                try:
+                    self.queue.put(job)
+                finally:
+                    self.delayed_cond.acquire()
+
+    def shutdown(self, timeout=10.0):
+        """
+        Stop accepting jobs, drain queued and delayed jobs, and stop the threads.
+
+        Args:
+            timeout: Maximum seconds to wait for the drain
+
+        Returns:
+            bool: True if everything drained in time
+        """
+        if not self.accepting:
+            return True
+        deadline = time.monotonic() + timeout
+
+        with self.delayed_cond:
+            self.accepting = False
+            self.delayed_cond.notify_all()
+        self.scheduler.join(timeout=max(0.0, deadline - time.monotonic()))
+
+        for _ in self.workers:
+            try:
+                self.queue.put(_STOP, timeout=max(0.01, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for worker in self.workers:
+            worker.join(timeout=max(0.0, deadline - time.monotonic()))
+
+        drained = not any(worker.is_alive() for worker in self.workers)
+        if not drained:
+            logger.warning("%s: %d job(s) still pending at shutdown", self.name, self.queue.qsize())
+        return drained
+
+    def get_stats(self):
+        """Get queue depth, throughput and latency metrics."""
+        with self.metrics_lock:
+            latencies = sorted(self.latencies)
+            waits = sorted(self.queue_waits)
+            return {
+                'workers': len(self.workers),
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'delayed_jobs': len(self.delayed),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'latency_avg': sum(latencies) / len(latencies) if latencies else 0.0,
+                'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+                'latency_max': latencies[-1] if latencies else 0.0,
+                'queue_wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+            }
@@ -0,0 +1,253 @@
+"""
+Polygon detection zones and exclusion masks.
+
+People only matter inside some areas (a door, a fence line) and never in
+others (a public pavement, a poster). Zones and exclusions are polygons in
+frame-relative coordinates, rasterised once per frame size into lookup
+tables at the model's input resolution:
+
+    labels       the first zone listed at each pixel, none under exclusions
+    area tables  summed-area tables of each zone and of the allowed area, so
+                 the part of any box inside a zone is four lookups
+
+Detections are then filtered in one vectorised pass, either on the box's
+foot point (bottom centre, where the person stands) or on the fraction of
+the box inside the allowed area. When the zones cover only part of the
+frame, their padded bounding box is also the region of interest: only that
+crop is passed to the model.
+
+Zone format (DETECTION_ZONES, EXCLUSION_ZONES): "name=x,y x,y x,y ..."
+polygons separated by ';', coordinates as fractions of the frame width and
+height, e.g. "door=0.1,0.3 0.35,0.3 0.35,1 0.1,1;fence=0,0.6 1,0.55 1,0.7 0,0.75".
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from config import Config
+
+MAX_ZONES = 255  # zone indexes in the label table are uint8, 255 = none
+NO_ZONE = 255
+FOOT, OVERLAP = 'foot', 'overlap'
+
+
+class Zone:
+    def __init__(self, name, points):
+        """
+        Args:
+            name: Zone name, reported with the detections inside it
+            points: (x, y) vertices as fractions of the frame size
+        """
+        self.name = name
+        self.points = np.asarray(points, dtype=np.float32)
+
+    def __repr__(self):
+        return f"{self.name} ({len(self.points)} points)"
+
+    def pixels(self, width, height):
+        """Vertices in pixels of a width x height image."""
+        return np.round(self.points * (width, height)).astype(np.int32)
+
+    @staticmethod
+    def parse_zones(spec):
+        """
+        Parse a zone specification string.
+
+        Returns:
+            list: Zone objects ([] for an empty spec)
+        """
+        zones = []
+        for index, part in enumerate(spec.split(';')):
+            part = part.strip()
+            if not part:
+                continue
+            name, _, coordinates = part.rpartition('=')
+            points = []
+            for pair in coordinates.split():
+                try:
+                    x, y = (float(value) for value in pair.split(','))
+                except ValueError:
+                    raise ValueError(f"zone {name or index}: bad point {pair!r}, expected x,y") from None
+                if not (0.0 <= x <= 1.0 and 0.0 <= y <= 1.0):
+                    raise ValueError(f"zone {name or index}: point {pair!r} outside 0..1")
+                points.append((x, y))
+            if len(points) < 3:
+                raise ValueError(f"zone {name or index}: a polygon needs at least 3 points")
+            zones.append(Zone(name.strip() or f"zone{index + 1}", points))
+        if len(zones) > MAX_ZONES:
+            raise ValueError(f"at most {MAX_ZONES} zones are supported")
+        return zones
+
+
+class _Masks:
+    """Lookup tables for one frame size."""
+
+    def __init__(self, zones, exclusions, frame_width, frame_height, mask_size):
+        self.scale = min(1.0, mask_size / max(frame_width, frame_height))
+        self.width = max(1, int(round(frame_width * self.scale)))
+        self.height = max(1, int(round(frame_height * self.scale)))
+
+        excluded = np.zeros((self.height, self.width), dtype=np.uint8)
+        for zone in exclusions:
+            cv2.fillPoly(excluded, [zone.pixels(self.width, self.height)], 1)
+
+        # Zones painted last to first, so where they overlap the first listed wins
+        self.labels = np.full((self.height, self.width), NO_ZONE, dtype=np.uint8)
+        zone_masks = []
+        for index, zone in reversed(list(enumerate(zones))):
+            mask = np.zeros((self.height, self.width), dtype=np.uint8)
+            cv2.fillPoly(mask, [zone.pixels(self.width, self.height)], 1)
+            mask[excluded == 1] = 0
+            self.labels[mask == 1] = index
+            zone_masks.insert(0, mask)
+        # Without zones the whole frame is allowed, minus exclusions
+        self.allowed = (self.labels != NO_ZONE) if zones else (excluded == 0)
+
+        # cv2.integral returns (h + 1, w + 1) tables with a zero first row and column
+        self.allowed_area = cv2.integral(self.allowed.astype(np.uint8))
+        self.zone_areas = (np.stack([cv2.integral(mask) for mask in zone_masks])
+                           if zone_masks else np.zeros((0, self.height + 1, self.width + 1), dtype=np.int32))
+
+
+class ZoneFilter:
+    def __init__(self, zones=None, exclusions=None, mode=None, min_overlap=None, mask_size=None,
+                 roi_padding=None, roi_max_fraction=None):
+        """
+        Initialize the filter.
+
+        Args:
+            zones: Zone list or specification string (default from config)
+            exclusions: Zone list or specification string (default from config)
+            mode: 'foot' (bottom centre of the box) or 'overlap' (default from config)
+            min_overlap: Fraction of a box that must be allowed in overlap mode (default from config)
+            mask_size: Longest side of the lookup tables, normally the inference size (default 640)
+            roi_padding: Margin around the zones' bounding box, as a fraction of the
+                frame size, so people standing in a zone are not cut off (default from config)
+            roi_max_fraction: Crop to the zones only if they cover less than this
+                fraction of the frame (default from config; 0 = never crop)
+        """
+        zones = zones if zones is not None else Config.DETECTION_ZONES
+        exclusions = exclusions if exclusions is not None else Config.EXCLUSION_ZONES
+        self.zones = Zone.parse_zones(zones) if isinstance(zones, str) else list(zones)
+        self.exclusions = Zone.parse_zones(exclusions) if isinstance(exclusions, str) else list(exclusions)
+        self.mode = mode or Config.ZONE_FILTER_MODE
+        if self.mode not in (FOOT, OVERLAP):
+            raise ValueError(f"Unknown zone filter mode {self.mode!r}, expected '{FOOT}' or '{OVERLAP}'")
+        self.min_overlap = min_overlap if min_overlap is not None else Config.ZONE_MIN_OVERLAP
+        self.mask_size = mask_size or 640
+        self.roi_padding = roi_padding if roi_padding is not None else Config.ZONE_ROI_PADDING
+        self.roi_max_fraction = roi_max_fraction if roi_max_fraction is not None else Config.ZONE_ROI_MAX_FRACTION
+
+        self.lock = threading.Lock()
+        self.masks = {}  # (width, height) -> _Masks
+        self.rois = {}  # (width, height) -> (x1, y1, x2, y2) or None
+
+        # Statistics
+        self.evaluated = 0
+        self.rejected = 0
+        self.cropped_frames = 0
+
+    @property
+    def active(self):
+        """True if any zone or exclusion is configured."""
+        return bool(self.zones or self.exclusions)
+
+    def _masks_for(self, frame_shape):
+        key = (frame_shape[1], frame_shape[0])
+        masks = self.masks.get(key)
+        if masks is None:
+            with self.lock:
+                masks = self.masks.get(key)
+                if masks is None:
+                    masks = self.masks[key] = _Masks(self.zones, self.exclusions, key[0], key[1], self.mask_size)
+        return masks
+
+    def roi(self, frame_shape):
+        """
+        Get the part of the frame worth running the model on.
+
+        Returns:
+            tuple or None: (x1, y1, x2, y2) in pixels, or None for the whole frame
+        """
+        key = (frame_shape[1], frame_shape[0])
+        if key not in self.rois:
+            self.rois[key] = self._compute_roi(*key)
+        roi = self.rois[key]
+        if roi is not None:
+            self.cropped_frames += 1
+        return roi
+
+    def _compute_roi(self, width, height):
+        if not self.zones or not self.roi_max_fraction:
+            return None
+        points = np.concatenate([zone.points for zone in self.zones])
+        (x1, y1), (x2, y2) = points.min(axis=0), points.max(axis=0)
+        x1, y1 = max(0.0, x1 - self.roi_padding), max(0.0, y1 - self.roi_padding)
+        x2, y2 = min(1.0, x2 + self.roi_padding), min(1.0, y2 + self.roi_padding)
+        if (x2 - x1) * (y2 - y1) >= self.roi_max_fraction:
+            return None
+        return int(x1 * width), int(y1 * height), int(np.ceil(x2 * width)), int(np.ceil(y2 * height))
+
+    def filter(self, detections, frame_shape):
+        """
+        Keep the detections inside the zones and outside the exclusions.
+
+        Args:
+            detections: Detection dicts with 'bbox' in frame pixels
+            frame_shape: Shape of the frame the boxes refer to
+
+        Returns:
+            list: Kept detections, each tagged with the 'zone' it is in (None without zones)
+        """
+        if not detections:
+            return detections
+        masks = self._masks_for(frame_shape)
+        boxes = np.array([detection['bbox'] for detection in detections], dtype=np.float32) * masks.scale
+
+        if self.mode == FOOT:
+            xs = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.int32), 0, masks.width - 1)
+            ys = np.clip(boxes[:, 3].astype(np.int32) - 1, 0, masks.height - 1)
+            keep = masks.allowed[ys, xs]
+            zone_index = masks.labels[ys, xs]
+        else:
+            x1 = np.clip(np.floor(boxes[:, 0]).astype(np.int32), 0, masks.width)
+            y1 = np.clip(np.floor(boxes[:, 1]).astype(np.int32), 0, masks.height)
+            x2 = np.clip(np.ceil(boxes[:, 2]).astype(np.int32), 0, masks.width)
+            y2 = np.clip(np.ceil(boxes[:, 3]).astype(np.int32), 0, masks.height)
+            box_area = np.maximum(1, (x2 - x1) * (y2 - y1))
+
+            def inside(table):
+                return table[..., y2, x2] - table[..., y1, x2] - table[..., y2, x1] + table[..., y1, x1]
+
+            keep = inside(masks.allowed_area) / box_area >= self.min_overlap
+            zone_index = inside(masks.zone_areas).argmax(axis=0) if self.zones else None
+
+        kept = []
+        for index in np.flatnonzero(keep):
+            detection = detections[index]
+            detection['zone'] = self.zones[zone_index[index]].name if self.zones else None
+            kept.append(detection)
+        self.evaluated += len(detections)
+        self.rejected += len(detections) - len(kept)
+        return kept
+
+    def draw(self, frame):
+        """Outline the zones (yellow) and exclusions (red) on a frame in place."""
+        height, width = frame.shape[:2]
+        for zones, color in ((self.zones, (0, 255, 255)), (self.exclusions, (0, 0, 255))):
+            for zone in zones:
+                cv2.polylines(frame, [zone.pixels(width, height)], True, color, 1)
+        return frame
+
+    def get_stats(self):
+        """Get filtering statistics."""
+        return {
+            'zones': len(self.zones),
+            'exclusions': len(self.exclusions),
+            'mode': self.mode,
+            'evaluated': self.evaluated,
+            'rejected': self.rejected,
+            'cropped_frames': self.cropped_frames,
+        }